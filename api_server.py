@@ -17,8 +17,10 @@ Endpoints :
   POST   /api/ventes                â†’ crÃ©er vente
   GET    /api/ventes/<id>           â†’ dÃ©tail vente
   GET    /api/factures              â†’ alias ventes
+  GET    /api/factures/<id>/pdf     â†’ PDF de la facture (cache, ETag, Range)
   GET    /api/sync                  â†’ tout d'un coup (sync complÃ¨te)
   POST   /api/sync/push             â†’ reÃ§oit donnÃ©es du mobile
+  GET    /api/metrics               â†’ metriques Prometheus (local)
   GET    /api/status                â†’ stats globales
 """
 
@@ -31,12 +33,22 @@ import re
 import secrets
 import logging
 import ipaddress
+from time import perf_counter
 from datetime import datetime, timedelta, timezone
+from dataclasses import replace
 from functools import wraps
 
-from flask import Flask, jsonify, request, g
+from flask import Flask, Response, jsonify, request, g, send_file
+from flask.json.provider import DefaultJSONProvider
 from db_manager import get_database
+from models.base import RowModel
 from auth import verify_password
+from repositories.pagination import MAX_PAGE_SIZE, Page, decode_cursor, encode_cursor
+from repositories.product_repository import ProductRepository
+from repositories.client_repository import ClientRepository
+from repositories.sale_repository import SaleRepository
+from services import api_metrics
+from services.query_profiler import PROFILER
 
 # â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€
 #  Configuration
@@ -51,11 +63,37 @@ API_RATE_LIMIT_MAX_REQUESTS = int(os.getenv("ERP_API_RATE_LIMIT_MAX_REQUESTS", "
 API_RATE_LIMIT_WINDOW_SEC = int(os.getenv("ERP_API_RATE_LIMIT_WINDOW_SEC", "60"))
 API_ALLOWED_SUBNETS = [s.strip() for s in os.getenv("ERP_API_ALLOWED_SUBNETS", "").split(",") if s.strip()]
 
+class _ModelJSONProvider(DefaultJSONProvider):
+    """Serialise les modeles a slots directement, sans copie prealable en dict."""
+
+    ensure_ascii = False
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, RowModel):
+            return o.to_json()
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
 app.config["JSON_ENSURE_ASCII"] = False
+app.json = _ModelJSONProvider(app)
 logger = logging.getLogger(__name__)
 _rate_limit_state = {}
 
+METRICS = api_metrics.REGISTRY
+HTTP_REQUESTS = METRICS.counter("erp_api_requests_total", "Requetes HTTP par route, methode et statut",
+                                ("route", "method", "status"))
+HTTP_LATENCY = METRICS.histogram("erp_api_request_duration_seconds", "Duree de traitement des requetes HTTP",
+                                 ("route", "method"))
+# static: token statique (aucune lecture en base), dynamic: token valide lu en base
+AUTH_RESULTS = METRICS.counter("erp_api_auth_total",
+                               "Controles d'acces: static, dynamic, missing, invalid, error, "
+                               "rate_limited, ip_blocked", ("result",))
+SYNC_PAYLOAD = METRICS.histogram("erp_api_sync_payload_bytes",
+                                 "Taille des echanges de synchronisation (out: /api/sync, in: /api/sync/push)",
+                                 ("direction",), buckets=api_metrics.SIZE_BUCKETS)
+
 
 # â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€
 #  Authentification par token
@@ -197,14 +235,17 @@ def require_token(f):
         client_ip = _client_ip()
 
         if not _is_ip_allowed(client_ip):
+            AUTH_RESULTS.inc("ip_blocked")
             _audit_security_event("api.ip_blocked", "failed", {"ip": client_ip})
             return jsonify({"error": "Acces refuse", "code": 403}), 403
 
         if _is_rate_limited(client_ip, token):
+            AUTH_RESULTS.inc("rate_limited")
             _audit_security_event("api.rate_limited", "failed", {"ip": client_ip})
             return jsonify({"error": "Trop de requetes", "code": 429}), 429
 
         if not token:
+            AUTH_RESULTS.inc("missing")
             _audit_security_event("api.token_missing", "failed")
             return jsonify({"error": "Token invalide", "code": 401}), 401
 
@@ -212,24 +253,51 @@ def require_token(f):
         if token == API_TOKEN:
             g.auth_user_id = None
             g.auth_token_kind = "static"
+            AUTH_RESULTS.inc("static")
             return f(*args, **kwargs)
 
         try:
             db = get_database()
             token_row = _validate_dynamic_token(db, token)
             if not token_row:
+                AUTH_RESULTS.inc("invalid")
                 _audit_security_event("api.token_invalid", "failed", {"kind": "dynamic"})
                 return jsonify({"error": "Token invalide", "code": 401}), 401
             g.auth_user_id = token_row.get("created_by_user_id")
             g.auth_token_kind = "dynamic"
+            AUTH_RESULTS.inc("dynamic")
             return f(*args, **kwargs)
         except Exception as exc:
             log_api_exception("auth.require_token", exc)
+            AUTH_RESULTS.inc("error")
             _audit_security_event("api.token_check_error", "failed")
             return jsonify({"error": "Token invalide", "code": 401}), 401
     return decorated
 
 
+@app.before_request
+def _metrics_start():
+    g.metrics_start = perf_counter()
+
+
+@app.after_request
+def _metrics_record(response):
+    """Compte la requete; la route est le motif Flask (/api/ventes/<int:sale_id>), pas l'URL."""
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+    HTTP_LATENCY.observe(perf_counter() - start, route, request.method)
+    if route == "/api/sync":
+        size = response.calculate_content_length()
+        if size is not None:
+            SYNC_PAYLOAD.observe(size, "out")
+    elif route == "/api/sync/push" and request.content_length is not None:
+        SYNC_PAYLOAD.observe(request.content_length, "in")
+    return response
+
+
 def ok(data=None, message="OK", **kwargs):
     resp = {"success": True, "message": message}
     if data is not None:
@@ -250,6 +318,42 @@ def log_api_exception(context, exc):
     logger.exception("API error in %s: %s", context, exc)
 
 
+def _page_args(default_limit=None):
+    """
+    Lit ?after=<curseur>&limit=<n> pour la pagination keyset.
+    Retourne (after, limit) ou None si le client ne pagine pas.
+    """
+    raw_after = request.args.get("after")
+    raw_limit = request.args.get("limit")
+    if raw_after is None and raw_limit is None and default_limit is None:
+        return None
+    after = decode_cursor(raw_after)
+    limit = int(raw_limit) if raw_limit is not None else (default_limit or 100)
+    return after, limit
+
+
+def _first_rows(fetch, after, limit):
+    """
+    Page demandee; sans curseur, ?limit=N renvoie N lignes comme avant la
+    pagination (lues par pages de MAX_PAGE_SIZE), pour les clients mobiles
+    qui ignorent next_cursor.
+    """
+    if after is not None:
+        return fetch(after=after, limit=limit)
+    items = []
+    while True:
+        page = fetch(after=after, limit=min(limit - len(items), MAX_PAGE_SIZE))
+        items.extend(page.items)
+        if not page.has_more or len(items) >= limit:
+            return Page(items, page.next_cursor)
+        after = page.next_cursor
+
+
+def ok_page(page, label):
+    return ok(page.items, f"{len(page.items)} {label}",
+              count=len(page.items), next_cursor=encode_cursor(page.next_cursor))
+
+
 # â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€
 #  Routes de base
 # â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€
@@ -279,6 +383,19 @@ def status():
     })
 
 
+@app.route("/api/metrics")
+def metrics():
+    """
+    Metriques au format texte Prometheus. Servies seulement en local (adresse
+    de la connexion, pas X-Forwarded-For): pas de token pour le collecteur.
+    """
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        AUTH_RESULTS.inc("ip_blocked")
+        return jsonify({"error": "Acces refuse", "code": 403}), 403
+    body = METRICS.render() + api_metrics.db_metrics(PROFILER)
+    return Response(body, content_type=api_metrics.CONTENT_TYPE)
+
+
 @app.route("/api/dashboard/stats")
 @require_token
 def dashboard_stats():
@@ -451,24 +568,21 @@ def _serialize_product(p):
 @require_token
 def get_produits():
     db = get_database()
+    try:
+        paging = _page_args()
+    except ValueError as e:
+        return err(str(e))
+    if paging and not request.args.get("since"):
+        try:
+            page = ProductRepository(db).iter_page(after=paging[0], limit=paging[1])
+            page = replace(page, items=[_serialize_product(p) for p in page.items])
+            return ok_page(page, "produit(s)")
+        except Exception as e:
+            log_api_exception("produits.page", e)
+            return err(str(e))
     since = request.args.get("since")   # filtre: modifiÃ©s aprÃ¨s cette date ISO
     try:
-        if since:
-            db.cursor.execute("""
-                SELECT p.*, c.name AS category_name
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.updated_at >= ? OR p.created_at >= ?
-                ORDER BY p.name
-            """, (since, since))
-        else:
-            db.cursor.execute("""
-                SELECT p.*, c.name AS category_name
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                ORDER BY p.name
-            """)
-        products = [_serialize_product(dict(r)) for r in db.cursor.fetchall()]
+        products = ProductRepository(db).list_products(since=since)
         return ok(products, f"{len(products)} produit(s)", count=len(products))
     except Exception as e:
         log_api_exception("produits.list", e)
@@ -570,15 +684,26 @@ def _save_product_image(db, product_id, image_base64):
 @require_token
 def get_clients():
     db = get_database()
+    try:
+        paging = _page_args()
+    except ValueError as e:
+        return err(str(e))
+    if paging and not request.args.get("since"):
+        try:
+            page = ClientRepository(db).iter_page(after=paging[0], limit=paging[1])
+            return ok_page(page, "client(s)")
+        except Exception as e:
+            log_api_exception("clients.page", e)
+            return err(str(e))
     since = request.args.get("since")
     try:
         if since:
             db.cursor.execute(
                 "SELECT * FROM clients WHERE created_at >= ? ORDER BY name",
                 (since,))
+            clients = [dict(r) for r in db.cursor.fetchall()]
         else:
-            db.cursor.execute("SELECT * FROM clients ORDER BY name")
-        clients = [dict(r) for r in db.cursor.fetchall()]
+            clients = ClientRepository(db).list_clients()
         return ok(clients, f"{len(clients)} client(s)", count=len(clients))
     except Exception as e:
         log_api_exception("clients.list", e)
@@ -645,27 +770,14 @@ def update_client(client_id):
 def get_ventes():
     db = get_database()
     since  = request.args.get("since")
-    limit  = int(request.args.get("limit", 100))
     try:
-        if since:
-            db.cursor.execute("""
-                SELECT s.*, c.name AS client_name
-                FROM sales s
-                LEFT JOIN clients c ON s.client_id = c.id
-                WHERE s.sale_date >= ?
-                ORDER BY s.sale_date DESC
-                LIMIT ?
-            """, (since, limit))
-        else:
-            db.cursor.execute("""
-                SELECT s.*, c.name AS client_name
-                FROM sales s
-                LEFT JOIN clients c ON s.client_id = c.id
-                ORDER BY s.sale_date DESC
-                LIMIT ?
-            """, (limit,))
-        ventes = [dict(r) for r in db.cursor.fetchall()]
-        return ok(ventes, f"{len(ventes)} vente(s)", count=len(ventes))
+        after, limit = _page_args(default_limit=100)
+    except ValueError as e:
+        return err(str(e))
+    try:
+        repository = SaleRepository(db)
+        page = _first_rows(lambda **kw: repository.iter_page(since=since, **kw), after, limit)
+        return ok_page(page, "vente(s)")
     except Exception as e:
         log_api_exception("ventes.list", e)
         return err(str(e))
@@ -691,6 +803,30 @@ def get_vente(sale_id):
     return ok(dict(sale))
 
 
+@app.route("/api/ventes/<int:sale_id>/pdf", methods=["GET"])
+@app.route("/api/factures/<int:sale_id>/pdf", methods=["GET"])
+@require_token
+def get_facture_pdf(sale_id):
+    """
+    PDF de la facture, servi depuis le cache disque.
+    ETag = empreinte du contenu : If-None-Match renvoie 304, Range renvoie 206.
+    """
+    from services.invoice_pdf_service import InvoicePdfService   # reportlab, au premier PDF
+
+    try:
+        cached = InvoicePdfService(get_database()).cached_pdf(sale_id)
+    except Exception as e:
+        log_api_exception("factures.pdf", e)
+        return err(str(e), 500)
+    if cached is None:
+        return err("Vente introuvable", 404)
+    path, digest = cached
+    response = send_file(path, mimetype="application/pdf", conditional=True, etag=digest,
+                         download_name=f"facture_{sale_id}.pdf", max_age=0)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/api/ventes", methods=["POST"])
 @require_token
 def create_vente():
@@ -740,26 +876,14 @@ def full_sync():
 
     try:
         # Produits
-        if since:
-            db.cursor.execute("""
-                SELECT p.*, c.name AS category_name
-                FROM products p LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.updated_at >= ? OR p.created_at >= ?
-            """, (since, since))
-        else:
-            db.cursor.execute("""
-                SELECT p.*, c.name AS category_name
-                FROM products p LEFT JOIN categories c ON p.category_id = c.id
-                ORDER BY p.name
-            """)
-        products = [_serialize_product(dict(r)) for r in db.cursor.fetchall()]
+        products = ProductRepository(db).list_products(since=since)
 
         # Clients
         if since:
             db.cursor.execute("SELECT * FROM clients WHERE created_at >= ?", (since,))
+            clients = [dict(r) for r in db.cursor.fetchall()]
         else:
-            db.cursor.execute("SELECT * FROM clients ORDER BY name")
-        clients = [dict(r) for r in db.cursor.fetchall()]
+            clients = ClientRepository(db).list_clients()
 
         # Ventes rÃ©centes (30 derniÃ¨res)
         db.cursor.execute("""
@@ -784,6 +908,7 @@ def full_sync():
             "clients":   clients,
             "ventes":    ventes,
             "settings":  settings,
+            "settings_version": db.settings_version,
             "sync_time": datetime.now().isoformat(),
             "counts": {
                 "produits": len(products),
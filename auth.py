@@ -100,6 +100,7 @@ PERMISSIONS: dict[str, set[str]] = {
     "backup_database":   {"admin"},
     "restore_database":  {"admin"},
     "cleanup_database":  {"admin"},
+    "repair_database":   {"admin"},
 
     # ── Gestion des utilisateurs ─────────────────────────────
     "manage_users":      {"admin"},
@@ -14,7 +14,6 @@ Toutes les données seront définitivement supprimées.
 import sqlite3
 import os
 from datetime import datetime
-import shutil
 
 
 class ERPDataCleaner:
@@ -27,23 +26,15 @@ class ERPDataCleaner:
     def create_backup(self):
         """
         Crée une sauvegarde de la base de données avant nettoyage
+        (instantané incrémental dans le magasin de sauvegardes)
         """
         if not os.path.exists(self.db_path):
             print(f"❌ Base de données '{self.db_path}' introuvable.")
             return False
         
-        # Créer un dossier de sauvegarde
-        backup_folder = 'backups'
-        if not os.path.exists(backup_folder):
-            os.makedirs(backup_folder)
-        
-        # Nom du fichier de sauvegarde avec date et heure
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        self.backup_path = os.path.join(backup_folder, f'erp_backup_{timestamp}.db')
-        
         try:
-            # Copier la base de données
-            shutil.copy2(self.db_path, self.backup_path)
+            from services.backup_service import create_backup
+            self.backup_path = create_backup(self.db_path, label="avant_nettoyage")
             print(f"✅ Sauvegarde créée : {self.backup_path}")
             return True
         except Exception as e:
@@ -98,7 +89,7 @@ class ERPDataCleaner:
         
         total_records = 0
         
-        print(f"\n{'Table':<25} {'Nombre d\'enregistrements':>20}")
+        print("\n{:<25} {:>20}".format("Table", "Nombre d'enregistrements"))
         print("-"*70)
         
         for table_name, count in sorted(table_info.items()):
@@ -320,10 +311,11 @@ def clean_specific_table(table_name, db_path='erp_system.db'):
 
 def restore_from_backup(backup_path, db_path='erp_system.db'):
     """
-    Restaure la base de données depuis une sauvegarde
+    Restaure la base de données depuis une sauvegarde : manifeste d'instantané
+    (.json du magasin) ou ancienne copie complète (.db)
     
     Usage:
-        restore_from_backup('backups/erp_backup_20260215_143022.db')
+        restore_from_backup('backups/manifests/erp_backup_20260215_143022.json')
     """
     try:
         if not os.path.exists(backup_path):
@@ -338,8 +330,13 @@ def restore_from_backup(backup_path, db_path='erp_system.db'):
             print("❌ Restauration annulée.")
             return False
         
-        # Copier la sauvegarde
-        shutil.copy2(backup_path, db_path)
+        # Reconstituer et vérifier la sauvegarde à côté de la base, puis permuter
+        from services.backup_service import prepare_restore
+        staged = prepare_restore(backup_path, db_path)
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        os.replace(staged, db_path)
         
         print(f"✅ Base de données restaurée depuis : {backup_path}")
         return True
@@ -349,19 +346,16 @@ def restore_from_backup(backup_path, db_path='erp_system.db'):
         return False
 
 
-def list_backups():
+def list_backups(backup_folder=None):
     """
-    Liste toutes les sauvegardes disponibles
+    Liste les instantanés du magasin de sauvegardes (du plus récent au plus ancien)
     """
-    backup_folder = 'backups'
-    
-    if not os.path.exists(backup_folder):
-        print("ℹ️  Aucune sauvegarde trouvée.")
-        return []
+    from services.backup_store import BackupStore
     
-    backups = [f for f in os.listdir(backup_folder) if f.endswith('.db')]
+    store = BackupStore(backup_folder)
+    snapshots = store.snapshots()
     
-    if not backups:
+    if not snapshots:
         print("ℹ️  Aucune sauvegarde trouvée.")
         return []
     
@@ -369,17 +363,18 @@ def list_backups():
     print("💾 SAUVEGARDES DISPONIBLES")
     print("="*70)
     
-    for i, backup in enumerate(sorted(backups, reverse=True), 1):
-        path = os.path.join(backup_folder, backup)
-        size = os.path.getsize(path) / 1024  # Ko
-        mtime = datetime.fromtimestamp(os.path.getmtime(path))
-        
-        print(f"{i}. {backup}")
-        print(f"   📅 Date: {mtime.strftime('%d/%m/%Y %H:%M:%S')}")
-        print(f"   📦 Taille: {size:.2f} Ko")
+    for i, snap in enumerate(snapshots, 1):
+        created = datetime.fromisoformat(snap.created_at)
+        
+        print(f"{i}. {snap.id}" + (f"  ({snap.label})" if snap.label else ""))
+        print(f"   📅 Date: {created.strftime('%d/%m/%Y %H:%M:%S')}")
+        print(f"   📦 Taille: {snap.size / 1024:.2f} Ko "
+              f"(écrit : {snap.stored_bytes / 1024:.2f} Ko, "
+              f"{snap.new_chunks}/{snap.chunk_count} blocs nouveaux)")
         print()
     
-    return backups
+    print(f"🗄️  Magasin : {store.stored_size() / 1024:.2f} Ko au total")
+    return snapshots
 
 
 # ============================================================================
@@ -431,9 +426,11 @@ def interactive_menu():
         elif choice == "5":
             backups = list_backups()
             if backups:
-                backup_name = input("\n📂 Nom du fichier de sauvegarde : ")
-                backup_path = os.path.join('backups', backup_name)
-                restore_from_backup(backup_path)
+                choice = input("\n📂 Numéro de la sauvegarde : ")
+                if choice.isdigit() and 1 <= int(choice) <= len(backups):
+                    restore_from_backup(backups[int(choice) - 1].path)
+                else:
+                    print("\n❌ Numéro invalide.")
             
         elif choice == "6":
             cleaner = ERPDataCleaner('erp_system.db')
@@ -466,9 +463,7 @@ def run_full_cleanup(db_path="erp_database.db"):
         dict  {"success": bool, "backup_path": str|None,
                "cleaned": dict[table->count], "message": str}
     """
-    import shutil
     from pathlib import Path
-    from datetime import datetime
 
     result = {
         "success":     False,
@@ -480,16 +475,11 @@ def run_full_cleanup(db_path="erp_database.db"):
     db_file = Path(db_path)
 
     # ── 1. Sauvegarde automatique avant toute suppression ─────────────
-    backup_dir = db_file.parent / "backups"
-    backup_dir.mkdir(exist_ok=True)
-    ts          = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = backup_dir / f"{db_file.stem}_avant_nettoyage_{ts}.db"
-
     try:
         if db_file.exists() and db_file.stat().st_size > 0:
-            shutil.copy2(db_path, backup_path)
-            result["backup_path"] = str(backup_path)
-            print(f"✅ Sauvegarde créée : {backup_path}")
+            from services.backup_service import create_backup
+            result["backup_path"] = create_backup(db_path, label="avant_nettoyage")
+            print(f"✅ Sauvegarde créée : {result['backup_path']}")
         else:
             print("⚠️  Base introuvable ou vide — sauvegarde ignorée")
     except Exception as e:
@@ -504,6 +494,12 @@ def run_full_cleanup(db_path="erp_database.db"):
         # Ordre respectant les clés étrangères (enfants avant parents)
         tables = [
             "return_items", "returns",
+            "product_abc", "product_sales_daily", "product_abc_state",
+            "product_affinity", "product_pair_counts",
+            "product_basket_counts", "product_affinity_state",
+            "client_segments", "client_segment_state",
+            "product_forecasts",
+            "stock_snapshot_items", "stock_snapshots",
             "stock_movements",
             "purchase_items", "purchases",
             "sale_items",     "sales",
@@ -527,6 +523,7 @@ def run_full_cleanup(db_path="erp_database.db"):
                 print(f"  ⚠️  {table:<22} ignoré ({e})")
 
         db.conn.commit()
+        db.invalidate_settings()
         result["cleaned"]  = cleaned
         result["success"]  = True
         total = sum(cleaned.values())
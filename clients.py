@@ -13,6 +13,7 @@ from currency import fmt_da, fmt, currency_manager  # IMPORT DE LA FONCTION DE F
 from repositories.client_repository import ClientRepository
 from services.client_service import ClientService
 from services.audit_service import AuditService
+from services.client_segments import SEGMENTS, segment_label, segment_color
 
 # ------------------ DIALOG POUR AJOUTER / MODIFIER CLIENT ------------------
 class ClientDialog(QDialog):
@@ -106,6 +107,7 @@ class ClientsPage(QWidget):
         self.db = get_database()
         self.client_service = ClientService(ClientRepository(self.db), audit_service=AuditService(self.db))
         self._all_clients = []   # cache complet pour filtre/tri
+        self._segments = {}      # client_id -> ligne client_segments (RFM)
 
         # ── Layout racine ──────────────────────────────────────
         root = QVBoxLayout(self)
@@ -172,13 +174,23 @@ class ClientsPage(QWidget):
         ctrl_row.addWidget(self.search_input, 1)
 
         self.sort_combo = QComboBox()
-        self.sort_combo.addItems(["A → Z", "Z → A", "Plus récent", "Plus de ventes"])
+        self.sort_combo.addItems(["A → Z", "Z → A", "Plus récent", "Plus de ventes", "Segment RFM"])
         self.sort_combo.setMinimumHeight(40)
         self.sort_combo.setFixedWidth(160)
         self.sort_combo.setStyleSheet(INPUT_STYLE)
         self.sort_combo.currentIndexChanged.connect(self._apply_filter)
         ctrl_row.addWidget(self.sort_combo)
 
+        self.segment_combo = QComboBox()
+        self.segment_combo.addItem("Tous les segments", None)
+        for code, (label, _) in SEGMENTS.items():
+            self.segment_combo.addItem(label, code)
+        self.segment_combo.setMinimumHeight(40)
+        self.segment_combo.setFixedWidth(170)
+        self.segment_combo.setStyleSheet(INPUT_STYLE)
+        self.segment_combo.currentIndexChanged.connect(self._apply_filter)
+        ctrl_row.addWidget(self.segment_combo)
+
         hdr_lay.addLayout(ctrl_row)
         root.addWidget(hdr_frame)
 
@@ -235,15 +247,10 @@ class ClientsPage(QWidget):
         init  = name[0].upper() if name else "?"
         color = self._AVATAR_COLORS[ord(init) % len(self._AVATAR_COLORS)]
 
-        # Compter les ventes
-        try:
-            self.db.cursor.execute(
-                "SELECT COUNT(*), COALESCE(SUM(total),0) FROM sales WHERE client_id=?", (cid,))
-            nb_v, ca = self.db.cursor.fetchone()
-            nb_v = int(nb_v or 0)
-            ca   = float(ca or 0)
-        except Exception:
-            nb_v, ca = 0, 0.0
+        # Ventes et segment RFM (table client_segments, sans requête par carte)
+        seg  = self._segments.get(cid) or {}
+        nb_v = int(seg.get("frequency") or 0)
+        ca   = float(seg.get("monetary") or 0)
 
         card = QFrame()
         card.setObjectName(f"card_{cid}")
@@ -303,6 +310,17 @@ class ClientsPage(QWidget):
             info_col.addWidget(em_lbl)
 
         top.addLayout(info_col, 1)
+
+        seg_color = segment_color(seg.get("segment"))
+        seg_lbl = QLabel(segment_label(seg.get("segment")))
+        seg_lbl.setFont(QFont("Segoe UI", 8, QFont.Weight.Bold))
+        seg_lbl.setToolTip(
+            f"R {seg['r_score']} · F {seg['f_score']} · M {seg['m_score']}" if seg else "Aucun achat")
+        seg_lbl.setStyleSheet(f"""
+            color:{seg_color}; background:{seg_color}1A;
+            border:1px solid {seg_color}55; border-radius:8px; padding:2px 8px;
+        """)
+        top.addWidget(seg_lbl, 0, Qt.AlignmentFlag.AlignTop)
         lay.addLayout(top)
 
         # ── Séparateur ──────────────────────────────────────────
@@ -410,6 +428,11 @@ class ClientsPage(QWidget):
                 if (text in name or text in phone or text in email):
                     clients.append(c)
 
+        segment = self.segment_combo.currentData()
+        if segment:
+            clients = [c for c in clients
+                       if (self._segments.get(c["id"]) or {}).get("segment") == segment]
+
         # Tri selon la sélection
         if order == 0:   # A → Z
             clients.sort(key=lambda c: c.get("name", "").lower())
@@ -418,15 +441,13 @@ class ClientsPage(QWidget):
         elif order == 2: # Plus récent
             clients.sort(key=lambda c: c.get("created_at", ""), reverse=True)
         elif order == 3: # Plus de ventes
-            def get_ca(client):
-                try:
-                    self.db.cursor.execute(
-                        "SELECT COALESCE(SUM(total),0) FROM sales WHERE client_id=?",
-                        (client["id"],))
-                    return float(self.db.cursor.fetchone()[0] or 0)
-                except Exception:
-                    return 0.0
-            clients.sort(key=get_ca, reverse=True)
+            clients.sort(key=lambda c: (self._segments.get(c["id"]) or {}).get("monetary", 0), reverse=True)
+        elif order == 4: # Segment RFM, meilleurs segments puis montant
+            rank = {code: i for i, code in enumerate(SEGMENTS)}
+            def seg_key(client):
+                seg = self._segments.get(client["id"]) or {}
+                return rank.get(seg.get("segment"), len(rank)), -seg.get("monetary", 0)
+            clients.sort(key=seg_key)
         
         # Afficher un petit badge avec le filtre actif
         if len(text) == 1 and text.isalpha():
@@ -480,6 +501,10 @@ class ClientsPage(QWidget):
             clients = self.client_service.list_clients()
         except Exception:
             clients = []
+        try:
+            self._segments = self.db.get_client_segments()
+        except Exception:
+            self._segments = {}
         self._all_clients = clients
         self._apply_filter()
 
@@ -599,6 +624,10 @@ class ClientFicheDialog(QDialog):
         super().__init__(parent)
         self.client = client
         self.db     = db
+        try:
+            self._segment = db.get_client_segment(client['id'])
+        except Exception:
+            self._segment = None
         self.setWindowTitle(f"📋 Fiche Client — {client.get('name','')}")
         self.setMinimumSize(820, 620)
         self.setStyleSheet(f"""
@@ -732,6 +761,17 @@ class ClientFicheDialog(QDialog):
         col.addWidget(self._header_sub_lbl)
         lay.addLayout(col, 1)
 
+        # Badge segment RFM
+        seg_code  = (self._segment or {}).get('segment')
+        seg_color = segment_color(seg_code)
+        seg_lbl = QLabel(segment_label(seg_code))
+        seg_lbl.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        seg_lbl.setStyleSheet(f"""
+            color: {seg_color}; background: {seg_color}1F;
+            border-radius: 8px; padding: 4px 12px; border: 1px solid {seg_color}55;
+        """)
+        lay.addWidget(seg_lbl)
+
         # Badge ID
         id_lbl = QLabel(f"#{self.client.get('id','')}")
         id_lbl.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
@@ -1160,10 +1200,9 @@ class ClientFicheDialog(QDialog):
         # Meilleure catégorie de produits achetés
         try:
             self.db.cursor.execute("""
-                SELECT p.name, SUM(si.quantity) as qty
+                SELECT si.product_name AS name, SUM(si.quantity) as qty
                 FROM sale_items si
                 JOIN sales s ON si.sale_id = s.id
-                LEFT JOIN products p ON si.product_id = p.id
                 WHERE s.client_id = ?
                 GROUP BY si.product_id
                 ORDER BY qty DESC LIMIT 5
@@ -1212,6 +1251,14 @@ class ClientFicheDialog(QDialog):
         grid.addWidget(stat_card("🏆", "Plus grosse facture", fmt_da(big),             '#F59E0B'), 1, 0)
         grid.addWidget(stat_card("📅", "Première visite",     prem,                    '#A0AACC'), 1, 1)
         grid.addWidget(stat_card("🕐", "Dernière visite",     last,                    '#A0AACC'), 1, 2)
+        seg = self._segment
+        if seg:
+            seg_color = segment_color(seg['segment'])
+            grid.addWidget(stat_card("🎯", "Segment RFM", segment_label(seg['segment']), seg_color), 2, 0)
+            grid.addWidget(stat_card("⭐", "Notes R · F · M",
+                                     f"{seg['r_score']} · {seg['f_score']} · {seg['m_score']}", seg_color), 2, 1)
+            grid.addWidget(stat_card("⏱️", "Jours depuis le dernier achat",
+                                     str(int(seg['recency_days'])), '#A0AACC'), 2, 2)
         lay.addLayout(grid)
 
         # Top produits achetés
@@ -29,6 +29,10 @@ _DEFAULTS = {
         "theme":     "dark",
         "page_size": "50",
     },
+    "invoices": {
+        "cache_dir":       "",
+        "cache_max_files": "2000",
+    },
     "logs": {
         "enabled": "true",
         "path":    "erp.log",
@@ -87,6 +91,20 @@ class AppConfig:
         """Nombre de lignes par page pour la pagination."""
         return self._parser.getint("app", "page_size")
 
+    # ── Paramètres factures ───────────────────────────────────────
+    @property
+    def invoice_cache_dir(self) -> str:
+        """Dossier du cache des PDF de factures (défaut : invoice_cache/ à côté de la base)."""
+        path = self._parser.get("invoices", "cache_dir").strip()
+        if not path:
+            return os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "invoice_cache")
+        return path
+
+    @property
+    def invoice_cache_max_files(self) -> int:
+        """Nombre maximum de PDF conservés dans le cache (les moins récemment servis sont supprimés)."""
+        return self._parser.getint("invoices", "cache_max_files")
+
     # ── Paramètres logs ───────────────────────────────────────────
     @property
     def logs_enabled(self) -> bool:
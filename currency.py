@@ -8,7 +8,9 @@ aux devises dans l'ERP. Il expose :
   • CURRENCIES — catalogue des 12 devises supportées
   • CurrencyManager — singleton qui lit/écrit les préférences en BDD
   • fmt() — remplace fmt_da() partout dans l'application
+  • format_many() / fmt_da_many() — formatage d'une colonne entière
   • convert() — convertit un montant d'une devise vers une autre
+  • convert_series() — conversion d'une colonne aux taux historiques
 
 Utilisation dans n'importe quel fichier :
     from currency import fmt, convert, currency_manager
@@ -19,10 +21,23 @@ Utilisation dans n'importe quel fichier :
 """
 
 from __future__ import annotations
+from bisect import bisect_right
 from dataclasses import dataclass, field
+from datetime import date
+from functools import lru_cache
 from typing import Optional
 import sqlite3
 
+try:  # optionnel : accélère format_many() / fmt_da_many()
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# En dessous, le formatage vectorisé coûte plus que la boucle Python
+BULK_MIN_SIZE = 64
+# Entrées du cache LRU des montants déjà formatés (valeurs répétées)
+FORMAT_CACHE_SIZE = 8192
+
 
 # ──────────────────────────────────────────────────────────────────
 # Catalogue des devises supportées
@@ -63,6 +78,9 @@ CURRENCIES: dict[str, Currency] = {
     "CAD": Currency("CAD", "CA$", "Dollar Canadien",     symbol_after=False, decimals=2, flag="🇨🇦"),
 }
 
+# Date d'effet du taux antérieur au premier changement enregistré
+HISTORY_START = "1970-01-01"
+
 # Taux par rapport au DZD (1 unité de devise = X DZD)
 # Source : taux indicatifs — l'utilisateur peut les ajuster dans les paramètres
 DEFAULT_RATES_TO_DZD: dict[str, float] = {
@@ -81,6 +99,162 @@ DEFAULT_RATES_TO_DZD: dict[str, float] = {
 }
 
 
+# ──────────────────────────────────────────────────────────────────
+# Formatage des montants : gabarits précompilés, cache LRU et colonnes
+# ──────────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=None)
+def _currency_parts(code: str, decimals: int) -> tuple[str, str, int]:
+    """(préfixe, suffixe, décimales) d'une devise, ex: ('', ' DA', 2)."""
+    currency = CURRENCIES.get(code, CURRENCIES["DZD"])
+    d = decimals if decimals >= 0 else currency.decimals
+    d = d if d in (0, 3) else 2
+    if currency.symbol_after:
+        return "", f" {currency.symbol}", d
+    return f"{currency.symbol} ", "", d
+
+
+@lru_cache(maxsize=None)
+def _currency_pattern(code: str, decimals: int) -> str:
+    """Gabarit str.format précompilé par devise, ex: '{:,.2f} DA'."""
+    prefix, suffix, d = _currency_parts(code, decimals)
+    escape = lambda t: t.replace("{", "{{").replace("}", "}}")
+    return f"{escape(prefix)}{{:,.{d}f}}{escape(suffix)}"
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_value(value: float, pattern: str) -> str:
+    return pattern.format(value)
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _fmt_da_value(value: float, include_da: bool, decimales) -> str:
+    if decimales is not None:
+        # Format fixe
+        partie_nombre = f"{value:,.{decimales}f}"
+    elif value.is_integer():
+        # Format intelligent
+        partie_nombre = f"{int(value):,}"
+    else:
+        partie_nombre = f"{value:,.2f}"
+    # Remplacer les virgules par des espaces
+    partie_nombre = partie_nombre.replace(',', ' ')
+    return f"{partie_nombre} DA" if include_da else partie_nombre
+
+
+@lru_cache(maxsize=None)
+def _group_table(sep: str, prefix: str = ""):
+    """
+    Groupes de 3 chiffres : [absent, tête, tête négative, groupe intérieur] ;
+    le préfixe (symbole avant le montant) est porté par la tête.
+    """
+    heads = [str(i) for i in range(1000)]
+    return np.array([[""] * 1000, [prefix + h for h in heads], [f"{prefix}-{h}" for h in heads],
+                     [f"{sep}{i:03d}" for i in range(1000)]])
+
+
+@lru_cache(maxsize=None)
+def _fraction_table(d: int, suffix: str = ""):
+    """Décimales suivies du suffixe (symbole après le montant)."""
+    if not d:
+        return np.array([suffix])
+    return np.array([f".{i:0{d}d}{suffix}" for i in range(10 ** d)])
+
+
+def _as_array(values):
+    """Tableau float64 des montants, ou None si une valeur n'est pas numérique."""
+    try:
+        return np.fromiter(map(float, values), dtype=float, count=len(values))
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_fixed(v, d: int, sep: str, prefix: str = "", suffix: str = "", whole_only=None):
+    """
+    Formate le tableau `v` avec `d` décimales et séparateur de milliers `sep`
+    (ex: '-1 234.50 DA') par tables de groupes de 3 chiffres, sans boucle
+    Python par valeur ; les valeurs du masque `whole_only` sont écrites sans
+    décimales. Retourne (textes, masque) : les valeurs du masque (non finies,
+    énormes ou à un demi-centime près) sont à formater en scalaire.
+    """
+    scale = 10 ** d
+    with np.errstate(invalid="ignore"):
+        scaled = np.abs(v) * scale
+        fallback = ~np.isfinite(scaled) | (scaled >= 1e15)
+        scaled[fallback] = 0
+        fallback |= np.abs(scaled - np.floor(scaled) - 0.5) <= scaled * 1e-15 + 1e-9
+    units = np.rint(scaled).astype(np.int64)
+    whole = units // scale
+
+    top = np.zeros(len(v), dtype=np.int64)      # rang du groupe de tête
+    rest = whole // 1000
+    while rest.any():
+        top += rest > 0
+        rest //= 1000
+
+    table = _group_table(sep, prefix)
+    head = np.where(v < 0, 2, 1)
+    out = None
+    for level in range(int(top.max(initial=0)), -1, -1):
+        variant = np.where(top > level, 3, np.where(top == level, head, 0))
+        group = table[variant, (whole // 1000 ** level) % 1000]
+        out = group if out is None else np.char.add(out, group)
+    fraction = _fraction_table(d, suffix)[units % scale]
+    if whole_only is not None:
+        fraction = np.where(whole_only, suffix, fraction)
+    return np.char.add(out, fraction), fallback
+
+
+def _render_many(v, render):
+    """
+    Applique `render(tableau) -> textes` ; si l'échantillon de tête montre
+    des valeurs répétées, chaque valeur distincte n'est formatée qu'une fois.
+    """
+    sample = v[:1024]
+    if len(np.unique(sample)) * 2 > len(sample):
+        return render(v)
+    distinct, inverse = np.unique(v, return_inverse=True)
+    return np.array(render(distinct), dtype=object)[inverse.ravel()].tolist()
+
+
+def _finish(texts, fallback, v, scalar):
+    result = texts.tolist()
+    for i in np.flatnonzero(fallback).tolist():
+        result[i] = scalar(float(v[i]))
+    return result
+
+
+def fmt_da_many(values, include_da=True, decimales=None) -> list[str]:
+    """Équivalent de [fmt_da(v, include_da, decimales) for v in values], par colonne."""
+    values = values if hasattr(values, "__len__") else list(values)
+    include_da = bool(include_da)
+    v = _as_array(values) if np is not None and len(values) >= BULK_MIN_SIZE \
+        and decimales in (None, 0, 1, 2, 3) else None
+    if v is None:
+        return [fmt_da(x, include_da, decimales) for x in values]
+
+    suffix = " DA" if include_da else ""
+    scalar = lambda x: _fmt_da_value(x, include_da, decimales)
+
+    def render(a):
+        if decimales is not None:
+            texts, fallback = _format_fixed(a, decimales, " ", suffix=suffix)
+        else:
+            # Format intelligent : entiers sans décimales, sinon 2 décimales
+            texts, fallback = _format_fixed(a, 2, " ", suffix=suffix,
+                                            whole_only=np.floor(a) == a)
+        return _finish(texts, fallback, a, scalar)
+
+    return _render_many(v + 0.0, render)
+
+
+def _day(value) -> str:
+    """Jour 'AAAA-MM-JJ' d'une date, d'un datetime ou d'un horodatage texte."""
+    if value is None or value == "":
+        return date.today().isoformat()
+    return str(value)[:10]
+
+
 # ──────────────────────────────────────────────────────────────────
 # Manager de devise — singleton
 # ──────────────────────────────────────────────────────────────────
@@ -98,6 +272,9 @@ class CurrencyManager:
         self._primary_code:   str   = "DZD"
         self._secondary_code: Optional[str] = None
         self._rates: dict[str, float] = dict(DEFAULT_RATES_TO_DZD)
+        # Historique par devise : (jours 'AAAA-MM-JJ' triés, taux vers le DZD)
+        self._history: dict[str, tuple[list[str], list[float]]] = {}
+        self._history_arrays: dict = {}
         self._db = None          # injecté via load()
 
     # ── Initialisation ────────────────────────────────────────────
@@ -118,19 +295,21 @@ class CurrencyManager:
         self._db = db
 
         try:
+            # Tous les paramètres en une lecture (cache de Database)
+            settings = db.get_settings()
+
             # Devise principale
-            primary = db.get_setting("currency_primary", "DZD")
+            primary = settings.get("currency_primary") or "DZD"
             if primary in CURRENCIES:
                 self._primary_code = primary
 
             # Devise secondaire (peut être vide)
-            secondary = db.get_setting("currency_secondary", "")
+            secondary = settings.get("currency_secondary") or ""
             self._secondary_code = secondary if secondary in CURRENCIES else None
 
             # Taux de change stockés en BDD
             for code in CURRENCIES:
-                key  = f"rate_{code}_to_DZD"
-                val  = db.get_setting(key, None)
+                val = settings.get(f"rate_{code}_to_DZD")
                 if val is not None:
                     try:
                         self._rates[code] = float(val)
@@ -138,6 +317,26 @@ class CurrencyManager:
                         pass
         except Exception as e:
             print(f"⚠️ CurrencyManager.load: {e}")
+        self.load_history(db)
+
+    def load_history(self, db=None) -> None:
+        """Charge l'historique des taux (table currency_rates) en une requête."""
+        db = db or self._db
+        if db is None:
+            return
+        history: dict[str, tuple[list[str], list[float]]] = {}
+        try:
+            rows = db.conn.execute(
+                "SELECT code, valid_from, rate FROM currency_rates ORDER BY code, valid_from")
+            for code, valid_from, rate in rows:
+                days, rates = history.setdefault(code, ([], []))
+                days.append(_day(valid_from))
+                rates.append(float(rate))
+        except (sqlite3.Error, AttributeError) as e:
+            print(f"⚠️ CurrencyManager.load_history: {e}")
+            return
+        self._history = history
+        self._history_arrays = {}
 
     def save(self, db=None) -> None:
         """Persiste les préférences en base de données.
@@ -149,10 +348,27 @@ class CurrencyManager:
         if db is None:
             return
         try:
+            previous = {code: db.get_setting(f"rate_{code}_to_DZD", None) for code in self._rates}
             db.set_setting("currency_primary",   self._primary_code)
             db.set_setting("currency_secondary", self._secondary_code or "")
             for code, rate in self._rates.items():
                 db.set_setting(f"rate_{code}_to_DZD", str(rate))
+            # Historique : un taux modifié s'applique à partir d'aujourd'hui,
+            # l'ancien reste valable pour les dates antérieures
+            today = date.today().isoformat()
+            for code, rate in self._rates.items():
+                if code == "DZD":
+                    continue
+                if code not in self._history:
+                    try:
+                        old = float(previous[code])
+                    except (TypeError, ValueError):
+                        old = DEFAULT_RATES_TO_DZD.get(code, rate)
+                    if old == rate:
+                        continue
+                    self.record_rate(code, old, HISTORY_START, db)
+                if self.get_rate_to_dzd_at(code, today) != rate:
+                    self.record_rate(code, rate, today, db)
         except Exception as e:
             print(f"⚠️ CurrencyManager.save: {e}")
 
@@ -228,6 +444,69 @@ class CurrencyManager:
             return 0.0
         return from_to_dzd / to_to_dzd
 
+    # ── Taux historiques ──────────────────────────────────────────
+
+    def record_rate(self, code: str, rate: float, valid_from=None, db=None) -> None:
+        """Enregistre le taux de ``code`` vers le DZD applicable à partir de ``valid_from``.
+
+        Args:
+            code (str): Code ISO de la devise.
+            rate (float): 1 unité = rate DZD.
+            valid_from: Date d'effet (défaut : aujourd'hui).
+            db: Instance Database (défaut : celle chargée).
+        """
+        if code not in CURRENCIES or rate <= 0:
+            return
+        day = _day(valid_from)
+        db = db or self._db
+        if db is not None:
+            db.conn.execute("""
+                INSERT INTO currency_rates (code, valid_from, rate) VALUES (?, ?, ?)
+                ON CONFLICT(code, valid_from) DO UPDATE SET rate = excluded.rate
+            """, (code, day, float(rate)))
+            db.conn.commit()
+        days, rates = self._history.setdefault(code, ([], []))
+        i = bisect_right(days, day)
+        if i and days[i - 1] == day:
+            rates[i - 1] = float(rate)
+        else:
+            days.insert(i, day)
+            rates.insert(i, float(rate))
+        self._history_arrays.pop(code, None)
+
+    def get_rate_to_dzd_at(self, code: str, when) -> float:
+        """Taux vers le DZD en vigueur à la date ``when`` (recherche dichotomique).
+
+        Avant le premier taux enregistré, le plus ancien s'applique ; sans
+        historique, le taux courant.
+        """
+        history = self._history.get(code)
+        if code == "DZD" or not history:
+            return self._rates.get(code, 1.0)
+        days, rates = history
+        return rates[max(bisect_right(days, _day(when)) - 1, 0)]
+
+    def get_rate_at(self, from_code: str, to_code: str, when) -> float:
+        """Taux de ``from_code`` vers ``to_code`` à la date ``when``."""
+        if from_code == to_code:
+            return 1.0
+        to_to_dzd = self.get_rate_to_dzd_at(to_code, when)
+        if to_to_dzd == 0:
+            return 0.0
+        return self.get_rate_to_dzd_at(from_code, when) / to_to_dzd
+
+    def _rates_to_dzd_at(self, code: str, days):
+        """Taux vers le DZD pour un tableau NumPy de jours ('U10')."""
+        history = self._history.get(code)
+        if code == "DZD" or not history:
+            return np.full(len(days), self._rates.get(code, 1.0))
+        arrays = self._history_arrays.get(code)
+        if arrays is None:
+            arrays = self._history_arrays[code] = (np.array(history[0], dtype="U10"),
+                                                   np.array(history[1], dtype=float))
+        index = np.searchsorted(arrays[0], days, side="right") - 1
+        return arrays[1][np.maximum(index, 0)]
+
     # ── Conversion ────────────────────────────────────────────────
 
     def convert(self, amount: float,
@@ -250,6 +529,50 @@ class CurrencyManager:
         rate = self.get_rate(from_, to)
         return float(amount) * rate
 
+    def convert_at(self, amount: float, when,
+                   from_: str = "", to: str = "") -> float:
+        """Convertit un montant au taux en vigueur à la date ``when``."""
+        f = from_ or self._primary_code
+        t = to or self._primary_code
+        if f == t:
+            return float(amount)
+        return float(amount) * self.get_rate_at(f, t, when)
+
+    def convert_series(self, amounts, dates, to_code: str,
+                       from_code: str = "") -> list[float]:
+        """Convertit une colonne de montants, chacun au taux de sa date.
+
+        Une seule passe (NumPy si disponible, sinon dichotomie mémoïsée par
+        jour), sans requête : les taux sont en mémoire.
+
+        Args:
+            amounts: Montants (None = 0).
+            dates: Dates des montants (date, datetime ou texte), même longueur.
+            to_code (str): Devise cible.
+            from_code (str): Devise des montants (vide = principale).
+
+        Returns:
+            list[float]: Montants convertis.
+        """
+        from_code = from_code or self._primary_code
+        amounts = [float(a or 0) for a in amounts]
+        if from_code == to_code:
+            return amounts
+        if np is not None and len(amounts) >= BULK_MIN_SIZE:
+            days = np.array([_day(d) for d in dates], dtype="U10")
+            factors = (self._rates_to_dzd_at(from_code, days)
+                       / self._rates_to_dzd_at(to_code, days))
+            return (np.asarray(amounts) * factors).tolist()
+        memo: dict[str, float] = {}
+        out = []
+        for amount, when in zip(amounts, dates):
+            day = _day(when)
+            rate = memo.get(day)
+            if rate is None:
+                rate = memo[day] = self.get_rate_at(from_code, to_code, day)
+            out.append(amount * rate)
+        return out
+
     def to_primary(self, amount: float, from_code: str) -> float:
         """Convertit vers la devise principale.
 
@@ -291,32 +614,47 @@ class CurrencyManager:
             str: Montant formaté ex: '1,250.00 DA' ou '€ 1,250.00'.
         """
         try:
-            v = float(amount)
+            v = float(amount) + 0.0
         except (TypeError, ValueError):
             v = 0.0
+        return _format_value(v, _currency_pattern(code or self._primary_code, decimals))
 
-        currency = CURRENCIES.get(code or self._primary_code, CURRENCIES["DZD"])
-        d = decimals if decimals >= 0 else currency.decimals
+    def format_many(self, values, code: str = "", decimals: int = -1) -> list[str]:
+        """Formate une colonne de montants (équivalent de format() valeur par valeur).
 
-        if d == 0:
-            formatted = f"{v:,.0f}"
-        elif d == 3:
-            formatted = f"{v:,.3f}"
-        else:
-            formatted = f"{v:,.2f}"
+        Vectorisé avec NumPy quand il est disponible, sinon via le cache LRU
+        de format().
 
-        if currency.symbol_after:
-            return f"{formatted} {currency.symbol}"
-        else:
-            return f"{currency.symbol} {formatted}"
+        Args:
+            values: Séquence de montants.
+            code (str): Code devise (vide = devise principale).
+            decimals (int): Décimales (-1 = selon la devise).
+
+        Returns:
+            list[str]: Montants formatés, dans l'ordre de ``values``.
+        """
+        values = values if hasattr(values, "__len__") else list(values)
+        code = code or self._primary_code
+        v = _as_array(values) if np is not None and len(values) >= BULK_MIN_SIZE else None
+        if v is None:
+            return [self.format(x, code, decimals) for x in values]
+        prefix, suffix, d = _currency_parts(code, decimals)
+        pattern = _currency_pattern(code, decimals)
+
+        def render(a):
+            texts, fallback = _format_fixed(a, d, ",", prefix, suffix)
+            return _finish(texts, fallback, a, lambda x: _format_value(x, pattern))
+
+        return _render_many(v + 0.0, render)
 
     def format_with_secondary(self, amount,
-                               decimals: int = -1) -> tuple[str, str]:
+                               decimals: int = -1, when=None) -> tuple[str, str]:
         """Formate un montant en devise principale ET secondaire.
 
         Args:
             amount: Montant en devise principale.
             decimals (int): Décimales pour la devise principale.
+            when: Date du montant (taux historique) ; None = taux courant.
 
         Returns:
             tuple[str, str]: (texte_principal, texte_secondaire).
@@ -324,7 +662,10 @@ class CurrencyManager:
         """
         primary_text = self.format(amount, self._primary_code, decimals)
         if self._secondary_code:
-            converted    = self.from_primary(float(amount or 0), self._secondary_code)
+            if when is None:
+                converted = self.from_primary(float(amount or 0), self._secondary_code)
+            else:
+                converted = self.convert_at(float(amount or 0), when, to=self._secondary_code)
             secondary_text = self.format(converted, self._secondary_code, decimals)
         else:
             secondary_text = ""
@@ -382,32 +723,21 @@ def fmt_da(montant, include_da=True, decimales=None):
         decimales: Nombre de décimales (None = auto, 0 = entier, 2 = toujours 2 décimales)
     """
     try:
-        montant_float = float(montant)
-        
-        # Déterminer le nombre de décimales
-        if decimales is not None:
-            # Format fixe
-            partie_nombre = f"{montant_float:,.{decimales}f}"
-        else:
-            # Format intelligent
-            if montant_float.is_integer():
-                partie_nombre = f"{int(montant_float):,}"
-            else:
-                partie_nombre = f"{montant_float:,.2f}"
-        
-        # Remplacer les virgules par des espaces
-        partie_nombre = partie_nombre.replace(',', ' ')
-        
-        # Ajouter "DA" si demandé
-        if include_da:
-            return f"{partie_nombre} DA"
-        else:
-            return partie_nombre
-            
+        return _fmt_da_value(float(montant) + 0.0, bool(include_da), decimales)
     except (ValueError, TypeError):
         return "0 DA" if include_da else "0"
 
 
+def format_many(values, code: str = "", decimals: int = -1) -> list[str]:
+    """Formate une colonne de montants (voir CurrencyManager.format_many)."""
+    return currency_manager.format_many(values, code=code, decimals=decimals)
+
+
+def convert_series(amounts, dates, to_code: str, from_code: str = "") -> list[float]:
+    """Convertit une colonne de montants aux taux de leurs dates (voir CurrencyManager)."""
+    return currency_manager.convert_series(amounts, dates, to_code, from_code)
+
+
 def convert(amount: float, from_: str = "", to: str = "") -> float:
     """Convertit un montant entre deux devises.
 
@@ -422,3 +752,33 @@ def convert(amount: float, from_: str = "", to: str = "") -> float:
     f = from_ or currency_manager.primary_code
     t = to    or currency_manager.primary_code
     return currency_manager.convert(amount, from_=f, to=t)
+
+
+if __name__ == "__main__":
+    # Mesure : python currency.py [nb_cellules]
+    import random
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    uniques = [round(random.uniform(-1e6, 1e7), 2) for _ in range(count)]
+    repeated = [random.choice(uniques[:500]) for _ in range(count)]
+
+    def best_of(func, values, runs=5):
+        best = float("inf")
+        for _ in range(runs):
+            _fmt_da_value.cache_clear()
+            _format_value.cache_clear()
+            started = time.perf_counter()
+            func(values)
+            best = min(best, time.perf_counter() - started)
+        return best * 1000
+
+    print(f"NumPy : {'oui' if np is not None else 'non'} — {count} cellules")
+    for label, values in (("valeurs distinctes", uniques), ("valeurs répétées", repeated)):
+        scalar = best_of(lambda vs: [fmt_da(v) for v in vs], values)
+        bulk = best_of(fmt_da_many, values)
+        print(f"fmt_da    {label:<18} scalaire {scalar:7.1f} ms   fmt_da_many {bulk:6.1f} ms")
+        scalar = best_of(lambda vs: [currency_manager.format(v) for v in vs], values)
+        bulk = best_of(format_many, values)
+        print(f"format    {label:<18} scalaire {scalar:7.1f} ms   format_many {bulk:6.1f} ms")
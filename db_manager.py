@@ -5,14 +5,42 @@ Gère toutes les opérations CRUD pour l'application ERP
 
 import sqlite3
 import logging
+import time
+from collections import namedtuple
+from functools import lru_cache
 from config import config
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 import json
 from migrations.runner import run_migrations
+from services import cost_engine
+from services.query_profiler import PROFILER, ProfiledCursor
 
 logger = logging.getLogger(__name__)
 
+# Taille des lots lus par fetchmany() dans les iterateurs iter_*
+STREAM_ARRAYSIZE = 2000
+# Delai minimal entre deux verifications du compteur settings_version
+# (ecritures d'autres connexions / processus)
+SETTINGS_CHECK_SECONDS = 1.0
+
+
+# ==================== FABRIQUES DE LIGNES ====================
+
+def tuple_row(cursor, row):
+    """row_factory minimale : renvoie le tuple brut (chemins critiques, exports)."""
+    return row
+
+
+@lru_cache(maxsize=64)
+def _row_class(fields):
+    return namedtuple("Row", fields, rename=True)
+
+
+def namedtuple_row(cursor, row):
+    """row_factory : namedtuple (acces par attribut, ~ cout d'un tuple)."""
+    return _row_class(tuple(d[0] for d in cursor.description))._make(row)
+
 
 class Database:
     """Classe principale pour gérer la base de données SQLite"""
@@ -27,21 +55,46 @@ class Database:
         self.db_path = db_path or config.db_path
         self.conn = None
         self.cursor = None
+        self._settings = None
+        self._settings_version = None
+        self._data_version = None
+        self._settings_checked = 0.0
         self.connect()
         self.create_tables()
         run_migrations(self.conn)
+        if self.get_setting('query_profiling', '0') == '1':
+            self.set_query_profiling(True, self.get_setting('slow_query_ms'), persist=False)
     
     def connect(self):
         """Établit la connexion à la base de données"""
         try:
             self.conn = sqlite3.connect(self.db_path)
             self.conn.row_factory = sqlite3.Row  # Pour accéder aux colonnes par nom
-            self.cursor = self.conn.cursor()
+            # WAL : lecteurs (API, sauvegardes en ligne) et caisses ne se bloquent pas
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.cursor = self._new_cursor()
+            self._settings = None
             logger.info("Connexion base de donnees etablie: %s", self.db_path)
         except sqlite3.Error as e:
             logger.exception("Erreur de connexion base de donnees: %s", e)
             raise
     
+    def _new_cursor(self):
+        """Curseur partagé `self.cursor`, chronométré si le profilage est actif."""
+        return self.conn.cursor(ProfiledCursor) if PROFILER.enabled else self.conn.cursor()
+
+    def set_query_profiling(self, enabled, slow_ms=None, persist=True):
+        """
+        Active ou désactive le profilage des requêtes de `self.cursor`
+        (services.query_profiler). `slow_ms` : seuil du journal des requêtes
+        lentes. `persist` : garde le choix pour les prochains démarrages.
+        """
+        PROFILER.configure(enabled, slow_ms)
+        self.cursor = self._new_cursor()
+        if persist:
+            self.set_setting('query_profiling', '1' if enabled else '0')
+            self.set_setting('slow_query_ms', str(PROFILER.slow_ms))
+
     def disconnect(self):
         """Ferme la connexion à la base de données"""
         if self.conn:
@@ -375,9 +428,11 @@ class Database:
     def get_all_clients(self, limit=None, offset=0):
         """Récupère les clients (pagination via limit/offset)."""
         query = "SELECT * FROM clients ORDER BY name"
+        params = ()
         if limit is not None:
-            query += f" LIMIT {limit} OFFSET {offset}"
-        self.cursor.execute(query)
+            query += " LIMIT ? OFFSET ?"
+            params = (int(limit), int(offset))
+        self.cursor.execute(query, params)
         return [dict(row) for row in self.cursor.fetchall()]
 
     def count_clients(self, search=None):
@@ -551,10 +606,18 @@ class Database:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (name, description, category_id, purchase_price,
                   selling_price, stock_quantity, min_stock, barcode))
+            product_id = self.cursor.lastrowid
+            if stock_quantity:
+                # Mouvement d'ouverture : la somme des mouvements rejoint le stock
+                self.cursor.execute("""
+                    INSERT INTO stock_movements (product_id, movement_type, quantity, notes)
+                    VALUES (?, 'initial', ?, 'Stock initial')
+                """, (product_id, stock_quantity))
             self.conn.commit()
-            return self.cursor.lastrowid
+            return product_id
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de l'ajout du produit: {e}")
+            self.conn.rollback()
             return None
     
     def get_all_products(self, limit=None, offset=0):
@@ -565,9 +628,11 @@ class Database:
             LEFT JOIN categories c ON p.category_id = c.id
             ORDER BY p.name
         """
+        params = ()
         if limit is not None:
-            query += f" LIMIT {limit} OFFSET {offset}"
-        self.cursor.execute(query)
+            query += " LIMIT ? OFFSET ?"
+            params = (int(limit), int(offset))
+        self.cursor.execute(query, params)
         return [dict(row) for row in self.cursor.fetchall()]
 
     def count_products(self, search=None):
@@ -595,8 +660,10 @@ class Database:
     def update_product(self, product_id, name, selling_price, 
                       category_id=None, description="", purchase_price=0, 
                       stock_quantity=0, min_stock=0, barcode=""):
-        """Met à jour un produit"""
+        """Met à jour un produit (un changement de stock est tracé en mouvement 'adjustment')"""
         try:
+            self.cursor.execute("SELECT stock_quantity FROM products WHERE id = ?", (product_id,))
+            row = self.cursor.fetchone()
             self.cursor.execute("""
                 UPDATE products 
                 SET name = ?, description = ?, category_id = ?,
@@ -605,10 +672,17 @@ class Database:
                 WHERE id = ?
             """, (name, description, category_id, purchase_price,
                   selling_price, stock_quantity, min_stock, barcode, product_id))
+            delta = (stock_quantity or 0) - ((row[0] or 0) if row else 0)
+            if row and delta:
+                self.cursor.execute("""
+                    INSERT INTO stock_movements (product_id, movement_type, quantity, notes)
+                    VALUES (?, 'adjustment', ?, 'Modification de la fiche produit')
+                """, (product_id, delta))
             self.conn.commit()
             return True
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la mise à jour du produit: {e}")
+            self.conn.rollback()
             return False
     
     def delete_product(self, product_id):
@@ -628,7 +702,7 @@ class Database:
         Args:
             product_id: ID du produit
             quantity: Quantité (positive ou négative)
-            movement_type: 'sale', 'purchase', 'adjustment', 'return'
+            movement_type: 'initial', 'sale', 'purchase', 'adjustment', 'return'
             notes: Notes additionnelles
         """
         try:
@@ -694,7 +768,45 @@ class Database:
             ORDER BY p.stock_quantity
         """)
         return [dict(row) for row in self.cursor.fetchall()]
-    
+
+    def get_product_suggestions(self, product_ids, limit=3):
+        """
+        Produits souvent achetés avec ceux du panier (index d'affinités de
+        services.product_affinity, mis à jour chaque nuit).
+        """
+        from services import product_affinity
+        try:
+            return product_affinity.suggestions(self.conn, product_ids, limit)
+        except sqlite3.Error as e:
+            logger.warning("Suggestions produits indisponibles: %s", e)
+            return []
+
+    def get_reorder_suggestions(self, limit=None):
+        """
+        Produits à réapprovisionner d'après les prévisions de demande
+        (services.demand_forecast), les plus proches de la rupture d'abord.
+        None si les prévisions n'ont jamais été calculées : le calcul est
+        alors demandé au recalcul d'arrière-plan (pas sur le thread appelant).
+        """
+        from services import demand_forecast
+        if demand_forecast.last_refresh(self.conn) is None:
+            demand_forecast.wake_forecast_worker(self)
+            return None
+        return demand_forecast.reorder_suggestions(self.conn, limit)
+
+    def get_abc_products(self, abc_class="A", by="revenue", low_stock=False):
+        """
+        Produits d'une classe ABC (services.abc_classification), par CA
+        (`by`='revenue') ou par marge ('margin'); `low_stock` : seulement ceux
+        au stock minimum ou dessous. None si le catalogue n'a jamais été
+        classé : le classement est alors demandé en arrière-plan.
+        """
+        from services import abc_classification
+        if abc_classification.last_refresh(self.conn) is None:
+            abc_classification.wake_abc_worker(self)
+            return None
+        return abc_classification.products_in_class(self.conn, abc_class, by, low_stock)
+
     # ==================== FOURNISSEURS ====================
     
     def add_supplier(self, name, phone="", email="", address="", nif=""):
@@ -765,18 +877,27 @@ class Database:
                       discount, total, payment_method, notes))
             
             sale_id = self.cursor.lastrowid
+            cost_method = cost_engine.cost_method(self)
             
             # Ajouter les articles
             for item in items:
                 item_total = (item['quantity'] * item['unit_price'] * 
                              (1 - item.get('discount', 0) / 100))
+                # Coût de revient figé sur la ligne (avant la sortie de stock)
+                unit_cost = cost_engine.issue(self.conn, item['product_id'],
+                                              item['quantity'], cost_method)
                 
+                # Nom et code-barres figés : la facture garde ce qui a été vendu
                 self.cursor.execute("""
                     INSERT INTO sale_items 
-                    (sale_id, product_id, quantity, unit_price, discount, total)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (sale_id, product_id, quantity, unit_price, discount, total, unit_cost,
+                     product_name, barcode)
+                    SELECT ?, ?, ?, ?, ?, ?, ?,
+                           (SELECT name FROM products WHERE id = ?),
+                           (SELECT barcode FROM products WHERE id = ?)
                 """, (sale_id, item['product_id'], item['quantity'], 
-                      item['unit_price'], item.get('discount', 0), item_total))
+                      item['unit_price'], item.get('discount', 0), item_total, unit_cost,
+                      item['product_id'], item['product_id']))
                 
                 # Diminuer le stock
                 self.update_stock(
@@ -805,10 +926,12 @@ class Database:
             GROUP BY s.id
             ORDER BY s.sale_date DESC
         """
+        params = ()
         if limit is not None:
-            query += f" LIMIT {limit} OFFSET {offset}"
+            query += " LIMIT ? OFFSET ?"
+            params = (int(limit), int(offset))
         
-        self.cursor.execute(query)
+        self.cursor.execute(query, params)
         return [dict(row) for row in self.cursor.fetchall()]
     
     def get_sale_by_id(self, sale_id):
@@ -838,11 +961,12 @@ class Database:
                 si.unit_price,
                 si.discount,
                 si.total,
-                COALESCE(p.name, 'Produit supprimé') AS product_name,
-                COALESCE(p.description, '')               AS product_reference
+                si.unit_cost,
+                COALESCE(si.product_name, 'Produit supprimé') AS product_name,
+                COALESCE(si.barcode, '')                      AS product_reference
             FROM sale_items si
-            LEFT JOIN products p ON si.product_id = p.id
             WHERE si.sale_id = ?
+            ORDER BY si.id
         """, (sale_id,))
         
         sale_dict['items'] = [dict(row) for row in self.cursor.fetchall()]
@@ -861,16 +985,34 @@ class Database:
                 si.unit_price,
                 si.discount,
                 si.total,
-                COALESCE(p.name, 'Produit supprimé') AS product_name,
-                COALESCE(p.barcode, '')               AS product_reference
+                si.unit_cost,
+                COALESCE(si.product_name, 'Produit supprimé') AS product_name,
+                COALESCE(si.barcode, '')                      AS product_reference
             FROM sale_items si
-            LEFT JOIN products p ON si.product_id = p.id
             WHERE si.sale_id = ?
             ORDER BY si.id
         """, (sale_id,))
         
         return [dict(row) for row in self.cursor.fetchall()]
 
+    def _sold_line(self, sale_id, product_id):
+        """Coût, nom et code-barres figés sur la ligne de vente (fiche produit et coût moyen à défaut)."""
+        self.cursor.execute("""
+            SELECT unit_cost, product_name, barcode FROM sale_items
+            WHERE sale_id = ? AND product_id = ?
+            LIMIT 1
+        """, (sale_id, product_id))
+        row = self.cursor.fetchone()
+        line = dict(row) if row else {'unit_cost': None, 'product_name': None, 'barcode': None}
+        if line['product_name'] is None:
+            self.cursor.execute("SELECT name, barcode FROM products WHERE id = ?", (product_id,))
+            product = self.cursor.fetchone()
+            if product:
+                line['product_name'], line['barcode'] = product['name'], product['barcode']
+        if line['unit_cost'] is None:
+            line['unit_cost'] = cost_engine.current_cost(self.conn, product_id)
+        return line
+
     def delete_sale(self, sale_id):
         """Supprime une vente et restaure le stock des articles vendus.
 
@@ -896,7 +1038,10 @@ class Database:
                     pid = it.get('product_id')
                     qty = int(it.get('quantity') or 0)
                     if pid and qty:
-                        # Ajouter la quantité annulée au stock
+                        # Ajouter la quantité annulée au stock, à son coût de vente
+                        cost_engine.receive(self.conn, pid, qty,
+                                            self._sold_line(sale_id, pid)['unit_cost'],
+                                            source='sale_deletion', source_ref=row['invoice_number'])
                         self.update_stock(pid, qty, 'sale_deletion', f"Annulation vente #{row['invoice_number']}")
                 except Exception:
                     # Ne pas bloquer la suppression si la restauration échoue pour un item
@@ -976,6 +1121,9 @@ class Database:
                 """, (purchase_id, item['product_id'], item['product_name'],
                     item['quantity'], item['unit_price'], item_total))
                 
+                # Nouvelle couche de coût au prix d'achat, puis entrée en stock
+                cost_engine.receive(self.conn, item['product_id'], item['quantity'],
+                                    item['unit_price'], source='purchase', source_ref=reference)
                 # Augmenter le stock avec l'ID du produit
                 self.update_stock(
                     item['product_id'],  # Maintenant c'est l'ID
@@ -1016,9 +1164,11 @@ class Database:
             LEFT JOIN suppliers s  ON pu.supplier_id = s.id
             ORDER BY pi.created_at DESC
         """
+        params = ()
         if limit:
-            query += f" LIMIT {limit}"
-        self.cursor.execute(query)
+            query += " LIMIT ?"
+            params = (int(limit),)
+        self.cursor.execute(query, params)
         return [dict(row) for row in self.cursor.fetchall()]
     
     # ==================== STATISTIQUES ====================
@@ -1115,11 +1265,10 @@ class Database:
         if year:
             self.cursor.execute("""
                 SELECT
-                    p.name,
+                    COALESCE(si.product_name, 'Produit supprimé') as name,
                     SUM(si.quantity) as total_quantity,
                     SUM(si.total) as total_sales
                 FROM sale_items si
-                JOIN products p ON si.product_id = p.id
                 JOIN sales s ON si.sale_id = s.id
                 WHERE strftime('%Y', s.sale_date) = ?
                 GROUP BY si.product_id
@@ -1129,11 +1278,10 @@ class Database:
         else:
             self.cursor.execute("""
                 SELECT
-                    p.name,
+                    COALESCE(si.product_name, 'Produit supprimé') as name,
                     SUM(si.quantity) as total_quantity,
                     SUM(si.total) as total_sales
                 FROM sale_items si
-                JOIN products p ON si.product_id = p.id
                 GROUP BY si.product_id
                 ORDER BY total_quantity DESC
                 LIMIT ?
@@ -1235,9 +1383,9 @@ class Database:
     # ==================== PARAMÈTRES ====================
     
     def set_setting(self, key, value):
-        """Définit un paramètre"""
+        """Définit un paramètre (écriture en base puis dans le cache)"""
         try:
-            self.cursor.execute("""
+            self.conn.execute("""
                 INSERT INTO settings (key, value)
                 VALUES (?, ?)
                 ON CONFLICT(key) DO UPDATE SET 
@@ -1245,16 +1393,66 @@ class Database:
                     updated_at = CURRENT_TIMESTAMP
             """, (key, value))
             self.conn.commit()
-            return True
         except sqlite3.Error as e:
             print(f"❌ Erreur lors de la définition du paramètre: {e}")
             return False
+        if self._settings is not None:
+            version = self._read_settings_version()
+            if version is not None and self._settings_version is not None \
+                    and version == self._settings_version + 1:
+                self._settings[key] = value
+                self._settings_version = version
+            else:
+                # Une autre connexion a aussi écrit : rechargement complet
+                self._settings = None
+        return True
     
     def get_setting(self, key, default=None):
-        """Récupère un paramètre"""
-        self.cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-        row = self.cursor.fetchone()
-        return row['value'] if row else default
+        """Récupère un paramètre (depuis le cache des paramètres)"""
+        value = self._settings_cache().get(key)
+        return default if value is None else value
+
+    def get_settings(self):
+        """Copie de tous les paramètres {clé: valeur}"""
+        return dict(self._settings_cache())
+
+    @property
+    def settings_version(self):
+        """Compteur incrémenté à chaque écriture dans settings (toutes connexions)"""
+        self._settings_cache()
+        return self._settings_version
+
+    def invalidate_settings(self):
+        """À appeler après une écriture SQL directe dans settings sur cette connexion"""
+        self._settings = None
+
+    def _read_settings_version(self):
+        try:
+            row = self.conn.execute("SELECT version FROM settings_version WHERE id = 1").fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def _settings_cache(self):
+        """
+        Paramètres chargés en une requête puis maintenus par set_setting.
+        Les écritures des autres connexions sont détectées (au plus toutes les
+        SETTINGS_CHECK_SECONDS) par PRAGMA data_version puis settings_version.
+        """
+        now = time.monotonic()
+        if self._settings is not None and now - self._settings_checked < SETTINGS_CHECK_SECONDS:
+            return self._settings
+        self._settings_checked = now
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._settings is not None and data_version == self._data_version:
+            return self._settings
+        self._data_version = data_version
+        version = self._read_settings_version()
+        if self._settings is None or version is None or version != self._settings_version:
+            self._settings = {row[0]: row[1] for row in
+                              self.conn.execute("SELECT key, value FROM settings")}
+            self._settings_version = version
+        return self._settings
     
     def get_tax_rates(self):
         """
@@ -1264,15 +1462,14 @@ class Database:
         """
         try:
             # Récupérer les valeurs stockées (peuvent être des strings)
-            vat_value = self.get_setting('vat', None)
-            purchase_vat_value = self.get_setting('purchase_vat', None)
+            settings = self._settings_cache()
+            vat_value = settings.get('vat')
+            purchase_vat_value = settings.get('purchase_vat')
             
             # Convertir en float avec gestion des None/empty
             sales_tax = float(vat_value) if vat_value else 19.0
             purchase_tax = float(purchase_vat_value) if purchase_vat_value else 10.0
             
-            print(f"📊 TVA Récupérée - Ventes: {sales_tax}%, Achats: {purchase_tax}%")
-            
             return {"sales_tax": sales_tax, "purchase_tax": purchase_tax}
         except Exception as e:
             print(f"❌ Erreur get_tax_rates: {e}")
@@ -1280,28 +1477,40 @@ class Database:
     
     # ==================== BACKUP & RESTORE ====================
     
-    def backup_database(self, backup_path):
-        """Crée une sauvegarde de la base de données"""
+    def backup_database(self, backup_path=None, progress=None, cancelled=None):
+        """
+        Sauvegarde en ligne (API backup de SQLite, par étapes) sans bloquer les
+        écritures. Sans chemin, crée une sauvegarde horodatée dans
+        config.backup_dir avec rotation. Retourne le chemin, ou None en cas d'échec.
+        """
+        from services.backup_service import BackupCancelled, create_backup
         try:
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
-            print(f"✅ Sauvegarde créée: {backup_path}")
-            return True
+            return create_backup(self.db_path, backup_path, progress=progress, cancelled=cancelled)
+        except BackupCancelled:
+            raise
         except Exception as e:
-            print(f"❌ Erreur lors de la sauvegarde: {e}")
-            return False
+            logger.exception("Erreur lors de la sauvegarde: %s", e)
+            return None
     
     def restore_database(self, backup_path):
-        """Restaure une sauvegarde"""
+        """
+        Restaure une sauvegarde après contrôle d'intégrité.
+
+        La copie vérifiée est recopiée dans la base en service par l'API
+        backup de SQLite, sur la connexion courante ; le fichier n'est pas
+        remplacé. Les autres connexions ouvertes (API, lecteurs de rapports,
+        travaux planifiés) restent sur le même fichier et lisent la base
+        restaurée à leur prochaine requête ; une écriture en cours est
+        attendue, pas perdue. Le schéma est ensuite mis à niveau et le cache
+        des paramètres vidé.
+        """
+        from services.backup_service import restore_backup
         try:
-            import shutil
-            self.disconnect()
-            shutil.copy2(backup_path, self.db_path)
-            self.connect()
-            print(f"✅ Base de données restaurée depuis: {backup_path}")
+            restore_backup(self, backup_path)
+            logger.info("Base de donnees restauree depuis: %s", backup_path)
             return True
         except Exception as e:
-            print(f"❌ Erreur lors de la restauration: {e}")
+            logger.exception("Erreur lors de la restauration: %s", e)
             return False
     
     def clear_all_data(self):
@@ -1309,6 +1518,18 @@ class Database:
         try:
             # Supprimer dans l'ordre inverse des dépendances
             tables = [
+                'product_abc',
+                'product_sales_daily',
+                'product_abc_state',
+                'product_affinity',
+                'product_pair_counts',
+                'product_basket_counts',
+                'product_affinity_state',
+                'client_segments',
+                'client_segment_state',
+                'product_forecasts',
+                'stock_snapshot_items',
+                'stock_snapshots',
                 'stock_movements',
                 'purchase_items',
                 'purchases',
@@ -1325,6 +1546,7 @@ class Database:
                 self.cursor.execute(f"DELETE FROM {table}")
             
             self.conn.commit()
+            self.invalidate_settings()
             print("✅ Toutes les données ont été supprimées")
             return True
             
@@ -1439,7 +1661,7 @@ class Database:
     def get_most_profitable_products(self, limit=10, year=None):
         """
         Récupère les produits avec la meilleure marge brute, filtrés par année si précisée
-        Marge = (Prix vente - Prix achat) * Quantité vendue
+        Marge = Montant vendu - Quantité vendue * Coût de revient figé à la vente
         """
         try:
             if year:
@@ -1451,10 +1673,10 @@ class Database:
                         p.selling_price,
                         COALESCE(SUM(si.quantity), 0) as quantity_sold,
                         COALESCE(SUM(si.total), 0) as total_revenue,
-                        COALESCE(SUM(si.quantity * (p.selling_price - p.purchase_price)), 0) as gross_margin,
+                        COALESCE(SUM(si.total - si.quantity * si.unit_cost), 0) as gross_margin,
                         CASE
                             WHEN SUM(si.total) > 0
-                            THEN (SUM(si.quantity * (p.selling_price - p.purchase_price)) * 100.0 / SUM(si.total))
+                            THEN (SUM(si.total - si.quantity * si.unit_cost) * 100.0 / SUM(si.total))
                             ELSE 0
                         END as margin_percentage
                     FROM products p
@@ -1475,10 +1697,10 @@ class Database:
                         p.selling_price,
                         COALESCE(SUM(si.quantity), 0) as quantity_sold,
                         COALESCE(SUM(si.total), 0) as total_revenue,
-                        COALESCE(SUM(si.quantity * (p.selling_price - p.purchase_price)), 0) as gross_margin,
+                        COALESCE(SUM(si.total - si.quantity * si.unit_cost), 0) as gross_margin,
                         CASE
                             WHEN SUM(si.total) > 0
-                            THEN (SUM(si.quantity * (p.selling_price - p.purchase_price)) * 100.0 / SUM(si.total))
+                            THEN (SUM(si.total - si.quantity * si.unit_cost) * 100.0 / SUM(si.total))
                             ELSE 0
                         END as margin_percentage
                     FROM products p
@@ -1496,24 +1718,30 @@ class Database:
     def get_product_profit_details(self, product_id):
         """
         Récupère les détails de profit pour un produit spécifique
+        La marge unitaire est celle de la fiche ; la marge totale vient des
+        coûts figés sur les lignes vendues.
         """
         try:
-            self.cursor.execute("""
+            self.cursor.execute(f"""
                 SELECT 
                     p.name,
                     p.purchase_price,
                     p.selling_price,
+                    {cost_engine.CURRENT_COST_SQL} as unit_cost,
                     (p.selling_price - p.purchase_price) as unit_margin,
-                    ((p.selling_price - p.purchase_price) * 100.0 / p.purchase_price) as margin_percentage,
+                    CASE WHEN p.purchase_price > 0
+                         THEN (p.selling_price - p.purchase_price) * 100.0 / p.purchase_price
+                         ELSE 0 END as margin_percentage,
                     COALESCE(SUM(si.quantity), 0) as total_sold,
-                    COALESCE(SUM(si.quantity * (p.selling_price - p.purchase_price)), 0) as total_margin
+                    COALESCE(SUM(si.total - si.quantity * si.unit_cost), 0) as total_margin
                 FROM products p
                 LEFT JOIN sale_items si ON p.id = si.product_id
                 WHERE p.id = ?
                 GROUP BY p.id
             """, (product_id,))
             
-            return dict(self.cursor.fetchone()) if self.cursor.fetchone() else None
+            row = self.cursor.fetchone()
+            return dict(row) if row else None
         except Exception as e:
             print(f"❌ Erreur get_product_profit_details: {e}")
             return None
@@ -1565,41 +1793,63 @@ class Database:
             print(f"❌ Erreur get_conversion_rate: {e}")
             return {'conversion_rate': 0, 'unique_buyers': 0, 'total_clients': 0}
 
-    def get_inventory_turnover(self):
+    def get_inventory_turnover(self, start=None, end=None):
         """
-        Calcule la rotation du stock
-        Rotation = Coût des marchandises vendues / Stock moyen
+        Calcule la rotation du stock sur la période (12 derniers mois par défaut)
+        Rotation = Coût des marchandises vendues / Valeur moyenne du stock
+        Le stock moyen vient du grand livre (services.stock_ledger) : stock à
+        l'ouverture, à chaque début de mois et à la clôture de la période.
         """
+        from services import stock_ledger
         try:
-            # Coût des marchandises vendues (CMV)
+            end = end or datetime.now().strftime('%Y-%m-%d')
+            if not start:
+                start = (datetime.strptime(end, '%Y-%m-%d') - timedelta(days=365)).strftime('%Y-%m-%d')
+
+            # Coût des marchandises vendues (CMV) sur la période
             self.cursor.execute("""
-                SELECT COALESCE(SUM(purchase_price * quantity), 0) as cogs
+                SELECT COALESCE(SUM(si.unit_cost * si.quantity), 0) as cogs
                 FROM sale_items si
-                JOIN products p ON si.product_id = p.id
-            """)
+                JOIN sales s ON si.sale_id = s.id
+                WHERE DATE(s.sale_date) BETWEEN ? AND ?
+            """, (start, end))
             cogs = dict(self.cursor.fetchone())['cogs']
-            
-            # Stock moyen (simplifié : moyenne du stock actuel)
-            self.cursor.execute("""
-                SELECT 
-                    COALESCE(AVG(purchase_price * stock_quantity), 0) as avg_stock_value,
-                    COALESCE(SUM(purchase_price * stock_quantity), 0) as total_stock_value
-                FROM products
+
+            avg_stock_value = stock_ledger.average_inventory_value(self.conn, start, end)
+            self.cursor.execute(f"""
+                SELECT COALESCE(SUM({cost_engine.CURRENT_COST_SQL} * p.stock_quantity), 0) as total_stock_value
+                FROM products p
             """)
-            stock_data = dict(self.cursor.fetchone())
-            
-            turnover = cogs / stock_data['avg_stock_value'] if stock_data['avg_stock_value'] > 0 else 0
-            
+            total_stock_value = dict(self.cursor.fetchone())['total_stock_value']
+
+            turnover = cogs / avg_stock_value if avg_stock_value > 0 else 0
+
             return {
                 'turnover_rate': turnover,
                 'cogs': cogs,
-                'avg_stock_value': stock_data['avg_stock_value'],
-                'total_stock_value': stock_data['total_stock_value']
+                'avg_stock_value': avg_stock_value,
+                'total_stock_value': total_stock_value
             }
         except Exception as e:
             print(f"❌ Erreur get_inventory_turnover: {e}")
             return {'turnover_rate': 0, 'cogs': 0, 'avg_stock_value': 0}
 
+    def get_client_segments(self):
+        """
+        Segments RFM de tous les clients ayant acheté : {client_id: ligne}.
+        Rafraîchit d'abord client_segments (incrémental ; le recalcul complet
+        du jour est fait en arrière-plan).
+        """
+        from services import client_segments
+        client_segments.refresh_for_read(self)
+        return client_segments.all_segments(self.conn)
+
+    def get_client_segment(self, client_id):
+        """Segment RFM d'un client (None s'il n'a jamais acheté)."""
+        from services import client_segments
+        client_segments.refresh_for_read(self)
+        return client_segments.segment_of(self.conn, client_id)
+
     def get_customer_lifetime_value(self):
         """
         Calcule la valeur moyenne à vie d'un client
@@ -1700,15 +1950,15 @@ class Database:
                 month_date = datetime.now() - timedelta(days=30*i)
                 month_str = month_date.strftime('%Y-%m')
                 
+                # CA sur les ventes, coût sur les lignes (une vente compte une fois)
                 self.cursor.execute("""
                     SELECT 
-                        COALESCE(SUM(s.total), 0) as revenue,
-                        COALESCE(SUM(p.purchase_price * si.quantity), 0) as cost
-                    FROM sales s
-                    JOIN sale_items si ON s.id = si.sale_id
-                    JOIN products p ON si.product_id = p.id
-                    WHERE strftime('%Y-%m', s.sale_date) = ?
-                """, (month_str,))
+                        (SELECT COALESCE(SUM(total), 0) FROM sales
+                         WHERE strftime('%Y-%m', sale_date) = ?) as revenue,
+                        (SELECT COALESCE(SUM(si.unit_cost * si.quantity), 0)
+                         FROM sale_items si JOIN sales s ON s.id = si.sale_id
+                         WHERE strftime('%Y-%m', s.sale_date) = ?) as cost
+                """, (month_str, month_str))
                 
                 data = self.cursor.fetchone()
                 revenue = data['revenue'] if data else 0
@@ -1775,17 +2025,26 @@ class Database:
             
             # Insérer les articles retournés et remettre en stock
             for item in items:
+                # Le retour rentre au coût auquel l'article était sorti, sous son nom de vente
+                line = self._sold_line(original_sale_id, item['product_id'])
+                unit_cost = line['unit_cost']
                 self.cursor.execute("""
                     INSERT INTO return_items
-                    (return_id, product_id, quantity, unit_price, total)
-                    VALUES (?, ?, ?, ?, ?)
+                    (return_id, product_id, quantity, unit_price, total, unit_cost,
+                     product_name, barcode)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     return_id,
                     item['product_id'],
                     item['quantity'],
                     item['unit_price'],
-                    item['total']
+                    item['total'],
+                    unit_cost,
+                    line['product_name'],
+                    line['barcode']
                 ))
+                cost_engine.receive(self.conn, item['product_id'], item['quantity'], unit_cost,
+                                    source='return', source_ref=return_number)
                 
                 # Remettre en stock (quantité positive)
                 self.update_stock(
@@ -1855,6 +2114,92 @@ class Database:
             print(f"❌ Erreur get_all_returns: {e}")
             return []
 
+    # ==================== LECTURE EN FLUX ====================
+
+    def iter_query(self, query, params=(), row_factory=None, arraysize=None):
+        """
+        Exécute une requête sur un curseur dédié et produit les lignes
+        au fur et à mesure (fetchmany), sans matérialiser le résultat.
+
+        Args:
+            row_factory: None (sqlite3.Row), tuple_row ou namedtuple_row
+            arraysize: taille des lots fetchmany (défaut STREAM_ARRAYSIZE)
+        """
+        cur = self.conn.cursor()
+        if row_factory is not None:
+            cur.row_factory = row_factory
+        cur.arraysize = arraysize or STREAM_ARRAYSIZE
+        try:
+            cur.execute(query, params)
+            while True:
+                batch = cur.fetchmany()
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            cur.close()
+
+    def iter_clients(self, row_factory=None, arraysize=None):
+        """Itère sur tous les clients triés par nom."""
+        return self.iter_query(
+            "SELECT * FROM clients ORDER BY name, id",
+            row_factory=row_factory, arraysize=arraysize)
+
+    def iter_products(self, row_factory=None, arraysize=None):
+        """Itère sur tous les produits (avec category_name) triés par nom."""
+        return self.iter_query("""
+            SELECT p.*, c.name as category_name
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            ORDER BY p.name, p.id
+        """, row_factory=row_factory, arraysize=arraysize)
+
+    def iter_sales(self, start_date=None, end_date=None, row_factory=None, arraysize=None):
+        """Itère sur les ventes (avec client_name), plus récentes d'abord."""
+        query = """
+            SELECT s.*, c.name as client_name
+            FROM sales s
+            LEFT JOIN clients c ON s.client_id = c.id
+        """
+        params = ()
+        if start_date and end_date:
+            query += " WHERE DATE(s.sale_date) BETWEEN ? AND ?"
+            params = (start_date, end_date)
+        query += " ORDER BY s.sale_date DESC, s.id DESC"
+        return self.iter_query(query, params, row_factory=row_factory, arraysize=arraysize)
+
+    def iter_sale_lines(self, start_date=None, end_date=None, row_factory=None, arraysize=None):
+        """Itère sur les lignes de vente (une par article vendu) avec l'en-tête de facture."""
+        query = """
+            SELECT s.invoice_number, s.sale_date,
+                   COALESCE(c.name, 'Client Anonyme') AS client_name,
+                   si.product_id,
+                   COALESCE(si.product_name, 'Produit supprimé') AS product_name,
+                   si.quantity, si.unit_price, si.discount, si.total
+            FROM sale_items si
+            JOIN sales s ON si.sale_id = s.id
+            LEFT JOIN clients c ON s.client_id = c.id
+        """
+        params = ()
+        if start_date and end_date:
+            query += " WHERE DATE(s.sale_date) BETWEEN ? AND ?"
+            params = (start_date, end_date)
+        query += " ORDER BY s.sale_date, si.id"
+        return self.iter_query(query, params, row_factory=row_factory, arraysize=arraysize)
+
+    def iter_purchases(self, row_factory=None, arraysize=None):
+        """Itère sur les lignes d'achat (même colonnes que get_all_purchases)."""
+        return self.iter_query("""
+            SELECT
+                pi.id, pi.purchase_id, pi.product_id, pi.product_name,
+                pi.quantity, pi.unit_price, pi.total, pi.created_at,
+                pu.payment_method, s.name AS supplier_name
+            FROM purchase_items pi
+            JOIN  purchases pu ON pi.purchase_id = pu.id
+            LEFT JOIN suppliers s  ON pu.supplier_id = s.id
+            ORDER BY pi.created_at DESC, pi.id DESC
+        """, row_factory=row_factory, arraysize=arraysize)
+
 
 # ==================== SINGLETON ====================
 
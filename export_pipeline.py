@@ -0,0 +1,396 @@
+"""
+Pipeline d'export en flux — CSV · XLSX · PDF
+=============================================
+Les writers consomment un itérable de lignes (typiquement une requête SQL lue
+par fetchmany via QuerySource) sans jamais matérialiser le résultat :
+  - CSV  : écriture ligne à ligne ;
+  - XLSX : xlsxwriter en mode `constant_memory` (une ligne en mémoire) ;
+  - PDF  : tableaux reportlab par blocs, fournis au fur et à mesure de la
+           mise en page (pas de liste complète de flowables).
+
+Le fichier est écrit dans `<chemin>.part` puis renommé : une annulation ou
+une erreur ne laisse pas de fichier tronqué.
+
+ExportWorker exécute un export dans un QThread ; start_export() l'associe à
+une QProgressDialog (progression + bouton Annuler).
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, suppress
+
+from PyQt6.QtCore import QObject, QThread, Qt, pyqtSignal
+from PyQt6.QtWidgets import QMessageBox, QProgressDialog
+
+from db_manager import STREAM_ARRAYSIZE
+
+PROGRESS_EVERY = 500        # lignes entre deux notifications / tests d'annulation
+PDF_CHUNK_ROWS = 200        # lignes par Table reportlab
+XLSX_MAX_ROWS = 1_048_576   # limite Excel par feuille
+
+
+class ExportCancelled(Exception):
+    """Levée dans le writer quand l'utilisateur annule l'export."""
+
+
+# ══════════════════════════════════════════════════════════════════════════
+#  SOURCES
+# ══════════════════════════════════════════════════════════════════════════
+
+class QuerySource:
+    """
+    Lignes d'une requête SQL lues par lots sur une connexion dédiée.
+
+    La connexion est ouverte au moment de l'itération, donc dans le thread
+    qui exporte (sqlite3 interdit de partager la connexion de l'UI).
+    `row_mapper(names)` renvoie une fonction ligne brute -> cellules.
+    """
+
+    def __init__(self, db_path, sql, params=(), row_mapper=None):
+        self.db_path = db_path
+        self.sql = sql
+        self.params = params
+        self.row_mapper = row_mapper
+
+    def __iter__(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cur = conn.execute(self.sql, self.params)
+            names = tuple(d[0] for d in cur.description)
+            mapper = self.row_mapper(names) if self.row_mapper else None
+            while True:
+                batch = cur.fetchmany(STREAM_ARRAYSIZE)
+                if not batch:
+                    break
+                if mapper:
+                    yield from map(mapper, batch)
+                else:
+                    yield from batch
+        finally:
+            conn.close()
+
+
+def _tracked(rows, progress=None, cancelled=None, every=PROGRESS_EVERY):
+    """Itère `rows` en notifiant la progression et en vérifiant l'annulation."""
+    n = 0
+    for row in rows:
+        yield row
+        n += 1
+        if n % every == 0:
+            if cancelled and cancelled():
+                raise ExportCancelled()
+            if progress:
+                progress(n)
+    if progress:
+        progress(n)
+
+
+@contextmanager
+def atomic_path(path):
+    """Fournit `<path>.part` à écrire ; renommé en `path` seulement si tout s'est bien passé."""
+    tmp = f"{path}.part"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+# ══════════════════════════════════════════════════════════════════════════
+#  WRITERS
+# ══════════════════════════════════════════════════════════════════════════
+
+def write_csv(path, headers, rows, *, delimiter=",", progress=None, cancelled=None) -> int:
+    """Écrit un CSV (UTF-8 BOM pour Excel). Retourne le nombre de lignes."""
+    count = 0
+    with atomic_path(path) as tmp:
+        with open(tmp, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f, delimiter=delimiter)
+            w.writerow(headers)
+            for row in _tracked(rows, progress, cancelled):
+                w.writerow(row)
+                count += 1
+    return count
+
+
+def write_xlsx(path, headers, rows, *, sheet_name="Rapport", title=None,
+               col_width=18, progress=None, cancelled=None) -> int:
+    """
+    Écrit un classeur en mode constant_memory : les lignes sont vidées sur
+    disque dès qu'on passe à la suivante. Au-delà de XLSX_MAX_ROWS, une
+    nouvelle feuille est ouverte.
+    """
+    import xlsxwriter
+
+    count = 0
+    with atomic_path(path) as tmp:
+        wb = xlsxwriter.Workbook(tmp, {"constant_memory": True})
+        try:
+            title_fmt = wb.add_format({"bold": True, "font_size": 14})
+            header_fmt = wb.add_format({"bold": True, "bg_color": "#3B82F6", "font_color": "white",
+                                        "border": 1, "align": "center", "valign": "vcenter"})
+            sheets = 0
+
+            def new_sheet():
+                nonlocal sheets
+                sheets += 1
+                name = sheet_name if sheets == 1 else f"{sheet_name} ({sheets})"
+                ws = wb.add_worksheet(name[:31])
+                ws.set_column(0, max(len(headers) - 1, 0), col_width)
+                r = 0
+                if title:
+                    ws.write(0, 0, title, title_fmt)
+                    r = 2
+                ws.write_row(r, 0, headers, header_fmt)
+                ws.freeze_panes(r + 1, 0)
+                return ws, r + 1
+
+            ws, r = new_sheet()
+            for row in _tracked(rows, progress, cancelled):
+                if r >= XLSX_MAX_ROWS:
+                    ws, r = new_sheet()
+                ws.write_row(r, 0, row)
+                r += 1
+                count += 1
+        finally:
+            wb.close()
+    return count
+
+
+class _FlowableStream(list):
+    """
+    Liste de flowables alimentée à la demande par un générateur : reportlab
+    ne voit que les quelques éléments en tête (build() consomme la liste
+    par l'avant), le document n'existe jamais en entier en mémoire.
+    """
+
+    LOOKAHEAD = 2
+
+    def __init__(self, head, gen):
+        super().__init__(head)
+        self._gen = gen
+
+    def _fill(self):
+        while self._gen is not None and list.__len__(self) < self.LOOKAHEAD:
+            try:
+                self.append(next(self._gen))
+            except StopIteration:
+                self._gen = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def write_pdf(path, headers, rows, *, title, subtitle="", footer="", landscape_mode=True,
+              chunk_rows=PDF_CHUNK_ROWS, progress=None, cancelled=None) -> int:
+    """
+    PDF paginé : les lignes sont regroupées en tableaux de `chunk_rows`
+    lignes (en-tête répété) générés pendant la mise en page.
+    """
+    from reportlab.lib import colors as rl_colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    pagesize = landscape(A4) if landscape_mode else A4
+    styles = getSampleStyleSheet()
+    c_navy = rl_colors.HexColor("#1E3A5F")
+    title_style = ParagraphStyle("Title", parent=styles["Title"], fontSize=16,
+                                 textColor=c_navy, spaceAfter=6)
+    sub_style = ParagraphStyle("Sub", parent=styles["Normal"], fontSize=9,
+                               textColor=rl_colors.HexColor("#6B7280"), spaceAfter=12)
+    footer_style = ParagraphStyle("Footer", parent=styles["Normal"], fontSize=8,
+                                  textColor=rl_colors.HexColor("#9CA3AF"), alignment=TA_CENTER)
+    # Style partagé par tous les blocs (ROWBACKGROUNDS plutôt qu'une commande par ligne)
+    table_style = TableStyle([
+        ("BACKGROUND",     (0, 0), (-1, 0), c_navy),
+        ("TEXTCOLOR",      (0, 0), (-1, 0), rl_colors.white),
+        ("FONTNAME",       (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE",       (0, 0), (-1, 0), 9),
+        ("ALIGN",          (0, 0), (-1, 0), "CENTER"),
+        ("FONTNAME",       (0, 1), (-1, -1), "Helvetica"),
+        ("FONTSIZE",       (0, 1), (-1, -1), 8),
+        ("TEXTCOLOR",      (0, 1), (-1, -1), rl_colors.HexColor("#1A1A2E")),
+        ("TOPPADDING",     (0, 0), (-1, -1), 6),
+        ("BOTTOMPADDING",  (0, 0), (-1, -1), 6),
+        ("LEFTPADDING",    (0, 0), (-1, -1), 6),
+        ("RIGHTPADDING",   (0, 0), (-1, -1), 6),
+        ("BOX",            (0, 0), (-1, -1), 1, rl_colors.HexColor("#D1D9E6")),
+        ("LINEBELOW",      (0, 0), (-1, 0), 1.5, c_navy),
+        ("INNERGRID",      (0, 0), (-1, -1), 0.3, rl_colors.HexColor("#D1D9E6")),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [rl_colors.white, rl_colors.HexColor("#F5F7FA")]),
+    ])
+    headers = list(headers)
+    col_w = [(pagesize[0] - 3 * cm) / max(len(headers), 1)] * len(headers)
+    count = 0
+
+    def blocks():
+        nonlocal count
+        chunk = []
+        for row in _tracked(rows, progress, cancelled):
+            chunk.append(list(row))
+            if len(chunk) >= chunk_rows:
+                count += len(chunk)
+                yield Table([headers] + chunk, colWidths=col_w, repeatRows=1, style=table_style)
+                chunk = []
+        if chunk or not count:
+            count += len(chunk)
+            yield Table([headers] + chunk, colWidths=col_w, repeatRows=1, style=table_style)
+        if footer:
+            yield Spacer(0, 0.5 * cm)
+            yield Paragraph(footer, footer_style)
+
+    head = [Paragraph(title, title_style)]
+    if subtitle:
+        head.append(Paragraph(subtitle, sub_style))
+
+    with atomic_path(path) as tmp:
+        doc = SimpleDocTemplate(tmp, pagesize=pagesize,
+                                rightMargin=1.5 * cm, leftMargin=1.5 * cm,
+                                topMargin=2 * cm, bottomMargin=1.5 * cm)
+        doc.build(_FlowableStream(head, blocks()))
+    return count
+
+
+WRITERS = {".csv": write_csv, ".xlsx": write_xlsx, ".pdf": write_pdf}
+
+
+# ══════════════════════════════════════════════════════════════════════════
+#  EXÉCUTION EN ARRIÈRE-PLAN
+# ══════════════════════════════════════════════════════════════════════════
+
+class ExportWorker(QObject):
+    """Exécute `job(progress, cancelled)` dans un QThread.
+
+    Signals:
+        progress (int): Lignes écrites jusqu'ici.
+        finished (int): Export terminé (nombre de lignes).
+        aborted (): Export annulé par l'utilisateur.
+        error (str): Message d'erreur.
+    """
+
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    aborted  = pyqtSignal()
+    error    = pyqtSignal(str)
+
+    def __init__(self, job):
+        super().__init__()
+        self._job = job
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            count = self._job(self.progress.emit, self._cancel.is_set)
+        except ExportCancelled:
+            self.aborted.emit()
+            return
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        self.finished.emit(int(count or 0))
+
+
+class _ExportRun(QObject):
+    """
+    Relie un ExportWorker à sa QProgressDialog (vit dans le thread UI).
+
+    Sans parent Qt : l'export est conservé dans `_RUNNING` jusqu'à la fin du
+    thread, même si la page qui l'a lancé est fermée entre-temps.
+    """
+
+    def __init__(self, parent, job, label, total, on_done, unit="ligne(s)"):
+        super().__init__()
+        self._parent = parent
+        self._alive = True
+        self._label = label
+        self._total = total
+        self._unit = unit
+        self._on_done = on_done
+
+        self.dialog = QProgressDialog(label, "Annuler", 0, total, parent)
+        self.dialog.setWindowTitle("Export en cours")
+        self.dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.dialog.setMinimumDuration(300)
+        self.dialog.setAutoClose(False)
+        self.dialog.setAutoReset(False)
+
+        self.thread = QThread()
+        self.worker = ExportWorker(job)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.dialog.canceled.connect(self.worker.cancel)
+        parent.destroyed.connect(self._on_parent_destroyed)
+        self.worker.progress.connect(self._on_progress)
+        self.worker.finished.connect(self._on_finished)
+        self.worker.aborted.connect(self._on_aborted)
+        self.worker.error.connect(self._on_error)
+        self.thread.finished.connect(self._release)
+
+    def start(self):
+        _RUNNING.add(self)
+        self.thread.start()
+
+    def _on_parent_destroyed(self):
+        # La page (et la boîte de progression, son enfant) n'existe plus
+        self._alive = False
+        self.worker.cancel()
+
+    def _release(self):
+        self.thread.wait()
+        _RUNNING.discard(self)
+
+    def _close(self):
+        self.thread.quit()
+        if self._alive:
+            self.dialog.close()
+        return self._alive
+
+    def _on_progress(self, n):
+        if not self._alive:
+            return
+        if self._total:
+            self.dialog.setValue(min(n, self._total))
+        self.dialog.setLabelText(f"{self._label}\n{n} {self._unit}")
+
+    def _on_finished(self, count):
+        if self._close() and self._on_done:
+            self._on_done(count)
+
+    def _on_aborted(self):
+        if self._close():
+            QMessageBox.information(self._parent, "Export annulé", "L'export a été annulé.")
+
+    def _on_error(self, message):
+        if self._close():
+            QMessageBox.critical(self._parent, "Erreur", f"Erreur lors de l'export :\n{message}")
+
+
+_RUNNING: set[_ExportRun] = set()
+
+
+def start_export(parent, job, *, label="Export en cours…", total=0, on_done=None,
+                 unit="ligne(s)"):
+    """
+    Lance `job(progress, cancelled)` hors du thread UI avec une barre de
+    progression (indéterminée si `total` vaut 0) et un bouton Annuler.
+    `on_done(count)` est appelé dans le thread UI une fois l'export terminé.
+    `unit` libelle la progression (lignes, pages de sauvegarde…).
+    """
+    run = _ExportRun(parent, job, label, total, on_done, unit)
+    run.start()
+    return run
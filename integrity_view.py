@@ -0,0 +1,224 @@
+"""
+Fenêtre « Intégrité de la base » : anomalies enregistrées par le contrôle
+d'arrière-plan (services.integrity_service), nouveau passage à la demande et
+réparations par lots — sans bloquer l'interface.
+"""
+
+from PyQt6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
+    QTableWidgetItem, QHeaderView, QAbstractItemView, QTextEdit, QMessageBox,
+)
+from PyQt6.QtGui import QFont, QColor
+from PyQt6.QtCore import Qt
+
+from styles import COLORS, TABLE_STYLE, INPUT_STYLE
+from db_manager import get_database
+from auth import session
+from export_pipeline import ExportCancelled, start_export
+from services import integrity_service as integrity
+
+SEVERITY_LABELS = {
+    "error":   ("❌ Erreur", COLORS.get("danger", "#EF4444")),
+    "warning": ("⚠️ Alerte", COLORS.get("warning", "#F59E0B")),
+    "info":    ("ℹ️ Info", COLORS.get("info", "#3B82F6")),
+}
+STATUS_LABELS = {"open": "Ouverte", "ignored": "Ignorée"}
+
+
+def _btn(text, color, outlined=False):
+    b = QPushButton(text)
+    b.setFixedHeight(38)
+    b.setCursor(Qt.CursorShape.PointingHandCursor)
+    b.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
+    if outlined:
+        b.setStyleSheet(f"""
+            QPushButton {{background:transparent; color:{color};
+                border:1.5px solid {color}77; border-radius:9px; padding:0 16px;}}
+            QPushButton:hover {{background:{color}18;}}
+            QPushButton:disabled {{color:#666; border-color:#444;}}
+        """)
+    else:
+        b.setStyleSheet(f"""
+            QPushButton {{background:{color}; color:white; border:none;
+                border-radius:9px; padding:0 16px;}}
+            QPushButton:hover {{background:{color}CC;}}
+            QPushButton:disabled {{background:#444; color:#888;}}
+        """)
+    return b
+
+
+def menu_label(db_path):
+    """Libellé du menu ERP avec le nombre d'anomalies ouvertes (erreurs + alertes)."""
+    try:
+        info = integrity.summary(db_path)
+    except Exception:
+        return "🔍  Vérifier l'intégrité de la base"
+    pending = info["error"] + info["warning"]
+    if pending:
+        icon = "❌" if info["error"] else "⚠️"
+        return f"{icon}  Intégrité de la base ({pending} anomalie(s))"
+    return "🔍  Vérifier l'intégrité de la base"
+
+
+class IntegrityDialog(QDialog):
+    """Liste des anomalies ouvertes, contrôle et réparations en arrière-plan."""
+
+    COLUMNS = ["Gravité", "Anomalie", "Table", "Lignes", "Statut", "Réparation"]
+
+    def __init__(self, parent=None, db=None):
+        super().__init__(parent)
+        self.db = db or get_database()
+        self.findings = []
+        self.setWindowTitle("🔍 Intégrité de la base")
+        self.setMinimumSize(860, 560)
+        self.setStyleSheet(f"QDialog{{background:{COLORS.get('bg_medium','#252535')};}} "
+                           f"QLabel{{color:{COLORS.get('text_primary','#F0F4FF')};font-size:13px;}}")
+
+        lay = QVBoxLayout(self)
+        lay.setSpacing(12)
+        lay.setContentsMargins(20, 20, 20, 20)
+
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont("Segoe UI", 11))
+        lay.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setStyleSheet(TABLE_STYLE)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.itemSelectionChanged.connect(self._on_selection)
+        lay.addWidget(self.table, 3)
+
+        self.details = QTextEdit()
+        self.details.setReadOnly(True)
+        self.details.setStyleSheet(INPUT_STYLE)
+        self.details.setMaximumHeight(140)
+        lay.addWidget(self.details, 1)
+
+        buttons = QHBoxLayout()
+        buttons.setSpacing(10)
+        self.run_btn = _btn("▶  Lancer une vérification", COLORS.get("primary", "#3B82F6"))
+        self.run_btn.clicked.connect(self.run_check)
+        self.repair_btn = _btn("🛠  Réparer", COLORS.get("success", "#10B981"))
+        self.repair_btn.clicked.connect(self.repair_selected)
+        self.ignore_btn = _btn("🙈  Ignorer", COLORS.get("TXT_SEC", "#A0AACC"), outlined=True)
+        self.ignore_btn.clicked.connect(self.toggle_ignore)
+        close = _btn("Fermer", COLORS.get("TXT_SEC", "#A0AACC"), outlined=True)
+        close.clicked.connect(self.accept)
+        for b in (self.run_btn, self.repair_btn, self.ignore_btn):
+            buttons.addWidget(b)
+        buttons.addStretch()
+        buttons.addWidget(close)
+        lay.addLayout(buttons)
+
+        self.reload()
+
+    # ── Données ──────────────────────────────────────────────────
+    def reload(self):
+        info = integrity.summary(self.db.db_path)
+        last = info["last_run"]
+        if last:
+            when = last["finished_at"]
+            origin = "planifiée" if last["origin"] == "schedule" else "manuelle"
+            text = f"Dernière vérification ({origin}) : {when} — {last['checks']} étape(s)"
+        else:
+            text = "Aucune vérification effectuée pour l'instant."
+        counts = f"   |   ❌ {info['error']}   ⚠️ {info['warning']}   ℹ️ {info['info']}"
+        self.summary_label.setText(text + counts)
+
+        self.findings = integrity.open_findings(self.db.db_path)
+        self.table.setRowCount(len(self.findings))
+        for row, f in enumerate(self.findings):
+            label, color = SEVERITY_LABELS.get(f["severity"], (f["severity"], "#A0AACC"))
+            cells = [label, f["title"], f["table_name"] or "—", str(f["affected"]),
+                     STATUS_LABELS.get(f["status"], f["status"]),
+                     integrity.REPAIR_LABELS.get(f["repair"], "—") if f["repair"] else "—"]
+            for col, value in enumerate(cells):
+                item = QTableWidgetItem(value)
+                if col == 0:
+                    item.setForeground(QColor(color))
+                if col == 3:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(row, col, item)
+        if not self.findings:
+            self.details.setPlainText("✅ Aucune anomalie ouverte.")
+        self._on_selection()
+
+    def _selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        return self.findings[rows[0].row()] if rows else None
+
+    def _on_selection(self):
+        f = self._selected()
+        can_repair = session.can("repair_database") if session.is_authenticated else True
+        self.repair_btn.setEnabled(bool(f and f["repair"] and can_repair))
+        self.ignore_btn.setEnabled(f is not None)
+        self.ignore_btn.setText("↩  Rouvrir" if f and f["status"] == "ignored" else "🙈  Ignorer")
+        if f:
+            self.details.setPlainText(
+                f"{f['title']} — {f['affected']} ligne(s)\n"
+                f"Vue pour la première fois : {f['first_seen_at']}, dernière : {f['last_seen_at']}\n\n"
+                f"{f['details']}")
+
+    # ── Actions ──────────────────────────────────────────────────
+    def run_check(self):
+        db_path = self.db.db_path
+
+        def job(progress, cancelled):
+            report = integrity.run_checks(db_path, progress=progress, cancelled=cancelled)
+            if report.status == "cancelled":
+                raise ExportCancelled()
+            return len(report.findings)
+
+        def done(count):
+            self.reload()
+            _refresh_parent_menu(self.parent())
+
+        start_export(self, job, label="Vérification de l'intégrité…", on_done=done, unit="étape(s)")
+
+    def repair_selected(self):
+        f = self._selected()
+        if not f or not f["repair"]:
+            return
+        action = integrity.REPAIR_LABELS.get(f["repair"], f["repair"])
+        reply = QMessageBox.question(
+            self, "🛠 Réparation",
+            f"{f['title']} ({f['affected']} ligne(s))\n\nAction : {action}\n\nContinuer ?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No)
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        db_path, finding_id = self.db.db_path, f["id"]
+        actor = {"id": session.user_id, "username": session.username} if session.is_authenticated else None
+
+        def job(progress, cancelled):
+            return integrity.repair_finding(db_path, finding_id, actor=actor,
+                                            progress=progress, cancelled=cancelled)
+
+        def done(count):
+            self.reload()
+            _refresh_parent_menu(self.parent())
+            QMessageBox.information(self, "✅ Réparation effectuée",
+                                    f"{count} ligne(s) traitée(s).\n"
+                                    "La prochaine vérification confirmera la correction.")
+
+        start_export(self, job, label=f"{action}…", on_done=done)
+
+    def toggle_ignore(self):
+        f = self._selected()
+        if not f:
+            return
+        integrity.set_status(self.db.db_path, f["id"], "open" if f["status"] == "ignored" else "ignored")
+        self.reload()
+
+
+def _refresh_parent_menu(parent):
+    refresh = getattr(parent, "refresh_integrity_menu", None)
+    if refresh:
+        refresh()
@@ -53,7 +53,7 @@ class EmailSender:
             message['Subject'] = f"Facture {invoice_number} - {company_name}"
             
             # Corps du message en HTML
-            html_body = self._create_email_body(
+            html_body = self.build_body(
                 invoice_number, 
                 customer_name, 
                 company_name
@@ -89,8 +89,8 @@ class EmailSender:
             print(f"❌ Erreur lors de l'envoi: {str(e)}")
             return False
     
-    def _create_email_body(self, invoice_number, customer_name, company_name):
-        """Crée le corps HTML de l'email"""
+    def build_body(self, invoice_number, customer_name, company_name):
+        """Crée le corps HTML de l'email (envoi direct et file d'envoi)"""
         
         html = f"""
         <!DOCTYPE html>
@@ -303,26 +303,154 @@ def send_invoice_email(recipient_email, invoice_number, pdf_path,
     )
 
 
-# Exemple d'utilisation
+def queue_sale_invoices(recipients_by_sale, db=None, batch_id=None):
+    """
+    Met en file, dans un seul lot, l'envoi des factures de plusieurs ventes
+    (ex: les relevés du mois). Retour immédiat : l'expéditeur d'arrière-plan
+    les envoie sur une seule session SMTP, avec nouvelles tentatives.
+
+    Args:
+        recipients_by_sale: {sale_id: email} ou liste de (sale_id, email)
+        batch_id: Lot existant à compléter (sinon un nouveau lot est créé)
+
+    Returns:
+        Identifiant du lot (statut : MailQueue.batch_status(batch_id))
+    """
+    from services.invoice_pdf_service import InvoicePdfService
+    from services.mail_queue import get_mail_queue
+
+    if db is None:
+        from db_manager import get_database
+        db = get_database()
+    service = InvoicePdfService(db)
+    messages = prepare_invoice_messages(recipients_by_sale, db, service)
+    return enqueue_invoice_messages(messages, get_mail_queue(db), service.cache, batch_id=batch_id)
+
+
+def prepare_invoice_messages(recipients_by_sale, db, service=None):
+    """
+    Lit les ventes et prépare les messages, PDF non encore rendus (accès
+    base : à appeler depuis le thread de la connexion).
+    """
+    from services.invoice_pdf_service import InvoicePdfService
+    from services.mail_queue import SmtpSettings
+
+    service = service or InvoicePdfService(db)
+    pairs = list(recipients_by_sale.items() if isinstance(recipients_by_sale, dict)
+                 else recipients_by_sale)
+    recipients = dict(pairs)
+    settings = SmtpSettings.from_settings(db.get_setting)
+    sender = EmailSender(settings.server, settings.port, settings.sender, settings.password)
+    company_name = db.get_setting('company_name', 'Ma Société')
+
+    messages = []
+    for sale in service.repository.get_invoice_sales([sale_id for sale_id, _ in pairs]):
+        number = sale.get('invoice_number', '')
+        messages.append({
+            'recipients': recipients[sale['id']],
+            'subject': f"Facture {number} - {company_name}",
+            'body': sender.build_body(number, sale.get('client_name') or 'Client', company_name),
+            'subtype': 'html',
+            'invoice': (sale['id'], service.invoice_data(sale)),
+        })
+    if len(messages) < len(pairs):
+        print(f"⚠️ {len(pairs) - len(messages)} vente(s) introuvable(s) ignorée(s)")
+    return messages
+
+
+def enqueue_invoice_messages(messages, queue, cache, batch_id=None, progress=None, cancelled=None):
+    """
+    Rend les PDF manquants (cache) et met les messages en file dans un seul
+    lot. N'utilise pas la connexion partagée : peut tourner hors du thread UI.
+
+    Returns:
+        Identifiant du lot, ou None si `cancelled()` a interrompu le rendu
+    """
+    from services.invoice_pdf_service import invoice_filename
+    from services.mail_queue import wake_mail_worker
+
+    ready = []
+    for done, msg in enumerate(messages, 1):
+        if cancelled and cancelled():
+            return None
+        msg = dict(msg)
+        sale_id, data = msg.pop('invoice')
+        msg['attachment_path'], _ = cache.get_or_render(sale_id, data)
+        msg['attachment_name'] = invoice_filename(data.get('invoice_number'))
+        ready.append(msg)
+        if progress:
+            progress(done)
+
+    batch_id = queue.enqueue_many(ready, batch_id=batch_id)
+    wake_mail_worker()
+    return batch_id
+
+
+def client_recipients(sale_ids, db):
+    """{sale_id: email du client} des ventes dont le client a un email."""
+    ids = list(dict.fromkeys(sale_ids))
+    recipients = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        for row in db.conn.execute(f"""
+            SELECT s.id, TRIM(c.email) AS email
+            FROM sales s JOIN clients c ON c.id = s.client_id
+            WHERE s.id IN ({marks}) AND TRIM(COALESCE(c.email, '')) <> ''
+        """, chunk):
+            recipients[row["id"]] = row["email"]
+    return recipients
+
+
+def queue_client_invoices(sale_ids, db=None, batch_id=None):
+    """
+    Met en file, dans un seul lot, les factures des ventes `sale_ids` à
+    l'adresse email de leur client. Les ventes sans client ou sans email
+    sont ignorées.
+
+    Returns:
+        (identifiant du lot ou None si rien à envoyer, nb mis en file, nb ignorés)
+    """
+    if db is None:
+        from db_manager import get_database
+        db = get_database()
+    ids = list(dict.fromkeys(sale_ids))
+    recipients = client_recipients(ids, db)
+    skipped = len(ids) - len(recipients)
+    if not recipients:
+        return None, 0, skipped
+    return queue_sale_invoices(recipients, db=db, batch_id=batch_id), len(recipients), skipped
+
+
+def month_sale_ids(month, db=None):
+    """Identifiants des ventes du mois `month` (AAAA-MM), par date."""
+    from datetime import date
+
+    if db is None:
+        from db_manager import get_database
+        db = get_database()
+    year, mon = (int(part) for part in month.split("-"))
+    start = date(year, mon, 1)
+    end = date(year + mon // 12, mon % 12 + 1, 1)
+    rows = db.conn.execute(
+        "SELECT id FROM sales WHERE sale_date >= ? AND sale_date < ? ORDER BY sale_date, id",
+        (start.isoformat(), end.isoformat()))
+    return [row["id"] for row in rows]
+
+
+# Relevés du mois en ligne de commande : python invoice_email.py 2026-09
+# Les messages sont mis en file ; l'application (expéditeur d'arrière-plan)
+# les envoie à son prochain passage.
 if __name__ == "__main__":
-    # Configuration de l'expéditeur
-    sender_config = {
-        'provider': 'gmail',
-        'email': 'votre.email@gmail.com',
-        'password': 'votre_mot_de_passe_application'  # Mot de passe d'application Google
-    }
-    
-    # Envoyer la facture
-    success = send_invoice_email(
-        recipient_email='client@example.com',
-        invoice_number='FAC-2026-001',
-        pdf_path='facture.pdf',
-        sender_config=sender_config,
-        customer_name='Entreprise X',
-        company_name='Ma Société SARL'
-    )
-    
-    if success:
-        print("✅ Facture envoyée avec succès !")
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Met en file l'envoi par email des factures d'un mois, en un seul lot.")
+    parser.add_argument("month", help="mois des ventes, AAAA-MM")
+    args = parser.parse_args()
+
+    batch_id, queued, skipped = queue_client_invoices(month_sale_ids(args.month))
+    if batch_id is None:
+        print(f"Aucune facture à envoyer ({skipped} vente(s) sans email client)")
     else:
-        print("❌ Échec de l'envoi")
\ No newline at end of file
+        print(f"✅ {queued} facture(s) en file, lot {batch_id} ({skipped} sans email client)")
@@ -13,6 +13,9 @@ from reportlab.platypus import (
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from datetime import datetime
+from functools import lru_cache
+from types import SimpleNamespace
+import io
 
 
 # ─────────────────────────────────────────────────────────────
@@ -52,6 +55,162 @@ def _s(val, default=''):
     return s if s else default
 
 
+# ─────────────────────────────────────────────────────────────
+#  Styles et textes société (calculés une fois par processus)
+# ─────────────────────────────────────────────────────────────
+@lru_cache(maxsize=1)
+def invoice_styles():
+    """
+    Styles de paragraphe et de tableau de la facture.
+
+    Ils ne dépendent d'aucune donnée : construits au premier appel puis
+    partagés par toutes les factures du processus (rendu par lot).
+    """
+    normal = getSampleStyleSheet()['Normal']
+
+    def ps(name, **kw):
+        return ParagraphStyle(name, parent=normal, **kw)
+
+    return SimpleNamespace(
+        inv_title  = ps('InvTitle',  fontSize=26, fontName='Helvetica-Bold',
+                        textColor=C_TEXT, alignment=TA_RIGHT),
+        co_name    = ps('CoName',    fontSize=12, fontName='Helvetica-Bold',
+                        textColor=C_TEXT),
+        co_info    = ps('CoInfo',    fontSize=8.5, textColor=C_MUTED, leading=13),
+        meta_lbl   = ps('MetaLbl',   fontSize=9,  textColor=C_MUTED, alignment=TA_LEFT),
+        meta_val   = ps('MetaVal',   fontSize=9,  fontName='Helvetica-Bold',
+                        textColor=C_TEXT, alignment=TA_RIGHT),
+        bill_tag   = ps('BillTag',   fontSize=8.5, textColor=C_MUTED),
+        bill_name  = ps('BillName',  fontSize=12, fontName='Helvetica-Bold',
+                        textColor=C_TEXT),
+        bill_info  = ps('BillInfo',  fontSize=9,  textColor=C_MUTED, leading=13),
+        total_lbl  = ps('TotLbl',    fontSize=9.5, textColor=C_MUTED,  alignment=TA_RIGHT),
+        total_val  = ps('TotVal',    fontSize=9.5, fontName='Helvetica-Bold',
+                        textColor=C_TEXT, alignment=TA_RIGHT),
+        grand_lbl  = ps('GrandLbl',  fontSize=12, fontName='Helvetica-Bold',
+                        textColor=C_WHITE, alignment=TA_RIGHT),
+        grand_val  = ps('GrandVal',  fontSize=14, fontName='Helvetica-Bold',
+                        textColor=C_WHITE, alignment=TA_RIGHT),
+        note       = ps('Note',      fontSize=9,  textColor=C_MUTED, alignment=TA_CENTER),
+        badge      = ps('Badge',     fontSize=16, fontName='Helvetica-Bold',
+                        textColor=C_GOLD, alignment=TA_CENTER),
+
+        badge_table = TableStyle([
+            ('BACKGROUND', (0,0), (-1,-1), C_NAVY),
+            ('ALIGN',      (0,0), (-1,-1), 'CENTER'),
+            ('VALIGN',     (0,0), (-1,-1), 'MIDDLE'),
+            ('BOX',        (0,0), (-1,-1), 1.5, C_GOLD),
+            ('ROUNDEDCORNERS', [6]),
+        ]),
+        meta_table = TableStyle([
+            ('ALIGN',         (0,0), (0,-1), 'LEFT'),
+            ('ALIGN',         (1,0), (1,-1), 'RIGHT'),
+            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
+            ('TOPPADDING',    (0,0), (-1,-1), 3),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
+        ]),
+        header_table = TableStyle([
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ]),
+        bill_table = TableStyle([
+            ('VALIGN',        (0,0), (-1,-1), 'TOP'),
+            ('TOPPADDING',    (0,0), (-1,-1), 2),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 2),
+        ]),
+        items_table = TableStyle([
+            # En-tête
+            ('BACKGROUND',    (0, 0), (-1, 0), C_NAVY),
+            ('TEXTCOLOR',     (0, 0), (-1, 0), C_WHITE),
+            ('FONTNAME',      (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE',      (0, 0), (-1, 0), 9),
+            ('ALIGN',         (0, 0), (-1, 0), 'CENTER'),
+            ('TOPPADDING',    (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 9),
+            # Corps
+            ('FONTNAME',      (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE',      (0, 1), (-1, -1), 9),
+            ('TEXTCOLOR',     (0, 1), (-1, -1), C_TEXT),
+            ('ALIGN',         (0, 1), (0, -1), 'CENTER'),   # Qté
+            ('ALIGN',         (1, 1), (1, -1), 'CENTER'),   # Ref
+            ('ALIGN',         (2, 1), (2, -1), 'LEFT'),     # Description
+            ('ALIGN',         (3, 1), (3, -1), 'RIGHT'),    # Prix
+            ('ALIGN',         (4, 1), (4, -1), 'CENTER'),   # TVA
+            ('ALIGN',         (5, 1), (5, -1), 'RIGHT'),    # Total
+            ('FONTNAME',      (5, 1), (5, -1), 'Helvetica-Bold'),
+            ('TOPPADDING',    (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+            ('LEFTPADDING',   (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING',  (0, 0), (-1, -1), 6),
+            # Bordures
+            ('BOX',       (0, 0), (-1, -1), 1,   C_BORDER),
+            ('LINEBELOW', (0, 0), (-1, 0),   1.5, C_NAVY),
+            ('INNERGRID', (0, 0), (-1, -1), 0.4, C_BORDER),
+            # Zèbrage des lignes
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [C_WHITE, C_LIGHT]),
+        ]),
+        totals_table = TableStyle([
+            ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
+            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
+            ('TOPPADDING',    (0,0), (-1,-1), 4),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 4),
+        ]),
+        grand_table = TableStyle([
+            ('BACKGROUND',    (0,0), (-1,-1), C_NAVY),
+            ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
+            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
+            ('TOPPADDING',    (0,0), (-1,-1), 10),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 10),
+            ('LEFTPADDING',   (0,0), (-1,-1), 12),
+            ('RIGHTPADDING',  (0,0), (-1,-1), 12),
+            ('ROUNDEDCORNERS', [4]),
+        ]),
+    )
+
+
+COMPANY_FIELDS = ('name', 'address', 'phone', 'email', 'nif', 'nis', 'rc')
+
+
+@lru_cache(maxsize=16)
+def company_lines(name, address='', phone='', email='', nif='', nis='', rc=''):
+    """
+    Textes du bloc société (badge, nom, coordonnées), calculés une fois par
+    société. Seules ces chaînes immuables sont mises en cache : les flowables
+    reportlab sont modifiés par wrap/split et ne se partagent pas entre deux
+    rendus (route PDF de l'API et interface en parallèle).
+    """
+    infos = tuple(f"{label}{value}" for label, value in (
+        ("", address), ("Tél : ", phone), ("Email : ", email),
+        ("NIF : ", nif), ("NIS : ", nis), ("RC : ", rc)) if value)
+    return name[:3].upper(), name.upper(), infos
+
+
+def company_block(company):
+    """Badge + coordonnées de la société (colonne gauche de l'en-tête), neufs à chaque document."""
+    st = invoice_styles()
+    badge_text, name, infos = company_lines(*company_key(company))
+    badge = Table([[Paragraph(badge_text, st.badge)]],
+                  colWidths=[2*cm], rowHeights=[2*cm])
+    badge.setStyle(st.badge_table)
+
+    block = [badge, Spacer(0, 0.25*cm), Paragraph(name, st.co_name)]
+    block.extend(Paragraph(info, st.co_info) for info in infos)
+    return block
+
+
+def company_key(company):
+    """Champs société normalisés, dans l'ordre de company_lines()."""
+    company = company or {}
+    return (_s(company.get('name'), 'Ma Société'),
+            *(_s(company.get(f)) for f in COMPANY_FIELDS[1:]))
+
+
+def warm_cache(company=None):
+    """Précharge styles (et textes société) — initialiseur des processus de rendu."""
+    invoice_styles()
+    if company is not None:
+        company_lines(*company_key(company))
+
+
 # ─────────────────────────────────────────────────────────────
 #  Classe principale
 # ─────────────────────────────────────────────────────────────
@@ -59,11 +218,12 @@ class InvoicePDF:
     """Génère une facture PDF au format professionnel DAR ELSSALEM."""
 
     def __init__(self, filename="facture.pdf"):
+        # chemin du fichier, ou objet fichier (ex. io.BytesIO) ouvert en écriture
         self.filename = filename
 
     def generate(self, invoice_data):
         """
-        Génère le PDF et retourne le chemin du fichier.
+        Génère le PDF et retourne le chemin du fichier (ou l'objet fichier).
 
         Clés attendues dans invoice_data :
             invoice_number, date,
@@ -78,38 +238,9 @@ class InvoicePDF:
             rightMargin=1.8*cm, leftMargin=1.8*cm,
             topMargin=1.5*cm,   bottomMargin=1.5*cm,
         )
-
-        styles = getSampleStyleSheet()
-
-        # ── Styles typographiques ─────────────────────────────
-        def ps(name, **kw):
-            return ParagraphStyle(name, parent=styles['Normal'], **kw)
-
-        sty_inv_title  = ps('InvTitle',  fontSize=26, fontName='Helvetica-Bold',
-                             textColor=C_TEXT, alignment=TA_RIGHT)
-        sty_co_name    = ps('CoName',    fontSize=12, fontName='Helvetica-Bold',
-                             textColor=C_TEXT)
-        sty_co_info    = ps('CoInfo',    fontSize=8.5, textColor=C_MUTED, leading=13)
-        sty_meta_lbl   = ps('MetaLbl',   fontSize=9,  textColor=C_MUTED, alignment=TA_LEFT)
-        sty_meta_val   = ps('MetaVal',   fontSize=9,  fontName='Helvetica-Bold',
-                             textColor=C_TEXT, alignment=TA_RIGHT)
-        sty_bill_tag   = ps('BillTag',   fontSize=8.5, textColor=C_MUTED)
-        sty_bill_name  = ps('BillName',  fontSize=12, fontName='Helvetica-Bold',
-                             textColor=C_TEXT)
-        sty_bill_info  = ps('BillInfo',  fontSize=9,  textColor=C_MUTED, leading=13)
-        sty_total_lbl  = ps('TotLbl',    fontSize=9.5, textColor=C_MUTED,  alignment=TA_RIGHT)
-        sty_total_val  = ps('TotVal',    fontSize=9.5, fontName='Helvetica-Bold',
-                             textColor=C_TEXT, alignment=TA_RIGHT)
-        sty_grand_lbl  = ps('GrandLbl',  fontSize=12, fontName='Helvetica-Bold',
-                             textColor=C_WHITE, alignment=TA_RIGHT)
-        sty_grand_val  = ps('GrandVal',  fontSize=14, fontName='Helvetica-Bold',
-                             textColor=C_WHITE, alignment=TA_RIGHT)
-        sty_note       = ps('Note',      fontSize=9,  textColor=C_MUTED, alignment=TA_CENTER)
-        sty_badge      = ps('Badge',     fontSize=16, fontName='Helvetica-Bold',
-                             textColor=C_GOLD, alignment=TA_CENTER)
+        st = invoice_styles()
 
         # ── Récupération des données ──────────────────────────
-        company  = invoice_data.get('company',  {}) or {}
         customer = invoice_data.get('customer', {}) or {}
         items    = invoice_data.get('items',    []) or []
 
@@ -120,14 +251,6 @@ class InvoicePDF:
         tax_rate = _f(invoice_data.get('tax_rate', 19))
         total    = _f(invoice_data.get('total'))
 
-        co_name  = _s(company.get('name'),    'Ma Société')
-        co_addr  = _s(company.get('address'))
-        co_phone = _s(company.get('phone'))
-        co_email = _s(company.get('email'))
-        co_nif   = _s(company.get('nif'))
-        co_nis   = _s(company.get('nis'))
-        co_rc    = _s(company.get('rc'))
-
         cl_name  = _s(customer.get('name'),    'Client Anonyme')
         cl_addr  = _s(customer.get('address'))
         cl_phone = _s(customer.get('phone'))
@@ -145,45 +268,18 @@ class InvoicePDF:
         # ─────────────────────────────────────────────────────
         #  2. EN-TÊTE : badge société (gauche) + FACTURE (droite)
         # ─────────────────────────────────────────────────────
-        initials = co_name[:3].upper()
-        badge_inner = Table(
-            [[Paragraph(initials, sty_badge)]],
-            colWidths=[2*cm], rowHeights=[2*cm]
-        )
-        badge_inner.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,-1), C_NAVY),
-            ('ALIGN',      (0,0), (-1,-1), 'CENTER'),
-            ('VALIGN',     (0,0), (-1,-1), 'MIDDLE'),
-            ('BOX',        (0,0), (-1,-1), 1.5, C_GOLD),
-            ('ROUNDEDCORNERS', [6]),
-        ]))
-
-        # Infos société sous le badge
-        co_paras = [badge_inner, Spacer(0, 0.25*cm),
-                    Paragraph(co_name.upper(), sty_co_name)]
-        if co_addr:  co_paras.append(Paragraph(co_addr, sty_co_info))
-        if co_phone: co_paras.append(Paragraph(f"Tél : {co_phone}", sty_co_info))
-        if co_email: co_paras.append(Paragraph(f"Email : {co_email}", sty_co_info))
-        if co_nif:   co_paras.append(Paragraph(f"NIF : {co_nif}", sty_co_info))
-        if co_nis:   co_paras.append(Paragraph(f"NIS : {co_nis}", sty_co_info))
-        if co_rc:    co_paras.append(Paragraph(f"RC : {co_rc}", sty_co_info))
+        co_paras = company_block(invoice_data.get('company'))
 
         # Bloc droit : titre + méta
         meta_rows = [
-            [Paragraph("Date :",       sty_meta_lbl), Paragraph(inv_date, sty_meta_val)],
-            [Paragraph("N° Facture :", sty_meta_lbl), Paragraph(inv_num,  sty_meta_val)],
+            [Paragraph("Date :",       st.meta_lbl), Paragraph(inv_date, st.meta_val)],
+            [Paragraph("N° Facture :", st.meta_lbl), Paragraph(inv_num,  st.meta_val)],
         ]
         meta_tbl = Table(meta_rows, colWidths=[3*cm, 5*cm])
-        meta_tbl.setStyle(TableStyle([
-            ('ALIGN',         (0,0), (0,-1), 'LEFT'),
-            ('ALIGN',         (1,0), (1,-1), 'RIGHT'),
-            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
-            ('TOPPADDING',    (0,0), (-1,-1), 3),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 3),
-        ]))
+        meta_tbl.setStyle(st.meta_table)
 
         right_block = [
-            Paragraph("FACTURE", sty_inv_title),
+            Paragraph("FACTURE", st.inv_title),
             Spacer(0, 0.2*cm),
             HRFlowable(width="100%", thickness=0.8, color=C_NAVY, spaceAfter=6),
             meta_tbl,
@@ -193,9 +289,7 @@ class InvoicePDF:
             [[co_paras, right_block]],
             colWidths=[9*cm, 8.5*cm]
         )
-        header_tbl.setStyle(TableStyle([
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ]))
+        header_tbl.setStyle(st.header_table)
         elements.append(header_tbl)
         elements.append(Spacer(0, 0.4*cm))
 
@@ -211,18 +305,14 @@ class InvoicePDF:
         #  4. SECTION "FACTURÉ À"
         # ─────────────────────────────────────────────────────
         bill_block = [
-            Paragraph("Facturé à :", sty_bill_tag),
-            Paragraph(cl_name.upper(), sty_bill_name),
+            Paragraph("Facturé à :", st.bill_tag),
+            Paragraph(cl_name.upper(), st.bill_name),
         ]
-        if cl_addr:  bill_block.append(Paragraph(cl_addr,          sty_bill_info))
-        if cl_phone: bill_block.append(Paragraph(f"Tél : {cl_phone}", sty_bill_info))
+        if cl_addr:  bill_block.append(Paragraph(cl_addr,          st.bill_info))
+        if cl_phone: bill_block.append(Paragraph(f"Tél : {cl_phone}", st.bill_info))
 
         bill_tbl = Table([[bill_block]], colWidths=[17.5*cm])
-        bill_tbl.setStyle(TableStyle([
-            ('VALIGN',        (0,0), (-1,-1), 'TOP'),
-            ('TOPPADDING',    (0,0), (-1,-1), 2),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 2),
-        ]))
+        bill_tbl.setStyle(st.bill_table)
         elements.append(bill_tbl)
         elements.append(Spacer(0, 0.5*cm))
 
@@ -257,44 +347,7 @@ class InvoicePDF:
 
         col_w     = [1.4*cm, 2.8*cm, 6.3*cm, 2.5*cm, 1.8*cm, 2.7*cm]
         items_tbl = Table(table_data, colWidths=col_w, repeatRows=1)
-
-        # Zèbrage des lignes
-        n = len(table_data)
-        row_bgs = [
-            ('BACKGROUND', (0, i), (-1, i), C_WHITE if i % 2 == 1 else C_LIGHT)
-            for i in range(1, n)
-        ]
-
-        items_tbl.setStyle(TableStyle([
-            # En-tête
-            ('BACKGROUND',    (0, 0), (-1, 0), C_NAVY),
-            ('TEXTCOLOR',     (0, 0), (-1, 0), C_WHITE),
-            ('FONTNAME',      (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE',      (0, 0), (-1, 0), 9),
-            ('ALIGN',         (0, 0), (-1, 0), 'CENTER'),
-            ('TOPPADDING',    (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 9),
-            # Corps
-            ('FONTNAME',      (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE',      (0, 1), (-1, -1), 9),
-            ('TEXTCOLOR',     (0, 1), (-1, -1), C_TEXT),
-            ('ALIGN',         (0, 1), (0, -1), 'CENTER'),   # Qté
-            ('ALIGN',         (1, 1), (1, -1), 'CENTER'),   # Ref
-            ('ALIGN',         (2, 1), (2, -1), 'LEFT'),     # Description
-            ('ALIGN',         (3, 1), (3, -1), 'RIGHT'),    # Prix
-            ('ALIGN',         (4, 1), (4, -1), 'CENTER'),   # TVA
-            ('ALIGN',         (5, 1), (5, -1), 'RIGHT'),    # Total
-            ('FONTNAME',      (5, 1), (5, -1), 'Helvetica-Bold'),
-            ('TOPPADDING',    (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-            ('LEFTPADDING',   (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING',  (0, 0), (-1, -1), 6),
-            # Bordures
-            ('BOX',       (0, 0), (-1, -1), 1,   C_BORDER),
-            ('LINEBELOW', (0, 0), (-1, 0),   1.5, C_NAVY),
-            ('INNERGRID', (0, 0), (-1, -1), 0.4, C_BORDER),
-            *row_bgs,
-        ]))
+        items_tbl.setStyle(st.items_table)
         elements.append(items_tbl)
         elements.append(Spacer(0, 0.7*cm))
 
@@ -302,18 +355,13 @@ class InvoicePDF:
         #  6. TOTAUX
         # ─────────────────────────────────────────────────────
         totals_rows = [
-            [Paragraph("Sous-total HT :", sty_total_lbl),
-             Paragraph(f"{subtotal:,.2f} DA", sty_total_val)],
-            [Paragraph(f"TVA ({tax_rate:.0f}%) :", sty_total_lbl),
-             Paragraph(f"{tax_amt:,.2f} DA", sty_total_val)],
+            [Paragraph("Sous-total HT :", st.total_lbl),
+             Paragraph(f"{subtotal:,.2f} DA", st.total_val)],
+            [Paragraph(f"TVA ({tax_rate:.0f}%) :", st.total_lbl),
+             Paragraph(f"{tax_amt:,.2f} DA", st.total_val)],
         ]
         totals_tbl = Table(totals_rows, colWidths=[13.5*cm, 4*cm])
-        totals_tbl.setStyle(TableStyle([
-            ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
-            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
-            ('TOPPADDING',    (0,0), (-1,-1), 4),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 4),
-        ]))
+        totals_tbl.setStyle(st.totals_table)
         elements.append(totals_tbl)
         elements.append(Spacer(0, 0.25*cm))
 
@@ -324,20 +372,11 @@ class InvoicePDF:
 
         # Ligne TOTAL TTC — fond bleu marine
         grand_tbl = Table(
-            [[Paragraph("TOTAL TTC :", sty_grand_lbl),
-              Paragraph(f"{total:,.2f} DA", sty_grand_val)]],
+            [[Paragraph("TOTAL TTC :", st.grand_lbl),
+              Paragraph(f"{total:,.2f} DA", st.grand_val)]],
             colWidths=[13.5*cm, 4*cm]
         )
-        grand_tbl.setStyle(TableStyle([
-            ('BACKGROUND',    (0,0), (-1,-1), C_NAVY),
-            ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
-            ('VALIGN',        (0,0), (-1,-1), 'MIDDLE'),
-            ('TOPPADDING',    (0,0), (-1,-1), 10),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 10),
-            ('LEFTPADDING',   (0,0), (-1,-1), 12),
-            ('RIGHTPADDING',  (0,0), (-1,-1), 12),
-            ('ROUNDEDCORNERS', [4]),
-        ]))
+        grand_tbl.setStyle(st.grand_table)
         elements.append(grand_tbl)
         elements.append(Spacer(0, 1.2*cm))
 
@@ -348,7 +387,7 @@ class InvoicePDF:
             "Veuillez nous contacter pour plus d'informations sur les options de paiement.",
             "Nous vous remercions de votre confiance.",
         ]:
-            elements.append(Paragraph(f"<b>{note}</b>", sty_note))
+            elements.append(Paragraph(f"<b>{note}</b>", st.note))
             elements.append(Spacer(0, 0.12*cm))
 
         elements.append(Spacer(0, 0.6*cm))
@@ -384,6 +423,13 @@ def create_invoice_pdf(invoice_data, filename="facture.pdf"):
     return pdf.generate(invoice_data)
 
 
+def render_invoice_bytes(invoice_data):
+    """Génère la facture en mémoire et retourne le contenu PDF (bytes)."""
+    buffer = io.BytesIO()
+    InvoicePDF(buffer).generate(invoice_data)
+    return buffer.getvalue()
+
+
 # ─────────────────────────────────────────────────────────────
 #  Test autonome
 # ─────────────────────────────────────────────────────────────
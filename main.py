@@ -5,38 +5,46 @@ Système de gestion complet avec tous les modules intégrés
 
 import sys
 import csv
+import importlib
+import logging
+import threading
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QPushButton, QStackedWidget, QFrame, QLabel,
     QMessageBox, QDialog, QGraphicsDropShadowEffect, QSizePolicy,
     QFileDialog, QLineEdit
 )
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QRect
+from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QRect, QTimer
 from PyQt6.QtGui import QFont, QIcon, QColor, QPixmap, QLinearGradient, QPainter, QBrush
 
 
 from styles import COLORS, BUTTON_STYLES
-from dashboard import DashboardPage
-from clients import ClientsPage
-from products import ProductsPage
-from sales import SalesPage
-from purchases import PurchasesPage
-from settings import SettingsPage
-from statistics_view import StatisticsPage
-from sales_history import SalesHistoryPage
-from returns import ReturnsPage
 from PyQt6.QtGui import QAction
 from db_manager import get_database
 from auth import session
-from login_dialog import LoginDialog, UsersPage, UserBadge
-from currency import currency_manager
-from api_server import start_api_server
-
-try:
-    from advanced_analytics_view import AdvancedAnalyticsPage
-except ImportError:
-    AdvancedAnalyticsPage = None
-    print("⚠️ advanced_analytics_view non trouvé, module désactivé")
+from login_dialog import LoginDialog, UserBadge
+
+logger = logging.getLogger(__name__)
+
+# Pages de la fenêtre principale : (clé, module, classe, titre).
+# Le module n'est importé et la page construite qu'à la première
+# navigation : l'écran de connexion s'affiche sans charger pyqtgraph,
+# reportlab ni les requêtes de chaque page.
+PAGES = [
+    ("dashboard",  "dashboard",       "DashboardPage",    "📊 Tableau de Bord"),
+    ("clients",    "clients",         "ClientsPage",      "👥 Clients"),
+    ("products",   "products",        "ProductsPage",     "📦 Produits"),
+    ("sales",      "sales",           "SalesPage",        "💰 Ventes"),
+    ("purchases",  "purchases",       "PurchasesPage",    "🛒 Achats"),
+    ("history",    "sales_history",   "SalesHistoryPage", "📊 Historique"),
+    ("returns",    "returns",         "ReturnsPage",      "📦 Retours & Avoirs"),
+    ("statistics", "statistics_view", "StatisticsPage",   "📈 Statistiques"),
+    ("settings",   "settings",        "SettingsPage",     "⚙️ Paramètres"),
+    ("users",      "login_dialog",    "UsersPage",        "👥 Utilisateurs"),
+]
+
+# Rafraîchissement du compteur d'anomalies d'intégrité dans le menu ERP
+INTEGRITY_MENU_REFRESH_MS = 10 * 60 * 1000
 
 
 class MainWindow(QMainWindow):
@@ -45,15 +53,13 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
+        from currency import currency_manager
+
         self.db = get_database()
         currency_manager.load(self.db)
         self.setWindowTitle("🏢 Système de Gestion ERP - Version Professionnelle")
         self.setMinimumSize(1400, 800)
 
-        self.clients_page = ClientsPage()
-        self.sales_page = SalesPage()
-        self.clients_page.client_added.connect(self.sales_page.load_clients)
-
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
@@ -73,17 +79,8 @@ class MainWindow(QMainWindow):
         """)
 
         self.pages = {}
-        self.users_page = UsersPage()
-        self.add_page("dashboard",  DashboardPage(),    "📊 Tableau de Bord")
-        self.add_page("clients",    self.clients_page,  "👥 Clients")
-        self.add_page("products",   ProductsPage(),     "📦 Produits")
-        self.add_page("sales",      self.sales_page,    "💰 Ventes")
-        self.add_page("purchases",  PurchasesPage(),    "🛒 Achats")
-        self.add_page("history",    SalesHistoryPage(), "📊 Historique")
-        self.add_page("returns",    ReturnsPage(),      "📦 Retours & Avoirs")
-        self.add_page("statistics", StatisticsPage(),   "📈 Statistiques")
-        self.add_page("settings",   SettingsPage(),     "⚙️ Paramètres")
-        self.add_page("users",      self.users_page,    "👥 Utilisateurs")
+        for key, module, class_name, title in PAGES:
+            self.add_page(key, _page_factory(module, class_name), title)
        
         #start_api_server(port=5000) # Déplacé dans main() pour être dispo dès le login
 
@@ -177,9 +174,14 @@ class MainWindow(QMainWindow):
         erp_menu.addSeparator()
         erp_menu.addSection("🔧 Divers")
 
-        integrity_action = QAction("🔍  Vérifier l'intégrité de la base", self)
-        integrity_action.triggered.connect(self.run_integrity_check)
-        erp_menu.addAction(integrity_action)
+        self.integrity_action = QAction("🔍  Vérifier l'intégrité de la base", self)
+        self.integrity_action.triggered.connect(self.run_integrity_check)
+        erp_menu.addAction(self.integrity_action)
+        # Anomalies trouvées par le contrôle planifié : compteur dans le menu
+        self._integrity_timer = QTimer(self)
+        self._integrity_timer.timeout.connect(self.refresh_integrity_menu)
+        self._integrity_timer.start(INTEGRITY_MENU_REFRESH_MS)
+        self.refresh_integrity_menu()
 
         about_action = QAction("ℹ️  À propos de l'application", self)
         about_action.setShortcut("F1")
@@ -195,10 +197,31 @@ class MainWindow(QMainWindow):
     #  Navigation
     # ─────────────────────────────────────────────────────────────────────
 
-    def add_page(self, key, page, title):
-        index = self.stack.count()
-        self.stack.addWidget(page)
-        self.pages[key] = {'index': index, 'page': page, 'title': title}
+    def add_page(self, key, factory, title):
+        """Enregistre une page ; `factory()` la construit à la première navigation."""
+        self.pages[key] = {'index': None, 'page': None, 'factory': factory, 'title': title}
+
+    def page(self, key):
+        """Page `key`, construite et ajoutée à la pile au premier appel."""
+        page_info = self.pages[key]
+        if page_info['page'] is None:
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+            try:
+                page = page_info['factory']()
+            finally:
+                QApplication.restoreOverrideCursor()
+            page_info['page'] = page
+            page_info['index'] = self.stack.addWidget(page)
+            self._connect_pages(key)
+        return page_info['page']
+
+    def _connect_pages(self, key):
+        """Liaisons entre pages, faites quand les deux existent."""
+        if key in ("clients", "sales"):
+            clients_page = self.pages["clients"]['page']
+            sales_page = self.pages["sales"]['page']
+            if clients_page is not None and sales_page is not None:
+                clients_page.client_added.connect(sales_page.load_clients)
 
     def create_sidebar(self):
         sidebar = QFrame()
@@ -397,10 +420,9 @@ class MainWindow(QMainWindow):
                 f"Votre rôle ({session.role_label}) ne permet pas d'accéder à cette section.")
             return
         if key in self.pages:
-            page_info = self.pages[key]
-            self.stack.setCurrentIndex(page_info['index'])
+            self.stack.setCurrentWidget(self.page(key))
             self.update_nav_buttons(key)
-            self.setWindowTitle(f"ERP Pro — {page_info['title']}")
+            self.setWindowTitle(f"ERP Pro — {self.pages[key]['title']}")
 
     def _do_logout(self) -> None:
         reply = QMessageBox.question(
@@ -493,28 +515,19 @@ class MainWindow(QMainWindow):
                 QMessageBox.critical(self, "Erreur", f"Erreur lors de la génération :\n{e}")
 
     def run_backup_database(self):
-        """Sauvegarde rapide de la base de données."""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "💾 Sauvegarder la base de données",
-            f"erp_backup_{timestamp}.db",
-            "Base de données (*.db);;Tous (*.*)"
-        )
-        if filename:
-            try:
-                if self.db.backup_database(filename):
-                    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-                    self.db.set_setting('last_backup_date', now)
-                    QMessageBox.information(self, "✅ Sauvegarde créée",
-                        f"Base de données sauvegardée avec succès.\n\n📁 {filename}")
-                else:
-                    QMessageBox.critical(self, "Erreur", "Échec de la sauvegarde.")
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", f"Impossible de créer la sauvegarde :\n{e}")
+        """Sauvegarde rapide en arrière-plan : instantané incrémental dans le magasin de sauvegardes."""
+        from settings import start_backup
+
+        def done(path):
+            QMessageBox.information(self, "✅ Sauvegarde créée",
+                f"Base de données sauvegardée avec succès.\n\n📁 {path}")
+        try:
+            start_backup(self, self.db, on_done=done)
+        except Exception as e:
+            QMessageBox.critical(self, "Erreur", f"Impossible de créer la sauvegarde :\n{e}")
 
     def run_restore_database(self):
-        """Restaure la base depuis une sauvegarde."""
+        """Restaure la base depuis une sauvegarde (vérifiée avant remplacement)."""
         reply = QMessageBox.warning(
             self, "⚠️ Restauration",
             "La restauration remplacera TOUTES les données actuelles.\n\n"
@@ -524,20 +537,19 @@ class MainWindow(QMainWindow):
         )
         if reply == QMessageBox.StandardButton.No:
             return
+        from pathlib import Path
+        from config import config
+        from settings import start_restore
         filename, _ = QFileDialog.getOpenFileName(
-            self, "📂 Restaurer une sauvegarde", "",
-            "Base de données (*.db);;Tous (*.*)"
+            self, "📂 Restaurer une sauvegarde", str(Path(config.backup_dir) / "manifests"),
+            "Sauvegardes (*.json *.db);;Tous (*.*)"
         )
         if filename:
-            try:
-                if self.db.restore_database(filename):
-                    QMessageBox.information(self, "✅ Restauration réussie",
-                        "Données restaurées avec succès.\n\n"
-                        "Veuillez redémarrer l'application pour appliquer les changements.")
-                else:
-                    QMessageBox.critical(self, "Erreur", "Échec de la restauration.")
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", f"Impossible de restaurer :\n{e}")
+            def done(_path):
+                QMessageBox.information(self, "✅ Restauration réussie",
+                    "Données restaurées avec succès.\n\n"
+                    "Veuillez redémarrer l'application pour appliquer les changements.")
+            start_restore(self, self.db, filename, on_done=done)
 
     def run_quick_stats(self):
         """Affiche un rapport de statistiques rapide."""
@@ -630,8 +642,7 @@ class MainWindow(QMainWindow):
     def run_export_clients_csv(self):
         """Exporte tous les clients en fichier CSV."""
         try:
-            clients = self.db.get_all_clients()
-            if not clients:
+            if not self.db.count_clients():
                 QMessageBox.information(self, "Info", "Aucun client à exporter.")
                 return
 
@@ -642,21 +653,23 @@ class MainWindow(QMainWindow):
             if not filename:
                 return
 
+            count = 0
             with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
                 writer = csv.writer(f)
                 writer.writerow(["ID", "Nom", "Téléphone", "Email", "Adresse", "Date création"])
-                for c in clients:
+                for c in self.db.iter_clients():
                     writer.writerow([
-                        c.get('id', ''),
-                        c.get('name', ''),
-                        c.get('phone', ''),
-                        c.get('email', ''),
-                        c.get('address', ''),
-                        str(c.get('created_at', '')).split(' ')[0],
+                        c['id'],
+                        c['name'] or '',
+                        c['phone'] or '',
+                        c['email'] or '',
+                        c['address'] or '',
+                        str(c['created_at'] or '').split(' ')[0],
                     ])
+                    count += 1
 
             QMessageBox.information(self, "✅ Export réussi",
-                f"{len(clients)} client(s) exporté(s) avec succès.\n\n📁 {filename}")
+                f"{count} client(s) exporté(s) avec succès.\n\n📁 {filename}")
 
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export :\n{e}")
@@ -667,80 +680,14 @@ class MainWindow(QMainWindow):
         dialog.exec()
 
     def run_integrity_check(self):
-        """Vérifie l'intégrité et la cohérence de la base de données."""
-        try:
-            issues = []
-            warnings = []
-
-            # 1. Intégrité SQLite
-            self.db.cursor.execute("PRAGMA integrity_check")
-            result = self.db.cursor.fetchone()
-            if result and result[0] != "ok":
-                issues.append(f"❌ Intégrité SQLite : {result[0]}")
-            else:
-                warnings.append("✅ Intégrité SQLite : OK")
-
-            # 2. Ventes sans client
-            self.db.cursor.execute("""
-                SELECT COUNT(*) FROM sales
-                WHERE client_id IS NOT NULL
-                  AND client_id NOT IN (SELECT id FROM clients)
-            """)
-            orphan_sales = self.db.cursor.fetchone()[0]
-            if orphan_sales:
-                issues.append(f"⚠️ {orphan_sales} vente(s) avec client introuvable")
-            else:
-                warnings.append("✅ Cohérence ventes/clients : OK")
-
-            # 3. Articles de vente sans produit
-            self.db.cursor.execute("""
-                SELECT COUNT(*) FROM sale_items
-                WHERE product_id NOT IN (SELECT id FROM products)
-            """)
-            orphan_items = self.db.cursor.fetchone()[0]
-            if orphan_items:
-                issues.append(f"⚠️ {orphan_items} article(s) de vente sans produit associé")
-            else:
-                warnings.append("✅ Cohérence articles/produits : OK")
-
-            # 4. Produits avec stock négatif
-            self.db.cursor.execute("""
-                SELECT COUNT(*) FROM products WHERE stock_quantity < 0
-            """)
-            neg_stock = self.db.cursor.fetchone()[0]
-            if neg_stock:
-                issues.append(f"⚠️ {neg_stock} produit(s) avec stock négatif")
-            else:
-                warnings.append("✅ Stocks : aucun négatif")
-
-            # 5. Taille de la base
-            self.db.cursor.execute("PRAGMA page_count")
-            pages = self.db.cursor.fetchone()[0]
-            self.db.cursor.execute("PRAGMA page_size")
-            page_size = self.db.cursor.fetchone()[0]
-            db_size_kb = (pages * page_size) / 1024
-            warnings.append(f"📦 Taille de la base : {db_size_kb:.1f} Ko")
-
-            # Rapport final
-            status_icon = "❌" if issues else "✅"
-            title = f"{status_icon} Rapport d'intégrité"
-
-            report = "🔍  VÉRIFICATION DE LA BASE DE DONNÉES\n"
-            report += "─" * 44 + "\n\n"
-            report += "\n".join(warnings) + "\n"
-            if issues:
-                report += "\n⚠️  PROBLÈMES DÉTECTÉS :\n"
-                report += "\n".join(issues) + "\n"
-            else:
-                report += "\n✅  Aucun problème détecté. La base est saine."
+        """Anomalies du contrôle d'intégrité (arrière-plan), vérification et réparations."""
+        from integrity_view import IntegrityDialog
+        IntegrityDialog(self, self.db).exec()
+        self.refresh_integrity_menu()
 
-            if issues:
-                QMessageBox.warning(self, title, report)
-            else:
-                QMessageBox.information(self, title, report)
-
-        except Exception as e:
-            QMessageBox.critical(self, "Erreur", f"Erreur lors de la vérification :\n{e}")
+    def refresh_integrity_menu(self):
+        from integrity_view import menu_label
+        self.integrity_action.setText(menu_label(self.db.db_path))
 
     def show_about(self):
         dialog = AboutDialog(self)
@@ -1150,14 +1097,58 @@ class AboutDialog(QDialog):
 #  Point d'entrée
 # ─────────────────────────────────────────────────────────────────────────
 
+def _page_factory(module, class_name):
+    def build():
+        return getattr(importlib.import_module(module), class_name)()
+    return build
+
+
+def start_background_services(db=None) -> threading.Thread:
+    """Démarre le serveur API et les tâches planifiées dans un thread dédié."""
+    if db is None:
+        db = get_database()    # singleton créé ici, dans le thread principal
+
+    services = (
+        # Serveur API dès l'écran de connexion (pour le mobile)
+        ("api_server", "start_api_server", {"port": 5000}),
+        # Expéditeur des emails en file (factures, rapports)
+        ("services.mail_queue", "start_mail_worker", {"db": db}),
+        # Contrôle d'intégrité planifié (arrière-plan, connexion dédiée)
+        ("services.integrity_service", "start_integrity_worker", {"db": db}),
+        # Instantanés mensuels du stock (stock à date, valorisation)
+        ("services.stock_ledger", "start_stock_snapshot_worker", {"db": db}),
+        # Prévisions de demande et points de commande (recalcul quotidien)
+        ("services.demand_forecast", "start_forecast_worker", {"db": db}),
+        # Index d'affinités produits pour les suggestions en caisse (quotidien)
+        ("services.product_affinity", "start_affinity_worker", {"db": db}),
+        # Classification ABC du catalogue (CA et marge, quotidienne)
+        ("services.abc_classification", "start_abc_worker", {"db": db}),
+        # Segments RFM des clients (recalcul complet quotidien)
+        ("services.client_segments", "start_segments_worker", {"db": db}),
+    )
+
+    def run():
+        # Un service qui échoue (import, port occupé…) n'empêche pas les suivants
+        for module, starter, kwargs in services:
+            try:
+                getattr(importlib.import_module(module), starter)(**kwargs)
+            except Exception:
+                logger.exception("Démarrage de %s.%s impossible", module, starter)
+
+    thread = threading.Thread(target=run, name="startup-services", daemon=True)
+    thread.start()
+    return thread
+
+
 def main():
     app = QApplication(sys.argv)
     app.setApplicationName("ERP Pro")
     app.setOrganizationName("DAR ELSSALEM")
     app.setApplicationVersion("2.0.0")
     
-    # Démarrer le serveur API dès maintenant (pour le mobile)
-    start_api_server(port=5000)
+    # Serveur API et tâches de fond démarrés hors du thread UI : l'import
+    # de Flask et des services ne retarde pas l'écran de connexion
+    start_background_services()
 
     login = LoginDialog()
     if login.exec() != QDialog.DialogCode.Accepted:
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
+import importlib.util
 import logging
 import sqlite3
 
@@ -25,10 +26,23 @@ def _applied_versions(conn: sqlite3.Connection) -> set[str]:
 
 
 def _migration_files() -> list[Path]:
+    """Scripts V*.sql et migrations Python V*.py, tries par version."""
     sql_dir = Path(__file__).parent / "sql"
     if not sql_dir.exists():
         return []
-    return sorted(sql_dir.glob("V*.sql"))
+    return sorted([*sql_dir.glob("V*.sql"), *sql_dir.glob("V*.py")], key=lambda p: p.stem)
+
+
+def _run_python(conn: sqlite3.Connection, path: Path) -> None:
+    """
+    Migration Python : le module expose migrate(conn). Utile pour les
+    traitements par lots, qui valident eux-memes chaque tranche et doivent
+    pouvoir reprendre apres une interruption.
+    """
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.migrate(conn)
 
 
 def run_migrations(conn: sqlite3.Connection) -> list[str]:
@@ -45,9 +59,11 @@ def run_migrations(conn: sqlite3.Connection) -> list[str]:
         if version in applied:
             continue
 
-        script = sql_file.read_text(encoding="utf-8")
         try:
-            conn.executescript(script)
+            if sql_file.suffix == ".py":
+                _run_python(conn, sql_file)
+            else:
+                conn.executescript(sql_file.read_text(encoding="utf-8"))
             conn.execute(
                 "INSERT INTO schema_migrations(version) VALUES (?)",
                 (version,),
@@ -0,0 +1,7 @@
+-- Index couvrant les cles de tri de la pagination keyset (repositories.iter_page)
+CREATE INDEX IF NOT EXISTS idx_clients_name_id ON clients(name, id);
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name, id);
+CREATE INDEX IF NOT EXISTS idx_sales_date_id ON sales(sale_date, id);
+CREATE INDEX IF NOT EXISTS idx_sale_items_sale_id ON sale_items(sale_id);
+CREATE INDEX IF NOT EXISTS idx_purchase_items_created_id ON purchase_items(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_returns_date_id ON returns(return_date, id);
@@ -0,0 +1,3 @@
+-- Jointures des rapports (report_engine) : ventes par client, lignes par produit
+CREATE INDEX IF NOT EXISTS idx_sales_client_id ON sales(client_id);
+CREATE INDEX IF NOT EXISTS idx_sale_items_product_id ON sale_items(product_id);
@@ -0,0 +1,23 @@
+-- Compteur incremente a chaque ecriture dans settings (toutes connexions et
+-- processus confondus): permet aux caches de parametres de se revalider.
+CREATE TABLE IF NOT EXISTS settings_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO settings_version(id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_settings_version_insert AFTER INSERT ON settings
+BEGIN
+    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_settings_version_update AFTER UPDATE ON settings
+BEGIN
+    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_settings_version_delete AFTER DELETE ON settings
+BEGIN
+    UPDATE settings_version SET version = version + 1 WHERE id = 1;
+END;
@@ -0,0 +1,9 @@
+-- Historique des taux de change : 1 unite de `code` = `rate` DZD a partir de `valid_from`
+CREATE TABLE IF NOT EXISTS currency_rates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT NOT NULL,
+    valid_from DATE NOT NULL,
+    rate REAL NOT NULL CHECK (rate > 0),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (code, valid_from)
+);
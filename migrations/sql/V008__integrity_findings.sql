@@ -0,0 +1,35 @@
+-- Controles d'integrite en arriere-plan (services.integrity_service)
+CREATE TABLE IF NOT EXISTS integrity_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL DEFAULT 'manual',
+    status TEXT NOT NULL DEFAULT 'running',
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    checks INTEGER NOT NULL DEFAULT 0,
+    findings INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+
+-- Une ligne par anomalie (check_key stable d'un passage a l'autre)
+CREATE TABLE IF NOT EXISTS integrity_findings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    check_key TEXT NOT NULL UNIQUE,
+    check_name TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    table_name TEXT,
+    affected INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL,
+    details TEXT NOT NULL DEFAULT '',
+    repair TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    first_seen_at TIMESTAMP NOT NULL,
+    last_seen_at TIMESTAMP NOT NULL,
+    last_run_id INTEGER,
+    resolved_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_integrity_findings_status ON integrity_findings(status, severity);
+CREATE INDEX IF NOT EXISTS idx_integrity_runs_finished ON integrity_runs(status, finished_at);
+
+-- Rapprochement stock / mouvements par produit
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements(product_id, quantity);
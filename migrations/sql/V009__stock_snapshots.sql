@@ -0,0 +1,25 @@
+-- Instantanes periodiques du stock (services.stock_ledger)
+-- last_movement_id: dernier stock_movements.id pris en compte par l'instantane
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    period TEXT NOT NULL UNIQUE,
+    taken_at TIMESTAMP NOT NULL,
+    last_movement_id INTEGER NOT NULL,
+    origin TEXT NOT NULL DEFAULT 'schedule',
+    products INTEGER NOT NULL DEFAULT 0
+);
+
+-- Seuls les produits en stock non nul ont une ligne
+CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+    snapshot_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (snapshot_id, product_id),
+    FOREIGN KEY (snapshot_id) REFERENCES stock_snapshots(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_stock_snapshots_last_movement ON stock_snapshots(last_movement_id);
+
+-- Date -> dernier mouvement a cette date
+CREATE INDEX IF NOT EXISTS idx_stock_movements_created ON stock_movements(created_at);
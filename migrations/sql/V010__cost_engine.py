@@ -0,0 +1,68 @@
+"""
+Moteur de cout (services.cost_engine): cout d'achat fige sur chaque ligne
+vendue/retournee, cout moyen pondere et couches FIFO par produit.
+
+Les lignes anterieures recoivent le meilleur cout connu, le prix d'achat
+actuel, par tranches de BATCH lignes, une transaction par tranche :
+l'application reste utilisable et une migration interrompue reprend au
+premier identifiant non rempli.
+"""
+
+BATCH = 5000
+TABLES = ("sale_items", "return_items")
+
+SCHEMA = """
+-- Cout moyen pondere courant par produit
+CREATE TABLE IF NOT EXISTS product_costs (
+    product_id INTEGER PRIMARY KEY,
+    avg_cost REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Couches FIFO: une par entree en stock, consommees de la plus ancienne a la plus recente
+CREATE TABLE IF NOT EXISTS cost_layers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    source_ref TEXT,
+    quantity INTEGER NOT NULL,
+    remaining INTEGER NOT NULL,
+    unit_cost REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cost_layers_open ON cost_layers(product_id, id) WHERE remaining > 0;
+
+-- Marges par produit: somme sur les colonnes de sale_items, sans jointure products
+CREATE INDEX IF NOT EXISTS idx_sale_items_margin ON sale_items(product_id, quantity, unit_cost, total);
+"""
+
+
+def _add_column(conn, table):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if "unit_cost" not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN unit_cost REAL")
+    conn.commit()
+
+
+def _backfill(conn, table):
+    last = conn.execute(f"SELECT COALESCE(MIN(id), 1) - 1 FROM {table} WHERE unit_cost IS NULL").fetchone()[0]
+    while True:
+        upper = conn.execute(f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+                             (last, BATCH)).fetchone()[0]
+        if upper is None:
+            break
+        conn.execute(f"""
+            UPDATE {table}
+            SET unit_cost = COALESCE((SELECT purchase_price FROM products p WHERE p.id = {table}.product_id), 0)
+            WHERE id > ? AND id <= ? AND unit_cost IS NULL
+        """, (last, upper))
+        conn.commit()
+        last = upper
+
+
+def migrate(conn):
+    for table in TABLES:
+        _add_column(conn, table)
+        _backfill(conn, table)
+    conn.executescript(SCHEMA)
@@ -0,0 +1,44 @@
+"""
+Nom et code-barres du produit figes sur sale_items et return_items (le cout
+de revient l'est depuis V010) : les factures et rapports n'ont plus besoin de
+joindre products et un produit supprime garde le nom sous lequel il a ete vendu.
+
+Remplissage des lignes existantes par tranches de BATCH lignes, une
+transaction par tranche : l'application reste utilisable et une migration
+interrompue reprend au premier identifiant non rempli.
+"""
+
+BATCH = 5000
+TABLES = ("sale_items", "return_items")
+COLUMNS = (("product_name", "TEXT"), ("barcode", "TEXT"))
+
+
+def _add_columns(conn, table):
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, kind in COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+    conn.commit()
+
+
+def _backfill(conn, table):
+    last = conn.execute(f"SELECT COALESCE(MIN(id), 1) - 1 FROM {table} WHERE product_name IS NULL").fetchone()[0]
+    while True:
+        upper = conn.execute(f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+                             (last, BATCH)).fetchone()[0]
+        if upper is None:
+            break
+        conn.execute(f"""
+            UPDATE {table}
+            SET product_name = (SELECT name FROM products p WHERE p.id = {table}.product_id),
+                barcode = (SELECT barcode FROM products p WHERE p.id = {table}.product_id)
+            WHERE id > ? AND id <= ? AND product_name IS NULL
+        """, (last, upper))
+        conn.commit()
+        last = upper
+
+
+def migrate(conn):
+    for table in TABLES:
+        _add_columns(conn, table)
+        _backfill(conn, table)
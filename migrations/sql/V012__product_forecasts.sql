@@ -0,0 +1,14 @@
+-- Previsions de demande et points de commande (services.demand_forecast)
+CREATE TABLE IF NOT EXISTS product_forecasts (
+    product_id INTEGER PRIMARY KEY,
+    daily_demand REAL NOT NULL DEFAULT 0,
+    moving_avg REAL NOT NULL DEFAULT 0,
+    sigma REAL NOT NULL DEFAULT 0,
+    stock INTEGER NOT NULL DEFAULT 0,
+    days_of_cover REAL,
+    reorder_point REAL NOT NULL DEFAULT 0,
+    order_qty INTEGER NOT NULL DEFAULT 0,
+    computed_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_forecasts_reorder ON product_forecasts(order_qty, days_of_cover);
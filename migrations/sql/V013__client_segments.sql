@@ -0,0 +1,29 @@
+-- Segmentation RFM des clients (services.client_segments)
+CREATE TABLE IF NOT EXISTS client_segments (
+    client_id INTEGER PRIMARY KEY,
+    last_sale TIMESTAMP,
+    recency_days REAL NOT NULL DEFAULT 0,
+    frequency INTEGER NOT NULL DEFAULT 0,
+    monetary REAL NOT NULL DEFAULT 0,
+    r_score INTEGER NOT NULL,
+    f_score INTEGER NOT NULL,
+    m_score INTEGER NOT NULL,
+    segment TEXT NOT NULL,
+    computed_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_client_segments_segment ON client_segments(segment);
+
+-- Bornes des quintiles du dernier calcul complet: les clients ayant achete
+-- depuis sont rescores contre ces bornes sans recalculer toute la base.
+CREATE TABLE IF NOT EXISTS client_segment_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    as_of DATE NOT NULL,
+    last_sale_id INTEGER NOT NULL DEFAULT 0,
+    recency_edges TEXT NOT NULL,
+    frequency_edges TEXT NOT NULL,
+    monetary_edges TEXT NOT NULL
+);
+
+-- Agregats par client lus sur l'index seul
+CREATE INDEX IF NOT EXISTS idx_sales_client_rfm ON sales(client_id, sale_date, total);
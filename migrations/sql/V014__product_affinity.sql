@@ -0,0 +1,39 @@
+-- Affinites produits (paniers) pour les suggestions de vente (services.product_affinity)
+
+-- Nombre de paniers contenant chaque produit
+CREATE TABLE IF NOT EXISTS product_basket_counts (
+    product_id INTEGER PRIMARY KEY,
+    baskets INTEGER NOT NULL DEFAULT 0
+);
+
+-- Matrice creuse des co-occurrences, une ligne par paire (product_a < product_b)
+CREATE TABLE IF NOT EXISTS product_pair_counts (
+    product_a INTEGER NOT NULL,
+    product_b INTEGER NOT NULL,
+    together INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_a, product_b)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_product_pair_counts_b ON product_pair_counts(product_b);
+
+-- Top-k voisins par produit, lus a la caisse
+CREATE TABLE IF NOT EXISTS product_affinity (
+    product_id INTEGER NOT NULL,
+    related_id INTEGER NOT NULL,
+    together INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    lift REAL NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (product_id, related_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS product_affinity_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_sale_id INTEGER NOT NULL DEFAULT 0,
+    baskets INTEGER NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Lecture des paniers dans l'ordre des ventes sur l'index seul
+CREATE INDEX IF NOT EXISTS idx_sale_items_basket ON sale_items(sale_id, product_id);
@@ -0,0 +1,36 @@
+-- Classification ABC (Pareto) des produits (services.abc_classification)
+
+-- Cumul journalier des ventes par produit, alimente par les nouvelles lignes
+-- de vente (sale_items.id > product_abc_state.last_line_id)
+CREATE TABLE IF NOT EXISTS product_sales_daily (
+    product_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    quantity REAL NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    margin REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_product_sales_daily_day ON product_sales_daily(day);
+
+-- Classe de chaque produit du catalogue, par CA et par marge
+CREATE TABLE IF NOT EXISTS product_abc (
+    product_id INTEGER PRIMARY KEY,
+    revenue REAL NOT NULL DEFAULT 0,
+    margin REAL NOT NULL DEFAULT 0,
+    revenue_share REAL NOT NULL DEFAULT 0,
+    margin_share REAL NOT NULL DEFAULT 0,
+    revenue_class TEXT NOT NULL,
+    margin_class TEXT NOT NULL,
+    computed_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_abc_revenue_class ON product_abc(revenue_class);
+CREATE INDEX IF NOT EXISTS idx_product_abc_margin_class ON product_abc(margin_class);
+
+CREATE TABLE IF NOT EXISTS product_abc_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_line_id INTEGER NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP,
+    computed_at TIMESTAMP
+);
@@ -0,0 +1 @@
+"""Couche modeles: objets metier compacts (__slots__) construits depuis SQLite."""
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from dataclasses import fields
+
+
+class RowModel:
+    """
+    Base des modeles a slots.
+
+    Les sous-classes sont des dataclasses(slots=True) dont l'ordre des champs
+    suit `COLUMNS` : `from_row` construit l'objet directement depuis le tuple
+    sqlite3 (aucun dict intermediaire). L'acces `obj["name"]` / `obj.get()`
+    reste disponible pour le code UI qui manipulait des dicts.
+    """
+
+    __slots__ = ()
+    COLUMNS: tuple[str, ...] = ()
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(*(data.get(name) for name in cls.COLUMNS))
+
+    @classmethod
+    def select_list(cls, alias: str = "") -> str:
+        """Liste SQL des colonnes dans l'ordre des champs (ex: 'p.id, p.name')."""
+        prefix = f"{alias}." if alias else ""
+        return ", ".join(prefix + name for name in cls.COLUMNS)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    def to_json(self) -> dict:
+        """Forme JSON exposee par l'API (par defaut identique a to_dict)."""
+        return self.to_dict()
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.COLUMNS
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.COLUMNS
+
+
+def column_names(model_cls) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(model_cls))
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from models.base import RowModel, column_names
+
+
+@dataclass(slots=True, eq=False)
+class Client(RowModel):
+    id: int
+    name: str
+    phone: str | None = None
+    email: str | None = None
+    address: str | None = None
+    nif: str | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+
+
+Client.COLUMNS = column_names(Client)
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from models.base import RowModel, column_names
+
+
+@dataclass(slots=True, eq=False)
+class Product(RowModel):
+    id: int
+    name: str
+    description: str | None = None
+    category_id: int | None = None
+    purchase_price: float = 0.0
+    selling_price: float = 0.0
+    stock_quantity: int = 0
+    min_stock: int = 0
+    barcode: str | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+    category_name: str | None = None
+
+    def to_json(self) -> dict:
+        # Cle attendue par l'app mobile (pas de colonne image en base)
+        data = self.to_dict()
+        data["image_base64"] = None
+        return data
+
+
+Product.COLUMNS = column_names(Product)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from models.base import RowModel, column_names
+
+
+@dataclass(slots=True, eq=False)
+class Sale(RowModel):
+    id: int
+    invoice_number: str
+    client_id: int | None = None
+    sale_date: str | None = None
+    subtotal: float = 0.0
+    tax_rate: float = 0.0
+    tax_amount: float = 0.0
+    discount: float = 0.0
+    total: float = 0.0
+    payment_method: str | None = None
+    payment_status: str | None = None
+    notes: str | None = None
+    created_at: str | None = None
+    client_name: str | None = None
+    items_count: int = 0
+
+
+@dataclass(slots=True, eq=False)
+class SaleItem(RowModel):
+    id: int
+    sale_id: int
+    product_id: int | None
+    quantity: int = 0
+    unit_price: float = 0.0
+    discount: float = 0.0
+    total: float = 0.0
+    product_name: str | None = None
+    product_reference: str | None = None
+
+
+Sale.COLUMNS = column_names(Sale)
+SaleItem.COLUMNS = column_names(SaleItem)
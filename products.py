@@ -9,6 +9,8 @@ from auth import session
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtCore import Qt
 from db_manager import get_database
+from config import config
+from table_paging import connect_keyset_paging
 from repositories.product_repository import ProductRepository
 from services.product_service import ProductService
 from services.audit_service import AuditService
@@ -436,6 +438,10 @@ class ProductsPage(QWidget):
             QHeaderView::section:first {{ border-top-left-radius: 12px; }}
             QHeaderView::section:last  {{ border-top-right-radius: 12px; }}
         """)
+        # Chargement par pages (keyset) quand on atteint le bas du tableau
+        self._next_cursor = None
+        self._fill_table = connect_keyset_paging(
+            self.table, self._load_next_page, lambda: self._next_cursor is not None)
         tbl_lay.addWidget(self.table)
         layout.addWidget(tbl_card)
 
@@ -525,8 +531,15 @@ class ProductsPage(QWidget):
 
     def load_products(self):
         self.table.setRowCount(0)
-        for product in self.product_service.list_products():
+        self._next_cursor = None
+        self._load_next_page()
+        self._fill_table()
+
+    def _load_next_page(self):
+        page = self.product_service.page_products(after=self._next_cursor, limit=config.page_size)
+        for product in page.items:
             self.add_product_to_table(product)
+        self._next_cursor = page.next_cursor
 
     def add_product_to_table(self, product):
         row = self.table.rowCount()
@@ -669,7 +682,9 @@ class ProductsPage(QWidget):
                 QMessageBox.critical(self, "Erreur", "Impossible de supprimer!")
 
     def delete_all_products(self):
-        count = self.table.rowCount()
+        # Le tableau ne contient que les pages deja chargees
+        product_ids = [p["id"] for p in self.product_service.list_products()]
+        count = len(product_ids)
         if count == 0:
             QMessageBox.information(self, "Info", "Aucun produit à supprimer.")
             return
@@ -686,8 +701,7 @@ class ProductsPage(QWidget):
         if reply2 != QMessageBox.StandardButton.Yes:
             return
         errors = 0
-        for row in range(self.table.rowCount()):
-            product_id = self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
+        for product_id in product_ids:
             actor = {"id": session.user_id, "username": session.username}
             if not self.product_service.delete_product(product_id, actor=actor):
                 errors += 1
@@ -703,6 +717,7 @@ class ProductsPage(QWidget):
             self.load_products()
             return
         self.table.setRowCount(0)
+        self._next_cursor = None
         for product in self.product_service.search_products(text.strip()):
             self.add_product_to_table(product)
 
@@ -786,21 +801,23 @@ class ProductsPage(QWidget):
         if not file_path:
             return
         try:
-            products = self.db.get_all_products()
+            count = 0
             with open(file_path, 'w', newline='', encoding='utf-8') as file:
                 fieldnames = ['id', 'name', 'category', 'stock_quantity',
                               'purchase_price', 'selling_price', 'min_stock']
-                writer = csv.DictWriter(file, fieldnames=fieldnames)
-                writer.writeheader()
-                for product in products:
-                    writer.writerow({
-                        'id': product['id'], 'name': product['name'],
-                        'category': product.get('category_name', ''),
-                        'stock_quantity': product['stock_quantity'],
-                        'purchase_price': product['purchase_price'],
-                        'selling_price': product['selling_price'],
-                        'min_stock': product.get('min_stock', 0)
-                    })
-            QMessageBox.information(self, "Succès", f"✅ {len(products)} produit(s) exporté(s)!")
+                writer = csv.writer(file)
+                writer.writerow(fieldnames)
+                # Lecture en flux : mémoire constante quel que soit le catalogue
+                for product in self.db.iter_products():
+                    writer.writerow((
+                        product['id'], product['name'],
+                        product['category_name'] or '',
+                        product['stock_quantity'],
+                        product['purchase_price'],
+                        product['selling_price'],
+                        product['min_stock'] or 0,
+                    ))
+                    count += 1
+            QMessageBox.information(self, "Succès", f"✅ {count} produit(s) exporté(s)!")
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur d'export:\n{str(e)}")
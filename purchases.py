@@ -644,10 +644,19 @@ class PurchasesPage(QWidget):
         self.add_item_btn.clicked.connect(self.add_item)
         self.add_item_btn.setCursor(Qt.CursorShape.PointingHandCursor)
 
+        self.suggest_btn = QPushButton("📈  Réappro suggéré")
+        self.suggest_btn.setStyleSheet(BTN['secondary'])
+        self.suggest_btn.setMinimumHeight(40)
+        self.suggest_btn.setFixedWidth(175)
+        self.suggest_btn.setToolTip("Ajoute les quantités suggérées par les prévisions de demande")
+        self.suggest_btn.clicked.connect(self.add_suggestions)
+        self.suggest_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+
         scl.addWidget(sup_lbl)
         scl.addWidget(self.supplier_combo)
         scl.addWidget(self.new_supplier_btn)
         scl.addStretch()
+        scl.addWidget(self.suggest_btn)
         scl.addWidget(self.add_item_btn)
         main_layout.addWidget(supplier_card)
 
@@ -800,53 +809,73 @@ class PurchasesPage(QWidget):
         dialog = ProductSelectorDialog(products)
         if dialog.exec() and dialog.selected_product:
             product = dialog.selected_product
-            quantity = product.get('_qty', 1)
-            for row in range(self.table.rowCount()):
-                item = self.table.item(row, 0)
-                if item and item.data(Qt.ItemDataRole.UserRole) == product['id']:
-                    qty_item = self.table.item(row, 1)
-                    qty_item.setText(str(int(clean_num(qty_item)) + quantity))
-                    self.update_totals()
-                    return
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setRowHeight(row, 44)
-
-            p_item = QTableWidgetItem(product['name'])
-            p_item.setData(Qt.ItemDataRole.UserRole, product['id'])
-            p_item.setFlags(p_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            p_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-            self.table.setItem(row, 0, p_item)
-
-            qty_item = QTableWidgetItem(str(quantity))
-            qty_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.table.setItem(row, 1, qty_item)
+            self._add_row(product, product.get('_qty', 1))
+            self.update_totals()
 
-            price_item = QTableWidgetItem(fmt_da(product['purchase_price']))
-            price_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            price_item.setForeground(QColor(C['amber']))
-            self.table.setItem(row, 2, price_item)
+    def add_suggestions(self):
+        """Brouillon d'achat à partir des prévisions de demande (services.demand_forecast)."""
+        suggestions = self.db.get_reorder_suggestions()
+        if suggestions is None:
+            QMessageBox.information(self, "Réapprovisionnement",
+                                    "Prévisions en cours de calcul, réessayez dans un instant.")
+            return
+        if not suggestions:
+            QMessageBox.information(self, "Réapprovisionnement",
+                                    "Aucun produit à commander d'après les prévisions.")
+            return
+        self.table.blockSignals(True)
+        for s in suggestions:
+            self._add_row({'id': s['product_id'], 'name': s['name'],
+                           'purchase_price': s['purchase_price']}, int(s['order_qty']))
+        self.table.blockSignals(False)
+        self.update_totals()
 
-            total = quantity * product['purchase_price']
-            total_item = QTableWidgetItem(fmt_da(total))
-            total_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-            total_item.setFlags(total_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-            total_item.setForeground(QColor(C['teal']))
-            total_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-            self.table.setItem(row, 3, total_item)
-
-            rm_btn = QPushButton("✕")
-            rm_btn.setStyleSheet(f"""
-                QPushButton {{ background:transparent; color:{C['coral']};
-                    border:none; font-size:14px; }}
-                QPushButton:hover {{
-                    background:{C['coral']}; color:white; border-radius:4px;
-                }}
-            """)
-            rm_btn.clicked.connect(lambda checked, r=row: self.remove_item(r))
-            rm_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-            self.table.setCellWidget(row, 4, rm_btn)
-            self.update_totals()
+    def _add_row(self, product, quantity):
+        """Ajoute `quantity` du produit au tableau (cumule si la ligne existe déjà)."""
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.ItemDataRole.UserRole) == product['id']:
+                qty_item = self.table.item(row, 1)
+                qty_item.setText(str(int(clean_num(qty_item)) + quantity))
+                return
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.table.setRowHeight(row, 44)
+
+        p_item = QTableWidgetItem(product['name'])
+        p_item.setData(Qt.ItemDataRole.UserRole, product['id'])
+        p_item.setFlags(p_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        p_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        self.table.setItem(row, 0, p_item)
+
+        qty_item = QTableWidgetItem(str(quantity))
+        qty_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.table.setItem(row, 1, qty_item)
+
+        price_item = QTableWidgetItem(fmt_da(product['purchase_price']))
+        price_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        price_item.setForeground(QColor(C['amber']))
+        self.table.setItem(row, 2, price_item)
+
+        total = quantity * product['purchase_price']
+        total_item = QTableWidgetItem(fmt_da(total))
+        total_item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        total_item.setFlags(total_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        total_item.setForeground(QColor(C['teal']))
+        total_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        self.table.setItem(row, 3, total_item)
+
+        rm_btn = QPushButton("✕")
+        rm_btn.setStyleSheet(f"""
+            QPushButton {{ background:transparent; color:{C['coral']};
+                border:none; font-size:14px; }}
+            QPushButton:hover {{
+                background:{C['coral']}; color:white; border-radius:4px;
+            }}
+        """)
+        rm_btn.clicked.connect(lambda checked, r=row: self.remove_item(r))
+        rm_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.table.setCellWidget(row, 4, rm_btn)
 
     def remove_item(self, row):
         self.table.removeRow(row)
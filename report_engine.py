@@ -0,0 +1,399 @@
+"""
+Moteur de rapports ERP
+======================
+Chaque rapport est une requete SQL dont le resultat est rendu en colonnes
+(une liste de valeurs par colonne) ; les totaux/KPI sont calcules par SQLite
+(requete d'agregats), pas par des boucles Python.
+
+Aucune dependance Qt : reports_module affiche un ReportResult via un
+QAbstractTableModel et les exports lisent directement les colonnes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+
+from services import client_segments, cohort_analysis, stock_ledger
+
+
+@dataclass
+class ReportResult:
+    """Resultat colonnaire : `columns[i]` contient toutes les valeurs de `names[i]`."""
+
+    names: tuple[str, ...] = ()
+    columns: list[tuple] = field(default_factory=list)
+    totals: dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def column(self, name: str) -> tuple:
+        """Colonne `name` (tuple vide si absente, ex: resultat vide apres erreur)."""
+        try:
+            return self.columns[self.names.index(name)]
+        except ValueError:
+            return ()
+
+    def rows(self):
+        """Lignes reconstituees a la demande (tuples)."""
+        return zip(*self.columns)
+
+
+def fetch_columns(db, sql: str, params=()) -> tuple[tuple[str, ...], list[tuple]]:
+    """Execute `sql` sur un curseur dedie et transpose le resultat en colonnes."""
+    cur = db.conn.cursor()
+    cur.row_factory = None          # tuples bruts : pas de sqlite3.Row par ligne
+    try:
+        cur.execute(sql, params)
+        names = tuple(d[0] for d in cur.description)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    columns = list(zip(*rows)) if rows else [() for _ in names]
+    return names, columns
+
+
+def fetch_totals(db, source: str, params=(), **exprs) -> dict:
+    """
+    Agregats SQL : SELECT <exprs> FROM <source>.
+    `source` est une table/jointure filtree ("sales s WHERE ...") ou une
+    sous-requete "(SELECT ...)". Les NULL (ensemble vide) sont ramenes a 0.
+    """
+    if not exprs:
+        return {}
+    select = ", ".join(f"{expr} AS {name}" for name, expr in exprs.items())
+    cur = db.conn.cursor()
+    cur.row_factory = None
+    try:
+        row = cur.execute(f"SELECT {select} FROM {source}", params).fetchone()
+    finally:
+        cur.close()
+    return {name: (value if value is not None else 0) for name, value in zip(exprs, row)}
+
+
+def run_report(db, sql: str, params=(), totals_from: str | None = None,
+               totals_params=None, **totals) -> ReportResult:
+    """
+    Rapport = colonnes de `sql` + agregats `totals`.
+    Par defaut les agregats portent sur le resultat de `sql` ; `totals_from`
+    permet de les calculer sur une source plus legere (sans jointure ni tri).
+    """
+    names, columns = fetch_columns(db, sql, params)
+    if totals_from is None:
+        totals_from, totals_params = f"({sql})", params
+    return ReportResult(names, columns, fetch_totals(
+        db, totals_from, params if totals_params is None else totals_params, **totals))
+
+
+def add_converted_column(result: ReportResult, amount_key: str, date_key: str,
+                         to_code: str, name: str, manager=None) -> ReportResult:
+    """
+    Ajoute la colonne `name` : `amount_key` converti en `to_code` au taux en
+    vigueur a la date `date_key` de chaque ligne (une passe, aucune requete).
+    """
+    if manager is None:
+        from currency import currency_manager as manager
+    amounts = result.column(amount_key)
+    converted = tuple(manager.convert_series(amounts, result.column(date_key), to_code)) \
+        if amounts else ()
+    return ReportResult(result.names + (name,), result.columns + [converted], dict(result.totals))
+
+
+def _date_filter(column: str, start, end, keyword="WHERE"):
+    if start and end:
+        return f" {keyword} DATE({column}) BETWEEN ? AND ?", (start, end)
+    return "", ()
+
+
+# ── 1. Ventes ──────────────────────────────────────────────────────────────
+
+def sales_query(start=None, end=None):
+    where, params = _date_filter("s.sale_date", start, end)
+    return f"""
+        SELECT s.invoice_number, s.sale_date,
+               COALESCE(c.name,'Client Anonyme') AS client_name,
+               s.subtotal, s.tax_amount, s.total,
+               s.payment_method, COALESCE(s.payment_status,'paid') AS payment_status
+        FROM sales s
+        LEFT JOIN clients c ON s.client_id = c.id
+        {where}
+        ORDER BY s.sale_date DESC
+    """, params
+
+
+def sales_report(db, start=None, end=None, to_code: str | None = None) -> ReportResult:
+    """Ventes de la periode ; avec `to_code`, total converti aux taux historiques."""
+    sql, params = sales_query(start, end)
+    where, _ = _date_filter("s.sale_date", start, end)
+    result = run_report(db, sql, params, totals_from=f"sales s{where}",
+                        count="COUNT(*)",
+                        revenue="COALESCE(SUM(total), 0)",
+                        tax="COALESCE(SUM(tax_amount), 0)")
+    if to_code:
+        result = add_converted_column(result, "total", "sale_date", to_code, "total_converted")
+        result.totals["revenue_converted"] = sum(result.column("total_converted"))
+    return result
+
+
+# ── 2. Achats ──────────────────────────────────────────────────────────────
+
+def purchases_query(start=None, end=None):
+    where, params = _date_filter("p.purchase_date", start, end)
+    return f"""
+        SELECT '#' || p.id AS reference, p.purchase_date,
+               COALESCE(sup.name,'—') AS supplier,
+               COALESCE(pr.name, pi.product_name, '—') AS product_name,
+               pi.quantity, pi.unit_price,
+               pi.quantity * pi.unit_price AS subtotal,
+               p.tax_amount, p.total
+        FROM purchases p
+        LEFT JOIN suppliers sup ON p.supplier_id = sup.id
+        LEFT JOIN purchase_items pi ON pi.purchase_id = p.id
+        LEFT JOIN products pr ON pi.product_id = pr.id
+        {where}
+        ORDER BY p.purchase_date DESC
+    """, params
+
+
+def purchases_report(db, start=None, end=None) -> ReportResult:
+    sql, params = purchases_query(start, end)
+    return run_report(db, sql, params,
+                      count="COUNT(*)",
+                      total="COALESCE(SUM(total), 0)",
+                      tax="COALESCE(SUM(tax_amount), 0)",
+                      suppliers="COUNT(DISTINCT supplier)")
+
+
+# ── 3. Stock ───────────────────────────────────────────────────────────────
+
+STOCK_FILTERS = {
+    0: "",
+    1: "stock > 0 AND stock <= min_stock",
+    2: "stock = 0",
+    3: "stock > min_stock",
+}
+
+
+def stock_query(stock_filter: int = 0, abc_class: str | None = None):
+    """
+    `stock_filter` : 0 tous, 1 stock faible, 2 rupture, 3 normal.
+    `abc_class` : 'A', 'B' ou 'C' (classe par CA, services.abc_classification).
+    """
+    where = [w for w in (STOCK_FILTERS.get(stock_filter, ""),) if w]
+    params = ()
+    if abc_class:
+        where.append("abc = ?")
+        params = (abc_class,)
+    return f"""
+        SELECT * FROM (
+            SELECT p.name, COALESCE(c.name,'—') AS category,
+                   a.revenue_class AS abc,
+                   COALESCE(p.stock_quantity, 0) AS stock,
+                   COALESCE(p.min_stock, 0) AS min_stock,
+                   CASE WHEN COALESCE(p.stock_quantity, 0) = 0 THEN 'rupture'
+                        WHEN p.stock_quantity <= COALESCE(p.min_stock, 0) AND p.stock_quantity > 0 THEN 'low'
+                        ELSE 'normal' END AS status,
+                   COALESCE(p.purchase_price, 0) AS purchase_price,
+                   COALESCE(p.selling_price, 0) AS selling_price,
+                   COALESCE(p.stock_quantity, 0) * COALESCE(p.selling_price, 0) AS stock_value
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            LEFT JOIN product_abc a ON a.product_id = p.id
+        )
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY stock ASC
+    """, params
+
+
+def stock_report(db, stock_filter: int = 0, abc_class: str | None = None) -> ReportResult:
+    """Colonne `abc` vide tant que le catalogue n'a pas ete classe (AbcWorker)."""
+    sql, params = stock_query(stock_filter, abc_class)
+    return run_report(db, sql, params,
+                      products="COUNT(*)",
+                      value="COALESCE(SUM(stock_value), 0)",
+                      low="COALESCE(SUM(status = 'low'), 0)",
+                      out="COALESCE(SUM(status = 'rupture'), 0)")
+
+
+def valuation_report(db, day=None) -> ReportResult:
+    """Stock valorise a la fin de `day` (aujourd'hui par defaut), via les instantanes du grand livre."""
+    sql, params = stock_ledger.valuation_query(db.conn, day or date.today())
+    return run_report(db, sql, params,
+                      products="COUNT(*)",
+                      quantity="COALESCE(SUM(quantity), 0)",
+                      value="COALESCE(SUM(value), 0)")
+
+
+def inventory_report(db, start=None, end=None) -> ReportResult:
+    """
+    Stock moyen et valorisation par produit sur la periode (depuis le premier
+    mouvement si aucune), avec le cout des ventes et la rotation du stock.
+    """
+    start, end = stock_ledger.period_bounds(db.conn, start, end)
+    sql, params = stock_ledger.average_inventory_query(db.conn, start, end)
+    result = run_report(db, sql, params,
+                        products="COUNT(*)",
+                        avg_value="COALESCE(SUM(avg_value), 0)",
+                        closing_value="COALESCE(SUM(closing_value), 0)")
+    where, date_params = _date_filter("s.sale_date", start, end)
+    result.totals.update(fetch_totals(
+        db, f"""sale_items si
+            JOIN sales s ON si.sale_id = s.id{where}""", date_params,
+        cogs="COALESCE(SUM(si.quantity * COALESCE(si.unit_cost, 0)), 0)"))
+    avg_value = result.totals["avg_value"]
+    result.totals["turnover"] = result.totals["cogs"] / avg_value if avg_value > 0 else 0
+    result.totals["start"], result.totals["end"] = start, end
+    return result
+
+
+# ── 4. Clients ─────────────────────────────────────────────────────────────
+
+def clients_query(start=None, end=None):
+    join_filter, params = _date_filter("s.sale_date", start, end, keyword="AND")
+    return f"""
+        SELECT ROW_NUMBER() OVER (ORDER BY COALESCE(SUM(s.total),0) DESC, c.id) AS rank,
+               c.name, COALESCE(c.phone,'—') AS phone, COALESCE(c.email,'—') AS email,
+               cs.segment,
+               COUNT(s.id) AS nb,
+               COALESCE(SUM(s.total),0) AS ca,
+               COALESCE(AVG(s.total),0) AS avg,
+               MAX(s.sale_date) AS last_visit
+        FROM clients c
+        LEFT JOIN client_segments cs ON cs.client_id = c.id
+        LEFT JOIN sales s ON s.client_id = c.id{join_filter}
+        GROUP BY c.id
+        ORDER BY rank
+    """, params
+
+
+def clients_report(db, start=None, end=None) -> ReportResult:
+    """Segment RFM (tous achats confondus) rafraichi avant lecture, en incremental seulement."""
+    client_segments.refresh_segments(db.conn, incremental_only=True)
+    sql, params = clients_query(start, end)
+    where, _ = _date_filter("s.sale_date", start, end)
+    return run_report(db, sql, params,
+                      totals_from=f"sales s JOIN clients c ON s.client_id = c.id{where}",
+                      clients="(SELECT COUNT(*) FROM clients)",
+                      revenue="COALESCE(SUM(s.total), 0)",
+                      active="COUNT(DISTINCT s.client_id)")
+
+
+COHORT_OFFSETS = 12
+
+
+def cohort_report(db, start=None, end=None, offsets=COHORT_OFFSETS) -> ReportResult:
+    """
+    Retention par cohorte (mois du premier achat) : une ligne par cohorte dont
+    le mois tombe dans la periode, `m1`..`m<offsets>` = % des clients de la
+    cohorte ayant rachete k mois apres (None : mois pas encore ecoule).
+    Pivot et cache par version de donnees dans services.cohort_analysis ;
+    n'utilise pas db.conn, donc appelable hors du thread UI.
+    """
+    data = cohort_analysis.cohorts(db.db_path)
+    first, last = (start[:7], end[:7]) if start and end else ("", "9999-12")
+    keep = [i for i, month in enumerate(data.months) if first <= month <= last and data.sizes[i]]
+    offset_names = tuple(f"m{k}" for k in range(1, offsets + 1))
+    rows = []
+    for i in keep:
+        size, active = data.sizes[i], data.active[i]
+        revenue = sum(v for v in data.revenue[i] if v is not None)
+        retention = [active[k] * 100.0 / size if k < len(active) and active[k] is not None else None
+                     for k in range(1, offsets + 1)]
+        rows.append((data.months[i], size, revenue, revenue / size, data.repeat[i] * 100.0 / size, *retention))
+    names = ("cohort", "clients", "revenue", "per_client", "repeat") + offset_names
+    columns = list(zip(*rows)) if rows else [() for _ in names]
+
+    clients = sum(data.sizes[i] for i in keep)
+    # M+1 pondere par la taille des cohortes dont le mois suivant est ecoule
+    m1 = [(data.active[i][1], data.sizes[i]) for i in keep
+          if len(data.active[i]) > 1 and data.active[i][1] is not None]
+    m1_base = sum(size for _, size in m1)
+    return ReportResult(names, columns, {
+        "cohorts": len(keep),
+        "clients": clients,
+        "revenue": sum(row[2] for row in rows),
+        "repeat_rate": sum(data.repeat[i] for i in keep) * 100.0 / clients if clients else 0,
+        "m1": sum(n for n, _ in m1) * 100.0 / m1_base if m1_base else None,
+    })
+
+
+# ── 5. Benefices ───────────────────────────────────────────────────────────
+
+def profit_report(db, start=None, end=None) -> ReportResult:
+    """Nom et cout figes sur sale_items : seule la periode demande la jointure sales."""
+    where, params = _date_filter("s.sale_date", start, end)
+    join = "JOIN sales s ON si.sale_id = s.id" if where else ""
+    sql = f"""
+        SELECT name, qty, ca_ht, cost, ca_ht - cost AS profit,
+               CASE WHEN ca_ht THEN (ca_ht - cost) * 100.0 / ca_ht ELSE 0 END AS margin
+        FROM (
+            SELECT COALESCE(si.product_name, 'Produit supprimé') AS name,
+                   SUM(si.quantity) AS qty,
+                   SUM(si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0)) AS ca_ht,
+                   SUM(si.quantity * COALESCE(si.unit_cost,0)) AS cost
+            FROM sale_items si
+            {join}
+            {where}
+            GROUP BY si.product_id
+        )
+        ORDER BY profit DESC
+    """
+    line_ca = "si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0)"
+    line_cost = "si.quantity * COALESCE(si.unit_cost,0)"
+    return run_report(db, sql, params,
+                      totals_from=f"sale_items si {join}{where}",
+                      revenue=f"COALESCE(SUM({line_ca}), 0)",
+                      cost=f"COALESCE(SUM({line_cost}), 0)",
+                      profit=f"COALESCE(SUM({line_ca}) - SUM({line_cost}), 0)")
+
+
+# ── 6. Tendances ───────────────────────────────────────────────────────────
+
+TREND_FORMATS = {0: "%Y-%m-%d", 1: "%Y-%W", 2: "%Y-%m", 3: "%Y"}
+
+
+def trends_report(db, group: int = 2, start=None, end=None) -> ReportResult:
+    """Ventes/achats agreges par periode ; `evolution` = variation du CA (LAG)."""
+    fmt = TREND_FORMATS.get(group, "%Y-%m")
+    where_s, params_s = _date_filter("sale_date", start, end)
+    where_p, params_p = _date_filter("purchase_date", start, end)
+    sql = f"""
+        WITH s AS (
+            SELECT strftime('{fmt}', sale_date) AS period, COUNT(*) AS nb, SUM(total) AS ca
+            FROM sales{where_s} GROUP BY period
+        ), pu AS (
+            SELECT strftime('{fmt}', purchase_date) AS period, COUNT(*) AS nb, SUM(total) AS total
+            FROM purchases{where_p} GROUP BY period
+        ), t AS (
+            SELECT per.period,
+                   COALESCE(s.nb, 0) AS nb_sales, COALESCE(s.ca, 0) AS ca,
+                   COALESCE(pu.nb, 0) AS nb_purchases, COALESCE(pu.total, 0) AS purchases
+            FROM (SELECT period FROM s UNION SELECT period FROM pu) per
+            LEFT JOIN s ON s.period IS per.period
+            LEFT JOIN pu ON pu.period IS per.period
+        )
+        SELECT period, nb_sales, ca, nb_purchases, purchases, ca - purchases AS profit,
+               CASE WHEN LAG(ca) OVER w > 0
+                    THEN (ca - LAG(ca) OVER w) * 100.0 / LAG(ca) OVER w END AS evolution
+        FROM t
+        WINDOW w AS (ORDER BY period)
+        ORDER BY period
+    """
+    params = params_s + params_p
+    result = run_report(db, sql, params,
+                        profit="COALESCE(SUM(profit), 0)",
+                        best_ca="COALESCE(MAX(ca), 0)")
+    # Premiere/derniere periode et meilleure periode : quelques dizaines de
+    # lignes deja agregees, lues directement dans les colonnes.
+    cas = result.column("ca")
+    periods = result.column("period")
+    if cas:
+        best = max(range(len(cas)), key=lambda i: (cas[i], -i))
+        result.totals["best_period"] = periods[best] if cas[best] > 0 else None
+        first, last = cas[0], cas[-1]
+        result.totals["growth"] = ((last - first) / first * 100) if len(cas) >= 2 and first > 0 else None
+    else:
+        result.totals["best_period"] = None
+        result.totals["growth"] = None
+    return result
@@ -1,25 +1,33 @@
 """
 Module de Rapports ERP — DAR ELSSALEM
 ======================================
-Rapports : Ventes · Achats · Stock · Clients · Bénéfices · Tendances · Alertes
+Rapports : Ventes · Achats · Stock · Clients · Bénéfices · Tendances · Cohortes · Alertes
 Fonctions : Export PDF · Export CSV · Filtre par période · Envoi email
 """
 
 from PyQt6.QtWidgets import (
     QDialog, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-    QFrame, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox,
+    QFrame, QTableWidget, QTableWidgetItem, QTableView, QHeaderView, QComboBox,
     QDateEdit, QStackedWidget, QScrollArea, QMessageBox, QFileDialog,
     QSizePolicy, QProgressBar, QLineEdit, QTextEdit, QSpacerItem
 )
 from PyQt6.QtGui import QFont, QColor
-from PyQt6.QtCore import Qt, QDate, pyqtSignal
+from PyQt6.QtCore import Qt, QDate, QObject, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
 from datetime import datetime, timedelta
+from typing import Callable, NamedTuple
 import csv
+import logging
 import os
 
 from styles import COLORS, INPUT_STYLE, BUTTON_STYLES
 from db_manager import get_database
-from currency import fmt_da, currency_manager
+from currency import fmt_da, fmt_da_many, currency_manager
+import report_engine
+from report_engine import ReportResult
+from export_pipeline import QuerySource, start_export, write_csv, write_pdf, write_xlsx
+from services import client_segments
+
+logger = logging.getLogger(__name__)
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -41,6 +49,149 @@ PAY_LABELS = {
     "transfer": "🏦 Virement", "mobile": "📱 Mobile", "credit": "🔄 Crédit",
 }
 
+SALE_STATUS_COLOR = {"paid": "#22C55E", "pending": "#FBBF24", "cancelled": "#EF4444"}
+SALE_STATUS_LABEL = {"paid": "✅ Payée", "pending": "⏳ En attente", "cancelled": "❌ Annulée"}
+
+# statut calculé par report_engine.stock_report -> (libellé, couleur)
+STOCK_STATUS = {
+    "rupture": ("🔴 Rupture", "#EF4444"),
+    "low":     ("🟡 Faible",  "#FBBF24"),
+    "normal":  ("🟢 Normal",  "#22C55E"),
+}
+
+# classe ABC par CA (services.abc_classification) -> couleur
+ABC_COLORS = {"A": "#22C55E", "B": "#FBBF24", "C": "#A0AACC"}
+
+
+def _money(v):
+    return fmt_da(float(v or 0))
+
+
+def _money_many(values):
+    return fmt_da_many([v or 0 for v in values])
+
+
+# Équivalents par colonne des formateurs de cellule (exports)
+BULK_FORMATTERS = {_money: _money_many}
+# Lignes formatées par bloc lors des exports
+EXPORT_CHUNK_ROWS = 4096
+
+
+def _day(v):
+    return str(v).split(" ")[0] if v else "—"
+
+
+def _int(v):
+    return str(int(v or 0))
+
+
+def _pct(v):
+    return f"{float(v or 0):.1f}%"
+
+
+def _sign_color(v):
+    return "#22C55E" if (v or 0) >= 0 else "#EF4444"
+
+
+# ══════════════════════════════════════════════════════════════════════════
+#  MODÈLE DE TABLE GÉNÉRIQUE
+# ══════════════════════════════════════════════════════════════════════════
+
+class ReportColumn(NamedTuple):
+    """
+    Colonne affichée : `key` est le nom de colonne SQL du ReportResult.
+    `color` est une couleur fixe ou une fonction de la valeur de `color_key`
+    (par défaut la colonne elle-même).
+    """
+    header: str
+    key: str
+    fmt: Callable = str
+    color: object = "#F0F4FF"
+    color_key: str = ""
+    align_right: bool = False
+
+
+class ReportTableModel(QAbstractTableModel):
+    """
+    Affiche un ReportResult colonnaire : les cellules sont formatées à la
+    demande (seules les lignes visibles le sont), aucun QTableWidgetItem.
+    """
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self._specs = list(columns)
+        self._result = ReportResult()
+        self._cols = [()] * len(self._specs)
+        self._color_cols = list(self._cols)
+        self._qcolors = {}
+
+    def set_result(self, result: ReportResult):
+        self.beginResetModel()
+        self._result = result
+        self._cols = [result.column(c.key) for c in self._specs]
+        self._color_cols = [result.column(c.color_key or c.key) for c in self._specs]
+        self.endResetModel()
+
+    def result(self) -> ReportResult:
+        return self._result
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._result)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._specs)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._specs[section].header
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        r, c = index.row(), index.column()
+        spec = self._specs[c]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return spec.fmt(self._cols[c][r]) if self._cols[c] else ""
+        if role == Qt.ItemDataRole.ForegroundRole:
+            color = spec.color
+            if callable(color):
+                color = color(self._color_cols[c][r]) if self._color_cols[c] else "#A0AACC"
+            qc = self._qcolors.get(color)
+            if qc is None:
+                qc = self._qcolors[color] = QColor(color)
+            return qc
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            h = Qt.AlignmentFlag.AlignRight if spec.align_right else Qt.AlignmentFlag.AlignLeft
+            return int(Qt.AlignmentFlag.AlignVCenter | h)
+        return None
+
+    def iter_display_rows(self):
+        """Lignes formatées (texte affiché) pour les exports, générées une à une.
+
+        Les colonnes sont capturées à l'appel : un rechargement du rapport
+        pendant un export en arrière-plan ne modifie pas les lignes exportées.
+        """
+        fmts = [c.fmt for c in self._specs]
+        cols = self._cols
+        return _iter_formatted(fmts, cols, len(self._result))
+
+
+def _iter_formatted(fmts, cols, count):
+    """Lignes formatées par blocs : les colonnes de montants le sont d'un seul appel."""
+    for start in range(0, count, EXPORT_CHUNK_ROWS):
+        size = min(EXPORT_CHUNK_ROWS, count - start)
+        block = []
+        for f, col in zip(fmts, cols):
+            if not col:
+                block.append([""] * size)
+                continue
+            values = col[start:start + size]
+            bulk = BULK_FORMATTERS.get(f)
+            block.append(bulk(values) if bulk else [f(v) for v in values])
+        for row in zip(*block):
+            yield list(row)
+
 
 def _lbl(text, size=11, bold=False, color=""):
     l = QLabel(text)
@@ -113,7 +264,7 @@ def _get_dates(period_key, start_qdate=None, end_qdate=None):
 class BaseReportPage(QWidget):
     """Page de rapport générique : filtres, tableau, export."""
 
-    TABLE_HEADERS: list = []
+    COLUMNS:       list = []   # ReportColumn, dans l'ordre d'affichage
     REPORT_TITLE:  str  = "Rapport"
     REPORT_ICON:   str  = "📄"
     FILENAME_BASE: str  = "rapport"
@@ -255,16 +406,18 @@ class BaseReportPage(QWidget):
         lay.setContentsMargins(0, 0, 0, 0)
         lay.setSpacing(0)
 
-        self.table = QTableWidget(0, len(self.TABLE_HEADERS))
-        self.table.setHorizontalHeaderLabels(self.TABLE_HEADERS)
+        self.model = ReportTableModel(self.COLUMNS, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(36)
         self.table.setAlternatingRowColors(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
         self.table.setShowGrid(False)
         self.table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background:{COLORS.get('BG_DEEP','#16161F')};
                 alternate-background-color:rgba(255,255,255,0.025);
                 color:{COLORS.get('TXT_PRI','#F0F4FF')};
@@ -277,8 +430,8 @@ class BaseReportPage(QWidget):
                 padding:10px 8px; border:none;
                 border-bottom:2px solid {COLORS.get('primary','#3B82F6')};
             }}
-            QTableWidget::item {{ padding:8px 10px; border-bottom:1px solid rgba(255,255,255,0.04); }}
-            QTableWidget::item:selected {{
+            QTableView::item {{ padding:8px 10px; border-bottom:1px solid rgba(255,255,255,0.04); }}
+            QTableView::item:selected {{
                 background:rgba(59,130,246,0.20); color:white;
             }}
         """)
@@ -292,6 +445,9 @@ class BaseReportPage(QWidget):
         self.btn_csv = _action_btn("📤 Exporter CSV", COLORS.get("success","#22C55E"), outlined=True)
         self.btn_csv.clicked.connect(self.export_csv)
 
+        self.btn_xlsx = _action_btn("📗 Exporter Excel", "#10B981", outlined=True)
+        self.btn_xlsx.clicked.connect(self.export_xlsx)
+
         self.btn_pdf = _action_btn("🖨️ Exporter PDF", "#8B5CF6", outlined=True)
         self.btn_pdf.clicked.connect(self.export_pdf)
 
@@ -299,6 +455,7 @@ class BaseReportPage(QWidget):
         self.btn_email.clicked.connect(self.send_email)
 
         h.addWidget(self.btn_csv)
+        h.addWidget(self.btn_xlsx)
         h.addWidget(self.btn_pdf)
         h.addWidget(self.btn_email)
         h.addStretch()
@@ -320,157 +477,137 @@ class BaseReportPage(QWidget):
 
     # ── À surcharger ───────────────────────────────────────────────────
 
+    def run_report(self) -> ReportResult:
+        """Surcharger : exécute le rapport (report_engine) pour les filtres courants."""
+        return ReportResult()
+
+    def show_result(self, result: ReportResult):
+        """Surcharger pour mettre à jour les KPI à partir de `result.totals`."""
+
     def load_data(self):
-        """Surcharger pour charger les données et remplir le tableau."""
-        pass
+        try:
+            result = self.run_report()
+        except Exception as e:
+            logger.exception("Rapport %s", type(self).__name__)
+            self.show_error(str(e))
+            return
+        self.result_badge.setToolTip("")
+        self.model.set_result(result)
+        self.show_result(result)
+
+    def show_error(self, message: str):
+        """État d'erreur : tableau vidé, message dans le badge (détail dans le journal)."""
+        self.model.set_result(ReportResult())
+        self.result_badge.setText(f"⚠️ Erreur : {message[:80]}")
+        self.result_badge.setToolTip(message)
 
     def get_headers(self):
-        return self.TABLE_HEADERS
+        return [c.header for c in self.COLUMNS]
 
     def get_rows(self):
         """Retourne les lignes du tableau pour export."""
-        rows = []
-        for r in range(self.table.rowCount()):
-            row = []
-            for c in range(self.table.columnCount()):
-                item = self.table.item(r, c)
-                row.append(item.text() if item else "")
-            rows.append(row)
-        return rows
-
-    # ── Export CSV ─────────────────────────────────────────────────────
+        return list(self.iter_rows())
+
+    def iter_rows(self):
+        """Produit les lignes à exporter une par une, depuis les colonnes du rapport."""
+        return iter(self.export_rows())
+
+    def report_query(self):
+        """Surcharger : (sql, params) relus en flux à l'export, ou None pour exporter le tableau affiché."""
+        return None
+
+    def export_rows(self):
+        """
+        Source des lignes exportées : la requête du rapport relue par lots sur
+        sa propre connexion (utilisable depuis le thread d'export), sinon les
+        colonnes déjà chargées dans le modèle.
+        """
+        query = self.report_query()
+        if query is None:
+            return self.model.iter_display_rows()
+        sql, params = query
+        columns = list(self.COLUMNS)
+
+        def row_mapper(names):
+            pos = [names.index(c.key) for c in columns]
+            fmts = [c.fmt for c in columns]
+            return lambda raw: [f(raw[i]) for f, i in zip(fmts, pos)]
+
+        return QuerySource(self.db.db_path, sql, params, row_mapper=row_mapper)
+
+    def _pdf_options(self):
+        """Titre, sous-titre et pied du PDF (lus dans le thread UI)."""
+        company = self.db.get_setting("company_name", "DAR ELSSALEM")
+        now_str = datetime.now().strftime("%d/%m/%Y à %H:%M")
+        return {
+            "title": f"{self.REPORT_ICON}  {self.REPORT_TITLE}",
+            "subtitle": f"{company}  ·  Période : {self.period_combo.currentText()}  ·  Généré le {now_str}",
+            "footer": f"{company}  —  {self.REPORT_TITLE}  —  {now_str}",
+        }
 
-    def export_csv(self):
-        rows = self.get_rows()
-        if not rows:
+    def _export_to(self, caption, ext, file_filter, writer, done_title, done_text, **options):
+        """Demande le fichier puis écrit l'export dans un thread, avec progression et annulation."""
+        if self.model.rowCount() == 0:
             QMessageBox.information(self, "Vide", "Aucune donnée à exporter.")
-            return
+            return None
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         fname, _ = QFileDialog.getSaveFileName(
-            self, "Exporter en CSV",
-            f"{self.FILENAME_BASE}_{ts}.csv",
-            "CSV (*.csv);;Tous (*.*)"
+            self, caption, f"{self.FILENAME_BASE}_{ts}{ext}", file_filter
         )
         if not fname:
-            return
+            return None
+        headers, rows = self.get_headers(), self.export_rows()
+
+        def job(progress, cancelled):
+            return writer(fname, headers, rows, progress=progress, cancelled=cancelled, **options)
+
+        def done(count):
+            QMessageBox.information(self, done_title, done_text.format(count=count, fname=fname))
+
+        return start_export(self, job, label=f"Export « {self.REPORT_TITLE} »…",
+                            total=self.model.rowCount(), on_done=done)
+
+    # ── Export CSV ─────────────────────────────────────────────────────
+
+    def export_csv(self):
+        return self._export_to(
+            "Exporter en CSV", ".csv", "CSV (*.csv);;Tous (*.*)", write_csv,
+            "✅ Exporté", "{count} ligne(s) exportée(s).\n\n📁 {fname}",
+        )
+
+    # ── Export Excel ───────────────────────────────────────────────────
+
+    def export_xlsx(self):
         try:
-            with open(fname, "w", newline="", encoding="utf-8-sig") as f:
-                w = csv.writer(f)
-                w.writerow(self.get_headers())
-                w.writerows(rows)
-            QMessageBox.information(self, "✅ Exporté",
-                f"{len(rows)} ligne(s) exportée(s).\n\n📁 {fname}")
-        except Exception as e:
-            QMessageBox.critical(self, "Erreur", f"Erreur lors de l'export :\n{e}")
+            import xlsxwriter  # noqa: F401
+        except ImportError:
+            QMessageBox.warning(self, "Module manquant",
+                "XlsxWriter est requis.\nInstallez-le avec : pip install xlsxwriter")
+            return None
+        return self._export_to(
+            "Exporter en Excel", ".xlsx", "Excel (*.xlsx);;Tous (*.*)", write_xlsx,
+            "✅ Exporté", "{count} ligne(s) exportée(s).\n\n📁 {fname}",
+            title=f"{self.REPORT_TITLE} — {self.period_combo.currentText()}",
+        )
 
     # ── Export PDF ─────────────────────────────────────────────────────
 
     def export_pdf(self):
-        rows = self.get_rows()
-        if not rows:
-            QMessageBox.information(self, "Vide", "Aucune donnée à exporter.")
-            return
         try:
-            from reportlab.lib.pagesizes import A4, landscape
-            from reportlab.lib import colors as rl_colors
-            from reportlab.lib.units import cm
-            from reportlab.platypus import (SimpleDocTemplate, Table,
-                                             TableStyle, Paragraph, Spacer)
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.enums import TA_CENTER, TA_LEFT
+            import reportlab  # noqa: F401
         except ImportError:
             QMessageBox.warning(self, "Module manquant",
                 "ReportLab est requis.\nInstallez-le avec : pip install reportlab")
-            return
-
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        fname, _ = QFileDialog.getSaveFileName(
-            self, "Exporter en PDF",
-            f"{self.FILENAME_BASE}_{ts}.pdf",
-            "PDF (*.pdf);;Tous (*.*)"
+            return None
+        return self._export_to(
+            "Exporter en PDF", ".pdf", "PDF (*.pdf);;Tous (*.*)", write_pdf,
+            "✅ PDF généré", "Rapport PDF créé avec succès.\n\n📄 {fname}",
+            **self._pdf_options(),
         )
-        if not fname:
-            return
 
-        try:
-            doc = SimpleDocTemplate(fname, pagesize=landscape(A4),
-                                    rightMargin=1.5*cm, leftMargin=1.5*cm,
-                                    topMargin=2*cm, bottomMargin=1.5*cm)
-            styles = getSampleStyleSheet()
-            C_NAVY = rl_colors.HexColor("#1E3A5F")
-            C_GOLD = rl_colors.HexColor("#C9A84C")
-
-            elems = []
-            # Titre
-            title_style = ParagraphStyle("Title", parent=styles["Title"],
-                                          fontSize=16, textColor=C_NAVY,
-                                          spaceAfter=6)
-            sub_style = ParagraphStyle("Sub", parent=styles["Normal"],
-                                        fontSize=9, textColor=rl_colors.HexColor("#6B7280"),
-                                        spaceAfter=12)
-            elems.append(Paragraph(f"{self.REPORT_ICON}  {self.REPORT_TITLE}", title_style))
-
-            db = get_database()
-            company = db.get_setting("company_name", "DAR ELSSALEM")
-            period_lbl = self.period_combo.currentText()
-            now_str = datetime.now().strftime("%d/%m/%Y à %H:%M")
-            elems.append(Paragraph(
-                f"{company}  ·  Période : {period_lbl}  ·  Généré le {now_str}",
-                sub_style))
-
-            # Tableau
-            header_row = self.get_headers()
-            data = [header_row] + rows
-
-            col_count = len(header_row)
-            page_w = landscape(A4)[0] - 3*cm
-            col_w = [page_w / col_count] * col_count
-
-            tbl = Table(data, colWidths=col_w, repeatRows=1)
-            n = len(data)
-            row_bgs = [
-                ("BACKGROUND", (0, i), (-1, i),
-                 rl_colors.white if i % 2 == 1 else rl_colors.HexColor("#F5F7FA"))
-                for i in range(1, n)
-            ]
-            tbl.setStyle(TableStyle([
-                ("BACKGROUND",    (0, 0), (-1, 0), C_NAVY),
-                ("TEXTCOLOR",     (0, 0), (-1, 0), rl_colors.white),
-                ("FONTNAME",      (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE",      (0, 0), (-1, 0), 9),
-                ("ALIGN",         (0, 0), (-1, 0), "CENTER"),
-                ("TOPPADDING",    (0, 0), (-1, 0), 8),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-                ("FONTNAME",      (0, 1), (-1, -1), "Helvetica"),
-                ("FONTSIZE",      (0, 1), (-1, -1), 8),
-                ("TEXTCOLOR",     (0, 1), (-1, -1), rl_colors.HexColor("#1A1A2E")),
-                ("TOPPADDING",    (0, 1), (-1, -1), 6),
-                ("BOTTOMPADDING", (0, 1), (-1, -1), 6),
-                ("LEFTPADDING",   (0, 0), (-1, -1), 6),
-                ("RIGHTPADDING",  (0, 0), (-1, -1), 6),
-                ("ALIGN",         (0, 1), (-1, -1), "LEFT"),
-                ("BOX",           (0, 0), (-1, -1), 1, rl_colors.HexColor("#D1D9E6")),
-                ("LINEBELOW",     (0, 0), (-1, 0), 1.5, C_NAVY),
-                ("INNERGRID",     (0, 0), (-1, -1), 0.3, rl_colors.HexColor("#D1D9E6")),
-                *row_bgs,
-            ]))
-            elems.append(tbl)
-
-            # Pied
-            elems.append(Spacer(0, 0.5*cm))
-            footer_style = ParagraphStyle("Footer", parent=styles["Normal"],
-                                           fontSize=8, textColor=rl_colors.HexColor("#9CA3AF"),
-                                           alignment=TA_CENTER)
-            elems.append(Paragraph(
-                f"{company}  —  {self.REPORT_TITLE}  —  {now_str}",
-                footer_style))
-
-            doc.build(elems)
-            QMessageBox.information(self, "✅ PDF généré",
-                f"Rapport PDF créé avec succès.\n\n📄 {fname}")
-
-        except Exception as e:
-            QMessageBox.critical(self, "Erreur PDF", f"Impossible de générer le PDF :\n{e}")
+    def export_pdf_to(self, fname):
+        """Version silencieuse et synchrone de export_pdf (pièce jointe email)."""
+        return write_pdf(fname, self.get_headers(), self.export_rows(), **self._pdf_options())
 
     # ── Envoi Email ────────────────────────────────────────────────────
 
@@ -505,8 +642,18 @@ class BaseReportPage(QWidget):
 # ══════════════════════════════════════════════════════════════════════════
 
 class SalesReportPage(BaseReportPage):
-    TABLE_HEADERS = ["N° Facture", "Date", "Client", "Sous-total HT",
-                     "TVA", "Total TTC", "Paiement", "Statut"]
+    COLUMNS = [
+        ReportColumn("N° Facture",    "invoice_number", lambda v: str(v or "—")),
+        ReportColumn("Date",          "sale_date",      _day, "#A0AACC"),
+        ReportColumn("Client",        "client_name"),
+        ReportColumn("Sous-total HT", "subtotal",       _money),
+        ReportColumn("TVA",           "tax_amount",     _money, "#FBBF24"),
+        ReportColumn("Total TTC",     "total",          _money, "#22C55E"),
+        ReportColumn("Paiement",      "payment_method", lambda v: PAY_LABELS.get(v, v or "—"), "#A0AACC"),
+        ReportColumn("Statut",        "payment_status",
+                     lambda v: SALE_STATUS_LABEL.get(v, v or "—"),
+                     lambda v: SALE_STATUS_COLOR.get(v, "#A0AACC")),
+    ]
     REPORT_TITLE  = "Rapport des Ventes"
     REPORT_ICON   = "📊"
     FILENAME_BASE = "rapport_ventes"
@@ -527,74 +674,26 @@ class SalesReportPage(BaseReportPage):
             self._kpi_vals[title] = val_lbl
         return frame
 
-    def load_data(self):
+    def run_report(self):
         s, e = self._current_dates()
-        try:
-            if s and e:
-                self.db.cursor.execute("""
-                    SELECT s.invoice_number, s.sale_date,
-                           COALESCE(c.name,'Client Anonyme') as client_name,
-                           s.subtotal, s.tax_amount, s.total,
-                           s.payment_method, COALESCE(s.payment_status,'paid')
-                    FROM sales s
-                    LEFT JOIN clients c ON s.client_id = c.id
-                    WHERE DATE(s.sale_date) BETWEEN ? AND ?
-                    ORDER BY s.sale_date DESC
-                """, (s, e))
-            else:
-                self.db.cursor.execute("""
-                    SELECT s.invoice_number, s.sale_date,
-                           COALESCE(c.name,'Client Anonyme') as client_name,
-                           s.subtotal, s.tax_amount, s.total,
-                           s.payment_method, COALESCE(s.payment_status,'paid')
-                    FROM sales s
-                    LEFT JOIN clients c ON s.client_id = c.id
-                    ORDER BY s.sale_date DESC
-                """)
-            rows = self.db.cursor.fetchall()
-        except Exception:
-            rows = []
+        return report_engine.sales_report(self.db, s, e, to_code=currency_manager.secondary_code)
 
-        self.table.setRowCount(0)
-        total_ca = total_tva = 0.0
-        STATUS_COLOR = {"paid": "#22C55E", "pending": "#FBBF24", "cancelled": "#EF4444"}
-        STATUS_LABEL = {"paid": "✅ Payée", "pending": "⏳ En attente", "cancelled": "❌ Annulée"}
+    def report_query(self):
+        return report_engine.sales_query(*self._current_dates())
 
-        for row in rows:
-            inv, date, client, sub, tva, total, pay, status = row
-            total_ca  += float(total or 0)
-            total_tva += float(tva or 0)
-            date_str = str(date).split(" ")[0] if date else "—"
-            pay_str  = PAY_LABELS.get(pay, pay or "—")
-            status_c = STATUS_COLOR.get(status, "#A0AACC")
-            status_l = STATUS_LABEL.get(status, status or "—")
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (str(inv or "—"),           "#F0F4FF"),
-                (date_str,                   "#A0AACC"),
-                (str(client),                "#F0F4FF"),
-                (fmt_da(float(sub or 0)),   "#F0F4FF"),
-                (fmt_da(float(tva or 0)),   "#FBBF24"),
-                (fmt_da(float(total or 0)), "#22C55E"),
-                (pay_str,                    "#A0AACC"),
-                (status_l,                   status_c),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(val)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
-
-        nb = len(rows)
+    def show_result(self, result):
+        t = result.totals
+        nb = int(t.get("count", 0))
+        total_ca = float(t.get("revenue", 0))
         avg = (total_ca / nb) if nb else 0
-        sym = currency_manager.primary.symbol
         self._kpi_vals["Chiffre d'affaires"].setText(fmt_da(total_ca))
+        code = currency_manager.secondary_code
+        self._kpi_vals["Chiffre d'affaires"].setToolTip(
+            f"≈ {currency_manager.format(t['revenue_converted'], code)} (taux à la date de chaque vente)"
+            if code and "revenue_converted" in t else "")
         self._kpi_vals["Nombre de ventes"].setText(str(nb))
         self._kpi_vals["Panier moyen"].setText(fmt_da(avg))
-        self._kpi_vals["TVA collectée"].setText(fmt_da(total_tva))
+        self._kpi_vals["TVA collectée"].setText(fmt_da(float(t.get("tax", 0))))
         self.result_badge.setText(f"{nb} vente(s) trouvée(s)")
 
 
@@ -603,8 +702,17 @@ class SalesReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class PurchasesReportPage(BaseReportPage):
-    TABLE_HEADERS = ["Référence", "Date", "Fournisseur", "Produit",
-                     "Qté", "Prix Unit.", "Total HT", "TVA", "Total TTC"]
+    COLUMNS = [
+        ReportColumn("Référence",   "reference",     lambda v: str(v or "—")),
+        ReportColumn("Date",        "purchase_date", _day, "#A0AACC"),
+        ReportColumn("Fournisseur", "supplier"),
+        ReportColumn("Produit",     "product_name"),
+        ReportColumn("Qté",         "quantity",      _int, "#38BDF8"),
+        ReportColumn("Prix Unit.",  "unit_price",    _money),
+        ReportColumn("Total HT",    "subtotal",      _money),
+        ReportColumn("TVA",         "tax_amount",    _money, "#FBBF24"),
+        ReportColumn("Total TTC",   "total",         _money, "#F87171"),
+    ]
     REPORT_TITLE  = "Rapport des Achats"
     REPORT_ICON   = "🛒"
     FILENAME_BASE = "rapport_achats"
@@ -624,78 +732,20 @@ class PurchasesReportPage(BaseReportPage):
             self._kpi_vals[title] = vl
         return frame
 
-    def load_data(self):
+    def run_report(self):
         s, e = self._current_dates()
-        try:
-            if s and e:
-                self.db.cursor.execute("""
-                    SELECT p.reference, p.purchase_date,
-                           COALESCE(sup.name,'—') as supplier,
-                           COALESCE(pr.name,'—') as product_name,
-                           pi.quantity, pi.unit_price,
-                           pi.quantity * pi.unit_price as subtotal,
-                           p.tax_amount, p.total
-                    FROM purchases p
-                    LEFT JOIN suppliers sup ON p.supplier_id = sup.id
-                    LEFT JOIN purchase_items pi ON pi.purchase_id = p.id
-                    LEFT JOIN products pr ON pi.product_id = pr.id
-                    WHERE DATE(p.purchase_date) BETWEEN ? AND ?
-                    ORDER BY p.purchase_date DESC
-                """, (s, e))
-            else:
-                self.db.cursor.execute("""
-                    SELECT p.reference, p.purchase_date,
-                           COALESCE(sup.name,'—') as supplier,
-                           COALESCE(pr.name,'—') as product_name,
-                           pi.quantity, pi.unit_price,
-                           pi.quantity * pi.unit_price as subtotal,
-                           p.tax_amount, p.total
-                    FROM purchases p
-                    LEFT JOIN suppliers sup ON p.supplier_id = sup.id
-                    LEFT JOIN purchase_items pi ON pi.purchase_id = p.id
-                    LEFT JOIN products pr ON pi.product_id = pr.id
-                    ORDER BY p.purchase_date DESC
-                """)
-            rows = self.db.cursor.fetchall()
-        except Exception:
-            rows = []
+        return report_engine.purchases_report(self.db, s, e)
 
-        self.table.setRowCount(0)
-        total_ach = total_tva = 0.0
-        suppliers_seen = set()
+    def report_query(self):
+        return report_engine.purchases_query(*self._current_dates())
 
-        for row in rows:
-            ref, date, sup, prod, qty, price, sub, tva, total = row
-            total_ach += float(total or 0)
-            total_tva += float(tva or 0)
-            if sup: suppliers_seen.add(sup)
-            date_str = str(date).split(" ")[0] if date else "—"
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (str(ref or "—"),              "#F0F4FF"),
-                (date_str,                      "#A0AACC"),
-                (str(sup),                      "#F0F4FF"),
-                (str(prod),                     "#F0F4FF"),
-                (str(int(qty or 0)),            "#38BDF8"),
-                (fmt_da(float(price or 0)),    "#F0F4FF"),
-                (fmt_da(float(sub or 0)),      "#F0F4FF"),
-                (fmt_da(float(tva or 0)),      "#FBBF24"),
-                (fmt_da(float(total or 0)),    "#F87171"),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(val)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
-
-        nb = self.table.rowCount()
-        self._kpi_vals["Total achats"].setText(fmt_da(total_ach))
+    def show_result(self, result):
+        t = result.totals
+        nb = int(t.get("count", 0))
+        self._kpi_vals["Total achats"].setText(fmt_da(float(t.get("total", 0))))
         self._kpi_vals["Articles achetés"].setText(str(nb))
-        self._kpi_vals["Fournisseurs actifs"].setText(str(len(suppliers_seen)))
-        self._kpi_vals["TVA payée"].setText(fmt_da(total_tva))
+        self._kpi_vals["Fournisseurs actifs"].setText(str(int(t.get("suppliers", 0))))
+        self._kpi_vals["TVA payée"].setText(fmt_da(float(t.get("tax", 0))))
         self.result_badge.setText(f"{nb} ligne(s)")
 
 
@@ -704,8 +754,20 @@ class PurchasesReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class StockReportPage(BaseReportPage):
-    TABLE_HEADERS = ["Produit", "Catégorie", "Stock", "Stock min",
-                     "Statut", "Prix achat", "Prix vente", "Valeur stock"]
+    COLUMNS = [
+        ReportColumn("Produit",      "name"),
+        ReportColumn("Catégorie",    "category",       str, "#A0AACC"),
+        ReportColumn("Classe ABC",   "abc",
+                     lambda v: v or "—", lambda v: ABC_COLORS.get(v, "#A0AACC")),
+        ReportColumn("Stock",        "stock",          _int,
+                     lambda v: STOCK_STATUS[v][1], color_key="status"),
+        ReportColumn("Stock min",    "min_stock",      _int, "#A0AACC"),
+        ReportColumn("Statut",       "status",
+                     lambda v: STOCK_STATUS[v][0], lambda v: STOCK_STATUS[v][1]),
+        ReportColumn("Prix achat",   "purchase_price", _money, "#A0AACC", align_right=True),
+        ReportColumn("Prix vente",   "selling_price",  _money, align_right=True),
+        ReportColumn("Valeur stock", "stock_value",    _money, "#22C55E", align_right=True),
+    ]
     REPORT_TITLE  = "Rapport Stock & Inventaire"
     REPORT_ICON   = "📦"
     FILENAME_BASE = "rapport_stock"
@@ -739,6 +801,17 @@ class StockReportPage(BaseReportPage):
         self.stock_filter.currentIndexChanged.connect(self.load_data)
         h.addWidget(self.stock_filter)
 
+        h.addWidget(_lbl("Classe :", 11, bold=True))
+        self.abc_filter = QComboBox()
+        self.abc_filter.setStyleSheet(INPUT_STYLE)
+        self.abc_filter.setMinimumHeight(36)
+        self.abc_filter.setFixedWidth(170)
+        self.abc_filter.addItem("Toutes les classes", None)
+        for cls in "ABC":
+            self.abc_filter.addItem(f"Classe {cls} (CA)", cls)
+        self.abc_filter.currentIndexChanged.connect(self.load_data)
+        h.addWidget(self.abc_filter)
+
         apply_btn = _action_btn("🔄 Actualiser", COLORS.get("primary","#3B82F6"), outlined=True)
         apply_btn.setFixedWidth(130)
         apply_btn.clicked.connect(self.load_data)
@@ -780,78 +853,68 @@ class StockReportPage(BaseReportPage):
             self._kpi_vals[title] = vl
         return frame
 
-    def load_data(self):
-        filt = self.stock_filter.currentIndex()
-        try:
-            self.db.cursor.execute("""
-                SELECT p.name, COALESCE(c.name,'—') as cat,
-                       p.stock_quantity, p.min_stock,
-                       p.purchase_price, p.selling_price
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                ORDER BY p.stock_quantity ASC
-            """)
-            rows = self.db.cursor.fetchall()
-        except Exception:
-            rows = []
-
-        self.table.setRowCount(0)
-        total_val = low = rupture = 0
-
-        for row in rows:
-            name, cat, stock, mini, p_buy, p_sell = row
-            stock = int(stock or 0)
-            mini  = int(mini or 0)
-            p_buy  = float(p_buy or 0)
-            p_sell = float(p_sell or 0)
-            val    = stock * p_sell
-
-            is_rupture = (stock == 0)
-            is_low     = (0 < stock <= mini)
-            is_normal  = (stock > mini)
-
-            if filt == 1 and not is_low:     continue
-            if filt == 2 and not is_rupture: continue
-            if filt == 3 and not is_normal:  continue
-
-            total_val += val
-            if is_rupture: rupture += 1
-            elif is_low:   low += 1
-
-            if is_rupture:
-                status, s_color = "🔴 Rupture", "#EF4444"
-            elif is_low:
-                status, s_color = "🟡 Faible",  "#FBBF24"
-            else:
-                status, s_color = "🟢 Normal",  "#22C55E"
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (str(name),       "#F0F4FF"),
-                (str(cat),        "#A0AACC"),
-                (str(stock),      s_color),
-                (str(mini),       "#A0AACC"),
-                (status,          s_color),
-                (fmt_da(p_buy),  "#A0AACC"),
-                (fmt_da(p_sell), "#F0F4FF"),
-                (fmt_da(val),    "#22C55E"),
-            ]
-            for col, (val_txt, color) in enumerate(cells):
-                it = QTableWidgetItem(val_txt)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(
-                    Qt.AlignmentFlag.AlignVCenter |
-                    (Qt.AlignmentFlag.AlignRight if col >= 5 else Qt.AlignmentFlag.AlignLeft))
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
-
-        nb = self.table.rowCount()
-        self._kpi_vals["Total produits"].setText(str(len(rows)))
-        self._kpi_vals["Valeur du stock"].setText(fmt_da(total_val))
-        self._kpi_vals["Stock faible"].setText(str(low))
-        self._kpi_vals["Rupture de stock"].setText(str(rupture))
-        self.result_badge.setText(f"{nb} produit(s)")
+    def run_report(self):
+        from services import abc_classification
+        if abc_classification.last_refresh(self.db.conn) is None:
+            # Jamais classé : calcul en arrière-plan, colonne Classe vide en attendant
+            abc_classification.wake_abc_worker(self.db)
+        return report_engine.stock_report(self.db, self.stock_filter.currentIndex(),
+                                          self.abc_filter.currentData())
+
+    def report_query(self):
+        return report_engine.stock_query(self.stock_filter.currentIndex(), self.abc_filter.currentData())
+
+    def show_result(self, result):
+        t = result.totals
+        self._kpi_vals["Total produits"].setText(str(int(t.get("products", 0))))
+        self._kpi_vals["Valeur du stock"].setText(fmt_da(float(t.get("value", 0))))
+        self._kpi_vals["Stock faible"].setText(str(int(t.get("low", 0))))
+        self._kpi_vals["Rupture de stock"].setText(str(int(t.get("out", 0))))
+        self.result_badge.setText(f"{len(result)} produit(s)")
+
+
+class InventoryReportPage(BaseReportPage):
+    """Stock moyen et valorisation sur la période (instantanés du grand livre de stock)."""
+
+    COLUMNS = [
+        ReportColumn("Produit",        "name"),
+        ReportColumn("Catégorie",      "category",      str, "#A0AACC"),
+        ReportColumn("Stock début",    "opening",       _int, "#A0AACC", align_right=True),
+        ReportColumn("Stock fin",      "closing",       _int, align_right=True),
+        ReportColumn("Stock moyen",    "avg_qty",       lambda v: f"{v:.1f}", "#38BDF8", align_right=True),
+        ReportColumn("Valeur moyenne", "avg_value",     _money, align_right=True),
+        ReportColumn("Valeur fin",     "closing_value", _money, "#22C55E", align_right=True),
+    ]
+    REPORT_TITLE  = "Valorisation & Stock moyen"
+    REPORT_ICON   = "🏷️"
+    FILENAME_BASE = "rapport_valorisation"
+
+    def _build_kpi_row(self):
+        frame = super()._build_kpi_row()
+        self._kpi_vals = {}
+        data = [
+            ("📦", "Valeur moyenne",   "0", COLORS.get("primary","#3B82F6")),
+            ("💰", "Valeur fin",       "0", COLORS.get("success","#22C55E")),
+            ("🛒", "Coût des ventes",  "0", COLORS.get("danger","#F87171")),
+            ("🔄", "Rotation",         "0x", COLORS.get("warning","#FBBF24")),
+        ]
+        for icon, title, val, color in data:
+            card, vl = self._make_kpi_card(icon, title, val, color)
+            self.kpi_layout.addWidget(card)
+            self._kpi_vals[title] = vl
+        return frame
+
+    def run_report(self):
+        s, e = self._current_dates()
+        return report_engine.inventory_report(self.db, s, e)
+
+    def show_result(self, result):
+        t = result.totals
+        self._kpi_vals["Valeur moyenne"].setText(fmt_da(float(t.get("avg_value", 0))))
+        self._kpi_vals["Valeur fin"].setText(fmt_da(float(t.get("closing_value", 0))))
+        self._kpi_vals["Coût des ventes"].setText(fmt_da(float(t.get("cogs", 0))))
+        self._kpi_vals["Rotation"].setText(f"{float(t.get('turnover', 0)):.1f}x")
+        self.result_badge.setText(f"{len(result)} produit(s)")
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -859,8 +922,21 @@ class StockReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class ClientsReportPage(BaseReportPage):
-    TABLE_HEADERS = ["#", "Client", "Téléphone", "Email",
-                     "Nb ventes", "CA Total", "Panier moyen", "Dernière visite"]
+    COLUMNS = [
+        ReportColumn("#",               "rank",
+                     lambda v: ["🥇", "🥈", "🥉"][v - 1] if v <= 3 else f"#{v}",
+                     lambda v: "#FBBF24" if v <= 3 else "#A0AACC"),
+        ReportColumn("Client",          "name"),
+        ReportColumn("Téléphone",       "phone",      str, "#A0AACC"),
+        ReportColumn("Email",           "email",      str, "#A0AACC"),
+        ReportColumn("Segment",         "segment",
+                     client_segments.segment_label, client_segments.segment_color),
+        ReportColumn("Nb ventes",       "nb",         _int, "#38BDF8"),
+        ReportColumn("CA Total",        "ca",         _money, "#22C55E"),
+        ReportColumn("Panier moyen",    "avg",        _money),
+        ReportColumn("Dernière visite", "last_visit",
+                     lambda v: str(v).split(" ")[0] if v else "Jamais", "#A0AACC"),
+    ]
     REPORT_TITLE  = "Rapport Clients"
     REPORT_ICON   = "👥"
     FILENAME_BASE = "rapport_clients"
@@ -880,76 +956,25 @@ class ClientsReportPage(BaseReportPage):
             self._kpi_vals[title] = vl
         return frame
 
-    def load_data(self):
+    def run_report(self):
         s, e = self._current_dates()
-        try:
-            if s and e:
-                self.db.cursor.execute("""
-                    SELECT c.id, c.name, COALESCE(c.phone,'—'), COALESCE(c.email,'—'),
-                           COUNT(s.id) as nb,
-                           COALESCE(SUM(s.total),0) as ca,
-                           COALESCE(AVG(s.total),0) as avg,
-                           MAX(s.sale_date) as last_visit
-                    FROM clients c
-                    LEFT JOIN sales s ON s.client_id = c.id
-                        AND DATE(s.sale_date) BETWEEN ? AND ?
-                    GROUP BY c.id
-                    ORDER BY ca DESC
-                """, (s, e))
-            else:
-                self.db.cursor.execute("""
-                    SELECT c.id, c.name, COALESCE(c.phone,'—'), COALESCE(c.email,'—'),
-                           COUNT(s.id) as nb,
-                           COALESCE(SUM(s.total),0) as ca,
-                           COALESCE(AVG(s.total),0) as avg,
-                           MAX(s.sale_date) as last_visit
-                    FROM clients c
-                    LEFT JOIN sales s ON s.client_id = c.id
-                    GROUP BY c.id
-                    ORDER BY ca DESC
-                """)
-            rows = self.db.cursor.fetchall()
-        except Exception:
-            rows = []
-
-        self.table.setRowCount(0)
-        total_ca = sum(float(r[5] or 0) for r in rows)
-        best     = rows[0][1] if rows else "—"
-        active   = sum(1 for r in rows if int(r[4] or 0) > 0)
-
-        for rank, row in enumerate(rows, 1):
-            cid, name, phone, email, nb, ca, avg, last = row
-            nb   = int(nb or 0)
-            ca   = float(ca or 0)
-            avg  = float(avg or 0)
-            last_str = str(last).split(" ")[0] if last else "Jamais"
-            medal = ["🥇","🥈","🥉"][rank-1] if rank <= 3 else f"#{rank}"
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (medal,            "#FBBF24" if rank <= 3 else "#A0AACC"),
-                (str(name),        "#F0F4FF"),
-                (str(phone),       "#A0AACC"),
-                (str(email),       "#A0AACC"),
-                (str(nb),          "#38BDF8"),
-                (fmt_da(ca),      "#22C55E"),
-                (fmt_da(avg),     "#F0F4FF"),
-                (last_str,         "#A0AACC"),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(val)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
-
-        nb_clients = len(rows)
-        ca_moy = (total_ca / nb_clients) if nb_clients else 0
+        # Recalcul RFM complet du jour en arrière-plan ; le rapport ne rescore que les nouveaux acheteurs
+        client_segments.wake_if_due(self.db)
+        return report_engine.clients_report(self.db, s, e)
+
+    def report_query(self):
+        return report_engine.clients_query(*self._current_dates())
+
+    def show_result(self, result):
+        t = result.totals
+        nb_clients = int(t.get("clients", 0))
+        names = result.column("name")
+        best = names[0] if names else "—"
+        ca_moy = (float(t.get("revenue", 0)) / nb_clients) if nb_clients else 0
         self._kpi_vals["Total clients"].setText(str(nb_clients))
         self._kpi_vals["Meilleur client"].setText(str(best)[:20])
         self._kpi_vals["CA moyen/client"].setText(fmt_da(ca_moy))
-        self._kpi_vals["Clients actifs"].setText(str(active))
+        self._kpi_vals["Clients actifs"].setText(str(int(t.get("active", 0))))
         self.result_badge.setText(f"{nb_clients} client(s)")
 
 
@@ -958,8 +983,16 @@ class ClientsReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class ProfitReportPage(BaseReportPage):
-    TABLE_HEADERS = ["Produit", "Qté vendue", "CA HT",
-                     "Coût achat", "Bénéfice brut", "Marge %"]
+    COLUMNS = [
+        ReportColumn("Produit",       "name"),
+        ReportColumn("Qté vendue",    "qty",    _int, "#38BDF8", align_right=True),
+        ReportColumn("CA HT",         "ca_ht",  _money, align_right=True),
+        ReportColumn("Coût achat",    "cost",   _money, "#F87171", align_right=True),
+        ReportColumn("Bénéfice brut", "profit", _money, _sign_color, align_right=True),
+        ReportColumn("Marge %",       "margin", _pct,
+                     lambda v: "#22C55E" if v >= 20 else ("#FBBF24" if v >= 0 else "#EF4444"),
+                     align_right=True),
+    ]
     REPORT_TITLE  = "Rapport Bénéfices & Marges"
     REPORT_ICON   = "💰"
     FILENAME_BASE = "rapport_benefices"
@@ -979,85 +1012,20 @@ class ProfitReportPage(BaseReportPage):
             self._kpi_vals[title] = vl
         return frame
 
-    def load_data(self):
+    def run_report(self):
         s, e = self._current_dates()
-        try:
-            if s and e:
-                self.db.cursor.execute("""
-                    SELECT p.name,
-                           SUM(si.quantity) as qty,
-                           SUM(si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0)) as ca_ht,
-                           SUM(si.quantity * COALESCE(p.purchase_price,0)) as cost,
-                           SUM(si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0))
-                             - SUM(si.quantity * COALESCE(p.purchase_price,0)) as profit
-                    FROM sale_items si
-                    JOIN sales s ON si.sale_id = s.id
-                    JOIN products p ON si.product_id = p.id
-                    WHERE DATE(s.sale_date) BETWEEN ? AND ?
-                    GROUP BY si.product_id
-                    ORDER BY profit DESC
-                """, (s, e))
-            else:
-                self.db.cursor.execute("""
-                    SELECT p.name,
-                           SUM(si.quantity) as qty,
-                           SUM(si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0)) as ca_ht,
-                           SUM(si.quantity * COALESCE(p.purchase_price,0)) as cost,
-                           SUM(si.quantity * si.unit_price * (1 - COALESCE(si.discount,0)/100.0))
-                             - SUM(si.quantity * COALESCE(p.purchase_price,0)) as profit
-                    FROM sale_items si
-                    JOIN sales s ON si.sale_id = s.id
-                    JOIN products p ON si.product_id = p.id
-                    GROUP BY si.product_id
-                    ORDER BY profit DESC
-                """)
-            rows = self.db.cursor.fetchall()
-        except Exception:
-            rows = []
-
-        self.table.setRowCount(0)
-        total_ca = total_cost = total_profit = 0.0
-
-        for row in rows:
-            name, qty, ca, cost, profit = row
-            qty    = int(qty or 0)
-            ca     = float(ca or 0)
-            cost   = float(cost or 0)
-            profit = float(profit or 0)
-            marge  = (profit / ca * 100) if ca else 0
-
-            total_ca     += ca
-            total_cost   += cost
-            total_profit += profit
-
-            profit_color = "#22C55E" if profit >= 0 else "#EF4444"
-            marge_color  = "#22C55E" if marge >= 20 else ("#FBBF24" if marge >= 0 else "#EF4444")
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (str(name),        "#F0F4FF"),
-                (str(qty),         "#38BDF8"),
-                (fmt_da(ca),      "#F0F4FF"),
-                (fmt_da(cost),    "#F87171"),
-                (fmt_da(profit),  profit_color),
-                (f"{marge:.1f}%", marge_color),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(val)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(
-                    Qt.AlignmentFlag.AlignVCenter |
-                    (Qt.AlignmentFlag.AlignRight if col >= 1 else Qt.AlignmentFlag.AlignLeft))
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
+        return report_engine.profit_report(self.db, s, e)
 
+    def show_result(self, result):
+        t = result.totals
+        total_ca = float(t.get("revenue", 0))
+        total_profit = float(t.get("profit", 0))
         moy_marge = (total_profit / total_ca * 100) if total_ca else 0
         self._kpi_vals["CA Total HT"].setText(fmt_da(total_ca))
-        self._kpi_vals["Coût des achats"].setText(fmt_da(total_cost))
+        self._kpi_vals["Coût des achats"].setText(fmt_da(float(t.get("cost", 0))))
         self._kpi_vals["Bénéfice brut"].setText(fmt_da(total_profit))
         self._kpi_vals["Marge moyenne"].setText(f"{moy_marge:.1f}%")
-        self.result_badge.setText(f"{self.table.rowCount()} produit(s)")
+        self.result_badge.setText(f"{len(result)} produit(s)")
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -1065,8 +1033,18 @@ class ProfitReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class TrendsReportPage(BaseReportPage):
-    TABLE_HEADERS = ["Période", "Nb ventes", "CA Total",
-                     "Nb achats", "Total achats", "Bénéfice net", "Évolution CA"]
+    COLUMNS = [
+        ReportColumn("Période",      "period"),
+        ReportColumn("Nb ventes",    "nb_sales",     _int, "#38BDF8"),
+        ReportColumn("CA Total",     "ca",           _money, align_right=True),
+        ReportColumn("Nb achats",    "nb_purchases", _int, "#F87171", align_right=True),
+        ReportColumn("Total achats", "purchases",    _money, "#F87171", align_right=True),
+        ReportColumn("Bénéfice net", "profit",       _money, _sign_color, align_right=True),
+        ReportColumn("Évolution CA", "evolution",
+                     lambda v: "—" if v is None else (f"+{v:.1f}%" if v >= 0 else f"{v:.1f}%"),
+                     lambda v: "#A0AACC" if v is None else _sign_color(v),
+                     align_right=True),
+    ]
     REPORT_TITLE  = "Rapport Tendances & Évolution"
     REPORT_ICON   = "📈"
     FILENAME_BASE = "rapport_tendances"
@@ -1147,110 +1125,191 @@ class TrendsReportPage(BaseReportPage):
             self._kpi_vals[title] = vl
         return frame
 
-    def load_data(self):
+    def run_report(self):
         s, e = self._current_dates()
-        grp  = self.group_combo.currentIndex()  # 0=jour 1=sem 2=mois 3=an
-
-        fmt_map = {0: "%Y-%m-%d", 1: "%Y-W%W", 2: "%Y-%m", 3: "%Y"}
-        sql_fmt  = {0: "%Y-%m-%d", 1: "%Y-%W",  2: "%Y-%m", 3: "%Y"}
-        fmt_str  = sql_fmt[grp]
-
-        date_filter = ""
-        params_s: list = []
-        params_p: list = []
-        if s and e:
-            date_filter = "WHERE DATE(sale_date) BETWEEN ? AND ?"
-            params_s    = [s, e]
-            date_filter_p = "WHERE DATE(purchase_date) BETWEEN ? AND ?"
-            params_p    = [s, e]
+        return report_engine.trends_report(self.db, self.group_combo.currentIndex(), s, e)
+
+    def show_result(self, result):
+        t = result.totals
+        growth = t.get("growth")
+        if growth is None:
+            evol_txt = "—"
         else:
-            date_filter_p = ""
+            evol_txt = f"+{growth:.1f}%" if growth >= 0 else f"{growth:.1f}%"
+        self._kpi_vals["Meilleures ventes"].setText(
+            f"{float(t.get('best_ca', 0)):,.0f}" if len(result) else "—")
+        self._kpi_vals["Croissance CA"].setText(evol_txt)
+        self._kpi_vals["Meilleure période"].setText(str(t.get("best_period") or "—"))
+        self._kpi_vals["Bénéfice total"].setText(fmt_da(float(t.get("profit", 0))))
+        self.result_badge.setText(f"{len(result)} période(s)")
+
+
+# ══════════════════════════════════════════════════════════════════════════
+#  6 bis. COHORTES & RÉACHAT
+# ══════════════════════════════════════════════════════════════════════════
+
+class ReportLoader(QObject):
+    """Exécute `job()` (un rapport report_engine) dans un QThread.
+
+    Signals:
+        finished (object): ReportResult calculé.
+        error (str): Message d'erreur.
+    """
+
+    finished = pyqtSignal(object)
+    error    = pyqtSignal(str)
 
+    def __init__(self, job):
+        super().__init__()
+        self._job = job
+
+    def run(self):
         try:
-            self.db.cursor.execute(f"""
-                SELECT strftime('{fmt_str}', sale_date) as period,
-                       COUNT(*) as nb, SUM(total) as ca
-                FROM sales {date_filter}
-                GROUP BY period ORDER BY period
-            """, params_s)
-            sales_rows = {r[0]: (int(r[1]), float(r[2] or 0))
-                          for r in self.db.cursor.fetchall()}
-        except Exception:
-            sales_rows = {}
+            result = self._job()
+        except Exception as e:
+            logger.exception("Rapport en arrière-plan")
+            self.error.emit(str(e))
+            return
+        self.finished.emit(result)
+
+
+class _ReportLoad(QObject):
+    """
+    Relie un ReportLoader à `on_done(result)` et `on_error(message)` (vit
+    dans le thread UI). Conservé dans `_LOADING` jusqu'à la fin du thread,
+    même si la page est fermée entre-temps.
+    """
 
+    def __init__(self, job, on_done, on_error):
+        super().__init__()
+        self._on_done = on_done
+        self._on_error = on_error
+        self.thread = QThread()
+        self.loader = ReportLoader(job)
+        self.loader.moveToThread(self.thread)
+        self.thread.started.connect(self.loader.run)
+        self.loader.finished.connect(self._finish)
+        self.loader.error.connect(self._fail)
+        self.thread.finished.connect(self._release)
+
+    def start(self):
+        _LOADING.add(self)
+        self.thread.start()
+
+    def _finish(self, result):
+        self._deliver(self._on_done, result)
+
+    def _fail(self, message):
+        self._deliver(self._on_error, message)
+
+    def _deliver(self, callback, value):
+        self.thread.quit()
         try:
-            self.db.cursor.execute(f"""
-                SELECT strftime('{fmt_str}', purchase_date) as period,
-                       COUNT(*) as nb, SUM(total) as total
-                FROM purchases {date_filter_p if s else ''}
-                GROUP BY period ORDER BY period
-            """, params_p if s else [])
-            pur_rows = {r[0]: (int(r[1]), float(r[2] or 0))
-                        for r in self.db.cursor.fetchall()}
-        except Exception:
-            pur_rows = {}
-
-        all_periods = sorted(set(list(sales_rows.keys()) + list(pur_rows.keys())))
-
-        self.table.setRowCount(0)
-        prev_ca = None
-        best_period = ("—", 0)
-        total_profit = 0.0
-        all_cas = []
-
-        for period in all_periods:
-            nb_s, ca = sales_rows.get(period, (0, 0.0))
-            nb_p, pa = pur_rows.get(period, (0, 0.0))
-            profit   = ca - pa
-            total_profit += profit
-
-            if ca > best_period[1]:
-                best_period = (period, ca)
-            all_cas.append(ca)
-
-            if prev_ca is not None and prev_ca > 0:
-                evol = ((ca - prev_ca) / prev_ca) * 100
-                evol_str  = f"+{evol:.1f}%" if evol >= 0 else f"{evol:.1f}%"
-                evol_color = "#22C55E" if evol >= 0 else "#EF4444"
-            else:
-                evol_str, evol_color = "—", "#A0AACC"
-            prev_ca = ca
-
-            profit_color = "#22C55E" if profit >= 0 else "#EF4444"
-
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            cells = [
-                (str(period),      "#F0F4FF"),
-                (str(nb_s),        "#38BDF8"),
-                (fmt_da(ca),      "#F0F4FF"),
-                (str(nb_p),        "#F87171"),
-                (fmt_da(pa),      "#F87171"),
-                (fmt_da(profit),  profit_color),
-                (evol_str,         evol_color),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(val)
-                it.setForeground(QColor(color))
-                it.setTextAlignment(
-                    Qt.AlignmentFlag.AlignVCenter |
-                    (Qt.AlignmentFlag.AlignRight if col >= 2 else Qt.AlignmentFlag.AlignLeft))
-                self.table.setItem(r, col, it)
-            self.table.setRowHeight(r, 36)
-
-        # KPIs
-        if len(all_cas) >= 2 and all_cas[0] > 0:
-            global_evol = ((all_cas[-1] - all_cas[0]) / all_cas[0]) * 100
-            evol_txt = f"+{global_evol:.1f}%" if global_evol >= 0 else f"{global_evol:.1f}%"
-        else:
-            evol_txt = "—"
+            callback(value)
+        except RuntimeError:  # page détruite pendant le calcul
+            pass
+
+    def _release(self):
+        self.thread.wait()
+        _LOADING.discard(self)
+
+
+_LOADING: set[_ReportLoad] = set()
+
+
+def _retention_color(v):
+    if v is None:
+        return "#4B5563"
+    if v >= 40:
+        return "#22C55E"
+    if v >= 20:
+        return "#A3E635"
+    if v >= 10:
+        return "#FBBF24"
+    return "#F87171" if v > 0 else "#A0AACC"
+
+
+def _retention(v):
+    return "—" if v is None else f"{v:.0f}%"
+
+
+class CohortReportPage(BaseReportPage):
+    """
+    Rétention par cohorte de premier achat. Le pivot (services.cohort_analysis)
+    est mis en cache par version de la base ; le premier calcul après une
+    écriture tourne dans un QThread pour ne pas figer l'interface.
+    """
+
+    COLUMNS = [
+        ReportColumn("Cohorte",        "cohort"),
+        ReportColumn("Clients",        "clients",    _int, "#38BDF8", align_right=True),
+        ReportColumn("CA cohorte",     "revenue",    _money, align_right=True),
+        ReportColumn("CA / client",    "per_client", _money, "#A0AACC", align_right=True),
+        ReportColumn("Réachat",        "repeat",     _pct, "#A855F7", align_right=True),
+    ] + [
+        ReportColumn(f"M+{k}", f"m{k}", _retention, _retention_color, align_right=True)
+        for k in range(1, report_engine.COHORT_OFFSETS + 1)
+    ]
+    REPORT_TITLE  = "Rapport Cohortes & Réachat"
+    REPORT_ICON   = "🔁"
+    FILENAME_BASE = "rapport_cohortes"
 
-        self._kpi_vals["Meilleures ventes"].setText(
-            f"{max(all_cas, default=0):,.0f}" if all_cas else "—")
-        self._kpi_vals["Croissance CA"].setText(evol_txt)
-        self._kpi_vals["Meilleure période"].setText(str(best_period[0]))
-        self._kpi_vals["Bénéfice total"].setText(fmt_da(total_profit))
-        self.result_badge.setText(f"{len(all_periods)} période(s)")
+    _load_seq = 0
+
+    def _build_filters_bar(self):
+        card = super()._build_filters_bar()
+        self.period_combo.blockSignals(True)
+        self.period_combo.setCurrentIndex(5)  # Tout : toutes les cohortes
+        self.period_combo.blockSignals(False)
+        return card
+
+    def _build_kpi_row(self):
+        frame = super()._build_kpi_row()
+        self._kpi_vals = {}
+        data = [
+            ("🗓️", "Cohortes",          "0",  COLORS.get("primary","#3B82F6")),
+            ("👥", "Nouveaux clients",  "0",  COLORS.get("info","#38BDF8")),
+            ("🔁", "Taux de réachat",   "0%", COLORS.get("secondary","#A855F7")),
+            ("📅", "Rétention M+1",     "—",  COLORS.get("success","#22C55E")),
+        ]
+        for icon, title, val, color in data:
+            card, vl = self._make_kpi_card(icon, title, val, color)
+            self.kpi_layout.addWidget(card)
+            self._kpi_vals[title] = vl
+        return frame
+
+    def run_report(self):
+        s, e = self._current_dates()
+        return report_engine.cohort_report(self.db, s, e)
+
+    def load_data(self):
+        """Calcul hors du thread UI ; seul le dernier lancement est affiché."""
+        self._load_seq += 1
+        seq = self._load_seq
+        self.result_badge.setText("⏳ Calcul…")
+        s, e = self._current_dates()
+        db = self.db
+
+        def done(result):
+            if seq == self._load_seq:
+                self.result_badge.setToolTip("")
+                self.model.set_result(result)
+                self.show_result(result)
+
+        def failed(message):
+            if seq == self._load_seq:
+                self.show_error(message)
+
+        _ReportLoad(lambda: report_engine.cohort_report(db, s, e), done, failed).start()
+
+    def show_result(self, result):
+        t = result.totals
+        m1 = t.get("m1")
+        self._kpi_vals["Cohortes"].setText(str(int(t.get("cohorts", 0))))
+        self._kpi_vals["Nouveaux clients"].setText(str(int(t.get("clients", 0))))
+        self._kpi_vals["Taux de réachat"].setText(_pct(t.get("repeat_rate", 0)))
+        self._kpi_vals["Rétention M+1"].setText("—" if m1 is None else _pct(m1))
+        self.result_badge.setText(f"{len(result)} cohorte(s)")
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -1258,7 +1317,7 @@ class TrendsReportPage(BaseReportPage):
 # ══════════════════════════════════════════════════════════════════════════
 
 class AlertsPage(QWidget):
-    """Page d'alertes : stock faible, impayés, produits sans mouvement."""
+    """Page d'alertes : stock faible, ruptures prévues, impayés, produits sans mouvement."""
 
     def __init__(self, db):
         super().__init__()
@@ -1407,6 +1466,36 @@ class AlertsPage(QWidget):
             "Tous les produits sont en stock suffisant."
         ))
 
+        # ── 1b. Ruptures prévues (prévisions de demande) ──────────
+        try:
+            forecast_raw = self.db.get_reorder_suggestions(limit=50)
+        except Exception:
+            forecast_raw = []
+        forecast_empty = "Aucune rupture prévue sur le délai de réapprovisionnement."
+        if forecast_raw is None:
+            forecast_raw, forecast_empty = [], "Prévisions en cours de calcul…"
+
+        forecast_rows = []
+        for f in forecast_raw:
+            cover = f["days_of_cover"]
+            soon = cover is not None and cover < 7
+            color = "#EF4444" if soon else "#FB923C"
+            abc = f.get("abc")
+            forecast_rows.append([
+                (str(f["name"]),                          "#F0F4FF"),
+                (abc or "—",                              ABC_COLORS.get(abc, "#A0AACC")),
+                (str(int(f["stock"] or 0)),               color),
+                (f"{f['daily_demand']:.1f} / jour",       "#A0AACC"),
+                (f"{cover:.0f} j" if cover is not None else "—", color),
+                (str(int(f["order_qty"])),                "#22C55E"),
+            ])
+
+        self.alerts_layout.addWidget(self._alert_section(
+            "📈", "Ruptures prévues", "#FB923C", forecast_rows,
+            ["Produit", "Classe", "Stock actuel", "Demande prévue", "Couverture", "À commander"],
+            forecast_empty
+        ))
+
         # ── 2. Impayés (paiements à crédit) ───────────────────────
         try:
             self.db.cursor.execute("""
@@ -1475,7 +1564,7 @@ class AlertsPage(QWidget):
 
         self.alerts_layout.addStretch()
 
-        total_alerts = len(stock_rows) + len(credit_rows) + len(inactive_rows)
+        total_alerts = len(stock_rows) + len(forecast_rows) + len(credit_rows) + len(inactive_rows)
         self.summary_lbl.setText(f"⚠️ {total_alerts} alerte(s) détectée(s)")
 
     def export_all_csv(self):
@@ -1581,11 +1670,8 @@ class SendEmailDialog(QDialog):
             QMessageBox.warning(self, "Champ manquant", "Veuillez renseigner le(s) destinataire(s).")
             return
 
-        import tempfile, smtplib
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        from email.mime.base import MIMEBase
-        from email import encoders
+        import tempfile
+        from services.mail_queue import SmtpSettings, deliver_due, get_mail_queue
 
         # Générer PDF temporaire
         try:
@@ -1600,103 +1686,62 @@ class SendEmailDialog(QDialog):
                 f"Impossible de générer le PDF :\n{e}")
             return
 
+        subject = self.subject_edit.toPlainText() if hasattr(
+            self.subject_edit, "toPlainText") else self.subject_edit.text()
+        body = self.msg_edit.toPlainText() or (
+            f"Bonjour,\n\nVeuillez trouver ci-joint le rapport : {self.report_title}.\n\n"
+            f"Date de génération : {datetime.now().strftime('%d/%m/%Y à %H:%M')}\n\n"
+            "Cordialement.")
+
+        # Mise en file (la pièce jointe est copiée dans le spool de la file)
+        queue = get_mail_queue()
         try:
-            msg = MIMEMultipart()
-            msg["From"]    = self.sender_email
-            msg["To"]      = to
-            msg["Subject"] = self.subject_edit.toPlainText() if hasattr(
-                self.subject_edit, "toPlainText") else self.subject_edit.text()
-
-            body = self.msg_edit.toPlainText() or (
-                f"Bonjour,\n\nVeuillez trouver ci-joint le rapport : {self.report_title}.\n\n"
-                f"Date de génération : {datetime.now().strftime('%d/%m/%Y à %H:%M')}\n\n"
-                "Cordialement.")
-            msg.attach(MIMEText(body, "plain", "utf-8"))
-
-            with open(pdf_path, "rb") as f:
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(f.read())
-                encoders.encode_base64(part)
-                part.add_header("Content-Disposition",
-                                f"attachment; filename={os.path.basename(pdf_path)}")
-                msg.attach(part)
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=15) as s:
-                s.starttls()
-                s.login(self.sender_email, self.sender_pwd)
-                recipients = [r.strip() for r in to.split(",") if r.strip()]
-                s.sendmail(self.sender_email, recipients, msg.as_string())
-
-            QMessageBox.information(self, "✅ Envoyé",
-                f"Rapport envoyé avec succès à :\n{to}")
-            self.accept()
-
-        except smtplib.SMTPAuthenticationError:
-            QMessageBox.critical(self, "❌ Authentification",
-                "Email ou mot de passe incorrect.")
+            batch_id = queue.enqueue(to, subject, body, attachment_path=pdf_path,
+                                     attachment_name=os.path.basename(pdf_path))
         except Exception as e:
             QMessageBox.critical(self, "❌ Erreur envoi", str(e))
+            return
         finally:
             try:
                 os.unlink(pdf_path)
             except Exception:
                 pass
 
+        try:
+            port = int(self.smtp_port)
+        except (TypeError, ValueError):
+            port = 587
+        settings = SmtpSettings(self.smtp_server, port, self.sender_email, self.sender_pwd)
+
+        # Envoi hors du thread UI ; en cas d'échec temporaire le message
+        # reste en file et l'expéditeur d'arrière-plan le retentera.
+        def job(progress, cancelled):
+            return deliver_due(queue, settings, batch_id=batch_id,
+                               progress=progress, cancelled=cancelled).sent
+
+        def done(sent):
+            status = queue.batch_status(batch_id)
+            if sent:
+                QMessageBox.information(self, "✅ Envoyé",
+                    f"Rapport envoyé avec succès à :\n{to}")
+                self.accept()
+                return
+            errors = [m["last_error"] for m in queue.messages(batch_id) if m["last_error"]]
+            detail = errors[-1] if errors else ""
+            if "SMTPAuthenticationError" in detail:
+                # Inutile de retenter avec les mêmes identifiants
+                queue.cancel(batch_id)
+                QMessageBox.critical(self, "❌ Authentification",
+                    "Email ou mot de passe incorrect.")
+            elif status["pending"]:
+                QMessageBox.warning(self, "⏳ Envoi différé",
+                    "Le rapport n'a pas pu être envoyé pour l'instant ; il reste en file "
+                    f"et sera renvoyé automatiquement.\n\n{detail}")
+                self.accept()
+            else:
+                QMessageBox.critical(self, "❌ Erreur envoi", detail)
 
-# Patch export_pdf_to sur BaseReportPage
-def _export_pdf_to(self, fname):
-    """Version silencieuse de export_pdf (sans dialogue)."""
-    rows = self.get_rows()
-    try:
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.lib import colors as rc
-        from reportlab.lib.units import cm
-        from reportlab.platypus import (SimpleDocTemplate, Table,
-                                         TableStyle, Paragraph, Spacer)
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER
-
-        doc = SimpleDocTemplate(fname, pagesize=landscape(A4),
-                                rightMargin=1.5*cm, leftMargin=1.5*cm,
-                                topMargin=2*cm, bottomMargin=1.5*cm)
-        styles = getSampleStyleSheet()
-        C_NAVY = rc.HexColor("#1E3A5F")
-
-        elems = []
-        t_style = ParagraphStyle("T", parent=styles["Title"],
-                                  fontSize=14, textColor=C_NAVY, spaceAfter=8)
-        s_style = ParagraphStyle("S", parent=styles["Normal"],
-                                  fontSize=8, textColor=rc.HexColor("#6B7280"), spaceAfter=10)
-        elems.append(Paragraph(f"{self.REPORT_ICON} {self.REPORT_TITLE}", t_style))
-        elems.append(Paragraph(
-            f"Généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}", s_style))
-
-        data = [self.get_headers()] + rows
-        col_w = [(landscape(A4)[0] - 3*cm) / len(self.get_headers())] * len(self.get_headers())
-        tbl = Table(data, colWidths=col_w, repeatRows=1)
-        n = len(data)
-        rbs = [("BACKGROUND", (0, i), (-1, i),
-                rc.white if i % 2 == 1 else rc.HexColor("#F5F7FA"))
-               for i in range(1, n)]
-        tbl.setStyle(TableStyle([
-            ("BACKGROUND",    (0, 0), (-1, 0), C_NAVY),
-            ("TEXTCOLOR",     (0, 0), (-1, 0), rc.white),
-            ("FONTNAME",      (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE",      (0, 0), (-1, -1), 8),
-            ("ALIGN",         (0, 0), (-1, 0), "CENTER"),
-            ("TOPPADDING",    (0, 0), (-1, -1), 6),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ("LEFTPADDING",   (0, 0), (-1, -1), 5),
-            ("BOX",           (0, 0), (-1, -1), 0.8, rc.HexColor("#D1D9E6")),
-            ("INNERGRID",     (0, 0), (-1, -1), 0.3, rc.HexColor("#D1D9E6")),
-            *rbs,
-        ]))
-        elems.append(tbl)
-        doc.build(elems)
-    except Exception as e:
-        raise e
-
-BaseReportPage.export_pdf_to = _export_pdf_to
+        start_export(self, job, label="Envoi du rapport…", total=1, on_done=done)
 
 
 # ══════════════════════════════════════════════════════════════════════════
@@ -1710,9 +1755,11 @@ class ReportsHub(QDialog):
         ("📊", "Ventes",          "sales"),
         ("🛒", "Achats",          "purchases"),
         ("📦", "Stock",           "stock"),
+        ("🏷️", "Valorisation",    "inventory"),
         ("👥", "Clients",         "clients"),
         ("💰", "Bénéfices",       "profit"),
         ("📈", "Tendances",       "trends"),
+        ("🔁", "Cohortes",        "cohorts"),
         ("🔔", "Alertes",         "alerts"),
     ]
 
@@ -1758,9 +1805,11 @@ class ReportsHub(QDialog):
             "sales":     SalesReportPage(self.db),
             "purchases": PurchasesReportPage(self.db),
             "stock":     StockReportPage(self.db),
+            "inventory": InventoryReportPage(self.db),
             "clients":   ClientsReportPage(self.db),
             "profit":    ProfitReportPage(self.db),
             "trends":    TrendsReportPage(self.db),
+            "cohorts":   CohortReportPage(self.db),
             "alerts":    AlertsPage(self.db),
         }
 
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+from db_manager import tuple_row
+from models.client import Client
+from repositories.pagination import Page, fetch_page
+
 
 class ClientRepository:
     """Acces SQL pour l'entite client."""
@@ -7,8 +11,21 @@ class ClientRepository:
     def __init__(self, db):
         self.db = db
 
-    def list_clients(self) -> list[dict]:
-        return self.db.get_all_clients() or []
+    def list_clients(self) -> list[Client]:
+        rows = self.db.iter_query(
+            f"SELECT {Client.select_list()} FROM clients ORDER BY name", row_factory=tuple_row)
+        return list(map(Client.from_row, rows))
+
+    def iter_page(self, after: tuple | None = None, limit: int = 50) -> Page:
+        """Page de clients triee par (name, id); `after` = curseur precedent."""
+        return fetch_page(
+            self.db,
+            "SELECT * FROM clients",
+            ("name", "id"),
+            ("name", "id"),
+            after=after,
+            limit=limit,
+        )
 
     def get_client(self, client_id: int) -> dict | None:
         return self.db.get_client_by_id(client_id)
@@ -21,4 +38,3 @@ class ClientRepository:
 
     def delete_client(self, client_id: int) -> bool:
         return bool(self.db.delete_client(client_id))
-
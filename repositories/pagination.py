@@ -0,0 +1,108 @@
+"""Pagination par curseur (keyset) commune aux repositories."""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass, field
+
+MAX_PAGE_SIZE = 500
+
+
+@dataclass(frozen=True)
+class Page:
+    """Une page de resultats et le curseur vers la suivante (None = fin)."""
+
+    items: list[dict] = field(default_factory=list)
+    next_cursor: tuple | None = None
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(cursor: tuple | None) -> str | None:
+    """Serialise un curseur en jeton opaque (pour l'API)."""
+    if cursor is None:
+        return None
+    raw = json.dumps(list(cursor), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str | None) -> tuple | None:
+    """Inverse de encode_cursor. Leve ValueError si le jeton est invalide."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except Exception as exc:
+        raise ValueError("Curseur invalide") from exc
+    if not isinstance(values, list) or not values:
+        raise ValueError("Curseur invalide")
+    return tuple(values)
+
+
+def clamp_limit(limit) -> int:
+    try:
+        value = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("Limite invalide") from None
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+
+def fetch_page(
+    db,
+    select_sql: str,
+    key_columns: tuple[str, ...],
+    key_fields: tuple[str, ...],
+    *,
+    after: tuple | None = None,
+    limit: int = 50,
+    descending: bool = False,
+    where: list[str] | None = None,
+    params: list | None = None,
+) -> Page:
+    """
+    Execute `select_sql` (sans WHERE/ORDER/LIMIT) en pagination keyset.
+
+    `key_columns` sont les expressions SQL de la cle de tri (unique, ex: name, id),
+    `key_fields` les noms correspondants dans les lignes retournees.
+    Le curseur `after` est la cle de la derniere ligne de la page precedente.
+    """
+    limit = clamp_limit(limit)
+    clauses = list(where or [])
+    values = list(params or [])
+    if after is not None:
+        if len(after) != len(key_columns):
+            raise ValueError("Curseur invalide")
+        op = "<" if descending else ">"
+        placeholders = ", ".join("?" for _ in key_columns)
+        clauses.append(f"({', '.join(key_columns)}) {op} ({placeholders})")
+        values.extend(after)
+
+    direction = "DESC" if descending else "ASC"
+    sql = select_sql
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + ", ".join(f"{col} {direction}" for col in key_columns)
+    sql += " LIMIT ?"
+    values.append(limit + 1)
+
+    # Curseur dedie: ne pas ecraser l'etat de db.cursor partage par l'UI
+    rows = [dict(row) for row in db.conn.execute(sql, values).fetchall()]
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, tuple(last[f] for f in key_fields))
+
+
+def iter_pages(fetch, *, after: tuple | None = None, limit: int = 200):
+    """Parcourt toutes les pages renvoyees par `fetch(after=..., limit=...)`."""
+    while True:
+        page = fetch(after=after, limit=limit)
+        yield page
+        if not page.has_more:
+            return
+        after = page.next_cursor
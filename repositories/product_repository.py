@@ -1,5 +1,15 @@
 from __future__ import annotations
 
+from db_manager import tuple_row
+from models.product import Product
+from repositories.pagination import Page, fetch_page
+
+_PRODUCT_SELECT = f"""
+    SELECT {", ".join("p." + c for c in Product.COLUMNS[:-1])}, c.name AS category_name
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+"""
+
 
 class ProductRepository:
     """Acces SQL pour l'entite produit."""
@@ -7,8 +17,30 @@ class ProductRepository:
     def __init__(self, db):
         self.db = db
 
-    def list_products(self) -> list[dict]:
-        return self.db.get_all_products() or []
+    def list_products(self, since: str | None = None) -> list[Product]:
+        """Tous les produits, ou ceux crees/modifies depuis `since` (date ISO)."""
+        if since:
+            rows = self.db.iter_query(
+                _PRODUCT_SELECT + " WHERE p.updated_at >= ? OR p.created_at >= ? ORDER BY p.name",
+                (since, since), row_factory=tuple_row)
+        else:
+            rows = self.db.iter_query(_PRODUCT_SELECT + " ORDER BY p.name", row_factory=tuple_row)
+        return list(map(Product.from_row, rows))
+
+    def iter_page(self, after: tuple | None = None, limit: int = 50) -> Page:
+        """Page de produits triee par (name, id); `after` = curseur precedent."""
+        return fetch_page(
+            self.db,
+            """
+            SELECT p.*, c.name AS category_name
+            FROM products p
+            LEFT JOIN categories c ON p.category_id = c.id
+            """,
+            ("p.name", "p.id"),
+            ("name", "id"),
+            after=after,
+            limit=limit,
+        )
 
     def search_products(self, query: str, starts_with: bool = True) -> list[dict]:
         return self.db.search_products(query, starts_with=starts_with) or []
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from repositories.pagination import Page, fetch_page
+
+
+class PurchaseRepository:
+    """Acces SQL pour les achats (lignes d'achat avec fournisseur)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_purchases(self) -> list[dict]:
+        return self.db.get_all_purchases() or []
+
+    def iter_page(self, after: tuple | None = None, limit: int = 50) -> Page:
+        """Page de lignes d'achat, plus recentes d'abord, triee par (created_at, id)."""
+        return fetch_page(
+            self.db,
+            """
+            SELECT
+                pi.id,
+                pi.purchase_id,
+                pi.product_id,
+                pi.product_name,
+                pi.quantity,
+                pi.unit_price,
+                pi.total,
+                pi.created_at,
+                pu.payment_method,
+                s.name AS supplier_name
+            FROM purchase_items pi
+            JOIN  purchases pu ON pi.purchase_id = pu.id
+            LEFT JOIN suppliers s  ON pu.supplier_id = s.id
+            """,
+            ("pi.created_at", "pi.id"),
+            ("created_at", "id"),
+            after=after,
+            limit=limit,
+            descending=True,
+        )
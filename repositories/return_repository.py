@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from repositories.pagination import Page, fetch_page
+
+
+class ReturnRepository:
+    """Acces SQL pour les avoirs (retours clients)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_returns(self) -> list[dict]:
+        return self.db.get_all_returns() or []
+
+    def totals(self) -> tuple[int, float]:
+        """(nombre d'avoirs, montant total rembourse)."""
+        count, total = self.db.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(total), 0) FROM returns").fetchone()
+        return count, float(total)
+
+    def iter_page(self, after: tuple | None = None, limit: int = 50) -> Page:
+        """Page d'avoirs, plus recents d'abord, triee par (return_date, id)."""
+        return fetch_page(
+            self.db,
+            """
+            SELECT r.*, s.invoice_number
+            FROM returns r
+            LEFT JOIN sales s ON r.original_sale_id = s.id
+            """,
+            ("r.return_date", "r.id"),
+            ("return_date", "id"),
+            after=after,
+            limit=limit,
+            descending=True,
+        )
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from db_manager import tuple_row
+from models.sale import Sale, SaleItem
+from repositories.pagination import Page, fetch_page
+
+
+class SaleRepository:
+    """Acces SQL pour les ventes (en-tetes de factures)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def list_sales(self) -> list[Sale]:
+        rows = self.db.iter_query(f"""
+            SELECT {", ".join("s." + c for c in Sale.COLUMNS[:-2])},
+                   c.name AS client_name,
+                   (SELECT COUNT(*) FROM sale_items si WHERE si.sale_id = s.id) AS items_count
+            FROM sales s
+            LEFT JOIN clients c ON s.client_id = c.id
+            ORDER BY s.sale_date DESC, s.id DESC
+        """, row_factory=tuple_row)
+        return list(map(Sale.from_row, rows))
+
+    def get_sale_items(self, sale_id: int) -> list[SaleItem]:
+        rows = self.db.iter_query("""
+            SELECT si.id, si.sale_id, si.product_id, si.quantity, si.unit_price,
+                   si.discount, si.total,
+                   COALESCE(si.product_name, 'Produit supprimé'),
+                   COALESCE(si.barcode, '')
+            FROM sale_items si
+            WHERE si.sale_id = ?
+            ORDER BY si.id
+        """, (sale_id,), row_factory=tuple_row)
+        return list(map(SaleItem.from_row, rows))
+
+    def iter_page(self, after: tuple | None = None, limit: int = 50, since: str | None = None) -> Page:
+        """Page de ventes, plus recentes d'abord, triee par (sale_date, id) decroissants."""
+        where, params = [], []
+        if since:
+            where.append("s.sale_date >= ?")
+            params.append(since)
+        return fetch_page(
+            self.db,
+            """
+            SELECT s.*, c.name AS client_name,
+                   (SELECT COUNT(*) FROM sale_items si WHERE si.sale_id = s.id) AS items_count
+            FROM sales s
+            LEFT JOIN clients c ON s.client_id = c.id
+            """,
+            ("s.sale_date", "s.id"),
+            ("sale_date", "id"),
+            after=after,
+            limit=limit,
+            descending=True,
+            where=where,
+            params=params,
+        )
+
+    def get_sale(self, sale_id: int) -> dict | None:
+        return self.db.get_sale_by_id(sale_id)
+
+    def get_invoice_sales(self, sale_ids, chunk: int = 500) -> list[dict]:
+        """
+        Ventes + articles pour un lot de factures (meme forme que get_sale_by_id),
+        en deux requetes par tranche de `chunk` ids au lieu de deux par vente.
+        """
+        sale_ids = list(sale_ids)
+        sales: dict[int, dict] = {}
+        for start in range(0, len(sale_ids), chunk):
+            ids = sale_ids[start:start + chunk]
+            marks = ", ".join("?" for _ in ids)
+            for row in self.db.iter_query(f"""
+                SELECT s.*, c.name AS client_name, c.phone AS client_phone,
+                       c.email AS client_email, c.address AS client_address
+                FROM sales s
+                LEFT JOIN clients c ON s.client_id = c.id
+                WHERE s.id IN ({marks})
+            """, ids):
+                sale = dict(row)
+                sale["items"] = []
+                sales[sale["id"]] = sale
+            for row in self.db.iter_query(f"""
+                SELECT si.id, si.sale_id, si.product_id, si.quantity, si.unit_price,
+                       si.discount, si.total,
+                       si.unit_cost,
+                       COALESCE(si.product_name, 'Produit supprimé') AS product_name,
+                       COALESCE(si.barcode, '') AS product_reference
+                FROM sale_items si
+                WHERE si.sale_id IN ({marks})
+                ORDER BY si.sale_id, si.id
+            """, ids):
+                sales[row["sale_id"]]["items"].append(dict(row))
+        return [sales[i] for i in sale_ids if i in sales]
@@ -13,7 +13,10 @@ from PyQt6.QtWidgets import (
 from currency import fmt_da, fmt, currency_manager
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtCore import Qt, pyqtSignal
+from config import config
+from table_paging import connect_keyset_paging
 from db_manager import get_database
+from repositories.return_repository import ReturnRepository
 from styles import COLORS, BUTTON_STYLES, INPUT_STYLE, TABLE_STYLE
 from datetime import datetime
 import logging
@@ -292,6 +295,7 @@ class ReturnsPage(QWidget):
     def __init__(self):
         super().__init__()
         self.db = get_database()
+        self.return_repository = ReturnRepository(self.db)
 
         layout = QVBoxLayout(self)
         layout.setSpacing(20)
@@ -357,6 +361,10 @@ class ReturnsPage(QWidget):
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         self.table.setStyleSheet(TABLE_STYLE)
         self.table.setMinimumHeight(300)
+        # Chargement par pages (keyset) quand on atteint le bas du tableau
+        self._next_cursor = None
+        self._fill_table = connect_keyset_paging(
+            self.table, self._load_next_page, lambda: self._next_cursor is not None)
         card_layout.addWidget(self.table)
         layout.addWidget(card)
 
@@ -391,7 +399,7 @@ class ReturnsPage(QWidget):
         return card
 
     def load_returns(self):
-        """Charge et affiche tous les avoirs."""
+        """Charge les totaux et la première page d'avoirs (les suivantes au défilement)."""
         # Nettoyer les cartes stats
         while self._stats_row.count():
             item = self._stats_row.takeAt(0)
@@ -399,69 +407,79 @@ class ReturnsPage(QWidget):
             if w is not None:
                 w.deleteLater()
 
-        returns = self.db.get_all_returns() or []
+        count, total_montant = self.return_repository.totals()
 
         # Cartes stats
-        total_montant = sum(float(r.get('total', 0)) for r in returns)
         self._stats_row.addWidget(self._make_stat_card(
-            "📦", "Total Avoirs", str(len(returns)), COLORS['primary']))
+            "📦", "Total Avoirs", str(count), COLORS['primary']))
         self._stats_row.addWidget(self._make_stat_card(
             "💰", "Montant Total Remboursé",
             fmt_da(total_montant, 0), "#EF4444"))
         self._stats_row.addStretch()
 
-        # Remplir le tableau
-        self.table.setRowCount(len(returns))
-        for row, ret in enumerate(returns):
-            try:
-                date_str = datetime.fromisoformat(
-                    ret.get('return_date', '')).strftime("%d/%m/%Y %H:%M")
-            except Exception:
-                date_str = str(ret.get('return_date', '—'))
-
-            MOTIF_COLOR = {
-                "Produit défectueux":   "#EF4444",
-                "Erreur de commande":   "#F59E0B",
-                "Produit non conforme": "#F59E0B",
-                "Client insatisfait":   "#6366F1",
-                "Autre":                "#A0AACC",
+        # Remplir le tableau par pages (keyset)
+        self.table.setRowCount(0)
+        self._next_cursor = None
+        self._load_next_page()
+        self._fill_table()
+
+    def _load_next_page(self):
+        page = self.return_repository.iter_page(after=self._next_cursor, limit=config.page_size)
+        for ret in page.items:
+            self.add_return_to_table(ret)
+        self._next_cursor = page.next_cursor
+
+    def add_return_to_table(self, ret):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        try:
+            date_str = datetime.fromisoformat(
+                ret.get('return_date', '')).strftime("%d/%m/%Y %H:%M")
+        except Exception:
+            date_str = str(ret.get('return_date', '—'))
+
+        MOTIF_COLOR = {
+            "Produit défectueux":   "#EF4444",
+            "Erreur de commande":   "#F59E0B",
+            "Produit non conforme": "#F59E0B",
+            "Client insatisfait":   "#6366F1",
+            "Autre":                "#A0AACC",
+        }
+        motif = ret.get("motif", "—")
+        motif_col = MOTIF_COLOR.get(motif, "#A0AACC")
+
+        cells = [
+            (ret.get("return_number", "—"),    "#F1F5F9"),
+            (ret.get("invoice_number", "—"),    COLORS.get("text_secondary","#A0AACC")),
+            (ret.get("client_name", "Anonyme"), COLORS.get("text_secondary","#A0AACC")),
+            (motif,                             motif_col), 
+            (f"{float(ret.get('total',0)):,.2f} DA", "#EF4444"),
+            (date_str,                          COLORS.get("text_tertiary","#6B7280")),
+        ]
+        for col, (val, color) in enumerate(cells):
+            it = QTableWidgetItem(str(val))
+            it.setForeground(QColor(color))
+            it.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
+            it.setFlags(it.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, col, it)
+
+        # Bouton Détails
+        det_btn = QPushButton("🔍 Détails")
+        det_btn.setFixedHeight(30)
+        det_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        det_btn.setStyleSheet("""
+            QPushButton {
+                background: rgba(239,68,68,0.15); color: #EF4444;
+                border: 1px solid rgba(239,68,68,0.35);
+                border-radius: 6px; font-size: 10px; font-weight: bold; padding: 0 8px;
             }
-            motif = ret.get("motif", "—")
-            motif_col = MOTIF_COLOR.get(motif, "#A0AACC")
-
-            cells = [
-                (ret.get("return_number", "—"),    "#F1F5F9"),
-                (ret.get("invoice_number", "—"),    COLORS.get("text_secondary","#A0AACC")),
-                (ret.get("client_name", "Anonyme"), COLORS.get("text_secondary","#A0AACC")),
-                (motif,                             motif_col), 
-                (f"{float(ret.get('total',0)):,.2f} DA", "#EF4444"),
-                (date_str,                          COLORS.get("text_tertiary","#6B7280")),
-            ]
-            for col, (val, color) in enumerate(cells):
-                it = QTableWidgetItem(str(val))
-                it.setForeground(QColor(color))
-                it.setTextAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
-                it.setFlags(it.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, col, it)
-
-            # Bouton Détails
-            det_btn = QPushButton("🔍 Détails")
-            det_btn.setFixedHeight(30)
-            det_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-            det_btn.setStyleSheet("""
-                QPushButton {
-                    background: rgba(239,68,68,0.15); color: #EF4444;
-                    border: 1px solid rgba(239,68,68,0.35);
-                    border-radius: 6px; font-size: 10px; font-weight: bold; padding: 0 8px;
-                }
-                QPushButton:hover { background: rgba(239,68,68,0.3); color: white; }
-            """)
-            rid = ret.get("id")
-            det_btn.clicked.connect(lambda _, r=ret: self._show_detail(r))
-            self.table.setCellWidget(row, 6, det_btn)
-            self.table.setRowHeight(row, 44)
-            
-            
+            QPushButton:hover { background: rgba(239,68,68,0.3); color: white; }
+        """)
+        rid = ret.get("id")
+        det_btn.clicked.connect(lambda _, r=ret: self._show_detail(r))
+        self.table.setCellWidget(row, 6, det_btn)
+        self.table.setRowHeight(row, 44)
+
     def _show_detail(self, ret: dict) -> None:
         """Affiche le détail d'un avoir dans un dialogue."""
         dlg = QDialog(self)
@@ -520,10 +538,9 @@ class ReturnsPage(QWidget):
                     ri.quantity,
                     ri.unit_price,
                     ri.total,
-                    COALESCE(p.name, 'Produit supprimé') as product_name,
-                    COALESCE(p.barcode, '') as product_reference
+                    COALESCE(ri.product_name, 'Produit supprimé') as product_name,
+                    COALESCE(ri.barcode, '') as product_reference
                 FROM return_items ri
-                LEFT JOIN products p ON ri.product_id = p.id
                 WHERE ri.return_id = ?
                 ORDER BY ri.id
             """, (ret.get("id"),))
@@ -7,6 +7,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtCore import Qt, pyqtSignal
 from db_manager import get_database
+from repositories.product_repository import ProductRepository
 from datetime import datetime
 from payment_module import show_payment_dialog
 
@@ -335,8 +336,8 @@ class AddProductDialog(QDialog):
     def load_products(self):
         self.all_products = []
         self.product_table.setRowCount(0)
-        for p in self.db.get_all_products():
-            self.all_products.append(p)
+        # Modeles a slots: la table garde une reference (UserRole), pas une copie
+        self.all_products = ProductRepository(self.db).list_products()
         self.display_products(self.all_products)
 
     def create_new_product(self):
@@ -628,6 +629,15 @@ class SalesPage(QWidget):
         self.table.setShowGrid(False)
         self.table.setStyleSheet(TABLE_STYLE)
         tcl.addWidget(self.table)
+
+        # Suggestions (produits souvent achetés avec ceux du panier)
+        self.suggest_bar = QFrame()
+        self.suggest_bar.setStyleSheet("QFrame { background:transparent; border:none; }")
+        self.suggest_layout = QHBoxLayout(self.suggest_bar)
+        self.suggest_layout.setContentsMargins(0, 0, 0, 0)
+        self.suggest_layout.setSpacing(8)
+        self.suggest_bar.setVisible(False)
+        tcl.addWidget(self.suggest_bar)
         layout.addWidget(tbl_card)
 
         # ── Résumé ──
@@ -784,6 +794,7 @@ class SalesPage(QWidget):
         self.cart_items = []
         self.table.setRowCount(0)
         self.update_totals()
+        self._refresh_suggestions()
 
     def load_clients(self):
         self.client_combo.clear()
@@ -809,61 +820,95 @@ class SalesPage(QWidget):
                     qty = 1
             
             disc = float(dialog.discount.text() or 0)
-            unit_price = p['selling_price']
-            total = qty * unit_price * (1 - disc / 100)
-            
-            self.cart_items.append({
-                'product_id': p['id'], 'product_name': p['name'],
-                'quantity': qty, 'unit_price': unit_price,
-                'discount': disc, 'total': total
-            })
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setRowHeight(row, 44)
-
-            product_item = QTableWidgetItem(p['name'])
-            product_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-            self.table.setItem(row, 0, product_item)
-
-            def mk_center(text, color=None):
-                it = QTableWidgetItem(text)
-                it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                if color:
-                    it.setForeground(QColor(color))
-                return it
-
-            def mk_right(text, color=None):
-                it = QTableWidgetItem(text)
-                it.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-                if color:
-                    it.setForeground(QColor(color))
-                return it
-
-            self.table.setItem(row, 1, mk_center(str(qty)))
-            self.table.setItem(row, 2, mk_right(f"{unit_price:,}", C['txt_sec']))
-            self.table.setItem(row, 3, mk_center(f"{disc:,}%", C['yellow']))
-            total_it = mk_right(f"{total:,}", C['amber'])
-            total_it.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
-            self.table.setItem(row, 4, total_it)
-
-            rm_btn = QPushButton("✕")
-            rm_btn.setFont(QFont("Segoe UI", 13))
-            rm_btn.setStyleSheet(f"""
-                QPushButton {{ background:transparent; color:{C['coral']}; border:none; }}
-                QPushButton:hover {{
-                    background:{C['coral']}; color:white; border-radius:4px;
-                }}
+            self._add_to_cart(p, qty, disc)
+
+    def _add_to_cart(self, p, qty, disc=0.0):
+        """Ajoute une ligne au panier puis met à jour totaux et suggestions."""
+        unit_price = p['selling_price']
+        total = qty * unit_price * (1 - disc / 100)
+
+        self.cart_items.append({
+            'product_id': p['id'], 'product_name': p['name'],
+            'quantity': qty, 'unit_price': unit_price,
+            'discount': disc, 'total': total
+        })
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.table.setRowHeight(row, 44)
+
+        product_item = QTableWidgetItem(p['name'])
+        product_item.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        self.table.setItem(row, 0, product_item)
+
+        def mk_center(text, color=None):
+            it = QTableWidgetItem(text)
+            it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            if color:
+                it.setForeground(QColor(color))
+            return it
+
+        def mk_right(text, color=None):
+            it = QTableWidgetItem(text)
+            it.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            if color:
+                it.setForeground(QColor(color))
+            return it
+
+        self.table.setItem(row, 1, mk_center(str(qty)))
+        self.table.setItem(row, 2, mk_right(f"{unit_price:,}", C['txt_sec']))
+        self.table.setItem(row, 3, mk_center(f"{disc:,}%", C['yellow']))
+        total_it = mk_right(f"{total:,}", C['amber'])
+        total_it.setFont(QFont("Segoe UI", 11, QFont.Weight.Bold))
+        self.table.setItem(row, 4, total_it)
+
+        rm_btn = QPushButton("✕")
+        rm_btn.setFont(QFont("Segoe UI", 13))
+        rm_btn.setStyleSheet(f"""
+            QPushButton {{ background:transparent; color:{C['coral']}; border:none; }}
+            QPushButton:hover {{
+                background:{C['coral']}; color:white; border-radius:4px;
+            }}
+        """)
+        rm_btn.clicked.connect(lambda _, r=row: self.remove_item(r))
+        rm_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.table.setCellWidget(row, 5, rm_btn)
+        self.update_totals()
+        self._refresh_suggestions()
+
+    def _refresh_suggestions(self):
+        """Produits souvent achetés avec le panier (index d'affinités, lecture par clé)."""
+        while self.suggest_layout.count():
+            w = self.suggest_layout.takeAt(0).widget()
+            if w:
+                w.deleteLater()
+        suggestions = self.db.get_product_suggestions(
+            [item['product_id'] for item in self.cart_items], limit=3)
+        self.suggest_bar.setVisible(bool(suggestions))
+        if not suggestions:
+            return
+        lbl = QLabel("💡  Souvent achetés avec :")
+        lbl.setFont(QFont("Segoe UI", 10, QFont.Weight.Bold))
+        lbl.setStyleSheet(f"color:{C['txt_sec']}; background:transparent;")
+        self.suggest_layout.addWidget(lbl)
+        for p in suggestions:
+            btn = QPushButton(f"＋  {p['name']}  ·  {p['selling_price']:,}")
+            btn.setToolTip(f"Acheté avec ces articles dans {p['confidence']:.0%} des paniers")
+            btn.setStyleSheet(f"""
+                QPushButton {{ background:transparent; color:{C['teal']};
+                    border:1px solid {C['teal']}; border-radius:6px; padding:4px 10px; }}
+                QPushButton:hover {{ background:{C['teal']}; color:white; }}
             """)
-            rm_btn.clicked.connect(lambda _, r=row: self.remove_item(r))
-            rm_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-            self.table.setCellWidget(row, 5, rm_btn)
-            self.update_totals()
+            btn.setCursor(Qt.CursorShape.PointingHandCursor)
+            btn.clicked.connect(lambda _, prod=p: self._add_to_cart(prod, 1))
+            self.suggest_layout.addWidget(btn)
+        self.suggest_layout.addStretch()
 
     def remove_item(self, row):
         if row < len(self.cart_items):
             del self.cart_items[row]
         self.table.removeRow(row)
         self.update_totals()
+        self._refresh_suggestions()
 
     def clear_cart(self):
         reply = QMessageBox.question(self, "Confirmation",
@@ -873,6 +918,7 @@ class SalesPage(QWidget):
             self.cart_items = []
             self.table.setRowCount(0)
             self.update_totals()
+            self._refresh_suggestions()
 
     def _get_vat_rate(self):
         try:
@@ -951,6 +997,7 @@ class SalesPage(QWidget):
         self.cart_items = []
         self.table.setRowCount(0)
         self.update_totals()
+        self._refresh_suggestions()
         self.client_combo.setCurrentIndex(0)
 
     def get_payment_method_name(self, method_code):
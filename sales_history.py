@@ -6,6 +6,10 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtCore import Qt
 from db_manager import get_database
+from config import config
+from table_paging import connect_keyset_paging
+from repositories.sale_repository import SaleRepository
+from export_pipeline import ExportCancelled, start_export
 try:
     from returns import ReturnDialog
     _RETURNS_AVAILABLE = True
@@ -13,6 +17,7 @@ except ImportError:
     _RETURNS_AVAILABLE = False
 from auth import session
 from datetime import datetime, timedelta
+import shutil
 
 # ── Palette Midnight Amber ────────────────────────────────────────────────
 C = {
@@ -697,7 +702,7 @@ class InvoiceDetailsDialog(QDialog):
 
     def export_pdf(self):
         try:
-            from invoice_pdf import create_invoice_pdf
+            from services.invoice_pdf_service import InvoicePdfService
         except ImportError:
             QMessageBox.warning(self, "Module manquant",
                 "ReportLab est requis.\n\npip install reportlab")
@@ -708,51 +713,9 @@ class InvoiceDetailsDialog(QDialog):
         if not filename:
             return
         try:
-            from db_manager import get_database as _gdb
-            db = _gdb()
-            items_list = []
-            for item in self.sale.get('items', []):
-                try:
-                    qty = int(item.get('quantity', 0) or 0)
-                    price = float(item.get('unit_price', 0) or 0)
-                    discount = float(item.get('discount', 0) or 0)
-                    total = float(item.get('total', 0) or 0)
-                    product = str(item.get('product_name') or 'N/A')
-                    ref = str(item.get('product_reference') or '')
-                except:
-                    qty, price, discount, total = 0, 0.0, 0.0, 0.0
-                    product, ref = 'N/A', ''
-                items_list.append({
-                    'product': product, 'reference': ref,
-                    'quantity': qty, 'price': price,
-                    'discount': discount, 'total': total
-                })
-            try:
-                sale_date = datetime.fromisoformat(self.sale['sale_date']).strftime('%d/%m/%Y')
-            except:
-                sale_date = str(self.sale.get('sale_date', ''))
-            invoice_data = {
-                'invoice_number': self.sale.get('invoice_number', ''),
-                'date': sale_date,
-                'company': {
-                    'name': db.get_setting('company_name', 'Ma Société'),
-                    'address': db.get_setting('company_address', ''),
-                    'phone': db.get_setting('company_phone', ''),
-                    'email': db.get_setting('company_email', ''),
-                    'nif': db.get_setting('vat_number', ''),
-                },
-                'customer': {
-                    'name': self.sale.get('client_name', 'Client Anonyme'),
-                    'address': self.sale.get('client_address', ''),
-                    'phone': self.sale.get('client_phone', ''),
-                },
-                'items': items_list,
-                'subtotal': float(self.sale.get('subtotal', 0) or 0),
-                'tax': float(self.sale.get('tax_amount', 0) or 0),
-                'tax_rate': float(self.sale.get('tax_rate', 0) or 0),
-                'total': float(self.sale.get('total', 0) or 0),
-            }
-            pdf_file = create_invoice_pdf(invoice_data, filename)
+            # PDF servi depuis le cache tant que la vente et la société n'ont pas changé
+            cached, _ = InvoicePdfService(get_database()).cached_pdf_for_sale(self.sale)
+            pdf_file = shutil.copyfile(cached, filename)
             QMessageBox.information(self, "✅ PDF Créé",
                 f"Facture exportée avec succès !\n\n📄 {pdf_file}")
         except Exception as e:
@@ -763,6 +726,8 @@ class SalesHistoryPage(QWidget):
     def __init__(self):
         super().__init__()
         self.db = get_database()
+        self.sale_repository = SaleRepository(self.db)
+        self._next_cursor = None
 
         self.setStyleSheet(f"background-color:{C['bg']};")
         layout = QVBoxLayout(self)
@@ -860,6 +825,8 @@ class SalesHistoryPage(QWidget):
         self.table.setShowGrid(False)
         self.table.setStyleSheet(TABLE_STYLE)
         self.table.doubleClicked.connect(self.view_sale_details)
+        self._fill_table = connect_keyset_paging(
+            self.table, self._load_next_page, lambda: self._next_cursor is not None)
         self.showEvent = self.load_sales()
         tcl.addWidget(self.table)
         layout.addWidget(tbl_card)
@@ -888,6 +855,22 @@ class SalesHistoryPage(QWidget):
         self.return_btn.setMinimumHeight(40)
         self.return_btn.setFixedWidth(165)
 
+        self.reprint_btn = QPushButton("🖨️  Réimprimer")
+        self.reprint_btn.setToolTip("Générer les factures PDF des ventes affichées")
+        self.reprint_btn.setStyleSheet(BTN['primary'])
+        self.reprint_btn.clicked.connect(self.reprint_invoices)
+        self.reprint_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.reprint_btn.setMinimumHeight(40)
+        self.reprint_btn.setFixedWidth(155)
+
+        self.email_btn = QPushButton("📧  Envoyer")
+        self.email_btn.setToolTip("Envoyer par email, en un lot, les factures des ventes affichées")
+        self.email_btn.setStyleSheet(BTN['primary'])
+        self.email_btn.clicked.connect(self.email_invoices)
+        self.email_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.email_btn.setMinimumHeight(40)
+        self.email_btn.setFixedWidth(140)
+
         self.import_btn = QPushButton("↓  Importer .DAT")
         self.import_btn.setStyleSheet(BTN['success'])
         self.import_btn.clicked.connect(self.import_dat_file)
@@ -896,6 +879,8 @@ class SalesHistoryPage(QWidget):
         self.import_btn.setFixedWidth(155)
 
         actions.addStretch()
+        actions.addWidget(self.reprint_btn)
+        actions.addWidget(self.email_btn)
         actions.addWidget(self.import_btn)
         actions.addWidget(self.return_btn)
         actions.addWidget(self.view_btn)
@@ -954,12 +939,18 @@ class SalesHistoryPage(QWidget):
         self.load_sales()
 
     def load_sales(self):
-        from currency import fmt_da
         self.table.setRowCount(0)
-        for sale in self.db.get_all_sales():
-            self.add_sale_to_table(sale)
+        self._next_cursor = None
+        self._load_next_page()
+        self._fill_table()
         self.update_statistics()
 
+    def _load_next_page(self):
+        page = self.sale_repository.iter_page(after=self._next_cursor, limit=config.page_size)
+        for sale in page.items:
+            self.add_sale_to_table(sale)
+        self._next_cursor = page.next_cursor
+
     def add_sale_to_table(self, sale):
         from currency import fmt_da
         row = self.table.rowCount()
@@ -980,8 +971,10 @@ class SalesHistoryPage(QWidget):
         client_item = QTableWidgetItem(sale.get('client_name', 'Anonyme'))
         self.table.setItem(row, 2, client_item)
 
-        sale_details = self.db.get_sale_by_id(sale['id'])
-        items_count = len(sale_details['items']) if sale_details else 0
+        items_count = sale.get('items_count')
+        if items_count is None:
+            sale_details = self.db.get_sale_by_id(sale['id'])
+            items_count = len(sale_details['items']) if sale_details else 0
         items_item = QTableWidgetItem(f"{items_count} article(s)")
         items_item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
         items_item.setForeground(QColor(C['txt_sec']))
@@ -1018,11 +1011,16 @@ class SalesHistoryPage(QWidget):
         elif period == "Cette année":
             start_date = datetime.now().replace(month=1, day=1).strftime("%Y-%m-%d")
         else:
+            if not search_text:
+                self.load_sales()
+                return
+            self._next_cursor = None
             self.table.setRowCount(0)
             for sale in self.db.get_all_sales():
                 if self._matches_search_starts_with(sale, search_text):
                     self.add_sale_to_table(sale)
             return
+        self._next_cursor = None
         self.table.setRowCount(0)
         for sale in self.db.get_sales_by_date_range(start_date, end_date):
             if self._matches_search_starts_with(sale, search_text):
@@ -1050,6 +1048,94 @@ class SalesHistoryPage(QWidget):
         dialog = InvoiceDetailsDialog(sale, self)
         dialog.exec()
 
+    def reprint_invoices(self):
+        """Génère en lot les factures PDF des ventes affichées (ex. fin de mois pour la comptabilité)."""
+        sale_ids = [self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
+                    for row in range(self.table.rowCount())]
+        if not sale_ids:
+            QMessageBox.information(self, "Aucune vente", "Aucune facture à générer.")
+            return None
+        try:
+            from services.invoice_pdf_service import InvoicePdfService, render_batch
+        except ImportError:
+            QMessageBox.warning(self, "Module manquant",
+                "ReportLab est requis.\n\npip install reportlab")
+            return None
+        out_dir = QFileDialog.getExistingDirectory(self, "Dossier des factures PDF")
+        if not out_dir:
+            return None
+        # Lecture de la base ici (thread UI), rendu dans les processus de l'export
+        invoices = InvoicePdfService(self.db, self.sale_repository).load_invoices(sale_ids)
+        stats = {}
+
+        def job(progress, cancelled):
+            result = render_batch(invoices, out_dir, progress=progress, cancelled=cancelled)
+            if result.cancelled:
+                raise ExportCancelled()
+            stats["result"] = result
+            return len(result.outputs)
+
+        def done(count):
+            result = stats["result"]
+            msg = (f"{count} facture(s) générée(s) en {result.elapsed:.1f} s "
+                   f"({result.invoices_per_second:.1f} factures/s, {result.workers} processus).\n\n📁 {out_dir}")
+            if result.errors:
+                msg += f"\n\n⚠️ {len(result.errors)} facture(s) en erreur."
+            QMessageBox.information(self, "✅ Factures générées", msg)
+
+        return start_export(self, job, label="Génération des factures PDF…",
+                            total=len(invoices), on_done=done)
+
+    def email_invoices(self):
+        """Met en file l'envoi par email des factures affichées (relevés du mois), en un seul lot."""
+        sale_ids = [self.table.item(row, 0).data(Qt.ItemDataRole.UserRole)
+                    for row in range(self.table.rowCount())]
+        if not sale_ids:
+            QMessageBox.information(self, "Aucune vente", "Aucune facture à envoyer.")
+            return None
+        try:
+            from invoice_email import (client_recipients, enqueue_invoice_messages,
+                                       prepare_invoice_messages)
+            from services.invoice_pdf_service import InvoicePdfService
+            from services.mail_queue import SmtpSettings, get_mail_queue
+        except ImportError:
+            QMessageBox.warning(self, "Module manquant",
+                "ReportLab est requis.\n\npip install reportlab")
+            return None
+        if not SmtpSettings.from_settings(self.db.get_setting).sender:
+            QMessageBox.warning(self, "Email non configuré",
+                "Renseignez l'adresse d'envoi (SMTP) dans les paramètres avant l'envoi.")
+            return None
+        recipients = client_recipients(sale_ids, self.db)
+        skipped = len(set(sale_ids)) - len(recipients)
+        if not recipients:
+            QMessageBox.information(self, "Aucun destinataire",
+                "Aucun client des ventes affichées n'a d'adresse email.")
+            return None
+        if QMessageBox.question(self, "Envoyer les factures",
+                f"Envoyer {len(recipients)} facture(s) par email ?"
+                + (f"\n\n{skipped} vente(s) sans email client seront ignorées." if skipped else "")
+                ) != QMessageBox.StandardButton.Yes:
+            return None
+        # Lecture de la base ici (thread UI), rendu des PDF et mise en file hors du thread UI
+        service = InvoicePdfService(self.db, self.sale_repository)
+        messages = prepare_invoice_messages(recipients, self.db, service)
+        queue = get_mail_queue(self.db)
+        cache = service.cache
+
+        def job(progress, cancelled):
+            if enqueue_invoice_messages(messages, queue, cache, progress=progress,
+                                        cancelled=cancelled) is None:
+                raise ExportCancelled()
+            return len(messages)
+
+        def done(count):
+            QMessageBox.information(self, "✅ Factures en file d'envoi",
+                f"{count} facture(s) en file d'envoi : elles partent en arrière-plan.")
+
+        return start_export(self, job, label="Préparation des factures…",
+                            total=len(messages), on_done=done, unit="facture(s)")
+
     def create_return(self):
         if not _RETURNS_AVAILABLE:
             QMessageBox.warning(self, "Module manquant",
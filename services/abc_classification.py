@@ -0,0 +1,228 @@
+"""
+Classification ABC (Pareto) de tout le catalogue, par CA et par marge.
+
+Les lignes de vente sont cumulees par produit et par jour dans
+product_sales_daily; chaque rafraichissement n'y ajoute que les lignes
+posterieures au precedent (sale_items.id > last_line_id). Les ventes
+supprimees ou modifiees sont reprises par la reconstruction complete du
+cumul, tous les REBUILD_DAYS jours.
+
+Le classement relit le cumul sur WINDOW_DAYS jours (une ligne par produit
+et par jour vendu, pas les lignes de vente), trie les produits par valeur
+decroissante et attribue:
+  A: part cumulee, avant le produit, sous CUTOFFS[0] (80 % par defaut);
+  B: sous CUTOFFS[1] (95 %);
+  C: le reste, et tout produit sans CA (ou marge) positif.
+Le produit qui franchit le seuil reste donc dans la classe superieure.
+
+Les classes sont rangees dans product_abc (indexee par classe): "classe A
+en stock faible" est une requete indexee, lue par le rapport stock,
+les alertes et le reapprovisionnement.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from services.periodic_worker import PeriodicWorker
+
+try:  # optionnel: tri et cumul vectorises
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CLASSES = ("A", "B", "C")
+CUTOFFS = (0.80, 0.95)
+WINDOW_DAYS = 365
+REBUILD_DAYS = 7
+STARTUP_DELAY_SECONDS = 300
+POLL_SECONDS = 3600
+REFRESH_HOURS = 24
+
+_LINE_REVENUE = "si.total"
+_LINE_MARGIN = "si.total - si.quantity * COALESCE(si.unit_cost, 0)"
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _classify_python(values, cutoffs):
+    order = sorted(range(len(values)), key=lambda i: -max(values[i], 0))
+    total = sum(max(v, 0) for v in values)
+    classes = ["C"] * len(values)
+    shares = [1.0] * len(values)
+    running = 0.0
+    for i in order:
+        value = max(values[i], 0)
+        if total > 0:
+            before = running / total
+            running += value
+            shares[i] = running / total
+            if value > 0:
+                classes[i] = "A" if before < cutoffs[0] else ("B" if before < cutoffs[1] else "C")
+    return classes, shares
+
+
+def _classify_numpy(values, cutoffs):
+    v = np.clip(np.asarray(values, dtype=float), 0, None)
+    if not len(v) or v.sum() <= 0:
+        return ["C"] * len(v), [1.0] * len(v)
+    order = np.argsort(-v, kind="stable")
+    cumulative = np.cumsum(v[order])
+    total = cumulative[-1]
+    before = (cumulative - v[order]) / total
+    ranked = np.where(v[order] <= 0, "C",
+                      np.where(before < cutoffs[0], "A", np.where(before < cutoffs[1], "B", "C")))
+    classes = np.empty(len(v), dtype="<U1")
+    shares = np.empty(len(v))
+    classes[order] = ranked
+    shares[order] = cumulative / total
+    return classes.tolist(), shares.tolist()
+
+
+def classify(values, cutoffs=CUTOFFS):
+    """
+    Classe ('A', 'B', 'C') et part cumulee (0-1, produits tries par valeur
+    decroissante) de chaque valeur, dans l'ordre de `values`.
+    """
+    values = list(values)
+    run = _classify_numpy if np is not None else _classify_python
+    return run(values, cutoffs)
+
+
+def _rollup(conn, after_line_id):
+    """Ajoute au cumul journalier les lignes de vente d'id > `after_line_id`."""
+    conn.execute(f"""
+        INSERT INTO product_sales_daily (product_id, day, quantity, revenue, margin)
+        SELECT si.product_id, DATE(s.sale_date), SUM(si.quantity),
+               SUM({_LINE_REVENUE}), SUM({_LINE_MARGIN})
+        FROM sale_items si
+        JOIN sales s ON s.id = si.sale_id
+        WHERE si.id > ? AND si.product_id IS NOT NULL
+        GROUP BY si.product_id, DATE(s.sale_date)
+        ON CONFLICT(product_id, day) DO UPDATE SET
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue,
+            margin = margin + excluded.margin
+    """, (after_line_id,))
+
+
+def refresh(db_path, as_of=None, window_days=WINDOW_DAYS, rebuild=False) -> int:
+    """
+    Met le cumul journalier a jour puis reclasse tout le catalogue sur les
+    `window_days` jours precedant `as_of` (inclus). Retourne le nombre de
+    produits classes.
+    """
+    as_of = as_of or date.today()
+    conn = _connect(db_path)
+    try:
+        now = datetime.now().replace(microsecond=0)
+        conn.execute("BEGIN IMMEDIATE")
+        state = conn.execute("SELECT last_line_id, rebuilt_at FROM product_abc_state WHERE id = 1").fetchone()
+        if state is None or state["rebuilt_at"] is None or \
+                now - datetime.fromisoformat(state["rebuilt_at"]) >= timedelta(days=REBUILD_DAYS):
+            rebuild = True
+        if rebuild:
+            conn.execute("DELETE FROM product_sales_daily")
+        last_line_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sale_items").fetchone()[0]
+        _rollup(conn, 0 if rebuild else state["last_line_id"])
+
+        rows = conn.execute("""
+            SELECT p.id, COALESCE(d.revenue, 0), COALESCE(d.margin, 0)
+            FROM products p
+            LEFT JOIN (
+                SELECT product_id, SUM(revenue) AS revenue, SUM(margin) AS margin
+                FROM product_sales_daily
+                WHERE day > ? AND day <= ?
+                GROUP BY product_id
+            ) d ON d.product_id = p.id
+        """, ((as_of - timedelta(days=window_days)).isoformat(), as_of.isoformat())).fetchall()
+        ids, revenue, margin = (list(c) for c in zip(*rows)) if rows else ([], [], [])
+        revenue_class, revenue_share = classify(revenue)
+        margin_class, margin_share = classify(margin)
+
+        stamp = now.isoformat(sep=" ")
+        conn.execute("DELETE FROM product_abc")
+        conn.executemany("""
+            INSERT INTO product_abc (product_id, revenue, margin, revenue_share, margin_share,
+                                     revenue_class, margin_class, computed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((*row, stamp) for row in zip(ids, revenue, margin, revenue_share, margin_share,
+                                           revenue_class, margin_class)))
+        conn.execute("""
+            INSERT INTO product_abc_state (id, last_line_id, rebuilt_at, computed_at)
+            VALUES (1, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET last_line_id = excluded.last_line_id,
+                rebuilt_at = COALESCE(?, rebuilt_at), computed_at = excluded.computed_at
+        """, (last_line_id, stamp, stamp, stamp if rebuild else None))
+        conn.commit()
+        logger.info("Classification ABC: %d produits%s", len(ids), " (reconstruction)" if rebuild else "")
+        return len(ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def last_refresh(conn) -> str | None:
+    row = conn.execute("SELECT computed_at FROM product_abc_state WHERE id = 1").fetchone()
+    return row[0] if row else None
+
+
+def products_in_class(conn, abc_class, by="revenue", low_stock=False) -> list[dict]:
+    """
+    Produits de la classe `abc_class` par CA (`by`='revenue') ou par marge
+    ('margin'), les plus contributeurs d'abord; `low_stock`: seulement ceux
+    dont le stock est au minimum ou dessous.
+    """
+    if by not in ("revenue", "margin"):
+        raise ValueError(f"Critere ABC inconnu: {by}")
+    sql = f"""
+        SELECT p.id, p.name, p.stock_quantity AS stock, p.min_stock,
+               a.revenue, a.margin, a.revenue_class, a.margin_class
+        FROM product_abc a
+        JOIN products p ON p.id = a.product_id
+        WHERE a.{by}_class = ?
+    """
+    if low_stock:
+        sql += " AND COALESCE(p.stock_quantity, 0) <= COALESCE(p.min_stock, 0)"
+    cur = conn.execute(sql + f" ORDER BY a.{by} DESC", (abc_class,))
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def is_due(db_path, hours=REFRESH_HOURS) -> bool:
+    conn = _connect(db_path)
+    try:
+        last = last_refresh(conn)
+    finally:
+        conn.close()
+    return last is None or datetime.now() - datetime.fromisoformat(last) >= timedelta(hours=hours)
+
+
+class AbcWorker(PeriodicWorker):
+    """
+    Reclassement quotidien du catalogue; `wake()` avance le prochain passage
+    (catalogue jamais classe, demande par l'interface).
+    """
+
+    thread_name = "abc-classification"
+    label = "Classification ABC planifiee"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def tick(self):
+        if is_due(self.db_path):
+            refresh(self.db_path)
+
+
+start_abc_worker = AbcWorker.start_once
+wake_abc_worker = AbcWorker.wake_or_start
@@ -0,0 +1,187 @@
+"""
+Metriques de l'API au format texte Prometheus (GET /api/metrics).
+
+Compteurs et histogrammes sans verrou sur le chemin chaud: chaque thread
+ecrit dans son propre tableau (threading.local), seule la lecture (scrape)
+les additionne. Le serveur de developpement Flask cree un thread par
+requete: les tableaux des threads termines sont replies dans un total
+commun a la lecture, ou des que plus de MAX_SHARDS tableaux existent.
+
+Aucune dependance Flask: api_server alimente les metriques depuis ses
+hooks before/after_request; db_metrics() ajoute les latences SQL du
+profileur de requetes (services.query_profiler) lorsqu'il est actif.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+
+# Secondes, bornes usuelles Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Octets
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+MAX_SHARDS = 64
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shard:
+    __slots__ = ("thread", "values")
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}       # (metrique, labels) -> nombre ou [classes..., somme]
+
+
+def _merge(into, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            cell = into.get(key)
+            if cell is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    cell[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, registry, name, help_text, labels):
+        self.registry, self.name, self.help, self.labels = registry, name, help_text, labels
+
+    def inc(self, *labels, value=1):
+        values = self.registry._values()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + value
+
+
+class Histogram:
+    def __init__(self, registry, name, help_text, labels, buckets):
+        self.registry, self.name, self.help, self.labels = registry, name, help_text, labels
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, *labels):
+        values = self.registry._values()
+        key = (self.name, labels)
+        cell = values.get(key)
+        if cell is None:
+            # une case par borne, une au-dela (+Inf), puis la somme
+            cell = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect_left(self.buckets, amount)] += 1
+        cell[-1] += amount
+
+
+class Registry:
+    """Ensemble de metriques, lu par render()."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        metric = self._metrics[name] = Counter(self, name, help_text, tuple(labels))
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = self._metrics[name] = Histogram(self, name, help_text, tuple(labels), buckets)
+        return metric
+
+    def _values(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+                if len(self._shards) > MAX_SHARDS:
+                    self._fold_dead()
+        return shard.values
+
+    def _fold_dead(self):
+        """Replie les tableaux des threads termines (appele sous self._lock)."""
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                _merge(self._retired, shard.values)
+        self._shards = alive
+
+    def collect(self) -> dict:
+        """(metrique, labels) -> valeur, tous threads confondus."""
+        with self._lock:
+            self._fold_dead()
+            total = {key: list(v) if isinstance(v, list) else v for key, v in self._retired.items()}
+            for shard in self._shards:
+                _merge(total, dict(shard.values))
+        return total
+
+    def reset(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.values.clear()
+            self._retired.clear()
+
+    def render(self) -> str:
+        values = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            series = sorted((labels, v) for (n, labels), v in values.items() if n == name)
+            if isinstance(metric, Histogram):
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} histogram"]
+                for labels, cell in series:
+                    lines += _histogram_lines(name, metric.labels, labels, metric.buckets,
+                                              cell[:-1], cell[-1])
+            else:
+                lines += [f"# HELP {name} {metric.help}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(metric.labels, labels)} {_number(v)}" for labels, v in series]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, label_names, labels, buckets, counts, total) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(buckets) + ["+Inf"], counts):
+        cumulative += count
+        le = 'le="%s"' % (bound if bound == "+Inf" else _number(float(bound)))
+        lines.append(f"{name}_bucket{_labels(label_names, labels, (le,))} {cumulative}")
+    lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(float(total))}")
+    lines.append(f"{name}_count{_labels(label_names, labels)} {cumulative}")
+    return lines
+
+
+def db_metrics(profiler) -> str:
+    """Latences des requetes SQL mesurees par le profileur (Database.cursor)."""
+    from services.query_profiler import HISTOGRAM_MS
+
+    counts, total_ms = profiler.histogram()
+    name = "erp_db_statement_duration_seconds"
+    lines = [
+        "# HELP erp_db_profiling_enabled Profilage des requetes SQL actif (1) ou non (0)",
+        "# TYPE erp_db_profiling_enabled gauge",
+        f"erp_db_profiling_enabled {int(profiler.enabled)}",
+        f"# HELP {name} Duree des requetes SQL passees par Database.cursor (profilage actif)",
+        f"# TYPE {name} histogram",
+    ]
+    lines += _histogram_lines(name, (), (), [ms / 1000 for ms in HISTOGRAM_MS], counts, total_ms / 1000)
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
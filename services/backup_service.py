@@ -0,0 +1,223 @@
+"""
+Sauvegardes en ligne de la base (API backup de SQLite), rotation et restauration verifiee.
+
+La copie se fait par etapes de `BACKUP_PAGES` pages sur une connexion dediee:
+entre deux etapes le verrou de lecture est relache, les caisses continuent
+d'ecrire pendant la sauvegarde. Le fichier est ecrit dans `<dest>.part`, verifie
+par `PRAGMA integrity_check`, puis renomme: une sauvegarde visible est toujours
+complete.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pages copiees par etape (4 Ko par page: ~1 Mo), verrou relache entre deux etapes
+BACKUP_PAGES = 256
+# Pause entre deux etapes: laisse passer les ecritures en attente
+STEP_PAUSE = 0.002
+# Relances tolerees (source modifiee hors WAL) avant une copie en une etape
+MAX_RESTARTS = 3
+# Attente maximale d'un verrou (secondes) pour les connexions de sauvegarde
+BUSY_TIMEOUT = 30
+# Tables attendues dans une base ERP (refus de restaurer un autre fichier SQLite)
+REQUIRED_TABLES = ("settings", "products", "sales")
+
+
+class BackupError(Exception):
+    """Sauvegarde ou restauration impossible (fichier invalide, annulation...)."""
+
+
+class BackupCancelled(BackupError):
+    """Sauvegarde interrompue a la demande de l'utilisateur."""
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def page_count(db_path) -> int:
+    """Nombre de pages de la base (total de la barre de progression)."""
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    try:
+        return conn.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def check_database(path):
+    """Leve BackupError si `path` n'est pas une base ERP saine."""
+    if not os.path.isfile(path):
+        raise BackupError(f"Fichier introuvable: {path}")
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
+        try:
+            problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as exc:
+        raise BackupError(f"Fichier illisible: {exc}") from exc
+    if problems != ["ok"]:
+        raise BackupError("Controle d'integrite en echec: " + "; ".join(problems[:5]))
+    missing = [t for t in REQUIRED_TABLES if t not in tables]
+    if missing:
+        raise BackupError("Ce fichier n'est pas une base ERP (tables manquantes: "
+                          + ", ".join(missing) + ")")
+
+
+class _Restart(Exception):
+    """La source a change pendant la copie (mode journal hors WAL)."""
+
+
+def copy_database(source, dest, *, pages=None, pause=None,
+                  progress=None, cancelled=None) -> int:
+    """
+    Copie en ligne `source` -> `dest` par l'API backup, puis verifie la copie.
+
+    En WAL, une transaction de lecture fige un instantane de la source: la
+    copie ne redemarre pas et les ecritures continuent. Hors WAL, chaque
+    ecriture d'une autre connexion relance la copie; apres `MAX_RESTARTS`
+    relances, le reste est copie en une seule etape.
+
+    `progress(pages_copiees)` est appele apres chaque etape; `cancelled()`
+    interrompt la copie (BackupCancelled). Retourne le nombre de pages copiees.
+    """
+    pages = pages or BACKUP_PAGES
+    pause = STEP_PAUSE if pause is None else pause
+    tmp = f"{dest}.part"
+    _discard(tmp)
+    state = {"copied": 0, "remaining": None, "restarts": 0}
+
+    def step(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _Restart()
+        state["remaining"] = remaining
+        state["copied"] = total - remaining
+        if progress:
+            progress(state["copied"])
+        if cancelled and cancelled():
+            raise BackupCancelled("Sauvegarde annulee")
+        if pause:
+            time.sleep(pause)
+
+    src = sqlite3.connect(source, timeout=BUSY_TIMEOUT)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        dst = sqlite3.connect(tmp)
+        try:
+            try:
+                src.backup(dst, pages=pages, progress=step)
+            except _Restart:
+                logger.info("Sauvegarde: source trop active, copie en une etape")
+                src.backup(dst)
+                state["copied"] = src.execute("PRAGMA page_count").fetchone()[0]
+            # Une sauvegarde tient en un seul fichier (pas de -wal/-shm a cote)
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+        if src.in_transaction:
+            src.rollback()
+        check_database(tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        _discard(tmp)
+        raise
+    finally:
+        src.close()
+    return state["copied"]
+
+
+def list_backups(backup_dir=None):
+    """Instantanes du magasin de sauvegardes, du plus recent au plus ancien."""
+    from services.backup_store import BackupStore
+    return BackupStore(backup_dir).snapshots()
+
+
+def create_backup(db_path, dest=None, *, backup_dir=None, max_count=None, label="",
+                  progress=None, cancelled=None) -> str:
+    """
+    Sauvegarde `db_path`. Avec `dest`: copie complete dans ce fichier. Sans:
+    instantane incremental dans le magasin de `config.backup_dir` (seuls les
+    blocs modifies sont ecrits), limite a `config.backup_max_count`
+    instantanes. Retourne le chemin du fichier ou du manifeste.
+    """
+    from config import config
+    from services.backup_store import BackupStore
+
+    started = time.perf_counter()
+    if dest is not None:
+        pages = copy_database(db_path, dest, progress=progress, cancelled=cancelled)
+        logger.info("Sauvegarde creee: %s (%d pages, %.2fs)", dest, pages,
+                    time.perf_counter() - started)
+        return dest
+    store = BackupStore(backup_dir or config.backup_dir)
+    snap = store.snapshot(db_path, label=label, progress=progress, cancelled=cancelled)
+    store.prune(config.backup_max_count if max_count is None else max_count)
+    return snap.path
+
+
+def prepare_restore(backup_path, db_path, *, progress=None, cancelled=None) -> str:
+    """
+    Verifie `backup_path` (fichier .db, ou manifeste .json du magasin) puis le
+    copie a cote de la base (`<db>.restore`), sans toucher a la base en service.
+    Retourne le fichier pret a etre recopie (swap_in).
+    """
+    staged = f"{db_path}.restore"
+    if backup_path.endswith(".json"):
+        from services.backup_store import store_for_manifest
+        store, snapshot_id = store_for_manifest(backup_path)
+        store.extract(snapshot_id, staged)
+        check_database(staged)
+        return staged
+    check_database(backup_path)
+    copy_database(backup_path, staged, pause=0, progress=progress, cancelled=cancelled)
+    return staged
+
+
+def swap_in(db, staged):
+    """
+    Recopie `staged` dans la base en service par l'API backup, sur la
+    connexion de `db`, puis met le schema a niveau (sauvegarde plus ancienne).
+
+    Le fichier de la base n'est pas remplace: les autres connexions (lecteur
+    des cohortes, travaux planifies) restent sur le meme fichier et voient la
+    base restauree; une ecriture en cours est attendue, pas perdue.
+    """
+    from migrations.runner import run_migrations
+
+    if db.conn.in_transaction:
+        db.conn.commit()
+    src = sqlite3.connect(staged, timeout=BUSY_TIMEOUT)
+    try:
+        # En WAL, la copie exige la meme taille de page que la base en service
+        page_size = db.conn.execute("PRAGMA page_size").fetchone()[0]
+        if src.execute("PRAGMA page_size").fetchone()[0] != page_size:
+            src.execute(f"PRAGMA page_size = {int(page_size)}")
+            src.execute("VACUUM")
+        src.backup(db.conn)
+    finally:
+        src.close()
+    _discard(staged)
+    db.create_tables()
+    run_migrations(db.conn)
+    db.invalidate_settings()
+    logger.info("Base restauree depuis la sauvegarde preparee %s", staged)
+
+
+def restore_backup(db, backup_path, *, progress=None, cancelled=None):
+    """Restaure `backup_path` dans la base de `db` apres controle d'integrite."""
+    swap_in(db, prepare_restore(backup_path, db.db_path, progress=progress, cancelled=cancelled))
@@ -0,0 +1,300 @@
+"""
+Magasin de sauvegardes incrementales: blocs dedupliques et compresses, un manifeste par instantane.
+
+Chaque instantane est une copie coherente de la base (API backup, voir
+backup_service) decoupee en blocs alignes sur les pages SQLite. Un bloc est
+range sous son empreinte SHA-256 (`chunks/ab/abcd....xz`): un bloc deja connu
+n'est pas reecrit, seuls les blocs modifies depuis l'instantane precedent
+occupent de la place. `manifests/<id>.json` liste les blocs dans l'ordre et
+l'empreinte du fichier complet, ce qui suffit a restaurer n'importe quel
+instantane.
+
+Compression zstd si le paquet `zstandard` est installe, lzma sinon.
+"""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import logging
+import lzma
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from services.backup_service import BackupCancelled, copy_database
+
+try:
+    import zstandard
+except ImportError:  # optionnel: lzma de la bibliotheque standard sinon
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Pages SQLite par bloc (16 x 4 Ko = 64 Ko): une ligne modifiee salit un seul bloc
+CHUNK_PAGES = 16
+LZMA_PRESET = 1
+ZSTD_LEVEL = 3
+MANIFEST_VERSION = 1
+SNAPSHOT_PREFIX = "erp_backup_"
+
+
+class StoreError(Exception):
+    """Instantane introuvable ou bloc manquant/corrompu."""
+
+
+@dataclass
+class Snapshot:
+    """Resume d'un instantane (contenu du manifeste sans la liste des blocs)."""
+
+    id: str
+    created_at: str
+    size: int
+    chunk_count: int
+    new_chunks: int = 0
+    stored_bytes: int = 0
+    label: str = ""
+    path: str = field(default="", repr=False)
+
+
+def _codec():
+    return "zstd" if zstandard is not None else "xz"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return lzma.compress(data, preset=LZMA_PRESET)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise StoreError("Bloc zstd: installer le paquet 'zstandard' pour restaurer")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return lzma.decompress(data)
+
+
+def _page_size(path) -> int:
+    """Taille de page lue dans l'en-tete SQLite (octets 16-17, 1 signifie 65536)."""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(b"SQLite format 3\0"):
+        raise StoreError(f"{path} n'est pas une base SQLite")
+    size = int.from_bytes(header[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+def _write_atomic(path, data: bytes):
+    tmp = f"{path}.part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class BackupStore:
+    """Magasin de blocs et de manifestes sous `root` (config.backup_dir par defaut)."""
+
+    def __init__(self, root=None):
+        if root is None:
+            from config import config
+            root = config.backup_dir
+        self.root = root
+        self.chunk_dir = os.path.join(root, "chunks")
+        self.manifest_dir = os.path.join(root, "manifests")
+
+    # ── Blocs ──────────────────────────────────────────────────────
+    def _chunk_path(self, digest: str, codec: str) -> str:
+        return os.path.join(self.chunk_dir, digest[:2], f"{digest}.{codec}")
+
+    def _find_chunk(self, digest: str) -> tuple[str, str] | None:
+        for codec in ("zstd", "xz"):
+            path = self._chunk_path(digest, codec)
+            if os.path.exists(path):
+                return path, codec
+        return None
+
+    def _put_chunk(self, data: bytes) -> tuple[str, int]:
+        """Range un bloc; retourne (empreinte, octets ecrits), 0 octet si deja present."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self._find_chunk(digest):
+            return digest, 0
+        codec = _codec()
+        path = self._chunk_path(digest, codec)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        packed = _compress(data, codec)
+        _write_atomic(path, packed)
+        return digest, len(packed)
+
+    def _get_chunk(self, digest: str) -> bytes:
+        found = self._find_chunk(digest)
+        if not found:
+            raise StoreError(f"Bloc manquant: {digest}")
+        path, codec = found
+        with open(path, "rb") as f:
+            data = _decompress(f.read(), codec)
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise StoreError(f"Bloc corrompu: {digest}")
+        return data
+
+    # ── Manifestes ─────────────────────────────────────────────────
+    def manifest_path(self, snapshot_id: str) -> str:
+        return os.path.join(self.manifest_dir, f"{snapshot_id}.json")
+
+    def load_manifest(self, snapshot_id: str) -> dict:
+        try:
+            with open(self.manifest_path(snapshot_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise StoreError(f"Instantane inconnu: {snapshot_id}") from None
+
+    @staticmethod
+    def _summary(manifest: dict, path: str) -> Snapshot:
+        return Snapshot(id=manifest["id"], created_at=manifest["created_at"],
+                        size=manifest["size"], chunk_count=len(manifest["chunks"]),
+                        new_chunks=manifest.get("new_chunks", 0),
+                        stored_bytes=manifest.get("stored_bytes", 0),
+                        label=manifest.get("label", ""), path=path)
+
+    def snapshots(self) -> list[Snapshot]:
+        """Instantanes du plus recent au plus ancien."""
+        found = []
+        for path in glob.glob(os.path.join(self.manifest_dir, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    found.append(self._summary(json.load(f), path))
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning("Manifeste illisible ignore: %s (%s)", path, exc)
+        return sorted(found, key=lambda s: (s.created_at, s.id), reverse=True)
+
+    def _new_id(self, label: str) -> str:
+        base = SNAPSHOT_PREFIX + datetime.now().strftime("%Y%m%d_%H%M%S")
+        if label:
+            base += "_" + "".join(c if c.isalnum() else "_" for c in label)
+        snapshot_id, n = base, 1
+        while os.path.exists(self.manifest_path(snapshot_id)):
+            n += 1
+            snapshot_id = f"{base}_{n}"
+        return snapshot_id
+
+    # ── Instantanes ────────────────────────────────────────────────
+    def add_file(self, path, *, label="", cancelled=None) -> Snapshot:
+        """
+        Ajoute au magasin une base SQLite au repos (copie deja coherente):
+        seuls les blocs absents du magasin sont compresses et ecrits.
+        """
+        started = time.perf_counter()
+        chunk_size = _page_size(path) * CHUNK_PAGES
+        whole = hashlib.sha256()
+        chunks, new_chunks, stored = [], 0, 0
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                if cancelled and cancelled():
+                    raise BackupCancelled("Sauvegarde annulee")
+                whole.update(data)
+                digest, written = self._put_chunk(data)
+                chunks.append(digest)
+                if written:
+                    new_chunks += 1
+                    stored += written
+        snapshot_id = self._new_id(label)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": snapshot_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "label": label,
+            "size": os.path.getsize(path),
+            "chunk_size": chunk_size,
+            "sha256": whole.hexdigest(),
+            "new_chunks": new_chunks,
+            "stored_bytes": stored,
+            "chunks": chunks,
+        }
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        target = self.manifest_path(snapshot_id)
+        _write_atomic(target, json.dumps(manifest, indent=1).encode("utf-8"))
+        logger.info("Instantane %s: %d blocs dont %d nouveaux (%d octets) en %.2fs",
+                    snapshot_id, len(chunks), new_chunks, stored, time.perf_counter() - started)
+        return self._summary(manifest, target)
+
+    def snapshot(self, db_path, *, label="", progress=None, cancelled=None) -> Snapshot:
+        """Instantane en ligne de `db_path`: copie coherente (API backup) puis decoupage."""
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f".snapshot.{os.getpid()}.db")
+        try:
+            copy_database(db_path, staging, progress=progress, cancelled=cancelled)
+            return self.add_file(staging, label=label, cancelled=cancelled)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+
+    def extract(self, snapshot_id: str, dest: str) -> str:
+        """Reconstitue l'instantane dans `dest` (verifie bloc par bloc et en entier)."""
+        manifest = self.load_manifest(snapshot_id)
+        whole = hashlib.sha256()
+        tmp = f"{dest}.part"
+        try:
+            with open(tmp, "wb") as f:
+                for digest in manifest["chunks"]:
+                    data = self._get_chunk(digest)
+                    whole.update(data)
+                    f.write(data)
+            if whole.hexdigest() != manifest["sha256"]:
+                raise StoreError(f"Empreinte de l'instantane {snapshot_id} incorrecte")
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return dest
+
+    def prune(self, keep: int) -> list[str]:
+        """Ne garde que les `keep` instantanes les plus recents puis supprime les blocs orphelins."""
+        removed = []
+        if keep is not None and keep > 0:
+            for snap in self.snapshots()[keep:]:
+                os.remove(snap.path)
+                removed.append(snap.id)
+        # Aussi les blocs laisses par un instantane interrompu
+        self.collect_garbage()
+        return removed
+
+    def collect_garbage(self) -> int:
+        """Supprime les blocs qu'aucun manifeste ne reference; retourne leur nombre."""
+        referenced = set()
+        for snap in self.snapshots():
+            referenced.update(self.load_manifest(snap.id)["chunks"])
+        count = 0
+        for path in glob.glob(os.path.join(self.chunk_dir, "*", "*.*")):
+            digest = os.path.basename(path).split(".", 1)[0]
+            if digest not in referenced and not path.endswith(".part"):
+                os.remove(path)
+                count += 1
+        return count
+
+    def stored_size(self) -> int:
+        """Octets occupes par les blocs compresses."""
+        return sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.chunk_dir, "*", "*")))
+
+
+def store_for_manifest(manifest_path) -> tuple[BackupStore, str]:
+    """(magasin, id) a partir du chemin d'un manifeste (`<racine>/manifests/<id>.json`)."""
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    snapshot_id = os.path.splitext(os.path.basename(manifest_path))[0]
+    return BackupStore(os.path.dirname(manifest_dir)), snapshot_id
+
+
+if __name__ == "__main__":
+    # Instantane de la base configuree: python -m services.backup_store [racine]
+    import sys
+
+    from config import config
+
+    store = BackupStore(sys.argv[1] if len(sys.argv) > 1 else None)
+    snap = store.snapshot(config.db_path)
+    print(f"{snap.id}: {snap.size / 1e6:.1f} Mo, {snap.new_chunks}/{snap.chunk_count} blocs nouveaux, "
+          f"{snap.stored_bytes / 1e6:.2f} Mo ecrits; magasin {store.stored_size() / 1e6:.1f} Mo")
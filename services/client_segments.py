@@ -0,0 +1,270 @@
+"""
+Segmentation RFM des clients (recence, frequence, montant).
+
+Une requete groupee donne, par client, le nombre de jours depuis le dernier
+achat, le nombre de ventes et le chiffre d'affaires. Chaque mesure est notee
+de 1 a 5 par quintile (NumPy: np.quantile + np.searchsorted sur toute la
+base d'un coup), puis le couple recence / (frequence + montant) donne le
+segment. Les resultats sont ranges dans client_segments, lus tels quels par
+la grille clients, la fiche client et le rapport clients.
+
+Rafraichissement:
+  - complet une fois par jour (les recences vieillissent et les quintiles
+    bougent): bornes recalculees et table remplacee, par SegmentsWorker en
+    arriere-plan sur sa propre connexion;
+  - sinon incremental, a la lecture (refresh_for_read): seuls les clients
+    ayant achete depuis le dernier calcul (ventes d'id > last_sale_id) sont
+    rescores contre les bornes gardees dans client_segment_state.
+
+Sans NumPy, meme calcul en Python pur (quantiles par interpolation lineaire,
+comme np.quantile).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import sqlite3
+from bisect import bisect_left
+from datetime import date, datetime
+
+from services.periodic_worker import PeriodicWorker
+
+try:  # optionnel: notation vectorisee
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+QUINTILES = (0.2, 0.4, 0.6, 0.8)
+STARTUP_DELAY_SECONDS = 60
+POLL_SECONDS = 3600
+
+# code -> (libelle, couleur), du meilleur au moins bon
+SEGMENTS = {
+    "champions":   ("Champions",   "#22C55E"),
+    "loyal":       ("Fidèles",     "#10B981"),
+    "new":         ("Nouveaux",    "#38BDF8"),
+    "promising":   ("Prometteurs", "#6366F1"),
+    "at_risk":     ("À risque",    "#F59E0B"),
+    "hibernating": ("En sommeil",  "#A0AACC"),
+    "lost":        ("Perdus",      "#EF4444"),
+}
+
+
+def segment_label(code) -> str:
+    return SEGMENTS.get(code, ("Sans achat", ""))[0]
+
+
+def segment_color(code) -> str:
+    return SEGMENTS.get(code, ("", "#A0AACC"))[1]
+
+
+def _segment(r, f, m, frequency) -> str:
+    """Segment d'un client a partir de ses notes (version scalaire de _score_numpy)."""
+    fm = (f + m) / 2
+    if r >= 4 and frequency == 1:
+        return "new"
+    if r >= 4 and fm >= 4:
+        return "champions"
+    if r >= 3 and fm >= 3:
+        return "loyal"
+    if r >= 3:
+        return "promising"
+    if fm >= 3:
+        return "at_risk"
+    return "hibernating" if r == 2 else "lost"
+
+
+def _quantiles(values) -> list[float]:
+    """Bornes des quintiles, interpolation lineaire (identique a np.quantile)."""
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    edges = []
+    for q in QUINTILES:
+        pos = q * last
+        lo = math.floor(pos)
+        hi = min(lo + 1, last)
+        edges.append(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo))
+    return edges
+
+
+def _score_python(recency, frequency, monetary, edges):
+    if edges is None:
+        edges = tuple(_quantiles(v) for v in (recency, frequency, monetary))
+    r_edges, f_edges, m_edges = edges
+    # Une valeur egale a une borne tombe dans le quintile inferieur; pour la
+    # recence, moins de jours = meilleure note
+    r = [5 - bisect_left(r_edges, v) for v in recency]
+    f = [1 + bisect_left(f_edges, v) for v in frequency]
+    m = [1 + bisect_left(m_edges, v) for v in monetary]
+    segments = [_segment(*scores) for scores in zip(r, f, m, frequency)]
+    return r, f, m, segments, edges
+
+
+def _score_numpy(recency, frequency, monetary, edges):
+    rec = np.asarray(recency, dtype=float)
+    freq = np.asarray(frequency, dtype=float)
+    mon = np.asarray(monetary, dtype=float)
+    if edges is None:
+        edges = tuple(np.quantile(v, QUINTILES).tolist() for v in (rec, freq, mon))
+    r_edges, f_edges, m_edges = edges
+    r = 5 - np.searchsorted(r_edges, rec, side="left")
+    f = 1 + np.searchsorted(f_edges, freq, side="left")
+    m = 1 + np.searchsorted(m_edges, mon, side="left")
+    fm = (f + m) / 2
+    segments = np.select(
+        [(r >= 4) & (freq == 1), (r >= 4) & (fm >= 4), (r >= 3) & (fm >= 3), r >= 3, fm >= 3, r == 2],
+        ["new", "champions", "loyal", "promising", "at_risk", "hibernating"],
+        default="lost")
+    return r.tolist(), f.tolist(), m.tolist(), segments.tolist(), edges
+
+
+def score(recency, frequency, monetary, edges=None):
+    """
+    Notes R, F, M (1 a 5) et segment de chaque client.
+    `edges`: bornes (recence, frequence, montant) a reutiliser; calculees sur
+    les valeurs fournies si None. Retourne (r, f, m, segments, edges).
+    """
+    run = _score_numpy if np is not None else _score_python
+    return run(recency, frequency, monetary, edges)
+
+
+def _aggregates(conn, as_of: date, since_sale_id=None) -> list[tuple]:
+    """(client_id, dernier achat, jours depuis, nb ventes, montant) par client."""
+    where = "WHERE client_id IS NOT NULL"
+    params = [as_of.isoformat()]
+    if since_sale_id is not None:
+        where += " AND client_id IN (SELECT client_id FROM sales WHERE id > ?)"
+        params.append(since_sale_id)
+    return conn.execute(f"""
+        SELECT client_id, MAX(sale_date),
+               MAX(julianday(?) - julianday(DATE(MAX(sale_date))), 0),
+               COUNT(*), COALESCE(SUM(total), 0)
+        FROM sales
+        {where}
+        GROUP BY client_id
+    """, params).fetchall()
+
+
+def _state(conn):
+    row = conn.execute("SELECT as_of, last_sale_id, recency_edges, frequency_edges, monetary_edges "
+                       "FROM client_segment_state WHERE id = 1").fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], tuple(json.loads(e) for e in row[2:])
+
+
+def refresh_segments(conn, as_of=None, full=False, incremental_only=False) -> int:
+    """
+    Met client_segments a jour (complet ou incremental, voir l'en-tete du
+    module). Retourne le nombre de clients rescores. `incremental_only`:
+    jamais de recalcul complet (lecture), les bornes gardees servent meme
+    si elles datent d'un jour precedent; rien a faire sans calcul anterieur.
+    """
+    as_of = as_of or date.today()
+    state = _state(conn)
+    last_sale_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+    incremental = (not full and state is not None and all(state[2])
+                   and (incremental_only or state[0] == as_of.isoformat()))
+    if incremental_only and not incremental:
+        return 0
+    if incremental and state[1] >= last_sale_id:
+        return 0
+
+    rows = _aggregates(conn, as_of, state[1] if incremental else None)
+    columns = list(zip(*rows)) or [(), (), (), (), ()]
+    ids, last_sales, recency, frequency, monetary = columns
+    if rows:
+        r, f, m, segments, edges = score(recency, frequency, monetary, state[2] if incremental else None)
+    else:
+        r = f = m = segments = ()
+        edges = state[2] if incremental else ([], [], [])
+    now = datetime.now().replace(microsecond=0).isoformat(sep=" ")
+    try:
+        if not incremental:
+            conn.execute("DELETE FROM client_segments")
+        conn.executemany("""
+            INSERT OR REPLACE INTO client_segments (client_id, last_sale, recency_days, frequency, monetary,
+                                                    r_score, f_score, m_score, segment, computed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((*row, now) for row in zip(ids, last_sales, recency, frequency, monetary, r, f, m, segments)))
+        conn.execute("""
+            INSERT OR REPLACE INTO client_segment_state (id, as_of, last_sale_id, recency_edges,
+                                                         frequency_edges, monetary_edges)
+            VALUES (1, ?, ?, ?, ?, ?)
+        """, (state[0] if incremental else as_of.isoformat(), last_sale_id,
+              *(json.dumps(list(e)) for e in edges)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info("Segments RFM: %d client(s) (%s)", len(rows), "incremental" if incremental else "complet")
+    return len(rows)
+
+
+def all_segments(conn) -> dict[int, dict]:
+    """client_id -> ligne de client_segments."""
+    cur = conn.execute("SELECT * FROM client_segments")
+    names = [d[0] for d in cur.description]
+    return {row[0]: dict(zip(names, row)) for row in cur.fetchall()}
+
+
+def segment_of(conn, client_id) -> dict | None:
+    cur = conn.execute("SELECT * FROM client_segments WHERE client_id = ?", (client_id,))
+    row = cur.fetchone()
+    return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+
+def _due(conn) -> bool:
+    state = _state(conn)
+    return state is None or state[0] != date.today().isoformat()
+
+
+def is_due(db_path) -> bool:
+    """Recalcul complet a faire: jamais calcule, ou pas encore aujourd'hui."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return _due(conn)
+    finally:
+        conn.close()
+
+
+def wake_if_due(db) -> bool:
+    """Demande a SegmentsWorker le recalcul complet du jour s'il reste a faire."""
+    if not _due(db.conn):
+        return False
+    wake_segments_worker(db)
+    return True
+
+
+def refresh_for_read(db) -> int:
+    """
+    Rafraichissement avant lecture (grille et fiche clients): incremental
+    seulement, le recalcul complet du jour est laisse a SegmentsWorker.
+    """
+    wake_if_due(db)
+    return refresh_segments(db.conn, incremental_only=True)
+
+
+class SegmentsWorker(PeriodicWorker):
+    """Recalcul complet quotidien des segments; `wake()` avance le prochain passage."""
+
+    thread_name = "client-segments"
+    label = "Segments RFM planifies"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def tick(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            if _due(conn):
+                refresh_segments(conn)
+        finally:
+            conn.close()
+
+
+start_segments_worker = SegmentsWorker.start_once
+wake_segments_worker = SegmentsWorker.wake_or_start
@@ -8,9 +8,9 @@ class ClientService:
         self.repository = repository
         self.audit = audit_service
 
-    def list_clients(self) -> list[dict]:
+    def list_clients(self) -> list:
         clients = self.repository.list_clients()
-        clients.sort(key=lambda c: (c.get("name") or "").lower())
+        clients.sort(key=lambda c: (c.name or "").lower())
         return clients
 
     def get_client(self, client_id: int) -> dict | None:
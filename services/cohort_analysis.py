@@ -0,0 +1,139 @@
+"""
+Cohortes de clients par mois du premier achat.
+
+Une seule requete groupee donne le chiffre d'affaires de chaque client par
+mois; le pivot cohorte x decalage (mois depuis le premier achat) est fait
+en NumPy (np.minimum.at pour le premier mois, np.add.at pour les clients
+actifs et le CA de chaque case). Sans NumPy, meme pivot en Python pur.
+
+Le resultat est garde en cache par base et par PRAGMA data_version d'une
+connexion de lecture dediee: il n'est recalcule qu'apres une ecriture dans
+la base. Le calcul peut tourner hors du thread UI (connexion partagee
+entre threads, protegee par un verrou).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+try:  # optionnel: pivot vectorise
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+@dataclass
+class Cohorts:
+    """
+    Ligne i = cohorte `months[i]` ('YYYY-MM'), colonne k = k mois apres le
+    premier achat. `active[i][k]` clients ayant achete ce mois-la,
+    `revenue[i][k]` leur CA; les cases posterieures au dernier mois de
+    donnees valent None.
+    """
+
+    months: list
+    sizes: list
+    repeat: list          # clients de la cohorte revenus au moins un autre mois
+    active: list
+    revenue: list
+
+    def __len__(self) -> int:
+        return len(self.months)
+
+
+_lock = threading.Lock()
+_readers: dict[str, sqlite3.Connection] = {}
+_cache: dict[str, tuple[int, Cohorts]] = {}
+
+
+def _month_key(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _client_months(conn) -> list[tuple]:
+    """(client_id, mois en nombre annee*12 + mois-1, CA) par client et par mois."""
+    return conn.execute("""
+        SELECT client_id,
+               CAST(substr(sale_date, 1, 4) AS INTEGER) * 12 + CAST(substr(sale_date, 6, 2) AS INTEGER) - 1
+                   AS month,
+               COALESCE(SUM(total), 0)
+        FROM sales
+        WHERE client_id IS NOT NULL AND sale_date IS NOT NULL
+        GROUP BY client_id, month
+    """).fetchall()
+
+
+def _mask_future(first_month, last_month, matrix):
+    """Remplace par None les cases posterieures au dernier mois de donnees."""
+    return [[value if first_month + i + k <= last_month else None for k, value in enumerate(row)]
+            for i, row in enumerate(matrix)]
+
+
+def _pivot_numpy(rows) -> Cohorts:
+    data = np.array(rows, dtype=float)
+    clients, inverse = np.unique(data[:, 0], return_inverse=True)
+    months = data[:, 1].astype(np.int64)
+    first = np.full(len(clients), months.max(), dtype=np.int64)
+    np.minimum.at(first, inverse, months)
+    base = int(first.min())
+    last = int(months.max())
+    cohort = first[inverse] - base
+    offset = months - first[inverse]
+    shape = (last - base + 1, last - base + 1)
+    active = np.zeros(shape, dtype=np.int64)
+    revenue = np.zeros(shape)
+    np.add.at(active, (cohort, offset), 1)
+    np.add.at(revenue, (cohort, offset), data[:, 2])
+    returned = np.zeros(len(clients), dtype=bool)
+    returned[inverse[offset > 0]] = True
+    repeat = np.bincount(first - base, weights=returned, minlength=shape[0]).astype(np.int64)
+    return Cohorts([_month_key(base + i) for i in range(shape[0])], active[:, 0].tolist(), repeat.tolist(),
+                   _mask_future(base, last, active.tolist()), _mask_future(base, last, revenue.tolist()))
+
+
+def _pivot_python(rows) -> Cohorts:
+    first: dict = {}
+    for client, month, _ in rows:
+        if month < first.get(client, month + 1):
+            first[client] = month
+    base, last = min(first.values()), max(month for _, month, _ in rows)
+    size = last - base + 1
+    active = [[0] * size for _ in range(size)]
+    revenue = [[0.0] * size for _ in range(size)]
+    returned = set()
+    for client, month, amount in rows:
+        cohort, offset = first[client] - base, month - first[client]
+        active[cohort][offset] += 1
+        revenue[cohort][offset] += amount
+        if offset:
+            returned.add(client)
+    repeat = [0] * size
+    for client in returned:
+        repeat[first[client] - base] += 1
+    return Cohorts([_month_key(base + i) for i in range(size)], [row[0] for row in active], repeat,
+                   _mask_future(base, last, active), _mask_future(base, last, revenue))
+
+
+def compute(conn) -> Cohorts:
+    rows = _client_months(conn)
+    if not rows:
+        return Cohorts([], [], [], [], [])
+    return (_pivot_numpy if np is not None else _pivot_python)(rows)
+
+
+def cohorts(db_path) -> Cohorts:
+    """Cohortes de la base `db_path`, recalculees seulement si elle a change."""
+    key = str(db_path)
+    with _lock:
+        conn = _readers.get(key)
+        if conn is None:
+            conn = _readers[key] = sqlite3.connect(key, timeout=30, check_same_thread=False)
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        result = compute(conn)
+        _cache[key] = (version, result)
+        return result
@@ -0,0 +1,124 @@
+"""
+Moteur de cout: cout moyen pondere et couches FIFO, tenus a jour a chaque mouvement.
+
+Chaque entree en stock (achat, retour client, annulation de vente) cree une
+couche FIFO et recalcule le cout moyen pondere; chaque sortie (vente)
+consomme les couches les plus anciennes. Le cout de la sortie, selon la
+methode choisie (parametre `cost_method`: "average" ou "fifo"), est fige sur
+la ligne de vente (sale_items.unit_cost): les marges passees ne bougent plus
+quand le prix d'achat change et les rapports se contentent d'une somme.
+
+products.stock_quantity reste la reference: avant chaque operation les
+couches ouvertes sont alignees sur le stock (couche "opening" au cout moyen
+pour un stock entre sans achat, consommation des plus anciennes pour un
+stock retire hors vente). Un produit sans historique demarre au prix
+d'achat de sa fiche.
+
+Les fonctions travaillent sur la connexion et la transaction de l'appelant
+et ne valident rien: db_manager les appelle avant update_stock.
+"""
+
+from __future__ import annotations
+
+METHODS = ("average", "fifo")
+DEFAULT_METHOD = "average"
+
+
+def cost_method(db) -> str:
+    """Methode configuree (parametre `cost_method`), cout moyen par defaut."""
+    method = db.get_setting("cost_method", DEFAULT_METHOD)
+    return method if method in METHODS else DEFAULT_METHOD
+
+
+def _product(conn, product_id) -> tuple[int, float]:
+    row = conn.execute("SELECT COALESCE(stock_quantity, 0), COALESCE(purchase_price, 0) "
+                       "FROM products WHERE id = ?", (product_id,)).fetchone()
+    return (row[0], row[1]) if row else (0, 0.0)
+
+
+def _average(conn, product_id, default: float) -> float:
+    row = conn.execute("SELECT avg_cost FROM product_costs WHERE product_id = ?", (product_id,)).fetchone()
+    return row[0] if row else default
+
+
+def _save_average(conn, product_id, avg_cost: float):
+    conn.execute("""
+        INSERT INTO product_costs (product_id, avg_cost, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(product_id) DO UPDATE SET avg_cost = excluded.avg_cost, updated_at = excluded.updated_at
+    """, (product_id, avg_cost))
+
+
+def _consume(conn, product_id, quantity: int) -> tuple[float, int]:
+    """Consomme `quantity` sur les couches ouvertes, plus anciennes d'abord: (cout, quantite servie)."""
+    cost, served = 0.0, 0
+    layers = conn.execute("SELECT id, remaining, unit_cost FROM cost_layers "
+                          "WHERE product_id = ? AND remaining > 0 ORDER BY id", (product_id,))
+    updates = []
+    for layer_id, remaining, unit_cost in layers:
+        take = min(remaining, quantity - served)
+        cost += take * unit_cost
+        served += take
+        updates.append((remaining - take, layer_id))
+        if served >= quantity:
+            break
+    conn.executemany("UPDATE cost_layers SET remaining = ? WHERE id = ?", updates)
+    return cost, served
+
+
+def _sync_layers(conn, product_id, stock: int, avg_cost: float):
+    """Aligne le total des couches ouvertes sur le stock du produit."""
+    opened = conn.execute("SELECT COALESCE(SUM(remaining), 0) FROM cost_layers "
+                          "WHERE product_id = ? AND remaining > 0", (product_id,)).fetchone()[0]
+    target = max(stock, 0)
+    if opened < target:
+        conn.execute("INSERT INTO cost_layers (product_id, source, quantity, remaining, unit_cost) "
+                     "VALUES (?, 'opening', ?, ?, ?)", (product_id, target - opened, target - opened, avg_cost))
+    elif opened > target:
+        _consume(conn, product_id, opened - target)
+
+
+def receive(conn, product_id, quantity: int, unit_cost: float, *, source: str, source_ref=None) -> float:
+    """Entree en stock de `quantity` au cout `unit_cost`; retourne le nouveau cout moyen."""
+    stock, price = _product(conn, product_id)
+    avg_cost = _average(conn, product_id, price)
+    _sync_layers(conn, product_id, stock, avg_cost)
+    if quantity <= 0:
+        return avg_cost
+    if stock <= 0:
+        avg_cost = unit_cost
+    else:
+        avg_cost = (stock * avg_cost + quantity * unit_cost) / (stock + quantity)
+    conn.execute("""
+        INSERT INTO cost_layers (product_id, source, source_ref, quantity, remaining, unit_cost)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (product_id, source, source_ref, quantity, quantity, unit_cost))
+    _save_average(conn, product_id, avg_cost)
+    return avg_cost
+
+
+def issue(conn, product_id, quantity: int, method: str = DEFAULT_METHOD) -> float:
+    """
+    Sortie de stock de `quantity`: consomme les couches FIFO et retourne le
+    cout unitaire a figer selon `method`. Une sortie au-dela des couches
+    (stock negatif) est valorisee au cout moyen.
+    """
+    stock, price = _product(conn, product_id)
+    avg_cost = _average(conn, product_id, price)
+    _sync_layers(conn, product_id, stock, avg_cost)
+    _save_average(conn, product_id, avg_cost)
+    if quantity <= 0:
+        return avg_cost
+    cost, served = _consume(conn, product_id, quantity)
+    if method != "fifo":
+        return avg_cost
+    return (cost + (quantity - served) * avg_cost) / quantity
+
+
+def current_cost(conn, product_id) -> float:
+    """Cout moyen courant (prix d'achat de la fiche si le produit n'a pas d'historique)."""
+    return _average(conn, product_id, _product(conn, product_id)[1])
+
+
+# Cout courant de chaque produit, pour les requetes de valorisation
+CURRENT_COST_SQL = "COALESCE((SELECT avg_cost FROM product_costs pc WHERE pc.product_id = p.id), " \
+                   "p.purchase_price, 0)"
@@ -0,0 +1,259 @@
+"""
+Prevision de la demande et points de commande.
+
+Les ventes journalieres de chaque produit sont chargees en une requete
+groupee dans une matrice produits x jours (NumPy), puis tous les produits
+sont traites ensemble:
+
+  - demande journaliere prevue: lissage exponentiel simple (poids
+    alpha * (1 - alpha)^age, un produit matrice-vecteur);
+  - moyenne mobile et ecart-type de la demande sur VARIABILITY_DAYS;
+  - jours de couverture = stock / demande prevue;
+  - point de commande = demande x delai + stock de securite
+    (z x ecart-type x racine du delai), jamais sous le stock minimum;
+  - quantite suggeree: de quoi couvrir delai + periode de revision quand le
+    stock est au point de commande ou dessous.
+
+Sans NumPy, meme calcul en Python pur sur les seuls jours vendus (plus lent
+sur de gros catalogues). Les resultats sont ranges dans product_forecasts,
+recalcules chaque jour par ForecastWorker; AlertsPage et PurchasesPage les
+lisent sans recalcul.
+
+Parametres (table settings): reorder_lead_days (delai fournisseur, 7 par
+defaut) et reorder_review_days (periode de revision, 14 par defaut).
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from services.periodic_worker import PeriodicWorker
+
+try:  # optionnel: calcul vectorise
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 730
+VARIABILITY_DAYS = 90
+SMOOTHING_ALPHA = 0.1
+# Taux de service vise 95 %
+SERVICE_Z = 1.65
+DEFAULT_LEAD_DAYS = 7
+DEFAULT_REVIEW_DAYS = 14
+STARTUP_DELAY_SECONDS = 180
+POLL_SECONDS = 3600
+REFRESH_HOURS = 24
+
+
+@dataclass
+class Forecast:
+    """Une valeur par produit, dans l'ordre de `product_ids`."""
+
+    product_ids: list
+    daily_demand: list
+    moving_avg: list
+    sigma: list
+    stock: list
+    days_of_cover: list          # None: aucune demande prevue
+    reorder_point: list
+    order_qty: list
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def rows(self):
+        return zip(self.product_ids, self.daily_demand, self.moving_avg, self.sigma, self.stock,
+                   self.days_of_cover, self.reorder_point, self.order_qty)
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _setting(conn, key, default: int) -> int:
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    try:
+        return max(int(float(row[0])), 0) if row and row[0] not in (None, "") else default
+    except ValueError:
+        return default
+
+
+def _products(conn) -> list[tuple]:
+    return conn.execute("SELECT id, COALESCE(stock_quantity, 0), COALESCE(min_stock, 0) "
+                        "FROM products ORDER BY id").fetchall()
+
+
+def _daily_sales(conn, first: date, end: date) -> list[tuple]:
+    """(product_id, jour depuis `first`, quantite) des ventes de [first, end]."""
+    return conn.execute("""
+        SELECT si.product_id,
+               CAST(julianday(DATE(s.sale_date)) - julianday(?) AS INTEGER) AS day,
+               SUM(si.quantity)
+        FROM sales s
+        JOIN sale_items si ON si.sale_id = s.id
+        WHERE s.sale_date >= ? AND DATE(s.sale_date) <= ?
+        GROUP BY si.product_id, day
+    """, (first.isoformat(), first.isoformat(), end.isoformat())).fetchall()
+
+
+def _plan(demand, sigma, stock, min_stock, lead, review, z):
+    """Couverture, point de commande et quantite suggeree d'un produit (version scalaire)."""
+    safety = z * sigma * math.sqrt(lead)
+    reorder_point = max(demand * lead + safety, min_stock)
+    target = max(demand * (lead + review) + safety, min_stock)
+    cover = stock / demand if demand > 0 else None
+    qty = math.ceil(target - stock - 1e-9) if stock <= reorder_point and target > stock else 0
+    return cover, reorder_point, qty
+
+
+def _forecast_numpy(products, sales, days, alpha, window, lead, review, z) -> Forecast:
+    ids = np.fromiter((p[0] for p in products), dtype=np.int64, count=len(products))
+    stock = np.fromiter((p[1] for p in products), dtype=float, count=len(products))
+    min_stock = np.fromiter((p[2] for p in products), dtype=float, count=len(products))
+    matrix = np.zeros((len(products), days), dtype=np.float32)
+    if sales:
+        raw = np.array(sales, dtype=float)
+        rows = np.searchsorted(ids, raw[:, 0].astype(np.int64))
+        known = (rows < len(ids)) & (ids[np.minimum(rows, len(ids) - 1)] == raw[:, 0])
+        known &= (raw[:, 1] >= 0) & (raw[:, 1] < days)
+        np.add.at(matrix, (rows[known], raw[known, 1].astype(np.int64)), raw[known, 2])
+
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=float)
+    demand = matrix @ weights
+    recent = matrix[:, -window:]
+    moving_avg = recent.mean(axis=1, dtype=float)
+    sigma = recent.std(axis=1, dtype=float)
+
+    safety = z * sigma * math.sqrt(lead)
+    reorder_point = np.maximum(demand * lead + safety, min_stock)
+    target = np.maximum(demand * (lead + review) + safety, min_stock)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(demand > 0, stock / demand, np.nan)
+    qty = np.where((stock <= reorder_point) & (target > stock), np.ceil(target - stock - 1e-9), 0)
+    return Forecast(ids.tolist(), demand.tolist(), moving_avg.tolist(), sigma.tolist(),
+                    stock.astype(int).tolist(),
+                    [None if math.isnan(c) else c for c in cover.tolist()],
+                    reorder_point.tolist(), qty.astype(int).tolist())
+
+
+def _forecast_python(products, sales, days, alpha, window, lead, review, z) -> Forecast:
+    by_product: dict[int, list] = {}
+    for product_id, day, quantity in sales:
+        if 0 <= day < days:
+            by_product.setdefault(product_id, []).append((day, quantity))
+    result = Forecast([], [], [], [], [], [], [], [])
+    for product_id, stock, min_stock in products:
+        sold = by_product.get(product_id, ())
+        demand = sum(alpha * (1 - alpha) ** (days - 1 - d) * q for d, q in sold)
+        recent = [q for d, q in sold if d >= days - window]
+        mean = sum(recent) / window
+        sigma = math.sqrt(max(sum(q * q for q in recent) / window - mean * mean, 0))
+        cover, reorder_point, qty = _plan(demand, sigma, stock, min_stock, lead, review, z)
+        for column, value in zip(result.__dict__.values(),
+                                 (product_id, demand, mean, sigma, stock, cover, reorder_point, qty)):
+            column.append(value)
+    return result
+
+
+def compute(conn, *, end=None, days=HISTORY_DAYS, alpha=SMOOTHING_ALPHA, window=VARIABILITY_DAYS,
+            lead_days=None, review_days=None, z=SERVICE_Z) -> Forecast:
+    """Previsions de tous les produits a partir des ventes des `days` jours finissant a `end`."""
+    end = end or date.today()
+    first = end - timedelta(days=days - 1)
+    lead = _setting(conn, "reorder_lead_days", DEFAULT_LEAD_DAYS) if lead_days is None else lead_days
+    review = _setting(conn, "reorder_review_days", DEFAULT_REVIEW_DAYS) if review_days is None else review_days
+    window = min(window, days)
+    run = _forecast_numpy if np is not None else _forecast_python
+    return run(_products(conn), _daily_sales(conn, first, end), days, alpha, window, lead, review, z)
+
+
+def refresh_forecasts(db_path, **options) -> int:
+    """Recalcule et remplace product_forecasts; retourne le nombre de produits."""
+    conn = _connect(db_path)
+    try:
+        forecast = compute(conn, **options)
+        now = datetime.now().replace(microsecond=0).isoformat(sep=" ")
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM product_forecasts")
+        conn.executemany("""
+            INSERT INTO product_forecasts (product_id, daily_demand, moving_avg, sigma, stock,
+                                           days_of_cover, reorder_point, order_qty, computed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (row + (now,) for row in forecast.rows()))
+        conn.commit()
+        logger.info("Previsions de demande: %d produits", len(forecast))
+        return len(forecast)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def last_refresh(conn) -> str | None:
+    row = conn.execute("SELECT MAX(computed_at) FROM product_forecasts").fetchone()
+    return row[0] if row else None
+
+
+def reorder_suggestions(conn, limit=None) -> list[dict]:
+    """
+    Produits a commander, les plus proches de la rupture d'abord, avec leur
+    classe ABC par CA (`abc`, None si le catalogue n'est pas encore classe).
+    """
+    sql = """
+        SELECT f.product_id, p.name, p.stock_quantity AS stock, p.min_stock,
+               COALESCE(p.purchase_price, 0) AS purchase_price,
+               f.daily_demand, f.days_of_cover, f.reorder_point, f.order_qty,
+               a.revenue_class AS abc
+        FROM product_forecasts f
+        JOIN products p ON p.id = f.product_id
+        LEFT JOIN product_abc a ON a.product_id = f.product_id
+        WHERE f.order_qty > 0
+        ORDER BY f.days_of_cover IS NULL, f.days_of_cover, f.order_qty DESC
+    """
+    params = ()
+    if limit:
+        sql += " LIMIT ?"
+        params = (int(limit),)
+    cur = conn.execute(sql, params)
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def is_due(db_path, hours=REFRESH_HOURS) -> bool:
+    conn = _connect(db_path)
+    try:
+        last = last_refresh(conn)
+    finally:
+        conn.close()
+    return last is None or datetime.now() - datetime.fromisoformat(last) >= timedelta(hours=hours)
+
+
+class ForecastWorker(PeriodicWorker):
+    """
+    Recalcule les previsions quand les dernieres datent de plus de
+    REFRESH_HOURS; `wake()` avance le prochain passage (previsions jamais
+    calculees, demandees par l'interface).
+    """
+
+    thread_name = "demand-forecast"
+    label = "Previsions de demande planifiees"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def tick(self):
+        if is_due(self.db_path):
+            refresh_forecasts(self.db_path)
+
+
+start_forecast_worker = ForecastWorker.start_once
+wake_forecast_worker = ForecastWorker.wake_or_start
@@ -0,0 +1,497 @@
+"""
+Controle d'integrite de la base en arriere-plan, par etapes courtes.
+
+Chaque etape (une table, une regle, un lot de produits) s'execute sur une
+connexion dediee puis rend la main: le controle est annulable et ne bloque ni
+l'interface ni les caisses. Les anomalies sont enregistrees dans
+integrity_findings (cle stable par anomalie, fermee automatiquement quand un
+passage complet ne la retrouve plus) et peuvent etre reparees par lots.
+
+Etapes:
+  - PRAGMA quick_check(table) par table;
+  - PRAGMA foreign_key_check(table) par table (cles non couvertes par une regle);
+  - lignes orphelines par anti-jointure (LEFT JOIN ... IS NULL);
+  - rapprochement products.stock_quantity / somme des stock_movements,
+    mouvement d'ouverture 'initial' (Database.add_product) compris. Sans ce
+    mouvement (produits crees avant lui), l'ecart est le stock d'ouverture
+    non trace: signale pour information, sans reparation.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from services.periodic_worker import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+# Erreurs gardees par table pour quick_check
+QUICK_CHECK_MAX_ERRORS = 20
+# Produits rapproches par etape / lignes reparees par transaction
+STOCK_BATCH = 500
+REPAIR_BATCH = 500
+# Pause entre deux etapes: laisse passer les ecritures des caisses
+STEP_PAUSE = 0.01
+# Lignes citees en exemple dans le detail d'une anomalie
+SAMPLE_SIZE = 10
+# Planification: premier passage apres le demarrage, puis toutes les N heures
+STARTUP_DELAY_SECONDS = 300
+DEFAULT_INTERVAL_HOURS = 24
+POLL_SECONDS = 600
+
+SEVERITIES = ("error", "warning", "info")
+RECONCILE_NOTE = "Rapprochement controle d'integrite"
+
+
+@dataclass(frozen=True)
+class OrphanRule:
+    """Lignes de `child` dont `fk` ne correspond a aucune ligne de `parent`."""
+
+    child: str
+    fk: str
+    parent: str
+    title: str
+    severity: str = "warning"
+    repair: str | None = None   # "delete" ou "detach" (fk remise a NULL)
+
+
+ORPHAN_RULES = {
+    "sale_items_sale": OrphanRule("sale_items", "sale_id", "sales",
+                                  "Lignes de vente sans vente", "error", "delete"),
+    "sale_items_product": OrphanRule("sale_items", "product_id", "products",
+                                     "Lignes de vente sans produit"),
+    "purchase_items_purchase": OrphanRule("purchase_items", "purchase_id", "purchases",
+                                          "Lignes d'achat sans achat", "error", "delete"),
+    "purchase_items_product": OrphanRule("purchase_items", "product_id", "products",
+                                         "Lignes d'achat sans produit"),
+    "return_items_return": OrphanRule("return_items", "return_id", "returns",
+                                      "Lignes de retour sans retour", "error", "delete"),
+    "stock_movements_product": OrphanRule("stock_movements", "product_id", "products",
+                                          "Mouvements de stock sans produit", "warning", "delete"),
+    "sales_client": OrphanRule("sales", "client_id", "clients",
+                               "Ventes avec client introuvable", "warning", "detach"),
+    "returns_sale": OrphanRule("returns", "original_sale_id", "sales",
+                               "Retours sans vente d'origine"),
+}
+
+REPAIR_LABELS = {
+    "delete": "Supprimer les lignes orphelines",
+    "detach": "Rattacher au client anonyme",
+    "reconcile_stock": "Creer les mouvements d'ajustement",
+    "reindex": "Reconstruire les index (REINDEX)",
+}
+
+
+@dataclass
+class Finding:
+    key: str
+    check: str
+    severity: str
+    title: str
+    table: str | None = None
+    affected: int = 0
+    details: str = ""
+    repair: str | None = None
+
+
+@dataclass
+class CheckReport:
+    run_id: int
+    status: str = "running"
+    checks: int = 0
+    findings: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def count(self, severity) -> int:
+        return sum(1 for f in self.findings if f.severity == severity)
+
+
+def _now() -> str:
+    return datetime.now().replace(microsecond=0).isoformat(sep=" ")
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _tables(conn) -> list[str]:
+    return [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Etapes de controle (generateurs: None = fin d'une etape)
+# ══════════════════════════════════════════════════════════════════
+
+def _quick_check(conn, tables):
+    targets = list(tables)
+    while targets:
+        table = targets.pop(0)
+        sql = f"PRAGMA quick_check({table})" if table else f"PRAGMA quick_check({QUICK_CHECK_MAX_ERRORS})"
+        try:
+            problems = [r[0] for r in conn.execute(sql).fetchmany(QUICK_CHECK_MAX_ERRORS)]
+        except sqlite3.OperationalError:
+            if table is None:
+                raise
+            targets = [None]  # SQLite < 3.33: pas de controle par table, un seul passage global
+            continue
+        if problems != ["ok"]:
+            yield Finding(f"quick_check:{table or '*'}", "quick_check", "error",
+                          "Structure de la base endommagee", table, len(problems),
+                          "\n".join(problems), "reindex")
+        yield None
+
+
+def _foreign_key_check(conn, tables):
+    covered = {(r.child, r.parent) for r in ORPHAN_RULES.values()}
+    for table in tables:
+        violations = {}
+        for row in conn.execute(f"PRAGMA foreign_key_check({table})"):
+            if (table, row[2]) not in covered:
+                violations.setdefault(row[2], []).append(row[1])
+        for parent, rowids in violations.items():
+            yield Finding(f"foreign_key:{table}:{parent}", "foreign_key", "warning",
+                          f"{table}: references vers {parent} introuvables", table, len(rowids),
+                          "rowid: " + ", ".join(map(str, rowids[:SAMPLE_SIZE])))
+        yield None
+
+
+def _orphan_select(rule: OrphanRule, columns="c.id") -> str:
+    return (f"SELECT {columns} FROM {rule.child} c LEFT JOIN {rule.parent} p ON p.id = c.{rule.fk} "
+            f"WHERE c.{rule.fk} IS NOT NULL AND p.id IS NULL")
+
+
+def _orphans(conn, tables):
+    present = set(tables)
+    for name, rule in ORPHAN_RULES.items():
+        if rule.child in present and rule.parent in present:
+            count = conn.execute(_orphan_select(rule, "COUNT(*)")).fetchone()[0]
+            if count:
+                sample = [r[0] for r in conn.execute(_orphan_select(rule) + f" LIMIT {SAMPLE_SIZE}")]
+                yield Finding(f"orphan:{name}", "orphan", rule.severity, rule.title, rule.child,
+                              count, f"{rule.fk} introuvable, id: " + ", ".join(map(str, sample)),
+                              rule.repair)
+        yield None
+
+
+_STOCK_SQL = """
+    SELECT p.id, p.name, p.stock_quantity AS stock,
+           COALESCE(SUM(m.quantity), 0) AS moved,
+           COUNT(CASE WHEN m.movement_type = 'initial' THEN 1 END) AS openings
+    FROM products p LEFT JOIN stock_movements m ON m.product_id = p.id
+    WHERE p.id > ?
+    GROUP BY p.id ORDER BY p.id LIMIT ?
+"""
+
+
+def _stock(conn, tables):
+    """Rapprochement par lots de produits (pagination keyset sur products.id)."""
+    if "products" not in tables or "stock_movements" not in tables:
+        return
+    counts = {"mismatch": 0, "opening": 0, "negative": 0}
+    samples = {kind: [] for kind in counts}
+
+    def note(kind, r):
+        counts[kind] += 1
+        if len(samples[kind]) < SAMPLE_SIZE:
+            samples[kind].append(f"#{r['id']} {r['name']}: stock {r['stock']}, mouvements {r['moved']}")
+
+    last_id = 0
+    while True:
+        rows = conn.execute(_STOCK_SQL, (last_id, STOCK_BATCH)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        for r in rows:
+            stock = r["stock"] or 0
+            if stock < 0:
+                note("negative", r)
+            if stock != r["moved"]:
+                note("mismatch" if r["openings"] else "opening", r)
+        yield None
+
+    if counts["mismatch"]:
+        yield Finding("stock:mismatch", "stock", "warning",
+                      "Stock different de la somme des mouvements", "products",
+                      counts["mismatch"], "\n".join(samples["mismatch"]), "reconcile_stock")
+    if counts["opening"]:
+        # Un ajustement date d'aujourd'hui fausserait le stock a date: pas de reparation
+        yield Finding("stock:opening", "stock", "info",
+                      "Stock d'ouverture non trace (produits anterieurs)", "products",
+                      counts["opening"], "\n".join(samples["opening"]))
+    if counts["negative"]:
+        yield Finding("stock:negative", "stock", "warning", "Produits en stock negatif",
+                      "products", counts["negative"], "\n".join(samples["negative"]))
+
+
+CHECKS = (_quick_check, _foreign_key_check, _orphans, _stock)
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Execution et enregistrement
+# ══════════════════════════════════════════════════════════════════
+
+def run_checks(db_path, *, origin="manual", progress=None, cancelled=None,
+               pause=None) -> CheckReport:
+    """
+    Passe complet des controles. `progress(etapes)` apres chaque etape;
+    `cancelled()` interrompt le passage (rien n'est enregistre hormis le run).
+    """
+    pause = STEP_PAUSE if pause is None else pause
+    started = time.perf_counter()
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute("INSERT INTO integrity_runs (origin, status, started_at) VALUES (?, 'running', ?)",
+                           (origin, _now()))
+        conn.commit()
+        report = CheckReport(run_id=cur.lastrowid)
+        try:
+            tables = _tables(conn)
+            for check in CHECKS:
+                for item in check(conn, tables):
+                    if item is not None:
+                        report.findings.append(item)
+                        continue
+                    report.checks += 1
+                    if progress:
+                        progress(report.checks)
+                    if cancelled and cancelled():
+                        report.status = "cancelled"
+                        break
+                    if pause:
+                        time.sleep(pause)
+                if report.status == "cancelled":
+                    break
+            else:
+                report.status = "done"
+                _store_findings(conn, report.run_id, report.findings)
+        except Exception as exc:
+            report.status = "error"
+            conn.rollback()
+            conn.execute("UPDATE integrity_runs SET error = ? WHERE id = ?", (str(exc), report.run_id))
+            raise
+        finally:
+            report.elapsed = time.perf_counter() - started
+            conn.execute(
+                "UPDATE integrity_runs SET status = ?, finished_at = ?, checks = ?, findings = ? WHERE id = ?",
+                (report.status, _now(), report.checks, len(report.findings), report.run_id))
+            conn.commit()
+    finally:
+        conn.close()
+    logger.info("Controle d'integrite %s (%s): %d etapes, %d anomalie(s) en %.2fs",
+                report.run_id, report.status, report.checks, len(report.findings), report.elapsed)
+    return report
+
+
+def _store_findings(conn, run_id, findings):
+    now = _now()
+    for f in findings:
+        conn.execute("""
+            INSERT INTO integrity_findings
+                (check_key, check_name, severity, table_name, affected, title, details, repair,
+                 status, first_seen_at, last_seen_at, last_run_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'open', ?, ?, ?)
+            ON CONFLICT(check_key) DO UPDATE SET
+                severity = excluded.severity, table_name = excluded.table_name,
+                affected = excluded.affected, title = excluded.title, details = excluded.details,
+                repair = excluded.repair, last_seen_at = excluded.last_seen_at,
+                last_run_id = excluded.last_run_id, resolved_at = NULL,
+                status = CASE WHEN status = 'ignored' THEN 'ignored' ELSE 'open' END,
+                first_seen_at = CASE WHEN status IN ('open', 'ignored') THEN first_seen_at
+                                     ELSE excluded.first_seen_at END
+        """, (f.key, f.check, f.severity, f.table, f.affected, f.title, f.details, f.repair,
+              now, now, run_id))
+    # Non retrouvees par ce passage complet: corrigees entre-temps
+    conn.execute("""
+        UPDATE integrity_findings SET status = 'resolved', resolved_at = ?
+        WHERE status IN ('open', 'ignored') AND COALESCE(last_run_id, 0) != ?
+    """, (now, run_id))
+
+
+def open_findings(db_path, include_ignored=True) -> list[dict]:
+    """Anomalies en cours, les plus graves d'abord."""
+    statuses = ("open", "ignored") if include_ignored else ("open",)
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(f"""
+            SELECT * FROM integrity_findings
+            WHERE status IN ({", ".join("?" * len(statuses))})
+            ORDER BY CASE severity WHEN 'error' THEN 0 WHEN 'warning' THEN 1 ELSE 2 END, id
+        """, statuses).fetchall()
+    finally:
+        conn.close()
+    return [dict(r) for r in rows]
+
+
+def summary(db_path) -> dict:
+    """Dernier passage termine et nombre d'anomalies ouvertes par gravite."""
+    conn = _connect(db_path)
+    try:
+        last = conn.execute("""
+            SELECT * FROM integrity_runs WHERE status = 'done'
+            ORDER BY finished_at DESC, id DESC LIMIT 1
+        """).fetchone()
+        counts = dict(conn.execute("""
+            SELECT severity, COUNT(*) FROM integrity_findings WHERE status = 'open' GROUP BY severity
+        """).fetchall())
+    finally:
+        conn.close()
+    return {"last_run": dict(last) if last else None,
+            **{s: counts.get(s, 0) for s in SEVERITIES}}
+
+
+def set_status(db_path, finding_id, status):
+    """Ignorer ('ignored') ou rouvrir ('open') une anomalie."""
+    conn = _connect(db_path)
+    try:
+        conn.execute("UPDATE integrity_findings SET status = ? WHERE id = ?", (status, finding_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Reparations (par lots, une transaction courte par lot)
+# ══════════════════════════════════════════════════════════════════
+
+def _batched(conn, statement, params=(), *, progress=None, cancelled=None, done=0) -> int:
+    """Repete `statement` (qui traite au plus REPAIR_BATCH lignes) jusqu'a epuisement."""
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        changed = conn.execute(statement, params).rowcount
+        conn.commit()
+        done += max(changed, 0)
+        if progress:
+            progress(done)
+        if changed < REPAIR_BATCH or (cancelled and cancelled()):
+            return done
+        time.sleep(STEP_PAUSE)
+
+
+def _repair_orphans(conn, rule, progress, cancelled) -> int:
+    targets = f"{_orphan_select(rule)} LIMIT {REPAIR_BATCH}"
+    if rule.repair == "delete":
+        sql = f"DELETE FROM {rule.child} WHERE id IN ({targets})"
+    else:
+        sql = f"UPDATE {rule.child} SET {rule.fk} = NULL WHERE id IN ({targets})"
+    return _batched(conn, sql, progress=progress, cancelled=cancelled)
+
+
+def _repair_stock(conn, progress, cancelled) -> int:
+    """
+    Mouvement 'adjustment' de la difference: la somme des mouvements rejoint
+    le stock. Seulement pour les produits ayant un mouvement 'initial'.
+    """
+    done, last_id = 0, 0
+    while True:
+        bound = conn.execute("SELECT MAX(id) FROM (SELECT id FROM products WHERE id > ? ORDER BY id LIMIT ?)",
+                             (last_id, REPAIR_BATCH)).fetchone()[0]
+        if bound is None:
+            return done
+        conn.execute("BEGIN IMMEDIATE")
+        done += conn.execute("""
+            INSERT INTO stock_movements (product_id, movement_type, quantity, notes)
+            SELECT p.id, 'adjustment', p.stock_quantity - COALESCE(SUM(m.quantity), 0), ?
+            FROM products p LEFT JOIN stock_movements m ON m.product_id = p.id
+            WHERE p.id > ? AND p.id <= ?
+            GROUP BY p.id
+            HAVING p.stock_quantity != COALESCE(SUM(m.quantity), 0)
+               AND COUNT(CASE WHEN m.movement_type = 'initial' THEN 1 END) > 0
+        """, (RECONCILE_NOTE, last_id, bound)).rowcount
+        conn.commit()
+        last_id = bound
+        if progress:
+            progress(done)
+        if cancelled and cancelled():
+            return done
+        time.sleep(STEP_PAUSE)
+
+
+def repair_finding(db_path, finding_id, *, actor=None, progress=None, cancelled=None) -> int:
+    """
+    Applique la reparation proposee pour une anomalie; retourne le nombre de
+    lignes traitees. L'anomalie passe en 'repaired' (un prochain passage la
+    rouvrira si elle subsiste) et l'action est tracee dans audit_log.
+    """
+    conn = _connect(db_path)
+    conn.isolation_level = None  # transactions explicites par lot
+    try:
+        row = conn.execute("SELECT * FROM integrity_findings WHERE id = ?", (finding_id,)).fetchone()
+        if row is None or not row["repair"]:
+            raise ValueError("Aucune reparation disponible pour cette anomalie")
+        key, action = row["check_key"], row["repair"]
+        if key.startswith("orphan:"):
+            count = _repair_orphans(conn, ORPHAN_RULES[key.split(":", 1)[1]], progress, cancelled)
+        elif action == "reconcile_stock":
+            count = _repair_stock(conn, progress, cancelled)
+        elif action == "reindex":
+            table = row["table_name"]
+            conn.execute(f"REINDEX {table}" if table else "REINDEX")
+            count = 1
+        else:
+            raise ValueError(f"Reparation inconnue: {action}")
+        finished = not (cancelled and cancelled())
+        conn.execute("BEGIN IMMEDIATE")
+        if finished:
+            conn.execute("UPDATE integrity_findings SET status = 'repaired', resolved_at = ? WHERE id = ?",
+                         (_now(), finding_id))
+        conn.execute("""
+            INSERT INTO audit_log (actor_id, actor_username, action, entity_type, entity_id, status, details)
+            VALUES (?, ?, 'integrity_repair', 'integrity_finding', ?, ?, ?)
+        """, ((actor or {}).get("id"), (actor or {}).get("username"), str(finding_id),
+              "success" if finished else "partial",
+              json.dumps({"check": key, "repair": action, "rows": count}, ensure_ascii=False)))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    logger.info("Reparation %s (%s): %d ligne(s)", key, action, count)
+    return count
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Planification
+# ══════════════════════════════════════════════════════════════════
+
+def is_due(db_path, interval_hours) -> bool:
+    last = summary(db_path)["last_run"]
+    if last is None or not last.get("finished_at"):
+        return True
+    finished = datetime.fromisoformat(last["finished_at"])
+    return datetime.now() - finished >= timedelta(hours=interval_hours)
+
+
+class IntegrityWorker(PeriodicWorker):
+    """
+    Lance un passage planifie quand le dernier passage termine date de plus
+    de `integrity_check_hours` (table settings, 24 par defaut).
+    """
+
+    thread_name = "integrity-check"
+    label = "Controle d'integrite planifie"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def interval_hours(self) -> float:
+        conn = _connect(self.db_path)
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE key = 'integrity_check_hours'").fetchone()
+        finally:
+            conn.close()
+        try:
+            return float(row["value"]) if row and row["value"] else DEFAULT_INTERVAL_HOURS
+        except ValueError:
+            return DEFAULT_INTERVAL_HOURS
+
+    def tick(self):
+        if is_due(self.db_path, self.interval_hours()):
+            run_checks(self.db_path, origin="schedule", cancelled=self.cancelled)
+
+
+start_integrity_worker = IntegrityWorker.start_once
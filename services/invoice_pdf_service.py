@@ -0,0 +1,282 @@
+"""Factures PDF: cache disque par empreinte et rendu par lot (reimpressions, envoi a la comptabilite)."""
+
+from __future__ import annotations
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import invoice_pdf
+
+# En dessous, le demarrage des processus coute plus que le rendu lui-meme
+MIN_PARALLEL_BATCH = 8
+# Factures envoyees a un processus par aller-retour
+CHUNK_SIZE = 8
+# A incrementer quand la mise en page d'invoice_pdf change (invalide le cache)
+INVOICE_LAYOUT_VERSION = 1
+
+
+@dataclass
+class BatchResult:
+    """Resultat d'un rendu par lot: sale_id -> chemin (ou bytes si rendu en memoire)."""
+
+    outputs: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    elapsed: float = 0.0
+    workers: int = 1
+    cancelled: bool = False
+
+    @property
+    def invoices_per_second(self) -> float:
+        return len(self.outputs) / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def invoice_filename(invoice_number) -> str:
+    safe = re.sub(r"[^\w.-]+", "_", str(invoice_number or "")).strip("_") or "sans_numero"
+    return f"facture_{safe}.pdf"
+
+
+def invoice_data_from_sale(sale: dict, company: dict) -> dict:
+    """Donnees attendues par InvoicePDF.generate a partir d'une vente (get_sale_by_id)."""
+    items = []
+    for item in sale.get("items", []):
+        try:
+            qty = int(item.get("quantity", 0) or 0)
+            price = float(item.get("unit_price", 0) or 0)
+            discount = float(item.get("discount", 0) or 0)
+            total = float(item.get("total", 0) or 0)
+            product = str(item.get("product_name") or "N/A")
+            ref = str(item.get("product_reference") or "")
+        except (TypeError, ValueError):
+            qty, price, discount, total = 0, 0.0, 0.0, 0.0
+            product, ref = "N/A", ""
+        items.append({
+            "product": product, "reference": ref,
+            "quantity": qty, "price": price,
+            "discount": discount, "total": total,
+        })
+    try:
+        sale_date = datetime.fromisoformat(sale["sale_date"]).strftime("%d/%m/%Y")
+    except (KeyError, TypeError, ValueError):
+        sale_date = str(sale.get("sale_date", ""))
+    return {
+        "invoice_number": sale.get("invoice_number", ""),
+        "date": sale_date,
+        "company": dict(company),
+        "customer": {
+            "name": sale.get("client_name") or "Client Anonyme",
+            "address": sale.get("client_address", ""),
+            "phone": sale.get("client_phone", ""),
+        },
+        "items": items,
+        "subtotal": float(sale.get("subtotal", 0) or 0),
+        "tax": float(sale.get("tax_amount", 0) or 0),
+        "tax_rate": float(sale.get("tax_rate", 0) or 0),
+        "total": float(sale.get("total", 0) or 0),
+    }
+
+
+def invoice_digest(invoice_data: dict) -> str:
+    """
+    Empreinte du contenu de la facture: vente, lignes et coordonnees societe
+    (tout ce qui est imprime), plus la version de la mise en page.
+    """
+    payload = json.dumps([INVOICE_LAYOUT_VERSION, invoice_data], sort_keys=True,
+                         default=str, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class InvoicePdfCache:
+    """
+    PDF de factures sur disque, nommes <sale_id>_<empreinte>.pdf.
+
+    Un PDF n'est regenere que si l'empreinte change; l'ancienne version de la
+    meme vente est alors supprimee. Au-dela de `max_files`, les fichiers les
+    moins recemment servis sont supprimes.
+    """
+
+    def __init__(self, directory: str, max_files: int = 2000):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sale_id: int, digest: str) -> str:
+        return os.path.join(self.directory, f"{int(sale_id)}_{digest}.pdf")
+
+    def get_or_render(self, sale_id: int, invoice_data: dict) -> tuple[str, str]:
+        """Retourne (chemin, empreinte), en generant le PDF seulement si absent."""
+        digest = invoice_digest(invoice_data)
+        path = self.path(sale_id, digest)
+        if os.path.exists(path):
+            os.utime(path)
+            return path, digest
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            invoice_pdf.create_invoice_pdf(invoice_data, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._drop_stale(sale_id, keep=path)
+        self._prune()
+        return path, digest
+
+    def _drop_stale(self, sale_id: int, keep: str):
+        for old in glob.glob(os.path.join(self.directory, f"{int(sale_id)}_*.pdf")):
+            if old != keep:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    def _prune(self):
+        files = glob.glob(os.path.join(self.directory, "*.pdf"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda f: os.stat(f).st_mtime)
+        for old in files[:len(files) - self.max_files]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def _render_job(job):
+    """Rendu d'une facture (dans un processus du pool): (sale_id, donnees, chemin|None)."""
+    sale_id, data, path = job
+    try:
+        if path:
+            return sale_id, invoice_pdf.create_invoice_pdf(data, path), None
+        return sale_id, invoice_pdf.render_invoice_bytes(data), None
+    except Exception as exc:
+        return sale_id, None, str(exc)
+
+
+class InvoicePdfService:
+    """Prepare les donnees de facture (thread UI / base) et les rend en parallele."""
+
+    def __init__(self, db, repository=None, cache: InvoicePdfCache | None = None):
+        if repository is None:
+            from repositories.sale_repository import SaleRepository
+            repository = SaleRepository(db)
+        self.db = db
+        self.repository = repository
+        self._cache = cache
+
+    @property
+    def cache(self) -> InvoicePdfCache:
+        if self._cache is None:
+            from config import config
+            self._cache = InvoicePdfCache(config.invoice_cache_dir, config.invoice_cache_max_files)
+        return self._cache
+
+    def company_info(self) -> dict:
+        return {
+            "name": self.db.get_setting("company_name", "Ma Société"),
+            "address": self.db.get_setting("company_address", ""),
+            "phone": self.db.get_setting("company_phone", ""),
+            "email": self.db.get_setting("company_email", ""),
+            "nif": self.db.get_setting("vat_number", ""),
+        }
+
+    def invoice_data(self, sale: dict) -> dict:
+        return invoice_data_from_sale(sale, self.company_info())
+
+    def load_invoices(self, sale_ids) -> list[tuple[int, dict]]:
+        """Lit les ventes (acces base: a appeler depuis le thread de la connexion)."""
+        company = self.company_info()
+        return [(sale["id"], invoice_data_from_sale(sale, company))
+                for sale in self.repository.get_invoice_sales(sale_ids)]
+
+    def cached_pdf(self, sale_id: int) -> tuple[str, str] | None:
+        """(chemin, empreinte) du PDF de la facture, depuis le cache si a jour; None si vente inconnue."""
+        sales = self.repository.get_invoice_sales([sale_id])
+        if not sales:
+            return None
+        return self.cached_pdf_for_sale(sales[0])
+
+    def cached_pdf_for_sale(self, sale: dict) -> tuple[str, str]:
+        return self.cache.get_or_render(sale["id"], self.invoice_data(sale))
+
+    def render_sales(self, sale_ids, out_dir: str | None = None, **kwargs) -> BatchResult:
+        return render_batch(self.load_invoices(sale_ids), out_dir, **kwargs)
+
+
+def render_batch(invoices, out_dir: str | None = None, *, max_workers: int | None = None,
+                 progress=None, cancelled=None) -> BatchResult:
+    """
+    Rend `invoices` [(sale_id, invoice_data)] dans `out_dir`, ou en memoire (bytes)
+    si `out_dir` est None. Les processus (spawn) prechargent styles et bloc
+    societe une seule fois; le debit est reporte en factures par seconde.
+    """
+    invoices = list(invoices)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    jobs = [(sale_id, data, os.path.join(out_dir, invoice_filename(data.get("invoice_number"))) if out_dir else None)
+            for sale_id, data in invoices]
+
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if len(jobs) < MIN_PARALLEL_BATCH:
+        workers = 1
+    result = BatchResult(workers=max(workers, 1))
+    company = jobs[0][1].get("company") if jobs else None
+    started = time.perf_counter()
+
+    def collect(results):
+        for n, (sale_id, output, error) in enumerate(results, 1):
+            if error is None:
+                result.outputs[sale_id] = output
+            else:
+                result.errors[sale_id] = error
+            if progress:
+                progress(n)
+            if cancelled and cancelled():
+                result.cancelled = True
+                return
+
+    if workers <= 1:
+        invoice_pdf.warm_cache(company)
+        collect(map(_render_job, jobs))
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=invoice_pdf.warm_cache,
+            initargs=(company,),
+        )
+        try:
+            collect(pool.map(_render_job, jobs, chunksize=CHUNK_SIZE))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+if __name__ == "__main__":
+    # Mesure du debit: python -m services.invoice_pdf_service [nb_factures] [processus]
+    import sys
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    company = {"name": "DAR ELSSALEM SARL", "address": "123 Rue Example, Alger 16000",
+               "phone": "023 45 67 89", "nif": "123456789012345"}
+    sample = {
+        "id": 0, "invoice_number": "FAC-BENCH", "sale_date": "2026-01-31T10:00:00",
+        "client_name": "CLIENT TEST", "subtotal": 1000, "tax_amount": 190, "tax_rate": 19, "total": 1190,
+        "items": [{"product_name": f"Article {i}", "product_reference": str(1000 + i), "quantity": 2,
+                   "unit_price": 50, "discount": 0, "total": 100} for i in range(10)],
+    }
+    batch = [(i, {**invoice_data_from_sale(sample, company), "invoice_number": f"FAC-{i:05d}"})
+             for i in range(count)]
+    for n in sorted({1, int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)}):
+        res = render_batch(batch, max_workers=n)
+        print(f"{n} processus: {len(res.outputs)} factures en {res.elapsed:.2f}s "
+              f"({res.invoices_per_second:.1f} factures/s)")
@@ -0,0 +1,475 @@
+"""
+File d'envoi des emails persistee en base (table mail_queue).
+
+Les messages sont mis en file depuis l'interface (retour immediat) puis
+delivres par lot hors du thread UI: une seule session SMTP authentifiee par
+lot, nouvelles tentatives espacees exponentiellement et statut consultable
+par lot (ex: les 300 releves mensuels forment un seul lot).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import smtplib
+import sqlite3
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from services.periodic_worker import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+# Au-dela, le message passe en echec definitif
+MAX_ATTEMPTS = 5
+# Delai avant la 2e tentative, double a chaque echec (plafonne)
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+# Messages reserves par aller-retour en base
+CLAIM_SIZE = 50
+# Intervalle de scrutation du worker quand personne ne le reveille
+POLL_SECONDS = 30
+
+STATUSES = ("pending", "sending", "sent", "failed")
+
+
+def _now() -> datetime:
+    return datetime.now().replace(microsecond=0)
+
+
+def _ts(moment: datetime) -> str:
+    return moment.isoformat(sep=" ")
+
+
+def retry_delay(attempts: int) -> int:
+    """Delai (secondes) avant la tentative suivant la `attempts`-ieme."""
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+@dataclass
+class SmtpSettings:
+    """Parametres SMTP (cles email_* de la table settings)."""
+
+    server: str
+    port: int = 587
+    sender: str = ""
+    password: str = ""
+    use_tls: bool = True
+    timeout: float = 30.0
+
+    @classmethod
+    def from_settings(cls, get) -> "SmtpSettings":
+        """`get(cle, defaut)`: Database.get_setting ou MailQueue.get_setting."""
+        try:
+            port = int(get("email_smtp_port", 587) or 587)
+        except (TypeError, ValueError):
+            port = 587
+        return cls(
+            server=get("email_smtp_server", "smtp.gmail.com") or "smtp.gmail.com",
+            port=port,
+            sender=get("email_sender", "") or "",
+            password=get("email_password", "") or "",
+        )
+
+
+@dataclass
+class DeliveryReport:
+    """Bilan d'un passage de l'expediteur."""
+
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    sessions: int = 0
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.retried + self.failed
+
+
+class MailQueue:
+    """
+    Acces a la table mail_queue par connexions courtes: utilisable depuis
+    n'importe quel thread (l'expediteur tourne hors du thread UI).
+
+    Les pieces jointes sont copiees dans `spool_dir` a la mise en file (le
+    fichier d'origine peut etre temporaire ou purge du cache) et supprimees
+    une fois le message envoye ou en echec definitif.
+    """
+
+    def __init__(self, db_path: str, spool_dir: str | None = None):
+        self.db_path = db_path
+        self.spool_dir = spool_dir or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), "mail_spool")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get_setting(self, key, default=None):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return row["value"] if row else default
+
+    # ---------- mise en file ----------
+
+    def _spool(self, path: str, name: str | None) -> tuple[str, str]:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Piece jointe introuvable: {path}")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        name = name or os.path.basename(path)
+        spooled = os.path.join(self.spool_dir, f"{uuid.uuid4().hex}_{os.path.basename(name)}")
+        shutil.copyfile(path, spooled)
+        return spooled, name
+
+    def enqueue_many(self, messages, batch_id: str | None = None) -> str:
+        """
+        Met en file des messages (dicts: recipients, subject, body, et
+        optionnellement subtype 'plain'/'html', attachment_path, attachment_name)
+        dans un meme lot; retourne l'identifiant du lot.
+        """
+        batch_id = batch_id or uuid.uuid4().hex
+        now = _ts(_now())
+        rows, spooled = [], []
+        try:
+            for msg in messages:
+                recipients = msg["recipients"]
+                if not isinstance(recipients, str):
+                    recipients = ", ".join(recipients)
+                path, name = None, None
+                if msg.get("attachment_path"):
+                    path, name = self._spool(msg["attachment_path"], msg.get("attachment_name"))
+                    spooled.append(path)
+                rows.append((batch_id, recipients, msg["subject"], msg.get("body", ""),
+                             msg.get("subtype", "plain"), path, name, now, now))
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("""
+                        INSERT INTO mail_queue(batch_id, recipients, subject, body, body_subtype,
+                                               attachment_path, attachment_name,
+                                               next_attempt_at, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, rows)
+            finally:
+                conn.close()
+        except Exception:
+            for path in spooled:
+                _remove(path)
+            raise
+        return batch_id
+
+    def enqueue(self, recipients, subject: str, body: str = "", **kwargs) -> str:
+        """Met un message en file (lot d'un seul message); retourne le lot."""
+        batch_id = kwargs.pop("batch_id", None)
+        return self.enqueue_many([dict(recipients=recipients, subject=subject, body=body, **kwargs)],
+                                 batch_id=batch_id)
+
+    # ---------- expedition ----------
+
+    def claim_due(self, limit: int | None = None, batch_id: str | None = None) -> list[dict]:
+        """Reserve (status 'sending') les messages dont l'echeance est passee."""
+        sql = "SELECT * FROM mail_queue WHERE status = 'pending' AND next_attempt_at <= ?"
+        params = [_ts(_now())]
+        if batch_id is not None:
+            sql += " AND batch_id = ?"
+            params.append(batch_id)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit or CLAIM_SIZE)
+
+        conn = self._connect()
+        try:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [dict(r) for r in conn.execute(sql, params)]
+                conn.executemany("UPDATE mail_queue SET status = 'sending' WHERE id = ?",
+                                 [(r["id"],) for r in rows])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return rows
+
+    def mark_sent(self, message: dict):
+        self._update("UPDATE mail_queue SET status = 'sent', attempts = attempts + 1, "
+                     "sent_at = ?, last_error = NULL WHERE id = ?",
+                     (_ts(_now()), message["id"]))
+        _remove(message.get("attachment_path"))
+
+    def mark_failed(self, message: dict, error: str, permanent: bool = False) -> bool:
+        """
+        Enregistre un echec; le message est replanifie avec un delai croissant
+        sauf erreur definitive ou tentatives epuisees. Retourne True s'il sera retente.
+        """
+        attempts = int(message.get("attempts") or 0) + 1
+        if permanent or attempts >= MAX_ATTEMPTS:
+            self._update("UPDATE mail_queue SET status = 'failed', attempts = ?, last_error = ? "
+                         "WHERE id = ?", (attempts, error, message["id"]))
+            _remove(message.get("attachment_path"))
+            return False
+        retry_at = _now() + timedelta(seconds=retry_delay(attempts))
+        self._update("UPDATE mail_queue SET status = 'pending', attempts = ?, last_error = ?, "
+                     "next_attempt_at = ? WHERE id = ?",
+                     (attempts, error, _ts(retry_at), message["id"]))
+        return True
+
+    def release_stale(self) -> int:
+        """Remet en attente les messages restes 'sending' (application interrompue)."""
+        return self._update("UPDATE mail_queue SET status = 'pending' WHERE status = 'sending'")
+
+    def release(self, messages) -> int:
+        """Rend a la file des messages reserves mais non traites (envoi annule)."""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.executemany(
+                    "UPDATE mail_queue SET status = 'pending' WHERE id = ? AND status = 'sending'",
+                    [(m["id"],) for m in messages]).rowcount
+        finally:
+            conn.close()
+
+    def cancel(self, batch_id: str) -> int:
+        """Abandonne les messages non encore envoyes d'un lot."""
+        conn = self._connect()
+        try:
+            with conn:
+                rows = conn.execute("SELECT attachment_path FROM mail_queue WHERE batch_id = ? "
+                                    "AND status = 'pending'", (batch_id,)).fetchall()
+                n = conn.execute("UPDATE mail_queue SET status = 'failed', last_error = "
+                                 "COALESCE(last_error, 'Annule') WHERE batch_id = ? "
+                                 "AND status = 'pending'", (batch_id,)).rowcount
+        finally:
+            conn.close()
+        for row in rows:
+            _remove(row["attachment_path"])
+        return n
+
+    def _update(self, sql, params=()) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    # ---------- statut ----------
+
+    def batch_status(self, batch_id: str | None = None) -> dict:
+        """Nombre de messages par statut (d'un lot, ou de toute la file) et total."""
+        sql = "SELECT status, COUNT(*) AS n FROM mail_queue"
+        params = ()
+        if batch_id is not None:
+            sql += " WHERE batch_id = ?"
+            params = (batch_id,)
+        conn = self._connect()
+        try:
+            counts = {r["status"]: r["n"] for r in conn.execute(sql + " GROUP BY status", params)}
+        finally:
+            conn.close()
+        status = {s: counts.get(s, 0) for s in STATUSES}
+        status["total"] = sum(counts.values())
+        return status
+
+    def messages(self, batch_id: str) -> list[dict]:
+        conn = self._connect()
+        try:
+            return [dict(r) for r in conn.execute(
+                "SELECT id, recipients, subject, status, attempts, next_attempt_at, "
+                "last_error, sent_at FROM mail_queue WHERE batch_id = ? ORDER BY id",
+                (batch_id,))]
+        finally:
+            conn.close()
+
+
+def _remove(path):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def split_recipients(recipients: str) -> list[str]:
+    return [r.strip() for r in recipients.replace(";", ",").split(",") if r.strip()]
+
+
+def build_message(row: dict, sender: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = ", ".join(split_recipients(row["recipients"]))
+    msg["Subject"] = row["subject"]
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid()
+    msg.set_content(row["body"] or "", subtype=row.get("body_subtype") or "plain")
+    if row.get("attachment_path"):
+        with open(row["attachment_path"], "rb") as f:
+            data = f.read()
+        name = row.get("attachment_name") or os.path.basename(row["attachment_path"])
+        maintype, subtype = ("application", "pdf") if name.lower().endswith(".pdf") \
+            else ("application", "octet-stream")
+        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=name)
+    return msg
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """Refus 5xx du serveur (adresse invalide, message rejete): inutile de retenter."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+class _Session:
+    """Session SMTP ouverte a la demande et reutilisee pour tout le lot."""
+
+    def __init__(self, settings: SmtpSettings, smtp_factory, report: DeliveryReport):
+        self.settings = settings
+        self.smtp_factory = smtp_factory
+        self.report = report
+        self.smtp = None
+
+    def get(self):
+        if self.smtp is None:
+            s = self.settings
+            smtp = self.smtp_factory(s.server, s.port, timeout=s.timeout)
+            try:
+                smtp.ehlo()
+                if s.use_tls:
+                    # Sans STARTTLS, le mot de passe circulerait en clair: refus
+                    smtp.starttls()
+                    smtp.ehlo()
+                if s.password:
+                    smtp.login(s.sender, s.password)
+            except Exception:
+                self._close(smtp)
+                raise
+            self.smtp = smtp
+            self.report.sessions += 1
+        return self.smtp
+
+    def drop(self):
+        if self.smtp is not None:
+            self._close(self.smtp)
+            self.smtp = None
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+
+def deliver_due(queue: MailQueue, settings: SmtpSettings, *, batch_id: str | None = None,
+                smtp_factory=smtplib.SMTP, progress=None, cancelled=None) -> DeliveryReport:
+    """
+    Envoie les messages echus (d'un lot, ou de toute la file) sur une seule
+    session SMTP, rouverte seulement si le serveur la coupe. Chaque message
+    est marque envoye, replanifie ou en echec au fil de l'eau.
+    """
+    report = DeliveryReport()
+    session = _Session(settings, smtp_factory, report)
+    try:
+        while not (cancelled and cancelled()):
+            rows = queue.claim_due(batch_id=batch_id)
+            if not rows:
+                break
+            for n, row in enumerate(rows):
+                if cancelled and cancelled():
+                    queue.release(rows[n:])
+                    return report
+                try:
+                    msg = build_message(row, settings.sender)
+                except Exception as exc:
+                    # Piece jointe disparue ou message invalide: definitif
+                    _record_failure(queue, report, row, exc, permanent=True)
+                    continue
+                try:
+                    smtp = session.get()
+                except Exception as exc:
+                    # Connexion ou authentification impossible: le reste est replanifie
+                    for pending in rows[n:]:
+                        _record_failure(queue, report, pending, exc, permanent=False)
+                    return report
+                try:
+                    smtp.send_message(msg, from_addr=settings.sender,
+                                      to_addrs=split_recipients(row["recipients"]))
+                except Exception as exc:
+                    if not isinstance(exc, (smtplib.SMTPResponseException,
+                                            smtplib.SMTPRecipientsRefused)):
+                        # Coupure reseau: nouvelle session pour le message suivant
+                        session.drop()
+                    _record_failure(queue, report, row, exc)
+                    continue
+                queue.mark_sent(row)
+                report.sent += 1
+                if progress:
+                    progress(report.processed)
+    finally:
+        session.drop()
+    return report
+
+
+def _record_failure(queue, report, row, exc, permanent=None):
+    if permanent is None:
+        permanent = _is_permanent(exc)
+    error = f"{type(exc).__name__}: {exc}"
+    if queue.mark_failed(row, error, permanent=permanent):
+        report.retried += 1
+    else:
+        report.failed += 1
+    logger.warning("Email %s vers %s non envoye: %s", row["id"], row["recipients"], error)
+
+
+class MailWorker(PeriodicWorker):
+    """
+    Expediteur en arriere-plan: vide la file a chaque reveil (`wake()` apres
+    une mise en file) ou toutes les POLL_SECONDS pour les nouvelles tentatives.
+    Les parametres SMTP sont relus a chaque passage.
+    """
+
+    thread_name = "mail-queue"
+    label = "File d'envoi email"
+
+    def __init__(self, queue: MailQueue, smtp_factory=smtplib.SMTP, poll_seconds: float = POLL_SECONDS):
+        super().__init__(queue.db_path, poll_seconds=poll_seconds, startup_delay=0)
+        self.queue = queue
+        self.smtp_factory = smtp_factory
+
+    @classmethod
+    def from_db(cls, db) -> "MailWorker":
+        return cls(get_mail_queue(db))
+
+    def setup(self):
+        self.queue.release_stale()
+
+    def tick(self):
+        settings = SmtpSettings.from_settings(self.queue.get_setting)
+        deliver_due(self.queue, settings, smtp_factory=self.smtp_factory,
+                    cancelled=self.cancelled)
+
+
+def get_mail_queue(db=None) -> MailQueue:
+    if db is None:
+        from db_manager import get_database
+        db = get_database()
+    return MailQueue(db.db_path)
+
+
+start_mail_worker = MailWorker.start_once
+# Signale de nouveaux messages a l'expediteur s'il tourne (sans le demarrer)
+wake_mail_worker = MailWorker.wake_running
@@ -0,0 +1,111 @@
+"""
+Travaux periodiques en arriere-plan (file d'envoi email, controle
+d'integrite, instantanes de stock, previsions, affinites, ABC, segments RFM).
+
+PeriodicWorker porte ce qui est commun a tous: thread demon, attente de
+demarrage, passage toutes les `poll_seconds`, `wake()` pour avancer le
+prochain passage, `stop()`, et une seule instance vivante par classe
+(start_once, wake_or_start). Chaque service ne fournit que `tick()` et ses
+delais.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Classe de travail -> instance demarree (une seule vivante par classe)
+_running: dict[type, "PeriodicWorker"] = {}
+_running_lock = threading.Lock()
+
+
+class PeriodicWorker(threading.Thread):
+    """
+    Appelle `tick()` apres `startup_delay` secondes, puis toutes les
+    `poll_seconds` ou des un `wake()`. Une erreur de passage est journalisee
+    et n'arrete pas le travail.
+    """
+
+    thread_name = "periodic-worker"
+    label = "Travail planifie"          # prefixe des avertissements
+    poll_seconds: float = 3600
+    startup_delay: float = 0
+
+    def __init__(self, db_path, poll_seconds=None, startup_delay=None):
+        super().__init__(name=self.thread_name, daemon=True)
+        self.db_path = db_path
+        if poll_seconds is not None:
+            self.poll_seconds = poll_seconds
+        if startup_delay is not None:
+            self.startup_delay = startup_delay
+        self._wake = threading.Event()
+        self._stopping = threading.Event()  # pas _stop: methode interne de Thread
+
+    @classmethod
+    def from_db(cls, db) -> "PeriodicWorker":
+        """Instance pour la base `db` (Database), utilisee par start_once."""
+        return cls(db.db_path)
+
+    def setup(self):
+        """Appele une fois dans le thread, avant l'attente de demarrage."""
+
+    def tick(self):
+        """Un passage du travail."""
+        raise NotImplementedError
+
+    def cancelled(self) -> bool:
+        """Arret demande (a passer aux traitements longs comme `cancelled`)."""
+        return self._stopping.is_set()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        try:
+            self.setup()
+        except Exception as exc:
+            logger.warning("%s (demarrage): %s", self.label, exc)
+        self._wake.wait(self.startup_delay)
+        while not self._stopping.is_set():
+            self._wake.clear()
+            try:
+                self.tick()
+            except Exception as exc:
+                logger.warning("%s: %s", self.label, exc)
+            self._wake.wait(self.poll_seconds)
+
+    @classmethod
+    def start_once(cls, db=None) -> "PeriodicWorker":
+        """Demarre le travail s'il ne tourne pas deja; retourne l'instance vivante."""
+        if db is None:
+            from db_manager import get_database
+            db = get_database()
+        with _running_lock:
+            worker = _running.get(cls)
+            if worker is None or not worker.is_alive():
+                worker = _running[cls] = cls.from_db(db)
+                worker.start()
+            return worker
+
+    @classmethod
+    def wake_or_start(cls, db=None) -> "PeriodicWorker":
+        """Passage au plus tot: reveille le travail, le demarre s'il ne tourne pas."""
+        worker = cls.start_once(db)
+        worker.wake()
+        return worker
+
+    @classmethod
+    def wake_running(cls) -> bool:
+        """Reveille le travail s'il tourne (sans le demarrer)."""
+        with _running_lock:
+            worker = _running.get(cls)
+        if worker is None or not worker.is_alive():
+            return False
+        worker.wake()
+        return True
@@ -0,0 +1,216 @@
+"""
+Affinites produits (analyse des paniers) pour les suggestions a la caisse.
+
+Chaque vente est un panier. On compte, en une lecture de sale_items triee
+par vente, le nombre de paniers contenant chaque produit et chaque paire
+de produits (matrice creuse en dict de compteurs). Les compteurs sont
+gardes en base (product_basket_counts, product_pair_counts): la mise a jour
+quotidienne ne lit que les ventes posterieures a la precedente.
+
+Pour un produit p et un voisin q:
+  confiance = paniers(p et q) / paniers(p)      (P(q | p))
+  lift      = confiance / (paniers(q) / paniers)  (> 1: achetes ensemble
+                                                    plus que par hasard)
+Les TOP_K voisins de lift > 1, tries par confiance puis nombre de paniers
+communs, sont ranges dans product_affinity; la caisse n'y fait qu'une
+lecture par cle primaire.
+
+Seuls les produits presents dans les nouveaux paniers sont reclasses: le
+classement des autres ne depend que de leurs propres compteurs, inchanges;
+seul leur lift (qui depend du nombre total de paniers) derive un peu
+jusqu'a la reconstruction complete (tous les REBUILD_DAYS jours, qui
+reprend aussi les ventes supprimees ou modifiees).
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import sqlite3
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from services.periodic_worker import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 10
+# Paires vues dans moins de paniers: bruit
+MIN_TOGETHER = 2
+# Au-dela, un panier (commande de gros, inventaire) ne compte pas pour les paires
+MAX_BASKET_ITEMS = 50
+REBUILD_DAYS = 30
+STARTUP_DELAY_SECONDS = 240
+POLL_SECONDS = 3600
+REFRESH_HOURS = 24
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _baskets(conn, after_sale_id, upto_sale_id):
+    """Produits distincts de chaque vente d'id dans ]after, upto]."""
+    rows = conn.execute("""
+        SELECT sale_id, product_id FROM sale_items
+        WHERE sale_id > ? AND sale_id <= ? AND product_id IS NOT NULL
+        ORDER BY sale_id
+    """, (after_sale_id, upto_sale_id))
+    for _, lines in groupby(rows, key=itemgetter(0)):
+        yield {line[1] for line in lines}
+
+
+def count_baskets(baskets):
+    """(nombre de paniers, Counter produit, Counter (a, b) avec a < b)."""
+    total = 0
+    singles: Counter = Counter()
+    pairs: Counter = Counter()
+    for items in baskets:
+        total += 1
+        singles.update(items)
+        if len(items) <= MAX_BASKET_ITEMS:
+            pairs.update(combinations(sorted(items), 2))
+    return total, singles, pairs
+
+
+def _top_neighbours(rows, counts, baskets):
+    """rows: (p, q, together) orientes; retourne les lignes de product_affinity."""
+    candidates = defaultdict(list)
+    for p, q, together in rows:
+        confidence = together / counts[p]
+        lift = together * baskets / (counts[p] * counts[q])
+        if lift > 1:
+            candidates[p].append((confidence, together, -q, lift))
+    for p, items in candidates.items():
+        best = heapq.nlargest(TOP_K, items)
+        for rank, (confidence, together, q, lift) in enumerate(best, 1):
+            yield p, -q, together, confidence, lift, rank
+
+
+def _state(conn):
+    return conn.execute("SELECT last_sale_id, baskets, rebuilt_at FROM product_affinity_state "
+                        "WHERE id = 1").fetchone()
+
+
+def update_index(db_path, rebuild=False) -> int:
+    """
+    Integre les ventes posterieures a la derniere mise a jour (tout
+    l'historique si `rebuild` ou si la derniere reconstruction a plus de
+    REBUILD_DAYS jours). Retourne le nombre de paniers lus.
+    """
+    conn = _connect(db_path)
+    try:
+        now = datetime.now().replace(microsecond=0)
+        state = _state(conn)
+        if state is None or state["rebuilt_at"] is None or \
+                now - datetime.fromisoformat(state["rebuilt_at"]) >= timedelta(days=REBUILD_DAYS):
+            rebuild = True
+        after, total = (0, 0) if rebuild else (state["last_sale_id"], state["baskets"])
+        upto = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sales").fetchone()[0]
+        new, singles, pairs = count_baskets(_baskets(conn, after, upto))
+        total += new
+
+        conn.execute("BEGIN IMMEDIATE")
+        if rebuild:
+            for table in ("product_affinity", "product_pair_counts", "product_basket_counts"):
+                conn.execute(f"DELETE FROM {table}")
+        conn.executemany("""
+            INSERT INTO product_basket_counts (product_id, baskets) VALUES (?, ?)
+            ON CONFLICT(product_id) DO UPDATE SET baskets = baskets + excluded.baskets
+        """, singles.items())
+        conn.executemany("""
+            INSERT INTO product_pair_counts (product_a, product_b, together) VALUES (?, ?, ?)
+            ON CONFLICT(product_a, product_b) DO UPDATE SET together = together + excluded.together
+        """, ((a, b, n) for (a, b), n in pairs.items()))
+
+        counts = dict(conn.execute("SELECT product_id, baskets FROM product_basket_counts"))
+        if rebuild:
+            stored = conn.execute("SELECT product_a, product_b, together FROM product_pair_counts "
+                                  "WHERE together >= ?", (MIN_TOGETHER,)).fetchall()
+            rows = [(a, b, n) for a, b, n in stored] + [(b, a, n) for a, b, n in stored]
+        else:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS affinity_touched (product_id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.affinity_touched")
+            conn.executemany("INSERT INTO temp.affinity_touched VALUES (?)", ((p,) for p in singles))
+            rows = conn.execute("""
+                SELECT product_a, product_b, together FROM product_pair_counts
+                WHERE together >= ? AND product_a IN (SELECT product_id FROM temp.affinity_touched)
+                UNION ALL
+                SELECT product_b, product_a, together FROM product_pair_counts
+                WHERE together >= ? AND product_b IN (SELECT product_id FROM temp.affinity_touched)
+            """, (MIN_TOGETHER, MIN_TOGETHER)).fetchall()
+            conn.execute("DELETE FROM product_affinity "
+                         "WHERE product_id IN (SELECT product_id FROM temp.affinity_touched)")
+        conn.executemany("""
+            INSERT INTO product_affinity (product_id, related_id, together, confidence, lift, rank)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, _top_neighbours(rows, counts, total))
+
+        stamp = now.isoformat(sep=" ")
+        conn.execute("""
+            INSERT INTO product_affinity_state (id, last_sale_id, baskets, rebuilt_at, updated_at)
+            VALUES (1, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET last_sale_id = excluded.last_sale_id, baskets = excluded.baskets,
+                rebuilt_at = COALESCE(?, rebuilt_at), updated_at = excluded.updated_at
+        """, (upto, total, stamp, stamp, stamp if rebuild else None))
+        conn.commit()
+        logger.info("Affinites produits: %d panier(s)%s", new, " (reconstruction)" if rebuild else "")
+        return new
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def suggestions(conn, product_ids, limit=3) -> list[dict]:
+    """
+    Produits en stock le plus souvent achetes avec ceux de `product_ids`
+    (hors ceux-ci), meilleure confiance d'abord.
+    """
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return []
+    marks = ",".join("?" * len(ids))
+    cur = conn.execute(f"""
+        SELECT a.related_id AS id, p.name, p.selling_price, p.stock_quantity,
+               MAX(a.confidence) AS confidence, MAX(a.lift) AS lift
+        FROM product_affinity a
+        JOIN products p ON p.id = a.related_id
+        WHERE a.product_id IN ({marks}) AND a.related_id NOT IN ({marks})
+          AND p.stock_quantity > 0
+        GROUP BY a.related_id
+        ORDER BY confidence DESC, lift DESC
+        LIMIT ?
+    """, (*ids, *ids, int(limit)))
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def is_due(db_path, hours=REFRESH_HOURS) -> bool:
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT updated_at FROM product_affinity_state WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    return row is None or datetime.now() - datetime.fromisoformat(row[0]) >= timedelta(hours=hours)
+
+
+class AffinityWorker(PeriodicWorker):
+    """Mise a jour quotidienne de l'index d'affinites."""
+
+    thread_name = "product-affinity"
+    label = "Affinites produits planifiees"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def tick(self):
+        if is_due(self.db_path):
+            update_index(self.db_path)
+
+
+start_affinity_worker = AffinityWorker.start_once
@@ -8,9 +8,12 @@ class ProductService:
         self.repository = repository
         self.audit = audit_service
 
-    def list_products(self) -> list[dict]:
+    def list_products(self) -> list:
         return self.repository.list_products()
 
+    def page_products(self, after: tuple | None = None, limit: int = 50):
+        return self.repository.iter_page(after=after, limit=limit)
+
     def search_products(self, query: str) -> list[dict]:
         return self.repository.search_products((query or "").strip(), starts_with=True)
 
@@ -0,0 +1,296 @@
+"""
+Profilage des requetes SQL passees par `Database.cursor`.
+
+Quand le profilage est actif, `Database.cursor` est un ProfiledCursor
+(sous-classe de sqlite3.Cursor): chaque requete est chronometree de
+l'execute() jusqu'a l'epuisement du curseur (fetchall, dernier fetchone /
+fetchmany) ou jusqu'a la requete suivante, lignes lues comprises. Par
+requete (texte normalise: espaces compactes, listes de ? reduites), le
+profileur garde le nombre d'appels, le temps total et maximal, le nombre de
+lignes et un histogramme des latences (HISTOGRAM_MS).
+
+Une requete plus lente que `slow_ms` est journalisee avec son EXPLAIN QUERY
+PLAN et ajoutee au tampon circulaire des requetes lentes (les SLOW_LOG_SIZE
+dernieres).
+
+Desactive, `Database.cursor` est un curseur sqlite3 ordinaire: aucun cout.
+Les requetes passees directement par `db.conn` ne sont pas mesurees.
+
+Lecture d'un export JSON: python -m services.query_profiler export.json
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# Bornes superieures des classes de l'histogramme (ms); derniere classe: au-dela
+HISTOGRAM_MS = (1, 5, 10, 50, 100, 500, 1000)
+DEFAULT_SLOW_MS = 100.0
+SLOW_LOG_SIZE = 50
+
+_SPACES = re.compile(r"\s+")
+_PLACEHOLDERS = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+
+
+@lru_cache(maxsize=2048)
+def normalize(sql: str) -> str:
+    """Texte de regroupement d'une requete (IN (?, ?, ?) -> IN (?...))."""
+    return _PLACEHOLDERS.sub("(?...)", _SPACES.sub(" ", sql).strip())
+
+
+class StatementStats:
+    """Compteurs d'une requete normalisee."""
+
+    __slots__ = ("sql", "count", "total", "max", "rows", "histogram")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(HISTOGRAM_MS) + 1)
+
+    def add(self, elapsed_ms, rows):
+        self.count += 1
+        self.total += elapsed_ms
+        self.max = max(self.max, elapsed_ms)
+        self.rows += rows
+        for i, bound in enumerate(HISTOGRAM_MS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            i = len(HISTOGRAM_MS)
+        self.histogram[i] += 1
+
+    def percentile(self, q) -> float | None:
+        """Borne superieure (ms) de la classe contenant le quantile `q` (None: au-dela)."""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.histogram):
+            seen += n
+            if n and seen >= target:
+                return HISTOGRAM_MS[i] if i < len(HISTOGRAM_MS) else None
+        return None
+
+    def as_dict(self) -> dict:
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0,
+            "max_ms": round(self.max, 3),
+            "rows": self.rows,
+            "p95_ms": self.percentile(0.95),
+            "histogram": dict(zip([f"<={b}" for b in HISTOGRAM_MS] + [f">{HISTOGRAM_MS[-1]}"],
+                                  self.histogram)),
+        }
+
+
+class QueryProfiler:
+    """Statistiques par requete et tampon des requetes lentes (thread-safe)."""
+
+    def __init__(self, slow_ms=DEFAULT_SLOW_MS, slow_log_size=SLOW_LOG_SIZE):
+        self.enabled = False
+        self.slow_ms = float(slow_ms)
+        self.started_at = None
+        self._stats: dict[str, StatementStats] = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, slow_ms=None):
+        if slow_ms is not None:
+            self.slow_ms = float(slow_ms)
+        if enabled is not None:
+            if enabled and not self.enabled:
+                self.started_at = datetime.now().replace(microsecond=0).isoformat(sep=" ")
+            self.enabled = bool(enabled)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+        if self.enabled:
+            self.started_at = datetime.now().replace(microsecond=0).isoformat(sep=" ")
+
+    def record(self, conn, sql, params, elapsed_ms, rows):
+        """Comptabilise une execution; journalise et garde le plan si elle est lente."""
+        key = normalize(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+            stats.add(elapsed_ms, rows)
+        if elapsed_ms >= self.slow_ms:
+            plan = explain(conn, sql, params)
+            logger.warning("Requete lente (%.1f ms, %d ligne(s)): %s\n%s",
+                           elapsed_ms, rows, key, "\n".join(plan) or "(pas de plan)")
+            with self._lock:
+                self._slow.append({
+                    "at": datetime.now().replace(microsecond=0).isoformat(sep=" "),
+                    "sql": key,
+                    "elapsed_ms": round(elapsed_ms, 3),
+                    "rows": rows,
+                    "plan": plan,
+                })
+
+    def top(self, limit=20, key="total") -> list[dict]:
+        """Requetes les plus couteuses (`key`: total, max, count ou rows)."""
+        with self._lock:
+            stats = sorted(self._stats.values(), key=lambda s: getattr(s, key), reverse=True)[:limit]
+            return [s.as_dict() for s in stats]
+
+    def slow_queries(self) -> list[dict]:
+        """Requetes lentes du tampon, la plus recente d'abord."""
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def histogram(self) -> tuple[list[int], float]:
+        """(classes de HISTOGRAM_MS cumulees sur toutes les requetes, temps total en ms)."""
+        with self._lock:
+            counts = [sum(column) for column in zip(*(s.histogram for s in self._stats.values()))]
+            total = sum(s.total for s in self._stats.values())
+        return counts or [0] * (len(HISTOGRAM_MS) + 1), total
+
+    def snapshot(self, limit=None) -> dict:
+        with self._lock:
+            statements = len(self._stats)
+            calls = sum(s.count for s in self._stats.values())
+            total = sum(s.total for s in self._stats.values())
+        return {
+            "enabled": self.enabled,
+            "started_at": self.started_at,
+            "slow_ms": self.slow_ms,
+            "statements": statements,
+            "calls": calls,
+            "total_ms": round(total, 3),
+            "top": self.top(limit or statements),
+            "slow": self.slow_queries(),
+        }
+
+    def dump(self, path) -> dict:
+        """Ecrit l'instantane JSON dans `path` et le retourne."""
+        data = self.snapshot()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
+
+
+PROFILER = QueryProfiler()
+
+
+def explain(conn, sql, params=()) -> list[str]:
+    """Lignes de EXPLAIN QUERY PLAN (liste vide si la requete ne s'y prete pas)."""
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error:
+        return []
+    return [str(row[-1]) for row in rows]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Curseur chronometre: voir l'en-tete du module."""
+
+    profiler = PROFILER
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._pending = None
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, params, elapsed, rows = pending
+            if rows < 0:
+                rows = max(self.rowcount, 0)
+            self.profiler.record(self.connection, sql, params, elapsed * 1000, rows)
+
+    def _begin(self, sql, params, elapsed, select):
+        self._finish()
+        if select:
+            self._pending = [sql, params, elapsed, 0]
+        else:
+            self._pending = [sql, params, elapsed, -1]
+            self._finish()
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._begin(sql, parameters, perf_counter() - start, self.description is not None)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._begin(sql, (), perf_counter() - start, False)
+
+    def _fetched(self, start, count, exhausted):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += perf_counter() - start
+            pending[3] += count
+            if exhausted:
+                self._finish()
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def fetchone(self):
+        start = perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows), len(rows) < (self.arraysize if size is None else size))
+        return rows
+
+    def fetchall(self):
+        start = perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+
+def _print_dump(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    print(f"Profil depuis {data.get('started_at')}: {data['calls']} appel(s), "
+          f"{data['statements']} requete(s), {data['total_ms'] / 1000:.2f} s")
+    for s in data["top"][:20]:
+        print(f"{s['total_ms']:>10.1f} ms  x{s['count']:<6} max {s['max_ms']:>8.1f} ms  "
+              f"{s['rows']:>8} l.  {s['sql'][:100]}")
+    if data["slow"]:
+        print(f"\n{len(data['slow'])} requete(s) lente(s) (> {data['slow_ms']:.0f} ms), la plus recente:")
+        last = data["slow"][0]
+        print(f"{last['at']}  {last['elapsed_ms']:.1f} ms  {last['sql'][:200]}")
+        for line in last["plan"]:
+            print(f"    {line}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    _print_dump(sys.argv[1] if len(sys.argv) > 1 else "query_profile.json")
@@ -0,0 +1,369 @@
+"""
+Grand livre du stock: instantanes periodiques et stock a une date.
+
+stock_movements trace chaque variation mais rejouer tous les mouvements pour
+connaitre le stock au 15 mars devient lent avec des millions de lignes. Un
+instantane (stock_snapshots + stock_snapshot_items) fige le stock de chaque
+produit et retient le dernier mouvement pris en compte (last_movement_id):
+
+    stock(date) = instantane le plus proche +/- mouvements entre les deux
+
+Le point de depart est l'instantane qui precede la date (rejeu vers l'avant),
+celui qui la suit (rejeu vers l'arriere) ou le stock courant de products,
+selon celui qui laisse le moins de mouvements a rejouer: au plus un mois de
+mouvements avec des instantanes mensuels. Les bornes sont des identifiants de
+mouvement, parcourus par la cle primaire.
+
+Les valeurs utilisent le cout fige dans l'instantane, sinon le cout moyen
+courant (services.cost_engine).
+
+Les dates sont comparees a stock_movements.created_at (CURRENT_TIMESTAMP de
+SQLite); un produit cree apres la date n'a pas de stock a cette date.
+
+Un instantane est pris au debut de chaque mois par StockSnapshotWorker; au
+premier passage les mois passes sont reconstitues (backfill_snapshots).
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from services.cost_engine import CURRENT_COST_SQL
+from services.periodic_worker import PeriodicWorker
+
+logger = logging.getLogger(__name__)
+
+# Mois reconstitues au premier passage
+BACKFILL_MONTHS = 36
+# Pause entre deux mois reconstitues: laisse passer les ecritures des caisses
+STEP_PAUSE = 0.01
+STARTUP_DELAY_SECONDS = 120
+POLL_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class Anchor:
+    """Point de depart d'un calcul de stock: un instantane, ou le stock courant (snapshot_id None)."""
+
+    snapshot_id: int | None
+    last_movement_id: int
+
+
+def _connect(db_path) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _opening(day) -> str:
+    """Borne exclusive: stock a l'ouverture de `day` (minuit)."""
+    return f"{_as_date(day).isoformat()} 00:00:00"
+
+
+def _closing(day) -> str:
+    """Borne exclusive: stock a la fermeture de `day` (minuit du lendemain)."""
+    return _opening(_as_date(day) + timedelta(days=1))
+
+
+def period_key(day=None) -> str:
+    return (_as_date(day) if day else date.today()).strftime("%Y-%m")
+
+
+def _month_start(key: str) -> date:
+    return date.fromisoformat(f"{key}-01")
+
+
+def _previous_month(key: str) -> str:
+    return period_key(_month_start(key) - timedelta(days=1))
+
+
+def month_openings(start, end) -> list[date]:
+    """Premiers jours de mois compris dans ]start, end]."""
+    start, end = _as_date(start), _as_date(end)
+    day = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    found = []
+    while day <= end:
+        found.append(day)
+        day = (day + timedelta(days=32)).replace(day=1)
+    return found
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Stock a une date
+# ══════════════════════════════════════════════════════════════════
+
+def movement_cut(conn, before: str) -> int:
+    """Dernier mouvement anterieur a `before` (0 si aucun); index created_at, sans parcours."""
+    row = conn.execute("""
+        SELECT id FROM stock_movements WHERE created_at < ?
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    """, (before,)).fetchone()
+    return row[0] if row else 0
+
+
+def find_anchor(conn, cut: int) -> Anchor:
+    """Instantane (ou stock courant) le plus proche du mouvement `cut`."""
+    before = conn.execute("""
+        SELECT id, last_movement_id FROM stock_snapshots WHERE last_movement_id <= ?
+        ORDER BY last_movement_id DESC LIMIT 1
+    """, (cut,)).fetchone()
+    after = conn.execute("""
+        SELECT id, last_movement_id FROM stock_snapshots WHERE last_movement_id > ?
+        ORDER BY last_movement_id LIMIT 1
+    """, (cut,)).fetchone()
+    if after:
+        candidates = [Anchor(after[0], after[1])]
+    else:
+        last = conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements").fetchone()[0]
+        candidates = [Anchor(None, last)]
+    if before:
+        candidates.append(Anchor(before[0], before[1]))
+    return min(candidates, key=lambda a: abs(a.last_movement_id - cut))
+
+
+def levels_query(conn, before: str, product_id=None) -> tuple[str, list]:
+    """
+    (sql, params) du stock de chaque produit juste avant `before`:
+    colonnes product_id, quantity, unit_cost (cout de l'instantane, NULL sinon).
+    """
+    cut = movement_cut(conn, before)
+    anchor = find_anchor(conn, cut)
+    only = " AND product_id = ?" if product_id is not None else ""
+    extra = [product_id] if product_id is not None else []
+
+    if anchor.snapshot_id is None:
+        base = "SELECT id AS product_id, COALESCE(stock_quantity, 0) AS qty, NULL AS unit_cost " \
+               "FROM products WHERE 1" + only.replace("product_id", "id")
+        base_params = extra
+    else:
+        base = "SELECT product_id, quantity AS qty, unit_cost FROM stock_snapshot_items " \
+               "WHERE snapshot_id = ?" + only
+        base_params = [anchor.snapshot_id] + extra
+
+    if anchor.last_movement_id <= cut:      # rejeu vers l'avant
+        sign, low, high = "", anchor.last_movement_id, cut
+    else:                                   # rejeu vers l'arriere
+        sign, low, high = "-", cut, anchor.last_movement_id
+    sql = f"""
+        SELECT product_id, SUM(qty) AS quantity, MAX(unit_cost) AS unit_cost
+        FROM (
+            {base}
+            UNION ALL
+            SELECT product_id, {sign}quantity, NULL FROM stock_movements
+            WHERE id > ? AND id <= ?{only}
+        )
+        WHERE product_id IN (SELECT id FROM products WHERE COALESCE(created_at, '') < ?)
+        GROUP BY product_id
+    """
+    return sql, base_params + [low, high] + extra + [before]
+
+
+def stock_at(conn, day, product_id=None):
+    """
+    Stock a la fin de `day`: quantite du produit `product_id`, ou
+    {product_id: quantite} des produits en stock non nul.
+    """
+    sql, params = levels_query(conn, _closing(day), product_id)
+    rows = conn.execute(sql, params).fetchall()
+    if product_id is not None:
+        return rows[0][1] if rows else 0
+    return {r[0]: r[1] for r in rows if r[1]}
+
+
+def valuation_query(conn, day) -> tuple[str, list]:
+    """Valorisation a la fin de `day`: quantite x cout (celui de l'instantane, sinon cout moyen courant)."""
+    levels, params = levels_query(conn, _closing(day))
+    return f"""
+        SELECT p.name, COALESCE(c.name, '—') AS category, l.quantity,
+               COALESCE(l.unit_cost, {CURRENT_COST_SQL}) AS unit_cost,
+               l.quantity * COALESCE(l.unit_cost, {CURRENT_COST_SQL}) AS value
+        FROM ({levels}) l
+        JOIN products p ON p.id = l.product_id
+        LEFT JOIN categories c ON p.category_id = c.id
+        WHERE l.quantity != 0
+        ORDER BY value DESC
+    """, params
+
+
+def average_inventory_query(conn, start, end) -> tuple[str, list]:
+    """
+    Stock moyen de la periode [start, end] par produit: moyenne du stock a
+    l'ouverture de `start`, a chaque debut de mois et a la fermeture de `end`.
+    Colonnes: name, category, opening, closing, avg_qty, avg_value, closing_value.
+    """
+    points = [_opening(start)] + [_opening(d) for d in month_openings(start, end)] + [_closing(end)]
+    parts, params = [], []
+    for i, before in enumerate(points):
+        sql, p = levels_query(conn, before)
+        parts.append(f"SELECT {i} AS point, product_id, quantity, unit_cost FROM ({sql})")
+        params += p
+    n, last = len(points), len(points) - 1
+    cost = f"COALESCE(l.unit_cost, {CURRENT_COST_SQL})"
+    return f"""
+        SELECT p.name, COALESCE(c.name, '—') AS category,
+               SUM(CASE WHEN l.point = 0 THEN l.quantity ELSE 0 END) AS opening,
+               SUM(CASE WHEN l.point = {last} THEN l.quantity ELSE 0 END) AS closing,
+               SUM(l.quantity) * 1.0 / {n} AS avg_qty,
+               SUM(l.quantity * {cost}) / {n} AS avg_value,
+               SUM(CASE WHEN l.point = {last} THEN l.quantity * {cost} ELSE 0 END) AS closing_value
+        FROM ({" UNION ALL ".join(parts)}) l
+        JOIN products p ON p.id = l.product_id
+        LEFT JOIN categories c ON p.category_id = c.id
+        GROUP BY l.product_id
+        HAVING SUM(l.quantity) != 0 OR closing != 0
+        ORDER BY avg_value DESC
+    """, params
+
+
+def average_inventory_value(conn, start, end) -> float:
+    sql, params = average_inventory_query(conn, start, end)
+    row = conn.execute(f"SELECT COALESCE(SUM(avg_value), 0) FROM ({sql})", params).fetchone()
+    return row[0]
+
+
+def period_bounds(conn, start=None, end=None) -> tuple[str, str]:
+    """Periode par defaut: du premier mouvement (ou d'aujourd'hui) a aujourd'hui."""
+    end = _as_date(end) if end else date.today()
+    if start:
+        return _as_date(start).isoformat(), end.isoformat()
+    row = conn.execute("SELECT created_at FROM stock_movements ORDER BY id LIMIT 1").fetchone()
+    first = _as_date(row[0]) if row and row[0] else end
+    return min(first, end).isoformat(), end.isoformat()
+
+
+# ══════════════════════════════════════════════════════════════════
+#  Instantanes
+# ══════════════════════════════════════════════════════════════════
+
+def take_snapshot(db_path, *, period=None, origin="schedule") -> int | None:
+    """
+    Fige le stock courant sous `period` (mois courant par defaut); None si
+    la periode a deja son instantane. Une seule transaction courte.
+    """
+    period = period or period_key()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM stock_snapshots WHERE period = ?", (period,)).fetchone():
+            conn.rollback()
+            return None
+        cur = conn.execute("""
+            INSERT INTO stock_snapshots (period, taken_at, last_movement_id, origin)
+            SELECT ?, CURRENT_TIMESTAMP, COALESCE(MAX(id), 0), ? FROM stock_movements
+        """, (period, origin))
+        snapshot_id = cur.lastrowid
+        count = conn.execute(f"""
+            INSERT INTO stock_snapshot_items (snapshot_id, product_id, quantity, unit_cost)
+            SELECT ?, p.id, p.stock_quantity, {CURRENT_COST_SQL}
+            FROM products p WHERE COALESCE(p.stock_quantity, 0) != 0
+        """, (snapshot_id,)).rowcount
+        conn.execute("UPDATE stock_snapshots SET products = ? WHERE id = ?", (count, snapshot_id))
+        conn.commit()
+        logger.info("Instantane de stock %s: %d produits", period, count)
+        return snapshot_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def backfill_snapshots(db_path, *, months=BACKFILL_MONTHS, progress=None, cancelled=None,
+                       pause=None) -> int:
+    """
+    Reconstitue les instantanes d'ouverture des mois precedant le plus ancien
+    instantane, en rejouant a rebours un mois de mouvements a la fois. S'arrete
+    au mois sans mouvement anterieur. Retourne le nombre d'instantanes crees.
+    """
+    pause = STEP_PAUSE if pause is None else pause
+    conn = _connect(db_path)
+    created = 0
+    try:
+        for _ in range(months):
+            if cancelled and cancelled():
+                break
+            nxt = conn.execute("""
+                SELECT id, period, last_movement_id FROM stock_snapshots
+                ORDER BY last_movement_id, taken_at LIMIT 1
+            """).fetchone()
+            if nxt is None or nxt["last_movement_id"] == 0:
+                break
+            period = _previous_month(nxt["period"])
+            before = _opening(_month_start(period))
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cut = movement_cut(conn, before)
+                snapshot_id = conn.execute("""
+                    INSERT INTO stock_snapshots (period, taken_at, last_movement_id, origin)
+                    VALUES (?, ?, ?, 'backfill')
+                """, (period, before, cut)).lastrowid
+                count = conn.execute(f"""
+                    INSERT INTO stock_snapshot_items (snapshot_id, product_id, quantity, unit_cost)
+                    SELECT ?, l.product_id, SUM(l.qty), COALESCE(MAX(l.unit_cost), {CURRENT_COST_SQL})
+                    FROM (
+                        SELECT product_id, quantity AS qty, unit_cost FROM stock_snapshot_items
+                        WHERE snapshot_id = ?
+                        UNION ALL
+                        SELECT product_id, -quantity, NULL FROM stock_movements
+                        WHERE id > ? AND id <= ?
+                    ) l
+                    JOIN products p ON p.id = l.product_id AND COALESCE(p.created_at, '') < ?
+                    GROUP BY l.product_id
+                    HAVING SUM(l.qty) != 0
+                """, (snapshot_id, nxt["id"], cut, nxt["last_movement_id"], before)).rowcount
+                conn.execute("UPDATE stock_snapshots SET products = ? WHERE id = ?", (count, snapshot_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            created += 1
+            if progress:
+                progress(created)
+            if cut == 0:
+                break
+            time.sleep(pause)
+    finally:
+        conn.close()
+    if created:
+        logger.info("Instantanes de stock reconstitues: %d mois", created)
+    return created
+
+
+def ensure_snapshots(db_path, cancelled=None) -> int:
+    """Instantane du mois courant s'il manque; au tout premier, reconstitue aussi l'historique."""
+    conn = _connect(db_path)
+    try:
+        first = conn.execute("SELECT COUNT(*) FROM stock_snapshots").fetchone()[0] == 0
+    finally:
+        conn.close()
+    created = 1 if take_snapshot(db_path) else 0
+    if first and created:
+        created += backfill_snapshots(db_path, cancelled=cancelled)
+    return created
+
+
+class StockSnapshotWorker(PeriodicWorker):
+    """Verifie toutes les heures que le mois courant a son instantane."""
+
+    thread_name = "stock-snapshots"
+    label = "Instantane de stock planifie"
+    poll_seconds = POLL_SECONDS
+    startup_delay = STARTUP_DELAY_SECONDS
+
+    def tick(self):
+        ensure_snapshots(self.db_path, cancelled=self.cancelled)
+
+
+start_stock_snapshot_worker = StockSnapshotWorker.start_once
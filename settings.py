@@ -1,16 +1,18 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, QHBoxLayout,
     QLineEdit, QComboBox, QFrame, QScrollArea, QMessageBox,
-    QFileDialog, QInputDialog, QApplication, QSizePolicy
+    QFileDialog, QInputDialog, QApplication, QSizePolicy,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
 )
 from PyQt6.QtGui import QFont, QColor
 from PyQt6.QtCore import Qt, QSize
 # import qdarktheme
-from styles import COLORS, SETTINGS_CARD_STYLE, SETTINGS_INPUT_STYLE, SETTINGS_COMBO_STYLE
+from styles import COLORS, SETTINGS_CARD_STYLE, SETTINGS_INPUT_STYLE, SETTINGS_COMBO_STYLE, TABLE_STYLE
 from db_manager import get_database
 from currency import currency_manager, CURRENCIES, fmt
 from currency_widget import CurrencySettingsWidget
 from datetime import datetime
+from services.query_profiler import PROFILER
 from PyQt6.QtGui import QFont, QColor, QPainter  # Ajouter QPainter
 from PyQt6.QtCore import Qt, QSize, QFileInfo    # Ajouter QFileInfo
 
@@ -57,6 +59,69 @@ def make_btn(text, color="#6366F1", text_color="white", outlined=False):
     return btn
 
 
+def start_backup(parent, db, dest=None, on_done=None):
+    """
+    Sauvegarde en ligne dans un thread (les caisses continuent d'écrire),
+    avec progression par pages. Sans `dest` : instantané incrémental dans le
+    magasin de config.backup_dir (config.backup_max_count instantanés gardés).
+    `on_done(chemin)` est appelé dans le thread UI.
+    """
+    from export_pipeline import ExportCancelled, start_export
+    from services.backup_service import BackupCancelled, create_backup, page_count
+
+    result = {}
+
+    def job(progress, cancelled):
+        try:
+            result["path"] = create_backup(db.db_path, dest, progress=progress, cancelled=cancelled)
+        except BackupCancelled as e:
+            raise ExportCancelled() from e
+        return 1
+
+    def done(_count):
+        db.set_setting('last_backup_date', datetime.now().strftime("%d/%m/%Y %H:%M"))
+        if on_done:
+            on_done(result["path"])
+
+    return start_export(parent, job, label="Sauvegarde de la base…",
+                        total=page_count(db.db_path), on_done=done, unit="page(s)")
+
+
+def start_restore(parent, db, backup_path, on_done=None):
+    """
+    Vérifie la sauvegarde (PRAGMA integrity_check) et la prépare dans un
+    thread ; la base en service n'est recopiée qu'une fois la copie validée.
+    """
+    from export_pipeline import ExportCancelled, start_export
+    from services.backup_service import BackupCancelled, page_count, prepare_restore, swap_in
+
+    result = {}
+
+    def job(progress, cancelled):
+        try:
+            result["staged"] = prepare_restore(backup_path, db.db_path,
+                                               progress=progress, cancelled=cancelled)
+        except BackupCancelled as e:
+            raise ExportCancelled() from e
+        return 1
+
+    def done(_count):
+        try:
+            swap_in(db, result["staged"])
+        except Exception as e:
+            QMessageBox.critical(parent, "Erreur", f"Impossible de restaurer :\n{e}")
+            return
+        if on_done:
+            on_done(backup_path)
+
+    try:
+        total = page_count(backup_path)
+    except Exception:
+        total = 0
+    return start_export(parent, job, label="Vérification et préparation de la sauvegarde…",
+                        total=total, on_done=done, unit="page(s)")
+
+
 class SectionCard(QFrame):
     """Carte de section avec titre et icône."""
     def __init__(self, icon, title, parent=None):
@@ -227,17 +292,20 @@ class SettingsPage(QWidget):
         self.content_system = self._build_system_tab()
         self.content_appearance = self._build_appearance_tab()
         self.content_database = self._build_database_tab()
+        self.content_diagnostics = self._build_diagnostics_tab()
 
         self.all_contents = [
             self.content_system,
             self.content_appearance,
             self.content_database,
+            self.content_diagnostics,
         ]
 
         tab_bar = TabBar([
             ("🏢", "Système",      lambda: self._show_tab(0)),
             ("🎨", "Apparence",    lambda: self._show_tab(1)),
             ("🗄️", "Base de Données", lambda: self._show_tab(2)),
+            ("🩺", "Diagnostics",  lambda: self._show_tab(3)),
         ])
         root.addWidget(tab_bar)
         root.addSpacing(20)
@@ -259,6 +327,8 @@ class SettingsPage(QWidget):
     def _show_tab(self, idx):
         for i, c in enumerate(self.all_contents):
             c.setVisible(i == idx)
+        if self.all_contents[idx] is self.content_diagnostics:
+            self.refresh_diagnostics()
 
     # ── Onglet SYSTÈME ────────────────────────────────────
     def _build_system_tab(self):
@@ -375,6 +445,16 @@ class SettingsPage(QWidget):
             row = FieldRow(lbl_text, field)
             body2.addLayout(row)
 
+        # Coût de revient figé sur chaque ligne vendue (services.cost_engine)
+        self.cost_method = QComboBox()
+        self.cost_method.setStyleSheet(INPUT_STYLE)
+        self.cost_method.setMinimumHeight(42)
+        self.cost_method.addItem("Coût moyen pondéré", "average")
+        self.cost_method.addItem("FIFO (premier entré, premier sorti)", "fifo")
+        index = self.cost_method.findData(self.db.get_setting('cost_method', 'average'))
+        self.cost_method.setCurrentIndex(max(index, 0))
+        body2.addLayout(FieldRow("Méthode de coût", self.cost_method))
+
         layout.addWidget(card_fin)
 
         # ── Carte Multi-Devises ──
@@ -518,6 +598,150 @@ class SettingsPage(QWidget):
     #  Méthodes métier (inchangées)
     # ─────────────────────────────────────────────────────
 
+    # ── Onglet DIAGNOSTICS ────────────────────────────────
+    def _build_diagnostics_tab(self):
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setStyleSheet("QScrollArea { border: none; background: transparent; }")
+
+        container = QWidget()
+        container.setStyleSheet("background: transparent;")
+        layout = QVBoxLayout(container)
+        layout.setSpacing(16)
+        layout.setContentsMargins(0, 0, 12, 0)
+
+        # ── Carte Profilage ──
+        card_prof = SectionCard("⏱️", "Profilage des Requêtes")
+        body_prof = card_prof.body()
+
+        desc = QLabel("Mesure la durée et le nombre de lignes de chaque requête SQL. "
+                      "Les requêtes plus lentes que le seuil sont journalisées avec leur plan d'exécution. "
+                      "Sans effet sur les performances lorsqu'il est désactivé.")
+        desc.setWordWrap(True)
+        desc.setFont(QFont("Segoe UI", 11))
+        desc.setStyleSheet(f"color: {COLORS['text_secondary']}; background: transparent; border: none;")
+        body_prof.addWidget(desc)
+
+        self.slow_ms_field = QLineEdit(f"{PROFILER.slow_ms:g}")
+        self.slow_ms_field.setStyleSheet(INPUT_STYLE)
+        self.slow_ms_field.setMinimumHeight(42)
+        self.slow_ms_field.setFixedWidth(120)
+        self.slow_ms_field.editingFinished.connect(self._apply_slow_threshold)
+        body_prof.addLayout(FieldRow("Seuil lent (ms)", self.slow_ms_field))
+
+        self.profiling_summary = QLabel()
+        self.profiling_summary.setFont(QFont("Segoe UI", 10))
+        self.profiling_summary.setStyleSheet(
+            f"color: {COLORS['TXT_MUTED']}; background: transparent; border: none;")
+        body_prof.addWidget(self.profiling_summary)
+
+        prof_btns = QHBoxLayout()
+        prof_btns.setSpacing(10)
+        self.profiling_btn = make_btn("", COLORS['success'])
+        self.profiling_btn.clicked.connect(self.toggle_profiling)
+        btn_refresh = make_btn("🔄  Actualiser", COLORS['secondary_dark'], outlined=True)
+        btn_refresh.clicked.connect(self.refresh_diagnostics)
+        btn_reset = make_btn("🧹  Réinitialiser", COLORS['secondary_dark'], outlined=True)
+        btn_reset.clicked.connect(self.reset_profiling)
+        btn_dump = make_btn("📤  Exporter JSON", COLORS['primary'], outlined=True)
+        btn_dump.clicked.connect(self.export_profiling)
+        for b in (self.profiling_btn, btn_refresh, btn_reset, btn_dump):
+            prof_btns.addWidget(b)
+        prof_btns.addStretch()
+        body_prof.addLayout(prof_btns)
+        layout.addWidget(card_prof)
+
+        # ── Carte Requêtes coûteuses ──
+        card_top = SectionCard("🐢", "Requêtes les plus coûteuses")
+        self.top_queries_table = self._diagnostics_table(
+            ["Requête", "Appels", "Total (ms)", "Moy. (ms)", "Max (ms)", "p95", "Lignes"])
+        card_top.body().addWidget(self.top_queries_table)
+        layout.addWidget(card_top)
+
+        # ── Carte Requêtes lentes ──
+        card_slow = SectionCard("🧾", "Requêtes lentes récentes")
+        self.slow_queries_table = self._diagnostics_table(["Heure", "Durée (ms)", "Lignes", "Requête"])
+        card_slow.body().addWidget(self.slow_queries_table)
+        layout.addWidget(card_slow)
+        layout.addStretch()
+
+        self.refresh_diagnostics()
+        scroll.setWidget(container)
+        return scroll
+
+    def _diagnostics_table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setStyleSheet(TABLE_STYLE)
+        table.setMinimumHeight(260)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        header.setSectionResizeMode(headers.index("Requête"), QHeaderView.ResizeMode.Stretch)
+        return table
+
+    @staticmethod
+    def _fill_table(table, rows, tooltips=None):
+        table.setRowCount(len(rows))
+        for r, cells in enumerate(rows):
+            for c, value in enumerate(cells):
+                item = QTableWidgetItem(str(value))
+                if tooltips:
+                    item.setToolTip(tooltips[r])
+                table.setItem(r, c, item)
+
+    def refresh_diagnostics(self):
+        on = PROFILER.enabled
+        self.profiling_btn.setText("⏸  Désactiver" if on else "▶  Activer le profilage")
+        snap = PROFILER.snapshot(limit=20)
+        if on or snap["calls"]:
+            since = f" depuis {snap['started_at']}" if snap["started_at"] else ""
+            self.profiling_summary.setText(
+                f"{'🟢 Actif' if on else '⚪ Inactif'}{since} — {snap['calls']} appel(s), "
+                f"{snap['statements']} requête(s) distincte(s), {snap['total_ms'] / 1000:.2f} s cumulées")
+        else:
+            self.profiling_summary.setText("⚪ Profilage inactif")
+        self._fill_table(self.top_queries_table, [
+            [q["sql"][:160], q["count"], f"{q['total_ms']:.1f}", f"{q['avg_ms']:.2f}",
+             f"{q['max_ms']:.1f}", f"≤ {q['p95_ms']} ms" if q["p95_ms"] is not None else "> 1 s", q["rows"]]
+            for q in snap["top"]
+        ], [q["sql"] for q in snap["top"]])
+        self._fill_table(self.slow_queries_table, [
+            [q["at"], f"{q['elapsed_ms']:.1f}", q["rows"], q["sql"][:160]] for q in snap["slow"]
+        ], [q["sql"] + "\n\n" + ("\n".join(q["plan"]) or "(pas de plan)") for q in snap["slow"]])
+
+    def _apply_slow_threshold(self):
+        try:
+            slow_ms = float(self.slow_ms_field.text().replace(",", "."))
+        except ValueError:
+            self.slow_ms_field.setText(f"{PROFILER.slow_ms:g}")
+            return
+        self.db.set_query_profiling(PROFILER.enabled, max(slow_ms, 0))
+
+    def toggle_profiling(self):
+        self._apply_slow_threshold()
+        self.db.set_query_profiling(not PROFILER.enabled)
+        self.refresh_diagnostics()
+
+    def reset_profiling(self):
+        PROFILER.reset()
+        self.refresh_diagnostics()
+
+    def export_profiling(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Exporter le profil des requêtes",
+            f"query_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", "JSON (*.json)")
+        if not filename:
+            return
+        try:
+            data = PROFILER.dump(filename)
+            QMessageBox.information(self, "✅ Exporté",
+                                    f"{data['statements']} requête(s) exportée(s).\n\n📁 {filename}")
+        except OSError as e:
+            QMessageBox.critical(self, "Erreur", f"Export impossible :\n{e}")
+
     def create_stat_item(self, icon, label, value, color):
         item = QFrame()
         item.setStyleSheet(f"""
@@ -629,20 +853,11 @@ class SettingsPage(QWidget):
             QMessageBox.critical(self, "Erreur", f"Erreur:\n{e}")
 
     def create_backup(self):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename, _ = QFileDialog.getSaveFileName(
-            self, "Sauvegarder", f"erp_backup_{timestamp}.db",
-            "Base de données (*.db);;Tous (*.*)"
-        )
-        if filename:
-            try:
-                if self.db.backup_database(filename):
-                    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-                    self.db.set_setting('last_backup_date', now)
-                    self.last_backup_label.setText(f"📅 Dernière sauvegarde : {now}")
-                    QMessageBox.information(self, "✅ Sauvegarde créée", f"Fichier : {filename}")
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", f"Impossible de créer la sauvegarde :\n{e}")
+        def done(path):
+            self.last_backup_label.setText(
+                f"📅 Dernière sauvegarde : {self.db.get_setting('last_backup_date', '')}")
+            QMessageBox.information(self, "✅ Sauvegarde créée", f"Instantané : {path}")
+        start_backup(self, self.db, on_done=done)
 
     def restore_backup(self):
         reply = QMessageBox.warning(
@@ -653,17 +868,18 @@ class SettingsPage(QWidget):
         )
         if reply == QMessageBox.StandardButton.No:
             return
+        from pathlib import Path
+        from config import config
         filename, _ = QFileDialog.getOpenFileName(
-            self, "Restaurer", "", "Base de données (*.db);;Tous (*.*)"
+            self, "Restaurer", str(Path(config.backup_dir) / "manifests"),
+            "Sauvegardes (*.json *.db);;Tous (*.*)"
         )
         if filename:
-            try:
-                if self.db.restore_database(filename):
-                    QMessageBox.information(self, "✅ Restauré",
-                                            "Données restaurées. Redémarrez l'application.")
-                    self.refresh_stats()
-            except Exception as e:
-                QMessageBox.critical(self, "Erreur", f"Impossible de restaurer :\n{e}")
+            def done(_path):
+                QMessageBox.information(self, "✅ Restauré",
+                                        "Données restaurées. Redémarrez l'application.")
+                self.refresh_stats()
+            start_restore(self, self.db, filename, on_done=done)
 
     def refresh_stats(self):
         self.load_statistics()
@@ -691,6 +907,7 @@ class SettingsPage(QWidget):
             self.db.set_setting('vat',             self.vat.text())
             self.db.set_setting('purchase_vat',    self.purchase_vat.text())
             self.db.set_setting('vat_number',      self.vat_number.text())
+            self.db.set_setting('cost_method',     self.cost_method.currentData())
             # Sauvegarder les préférences de devises
             self._currency_widget.save(self.db)
             QMessageBox.information(self, "✅ Enregistré", "Paramètres enregistrés avec succès.")
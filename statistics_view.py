@@ -15,9 +15,13 @@ from PyQt6.QtCore import Qt
 import pyqtgraph as pg
 import csv
 import datetime as _dt
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from db_manager import get_database
 from currency import fmt_da, fmt, currency_manager
+from export_pipeline import ExportCancelled, atomic_path, start_export
 
 # Styles inspirés du dashboard
 COLORS = {
@@ -1463,14 +1467,61 @@ class StatisticsPage(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Erreur Export", f"Impossible d'exporter :\n{e}")
 
+    # ─────────────────────────────────────────────────────────
+    #  Données communes des exports Excel / PDF
+    # ─────────────────────────────────────────────────────────
+
+    def _export_snapshot(self, limit=10):
+        """Données de l'export, lues dans le thread UI (connexion SQLite de l'application)."""
+        year = self._get_year()
+        return {
+            "year": year,
+            "symbol": currency_manager.primary.symbol,
+            "stats": self.db.get_statistics(year=year) or {},
+            "monthly": {int(r["month"]): r for r in (self.db.get_sales_by_month(year) or [])},
+            "profits": {int(r["month"]): r for r in (self.db.get_profit_by_month(year) or [])},
+            "top_products": self.db.get_top_products(limit=limit, year=year) or [],
+            "top_clients": self.db.get_top_clients(limit=limit, year=year) or [],
+            "profitable": self.db.get_most_profitable_products(limit=limit, year=year) or [],
+        }
+
+    def _export_charts(self, temp_dir):
+        """Rend les graphiques en PNG (pyqtgraph ne peut être utilisé que dans le thread UI)."""
+        import pyqtgraph.exporters as exporters
+
+        charts = {}
+        for key, widget in (("sales", self.sales_chart), ("profit", self.profit_chart),
+                            ("products", self.products_chart), ("clients", self.clients_chart)):
+            filename = os.path.join(temp_dir, f"{key}.png")
+            try:
+                exporters.ImageExporter(widget.plotItem).export(filename)
+                charts[key] = filename
+            except Exception:
+                charts[key] = None
+        return charts
+
+    def _start_stats_export(self, writer, path, label, title, message):
+        """Collecte données + graphiques ici, puis écrit le fichier dans un thread d'export."""
+        data = self._export_snapshot()
+        temp_dir = tempfile.mkdtemp()
+        charts = self._export_charts(temp_dir)
+
+        def job(progress, cancelled):
+            try:
+                return writer(path, data, charts, progress=progress, cancelled=cancelled)
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return start_export(
+            self, job, label=label, total=STATS_EXPORT_STEPS,
+            on_done=lambda _n: QMessageBox.information(self, title, message),
+        )
+
     # ─────────────────────────────────────────────────────────
     #  Export Excel PRO+ (avec style dashboard)
     # ─────────────────────────────────────────────────────────
 
     def _export_excel_pro_plus(self):
-        import tempfile, os
-        import xlsxwriter
-        import pyqtgraph.exporters as exporters
         from datetime import datetime as dt
 
         path, _ = QFileDialog.getSaveFileName(
@@ -1480,233 +1531,18 @@ class StatisticsPage(QWidget):
             "Excel Files (*.xlsx)"
         )
         if not path:
-            return
-
-        temp_dir = tempfile.mkdtemp()
-
-        def save_chart(widget, filename):
-            try:
-                exporter = exporters.ImageExporter(widget.plotItem)
-                exporter.export(filename)
-                return filename
-            except:
-                return None
-
-        wb = xlsxwriter.Workbook(path)
-
-        # FORMATS
-        title_fmt = wb.add_format({"bold": True, "font_size": 14, "bg_color": "#1F2937", "font_color": "white", "align": "center", "valign": "vcenter", "border": 1})
-        header_fmt = wb.add_format({"bold": True, "bg_color": "#3B82F6", "font_color": "white", "border": 1, "align": "center", "valign": "vcenter"})
-        data_fmt = wb.add_format({"border": 1, "align": "left", "num_format": "#,##0.00"})
-        number_fmt = wb.add_format({"border": 1, "align": "center", "num_format": "#,##0"})
-
-        # FEUILLE 1: TABLEAU DE BORD (KPI)
-        ws = wb.add_worksheet("📊 Dashboard")
-        ws.set_column("A:A", 25)
-        ws.set_column("B:D", 18)
-
-        row = 0
-        ws.merge_range(row, 0, row, 3, "TABLEAU DE BORD KPI", title_fmt)
-        row += 1
-        ws.write(row, 0, f"Généré le : {dt.now().strftime('%d/%m/%Y %H:%M')}")
-        row += 2
-
-        ws.write(row, 0, "Indicateur", header_fmt)
-        ws.write(row, 1, "Valeur", header_fmt)
-        ws.write(row, 2, "Unité", header_fmt)
-        row += 1
-
-        stats = self.db.get_statistics(year=self._get_year()) or {}
-        sales_total = float(stats.get("sales_total", 0))
-        purchases_total = float(stats.get("purchases_total", 0))
-        profit = sales_total - purchases_total
-        margin_pct = (profit / sales_total * 100) if sales_total > 0 else 0
-
-        kpis = [
-            ("Chiffre d'Affaires", sales_total, f"{currency_manager.primary.symbol}"),
-            ("Achats Totaux", purchases_total, f"{currency_manager.primary.symbol}"),
-            ("Profit Net", profit, f"{currency_manager.primary.symbol}"),
-            ("Taux de Marge", margin_pct, "%"),
-            ("Nombre Clients", stats.get("total_clients", 0), "clients"),
-            ("Nombre Produits", stats.get("total_products", 0), "produits"),
-            ("Total Ventes", stats.get("total_sales", 0), "transactions"),
-            ("Valeur du Stock", stats.get("stock_value", 0), f"{currency_manager.primary.symbol}"),
-        ]
-
-        for kpi_name, value, unit in kpis:
-            ws.write(row, 0, kpi_name, data_fmt)
-            if unit == f"{currency_manager.primary.symbol}":
-                ws.write(row, 1, value, data_fmt)
-            elif unit == "%":
-                ws.write(row, 1, value, number_fmt)
-            else:
-                ws.write(row, 1, value, number_fmt)
-            ws.write(row, 2, unit, data_fmt)
-            row += 1
-
-        # FEUILLE 2: VENTES MENSUELLES
-        ws = wb.add_worksheet("📈 Ventes Mensuelles")
-        ws.set_column("A:A", 20)
-        ws.set_column("B:E", 18)
-
-        row = 0
-        year = self._get_year()
-        ws.merge_range(row, 0, row, 4, f"VENTES MENSUELLES {year}", title_fmt)
-        row += 2
-
-        ws.write(row, 0, "Mois", header_fmt)
-        ws.write(row, 1, "Nombre Ventes", header_fmt)
-        ws.write(row, 2, "Montant (DA)", header_fmt)
-        ws.write(row, 3, "Panier Moyen", header_fmt)
-        ws.write(row, 4, "Croissance %", header_fmt)
-        row += 1
-
-        MOIS = ["Jan", "Fév", "Mar", "Avr", "Mai", "Jun", "Jul", "Aoû", "Sep", "Oct", "Nov", "Déc"]
-        monthly = {int(r["month"]): r for r in (self.db.get_sales_by_month(year) or [])}
-
-        prev_total = 0
-        for m in range(1, 13):
-            r = monthly.get(m, {"count": 0, "total": 0})
-            count = r.get("count", 0)
-            total = r.get("total", 0)
-            avg = total / count if count > 0 else 0
-            growth = ((total - prev_total) / prev_total * 100) if prev_total > 0 else 0
-
-            ws.write(row, 0, MOIS[m - 1], data_fmt)
-            ws.write(row, 1, count, number_fmt)
-            ws.write(row, 2, total, data_fmt)
-            ws.write(row, 3, avg, data_fmt)
-            ws.write(row, 4, growth, data_fmt)
-            row += 1
-            prev_total = total
-
-        # FEUILLE 3: PROFITS MENSUELS
-        ws = wb.add_worksheet("💰 Profits Mensuels")
-        ws.set_column("A:A", 20)
-        ws.set_column("B:B", 20)
-
-        row = 0
-        ws.merge_range(row, 0, row, 1, f"PROFITS MENSUELS {year}", title_fmt)
-        row += 2
-
-        ws.write(row, 0, "Mois", header_fmt)
-        ws.write(row, 1, "Profit (DA)", header_fmt)
-        row += 1
-
-        profits = {int(r["month"]): r for r in (self.db.get_profit_by_month(year) or [])}
-        for m in range(1, 13):
-            p = profits.get(m, {"profit": 0})
-            ws.write(row, 0, MOIS[m - 1], data_fmt)
-            ws.write(row, 1, p.get("profit", 0), data_fmt)
-            row += 1
-
-        # FEUILLE 4: TOP PRODUITS
-        ws = wb.add_worksheet("🏆 Top Produits")
-        ws.set_column("A:A", 5)
-        ws.set_column("B:B", 40)
-        ws.set_column("C:D", 18)
-
-        row = 0
-        ws.merge_range(row, 0, row, 3, "TOP 10 PRODUITS LES PLUS VENDUS", title_fmt)
-        row += 2
-
-        ws.write(row, 0, "Rang", header_fmt)
-        ws.write(row, 1, "Produit", header_fmt)
-        ws.write(row, 2, "Quantité", header_fmt)
-        ws.write(row, 3, "Montant (DA)", header_fmt)
-        row += 1
-
-        top_products = self.db.get_top_products(limit=10, year=self._get_year()) or []
-        for idx, prod in enumerate(top_products, 1):
-            ws.write(row, 0, idx, number_fmt)
-            ws.write(row, 1, prod.get("name", "—"), data_fmt)
-            ws.write(row, 2, int(prod.get("total_quantity", 0)), number_fmt)
-            ws.write(row, 3, prod.get("total_sales", 0), data_fmt)
-            row += 1
-
-        # FEUILLE 5: TOP CLIENTS
-        ws = wb.add_worksheet("👥 Top Clients")
-        ws.set_column("A:A", 5)
-        ws.set_column("B:B", 35)
-        ws.set_column("C:D", 18)
-
-        row = 0
-        ws.merge_range(row, 0, row, 3, "TOP 10 MEILLEURS CLIENTS", title_fmt)
-        row += 2
-
-        ws.write(row, 0, "Rang", header_fmt)
-        ws.write(row, 1, "Nom Client", header_fmt)
-        ws.write(row, 2, "Nombre Ventes", header_fmt)
-        ws.write(row, 3, "Montant Total (DA)", header_fmt)
-        row += 1
-
-        top_clients = self.db.get_top_clients(limit=10, year=self._get_year()) or []
-        for idx, client in enumerate(top_clients, 1):
-            ws.write(row, 0, idx, number_fmt)
-            ws.write(row, 1, client.get("name", "—"), data_fmt)
-            ws.write(row, 2, int(client.get("sale_count", 0)), number_fmt)
-            ws.write(row, 3, client.get("total_amount", 0), data_fmt)
-            row += 1
-
-        # FEUILLE 6: PRODUITS RENTABLES
-        ws = wb.add_worksheet("💎 Rentabilité")
-        ws.set_column("A:A", 5)
-        ws.set_column("B:B", 35)
-        ws.set_column("C:E", 18)
-
-        row = 0
-        ws.merge_range(row, 0, row, 4, "TOP 10 PRODUITS PAR MARGE BRUTE", title_fmt)
-        row += 2
-
-        ws.write(row, 0, "Rang", header_fmt)
-        ws.write(row, 1, "Produit", header_fmt)
-        ws.write(row, 2, "Quantité", header_fmt)
-        ws.write(row, 3, "Marge Unit. (DA)", header_fmt)
-        ws.write(row, 4, "Marge Totale (DA)", header_fmt)
-        row += 1
-
-        profitable = self.db.get_most_profitable_products(limit=10, year=self._get_year()) or []
-        for idx, prod in enumerate(profitable, 1):
-            ws.write(row, 0, idx, number_fmt)
-            ws.write(row, 1, prod.get("name", "—"), data_fmt)
-            ws.write(row, 2, int(prod.get("qty_sold", 0)), number_fmt)
-            ws.write(row, 3, prod.get("unit_margin", 0), data_fmt)
-            ws.write(row, 4, prod.get("total_margin", 0), data_fmt)
-            row += 1
-
-        # FEUILLE 7: GRAPHIQUES
-        try:
-            img_sales = save_chart(self.sales_chart, os.path.join(temp_dir, "sales.png"))
-            img_profit = save_chart(self.profit_chart, os.path.join(temp_dir, "profit.png"))
-            img_prod = save_chart(self.products_chart, os.path.join(temp_dir, "products.png"))
-            img_clients = save_chart(self.clients_chart, os.path.join(temp_dir, "clients.png"))
-
-            charts_data = [("📊 Ventes", img_sales), ("💹 Profit", img_profit), ("📦 Produits", img_prod), ("🎯 Clients", img_clients)]
-
-            for sheet_name, img in charts_data:
-                if img:
-                    ws = wb.add_worksheet(sheet_name)
-                    ws.set_column("A:A", 60)
-                    ws.insert_image("A1", img, {"x_scale": 0.7, "y_scale": 0.7})
-        except:
-            pass
-
-        wb.close()
-        QMessageBox.information(self, "Excel Complet ✅", f"Rapport complet généré avec succès !\n\n📄 Fichier : {path}")
+            return None
+        return self._start_stats_export(
+            _write_stats_xlsx, path, "Génération du rapport Excel…",
+            "Excel Complet ✅", f"Rapport complet généré avec succès !\n\n📄 Fichier : {path}",
+        )
 
     # ─────────────────────────────────────────────────────────
     #  Export PDF Professionnel (avec style dashboard)
     # ─────────────────────────────────────────────────────────
 
     def _export_pdf_pro(self):
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import cm
-        from reportlab.lib import colors
         from datetime import datetime as dt
-        import tempfile, os
-        import pyqtgraph.exporters as exporters
 
         path, _ = QFileDialog.getSaveFileName(
             self,
@@ -1715,189 +1551,281 @@ class StatisticsPage(QWidget):
             "PDF Files (*.pdf)"
         )
         if not path:
-            return
-
-        temp_dir = tempfile.mkdtemp()
-
-        def save_chart(widget, filename):
-            try:
-                exporter = exporters.ImageExporter(widget.plotItem)
-                exporter.export(filename)
-                return filename
-            except:
-                return None
-
-        img_sales = save_chart(self.sales_chart, os.path.join(temp_dir, "sales.png"))
-        img_profit = save_chart(self.profit_chart, os.path.join(temp_dir, "profit.png"))
-        img_prod = save_chart(self.products_chart, os.path.join(temp_dir, "prod.png"))
-        img_clients = save_chart(self.clients_chart, os.path.join(temp_dir, "clients.png"))
-
-        doc = SimpleDocTemplate(path, pagesize=A4, topMargin=1 * cm, bottomMargin=1 * cm, leftMargin=1.5 * cm, rightMargin=1.5 * cm)
-        styles = getSampleStyleSheet()
-        story = []
-
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1F2937'), spaceAfter=6, alignment=1, fontName='Helvetica-Bold')
-        heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#3B82F6'), spaceAfter=6, spaceBefore=8, fontName='Helvetica-Bold')
-
-        # PAGE 1: COUVERTURE
-        story.append(Spacer(1, 2 * cm))
-        story.append(Paragraph("📊 RAPPORT STATISTIQUE ERP", title_style))
-        story.append(Paragraph("Analyse Complète et Détaillée", styles['Heading2']))
-        story.append(Spacer(1, 1 * cm))
-
-        date_text = dt.now().strftime("%d/%m/%Y à %H:%M:%S")
-        year = self._get_year()
-        story.append(Paragraph(f"<b>Généré le :</b> {date_text}", styles['Normal']))
-        story.append(Paragraph(f"<b>Période :</b> Année {year}", styles['Normal']))
-        story.append(Spacer(1, 2 * cm))
-
-        # RÉSUMÉ EXÉCUTIF (KPI)
-        stats = self.db.get_statistics(year=self._get_year()) or {}
-        sales_total = float(stats.get("sales_total", 0))
-        purchases_total = float(stats.get("purchases_total", 0))
-        profit = sales_total - purchases_total
-        margin_pct = (profit / sales_total * 100) if sales_total > 0 else 0
-
-        story.append(Paragraph("📌 RÉSUMÉ EXÉCUTIF", heading_style))
-
-        kpi_data = [
-            ["Indicateur", "Valeur"],
-            ["Chiffre d'Affaires Total", f"{fmt_da(sales_total, 0)}"],
-            ["Achats Totaux", f"{fmt_da(purchases_total, 0)}"],
-            ["Profit Net", f"{fmt_da(profit, 0)}"],
-            ["Taux de Marge", f"{margin_pct:.1f} %"],
-            ["Nombre de Clients", f"{stats.get('total_clients', 0)}"],
-            ["Nombre de Produits", f"{stats.get('total_products', 0)}"],
-            ["Total des Ventes", f"{stats.get('total_sales', 0)}"],
-        ]
-
-        kpi_table = Table(kpi_data, colWidths=[8 * cm, 8 * cm])
-        kpi_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3B82F6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F3F4F6')]),
-        ]))
-        story.append(kpi_table)
-        story.append(Spacer(1, 0.5 * cm))
-        story.append(PageBreak())
-
-        # PAGE 2: STATISTIQUES DÉTAILLÉES
-        story.append(Paragraph("📊 STATISTIQUES MENSUELLES", heading_style))
-
-        MOIS = ["Jan", "Fév", "Mar", "Avr", "Mai", "Jun", "Jul", "Aoû", "Sep", "Oct", "Nov", "Déc"]
-        monthly_data = [["Mois", "Ventes", "Montant (DA)", "Panier Moyen"]]
-
-        monthly = {int(r["month"]): r for r in (self.db.get_sales_by_month(year) or [])}
-        for m in range(1, 13):
-            r = monthly.get(m, {"count": 0, "total": 0})
-            count = r.get("count", 0)
-            total = r.get("total", 0)
-            avg = total / count if count > 0 else 0
-            monthly_data.append([MOIS[m - 1], str(count), f"{total:,.0f}", f"{avg:,.0f}"])
-
-        monthly_table = Table(monthly_data, colWidths=[3 * cm, 3 * cm, 5 * cm, 5 * cm])
-        monthly_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3B82F6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F3F4F6')]),
-        ]))
-        story.append(monthly_table)
-        story.append(Spacer(1, 0.5 * cm))
+            return None
+        return self._start_stats_export(
+            _write_stats_pdf, path, "Génération du rapport PDF…",
+            "PDF Complet ✅", f"Rapport PDF détaillé généré avec succès !\n\n📄 Fichier : {path}",
+        )
 
-        if img_sales:
-            story.append(Paragraph("📈 Évolution des Ventes", styles['Heading3']))
-            story.append(Image(img_sales, width=15 * cm, height=7.5 * cm))
-            story.append(Spacer(1, 0.3 * cm))
 
-        story.append(PageBreak())
+# ─────────────────────────────────────────────────────────────
+#  ÉCRITURE DES EXPORTS (thread d'export, sans accès à la base)
+# ─────────────────────────────────────────────────────────────
 
-        # PAGE 3: TOP PRODUITS
-        story.append(Paragraph("🏆 TOP 10 PRODUITS LES PLUS VENDUS", heading_style))
+STATS_EXPORT_STEPS = 7
 
-        top_products = self.db.get_top_products(limit=10, year=self._get_year()) or []
-        prod_data = [["Rang", "Produit", "Quantité", "Montant (DA)"]]
-        for idx, prod in enumerate(top_products, 1):
-            prod_data.append([str(idx), prod.get("name", "—")[:30], str(int(prod.get("total_quantity", 0))), f"{prod.get('total_sales', 0):,.0f}"])
 
-        prod_table = Table(prod_data, colWidths=[1.5 * cm, 8 * cm, 3 * cm, 4 * cm])
-        prod_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F59E0B')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FFFBEB')]),
-        ]))
-        story.append(prod_table)
-        story.append(Spacer(1, 0.5 * cm))
+def _steps(progress, cancelled):
+    """Retourne step() : vérifie l'annulation puis notifie la section suivante."""
+    done = [0]
 
-        if img_prod:
-            story.append(Paragraph("📦 Visualisation", styles['Heading3']))
-            story.append(Image(img_prod, width=15 * cm, height=7.5 * cm))
+    def step():
+        if cancelled and cancelled():
+            raise ExportCancelled()
+        done[0] += 1
+        if progress:
+            progress(done[0])
+        return done[0]
 
-        story.append(PageBreak())
+    return step
 
-        # PAGE 4: TOP CLIENTS
-        story.append(Paragraph("👥 TOP 10 MEILLEURS CLIENTS", heading_style))
 
-        top_clients = self.db.get_top_clients(limit=10, year=self._get_year()) or []
-        client_data = [["Rang", "Nom Client", "Ventes", "Montant Total (DA)"]]
-        for idx, client in enumerate(top_clients, 1):
-            client_data.append([str(idx), client.get("name", "—")[:30], str(int(client.get("sale_count", 0))), f"{client.get('total_amount', 0):,.0f}"])
+def _write_stats_xlsx(path, data, charts, progress=None, cancelled=None):
+    import xlsxwriter
+    from datetime import datetime as dt
 
-        client_table = Table(client_data, colWidths=[1.5 * cm, 8 * cm, 3 * cm, 4 * cm])
-        client_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8B5CF6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F5F3FF')]),
-        ]))
-        story.append(client_table)
-        story.append(Spacer(1, 0.5 * cm))
+    step = _steps(progress, cancelled)
+    year, symbol, stats = data["year"], data["symbol"], data["stats"]
 
-        if img_clients:
-            story.append(Paragraph("📊 Visualisation", styles['Heading3']))
-            story.append(Image(img_clients, width=15 * cm, height=7.5 * cm))
+    with atomic_path(path) as tmp:
+        # constant_memory : chaque feuille est écrite ligne après ligne
+        wb = xlsxwriter.Workbook(tmp, {"constant_memory": True})
 
-        story.append(PageBreak())
+        # FORMATS
+        title_fmt = wb.add_format({"bold": True, "font_size": 14, "bg_color": "#1F2937", "font_color": "white", "align": "center", "valign": "vcenter", "border": 1})
+        header_fmt = wb.add_format({"bold": True, "bg_color": "#3B82F6", "font_color": "white", "border": 1, "align": "center", "valign": "vcenter"})
+        data_fmt = wb.add_format({"border": 1, "align": "left", "num_format": "#,##0.00"})
+        number_fmt = wb.add_format({"border": 1, "align": "center", "num_format": "#,##0"})
 
-        # PAGE 5: RENTABILITÉ
-        story.append(Paragraph("💎 TOP 10 PRODUITS PAR MARGE BRUTE", heading_style))
+        def table_sheet(name, title, headers, widths, rows, formats):
+            ws = wb.add_worksheet(name)
+            for col, width in widths:
+                ws.set_column(col, width)
+            ws.merge_range(0, 0, 0, len(headers) - 1, title, title_fmt)
+            for c, h in enumerate(headers):
+                ws.write(2, c, h, header_fmt)
+            for r, values in enumerate(rows, 3):
+                for c, (value, fmt) in enumerate(zip(values, formats)):
+                    ws.write(r, c, value, fmt)
+            step()
 
-        profitable = self.db.get_most_profitable_products(limit=10, year=self._get_year()) or []
-        profit_data = [["Rang", "Produit", "Quantité", "Marge Unit.", "Marge Totale"]]
-        for idx, prod in enumerate(profitable, 1):
-            profit_data.append([str(idx), prod.get("name", "—")[:28], str(int(prod.get("qty_sold", 0))), f"{prod.get('unit_margin', 0):,.0f}", f"{prod.get('total_margin', 0):,.0f}"])
+        try:
+            # FEUILLE 1: TABLEAU DE BORD (KPI)
+            ws = wb.add_worksheet("📊 Dashboard")
+            ws.set_column("A:A", 25)
+            ws.set_column("B:D", 18)
+            ws.merge_range(0, 0, 0, 3, "TABLEAU DE BORD KPI", title_fmt)
+            ws.write(1, 0, f"Généré le : {dt.now().strftime('%d/%m/%Y %H:%M')}")
+            ws.write(3, 0, "Indicateur", header_fmt)
+            ws.write(3, 1, "Valeur", header_fmt)
+            ws.write(3, 2, "Unité", header_fmt)
 
-        profit_table = Table(profit_data, colWidths=[1.5 * cm, 7 * cm, 2.5 * cm, 3.5 * cm, 3.5 * cm])
-        profit_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10B981')),
+            sales_total = float(stats.get("sales_total", 0))
+            purchases_total = float(stats.get("purchases_total", 0))
+            profit = sales_total - purchases_total
+            margin_pct = (profit / sales_total * 100) if sales_total > 0 else 0
+            kpis = [
+                ("Chiffre d'Affaires", sales_total, symbol),
+                ("Achats Totaux", purchases_total, symbol),
+                ("Profit Net", profit, symbol),
+                ("Taux de Marge", margin_pct, "%"),
+                ("Nombre Clients", stats.get("total_clients", 0), "clients"),
+                ("Nombre Produits", stats.get("total_products", 0), "produits"),
+                ("Total Ventes", stats.get("total_sales", 0), "transactions"),
+                ("Valeur du Stock", stats.get("stock_value", 0), symbol),
+            ]
+            for row, (kpi_name, value, unit) in enumerate(kpis, 4):
+                ws.write(row, 0, kpi_name, data_fmt)
+                ws.write(row, 1, value, data_fmt if unit == symbol else number_fmt)
+                ws.write(row, 2, unit, data_fmt)
+            step()
+
+            # FEUILLE 2: VENTES MENSUELLES
+            monthly_rows = []
+            prev_total = 0
+            for m in range(1, 13):
+                r = data["monthly"].get(m, {"count": 0, "total": 0})
+                count = r.get("count", 0)
+                total = r.get("total", 0)
+                avg = total / count if count > 0 else 0
+                growth = ((total - prev_total) / prev_total * 100) if prev_total > 0 else 0
+                monthly_rows.append((MONTHS_FR[m - 1], count, total, avg, growth))
+                prev_total = total
+            table_sheet("📈 Ventes Mensuelles", f"VENTES MENSUELLES {year}",
+                        ["Mois", "Nombre Ventes", "Montant (DA)", "Panier Moyen", "Croissance %"],
+                        [("A:A", 20), ("B:E", 18)], monthly_rows,
+                        [data_fmt, number_fmt, data_fmt, data_fmt, data_fmt])
+
+            # FEUILLE 3: PROFITS MENSUELS
+            table_sheet("💰 Profits Mensuels", f"PROFITS MENSUELS {year}",
+                        ["Mois", "Profit (DA)"], [("A:A", 20), ("B:B", 20)],
+                        [(MONTHS_FR[m - 1], data["profits"].get(m, {"profit": 0}).get("profit", 0))
+                         for m in range(1, 13)],
+                        [data_fmt, data_fmt])
+
+            # FEUILLE 4: TOP PRODUITS
+            table_sheet("🏆 Top Produits", "TOP 10 PRODUITS LES PLUS VENDUS",
+                        ["Rang", "Produit", "Quantité", "Montant (DA)"],
+                        [("A:A", 5), ("B:B", 40), ("C:D", 18)],
+                        [(idx, prod.get("name", "—"), int(prod.get("total_quantity", 0)), prod.get("total_sales", 0))
+                         for idx, prod in enumerate(data["top_products"], 1)],
+                        [number_fmt, data_fmt, number_fmt, data_fmt])
+
+            # FEUILLE 5: TOP CLIENTS
+            table_sheet("👥 Top Clients", "TOP 10 MEILLEURS CLIENTS",
+                        ["Rang", "Nom Client", "Nombre Ventes", "Montant Total (DA)"],
+                        [("A:A", 5), ("B:B", 35), ("C:D", 18)],
+                        [(idx, client.get("name", "—"), int(client.get("sale_count", 0)), client.get("total_amount", 0))
+                         for idx, client in enumerate(data["top_clients"], 1)],
+                        [number_fmt, data_fmt, number_fmt, data_fmt])
+
+            # FEUILLE 6: PRODUITS RENTABLES
+            table_sheet("💎 Rentabilité", "TOP 10 PRODUITS PAR MARGE BRUTE",
+                        ["Rang", "Produit", "Quantité", "Marge Unit. (DA)", "Marge Totale (DA)"],
+                        [("A:A", 5), ("B:B", 35), ("C:E", 18)],
+                        [(idx, prod.get("name", "—"), int(prod.get("qty_sold", 0)),
+                          prod.get("unit_margin", 0), prod.get("total_margin", 0))
+                         for idx, prod in enumerate(data["profitable"], 1)],
+                        [number_fmt, data_fmt, number_fmt, data_fmt, data_fmt])
+
+            # FEUILLE 7: GRAPHIQUES
+            for sheet_name, key in (("📊 Ventes", "sales"), ("💹 Profit", "profit"),
+                                    ("📦 Produits", "products"), ("🎯 Clients", "clients")):
+                if charts.get(key):
+                    ws = wb.add_worksheet(sheet_name)
+                    ws.set_column("A:A", 60)
+                    ws.insert_image("A1", charts[key], {"x_scale": 0.7, "y_scale": 0.7})
+            step()
+        finally:
+            wb.close()
+    return STATS_EXPORT_STEPS
+
+
+def _write_stats_pdf(path, data, charts, progress=None, cancelled=None):
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.lib import colors
+    from datetime import datetime as dt
+
+    step = _steps(progress, cancelled)
+    year, stats = data["year"], data["stats"]
+
+    styles = getSampleStyleSheet()
+    story = []
+
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1F2937'), spaceAfter=6, alignment=1, fontName='Helvetica-Bold')
+    heading_style = ParagraphStyle('CustomHeading', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#3B82F6'), spaceAfter=6, spaceBefore=8, fontName='Helvetica-Bold')
+
+    def table(rows, col_widths, head_color, stripe_color, extra=()):
+        t = Table(rows, colWidths=col_widths)
+        t.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(head_color)),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            *extra,
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F0FDF4')]),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor(stripe_color)]),
         ]))
-        story.append(profit_table)
-        story.append(Spacer(1, 0.5 * cm))
-
-        if img_profit:
-            story.append(Paragraph("💹 Évolution du Profit", styles['Heading3']))
-            story.append(Image(img_profit, width=15 * cm, height=7.5 * cm))
-
+        return t
+
+    def chart(key, caption):
+        if charts.get(key):
+            story.append(Paragraph(caption, styles['Heading3']))
+            story.append(Image(charts[key], width=15 * cm, height=7.5 * cm))
+
+    # PAGE 1: COUVERTURE
+    story.append(Spacer(1, 2 * cm))
+    story.append(Paragraph("📊 RAPPORT STATISTIQUE ERP", title_style))
+    story.append(Paragraph("Analyse Complète et Détaillée", styles['Heading2']))
+    story.append(Spacer(1, 1 * cm))
+    story.append(Paragraph(f"<b>Généré le :</b> {dt.now().strftime('%d/%m/%Y à %H:%M:%S')}", styles['Normal']))
+    story.append(Paragraph(f"<b>Période :</b> Année {year}", styles['Normal']))
+    story.append(Spacer(1, 2 * cm))
+
+    # RÉSUMÉ EXÉCUTIF (KPI)
+    sales_total = float(stats.get("sales_total", 0))
+    purchases_total = float(stats.get("purchases_total", 0))
+    profit = sales_total - purchases_total
+    margin_pct = (profit / sales_total * 100) if sales_total > 0 else 0
+
+    story.append(Paragraph("📌 RÉSUMÉ EXÉCUTIF", heading_style))
+    kpi_data = [
+        ["Indicateur", "Valeur"],
+        ["Chiffre d'Affaires Total", f"{fmt_da(sales_total, 0)}"],
+        ["Achats Totaux", f"{fmt_da(purchases_total, 0)}"],
+        ["Profit Net", f"{fmt_da(profit, 0)}"],
+        ["Taux de Marge", f"{margin_pct:.1f} %"],
+        ["Nombre de Clients", f"{stats.get('total_clients', 0)}"],
+        ["Nombre de Produits", f"{stats.get('total_products', 0)}"],
+        ["Total des Ventes", f"{stats.get('total_sales', 0)}"],
+    ]
+    story.append(table(kpi_data, [8 * cm, 8 * cm], '#3B82F6', '#F3F4F6', extra=[
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ]))
+    story.append(Spacer(1, 0.5 * cm))
+    story.append(PageBreak())
+    step()
+
+    # PAGE 2: STATISTIQUES DÉTAILLÉES
+    story.append(Paragraph("📊 STATISTIQUES MENSUELLES", heading_style))
+    monthly_data = [["Mois", "Ventes", "Montant (DA)", "Panier Moyen"]]
+    for m in range(1, 13):
+        r = data["monthly"].get(m, {"count": 0, "total": 0})
+        count = r.get("count", 0)
+        total = r.get("total", 0)
+        avg = total / count if count > 0 else 0
+        monthly_data.append([MONTHS_FR[m - 1], str(count), f"{total:,.0f}", f"{avg:,.0f}"])
+    story.append(table(monthly_data, [3 * cm, 3 * cm, 5 * cm, 5 * cm], '#3B82F6', '#F3F4F6', extra=[
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ]))
+    story.append(Spacer(1, 0.5 * cm))
+    chart("sales", "📈 Évolution des Ventes")
+    if charts.get("sales"):
+        story.append(Spacer(1, 0.3 * cm))
+    story.append(PageBreak())
+    step()
+
+    # PAGE 3: TOP PRODUITS
+    story.append(Paragraph("🏆 TOP 10 PRODUITS LES PLUS VENDUS", heading_style))
+    prod_data = [["Rang", "Produit", "Quantité", "Montant (DA)"]]
+    for idx, prod in enumerate(data["top_products"], 1):
+        prod_data.append([str(idx), prod.get("name", "—")[:30], str(int(prod.get("total_quantity", 0))), f"{prod.get('total_sales', 0):,.0f}"])
+    story.append(table(prod_data, [1.5 * cm, 8 * cm, 3 * cm, 4 * cm], '#F59E0B', '#FFFBEB'))
+    story.append(Spacer(1, 0.5 * cm))
+    chart("products", "📦 Visualisation")
+    story.append(PageBreak())
+    step()
+
+    # PAGE 4: TOP CLIENTS
+    story.append(Paragraph("👥 TOP 10 MEILLEURS CLIENTS", heading_style))
+    client_data = [["Rang", "Nom Client", "Ventes", "Montant Total (DA)"]]
+    for idx, client in enumerate(data["top_clients"], 1):
+        client_data.append([str(idx), client.get("name", "—")[:30], str(int(client.get("sale_count", 0))), f"{client.get('total_amount', 0):,.0f}"])
+    story.append(table(client_data, [1.5 * cm, 8 * cm, 3 * cm, 4 * cm], '#8B5CF6', '#F5F3FF'))
+    story.append(Spacer(1, 0.5 * cm))
+    chart("clients", "📊 Visualisation")
+    story.append(PageBreak())
+    step()
+
+    # PAGE 5: RENTABILITÉ
+    story.append(Paragraph("💎 TOP 10 PRODUITS PAR MARGE BRUTE", heading_style))
+    profit_data = [["Rang", "Produit", "Quantité", "Marge Unit.", "Marge Totale"]]
+    for idx, prod in enumerate(data["profitable"], 1):
+        profit_data.append([str(idx), prod.get("name", "—")[:28], str(int(prod.get("qty_sold", 0))), f"{prod.get('unit_margin', 0):,.0f}", f"{prod.get('total_margin', 0):,.0f}"])
+    story.append(table(profit_data, [1.5 * cm, 7 * cm, 2.5 * cm, 3.5 * cm, 3.5 * cm], '#10B981', '#F0FDF4'))
+    story.append(Spacer(1, 0.5 * cm))
+    chart("profit", "💹 Évolution du Profit")
+    step()
+
+    with atomic_path(path) as tmp:
+        doc = SimpleDocTemplate(tmp, pagesize=A4, topMargin=1 * cm, bottomMargin=1 * cm, leftMargin=1.5 * cm, rightMargin=1.5 * cm)
+        step()
         doc.build(story)
-
-        QMessageBox.information(self, "PDF Complet ✅", f"Rapport PDF détaillé généré avec succès !\n\n📄 Fichier : {path}")
\ No newline at end of file
+    step()
+    return STATS_EXPORT_STEPS
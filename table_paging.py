@@ -0,0 +1,44 @@
+"""
+Chargement par pages (keyset) des QTableWidget.
+
+La page suivante est chargée quand on atteint le bas du tableau, et tant
+que les lignes chargées ne remplissent pas la vue (grand écran, pas de
+barre de défilement) : sinon la suite de la liste serait inaccessible.
+"""
+
+from PyQt6.QtCore import QEvent, QObject
+
+
+class _ViewportWatcher(QObject):
+    """Relance le remplissage quand la vue du tableau change de taille."""
+
+    def __init__(self, table, fill):
+        super().__init__(table)
+        self._fill = fill
+        table.viewport().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Type.Resize:
+            self._fill()
+        return False
+
+
+def connect_keyset_paging(table, load_more, has_more):
+    """
+    Branche le chargement par pages de `table`. `load_more()` ajoute la page
+    suivante, `has_more()` dit s'il en reste. Retourne `fill()`, à appeler
+    après la première page.
+    """
+    bar = table.verticalScrollBar()
+
+    def fill():
+        while has_more() and table.verticalHeader().length() <= table.viewport().height():
+            load_more()
+
+    def on_scrolled(value):
+        if has_more() and value >= bar.maximum():
+            load_more()
+
+    bar.valueChanged.connect(on_scrolled)
+    table._keyset_watcher = _ViewportWatcher(table, fill)
+    return fill
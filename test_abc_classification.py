@@ -0,0 +1,96 @@
+from datetime import date
+
+import pytest
+
+import report_engine
+from db_manager import get_database
+from services import abc_classification
+
+AS_OF = date(2026, 6, 30)
+
+
+def _sell(db, cid, pid, amount, day="2026-06-10"):
+    db.create_sale(db.generate_invoice_number(), cid,
+                   [{"product_id": pid, "quantity": 1, "unit_price": amount}],
+                   tax_rate=0, sale_date=f"{day} 10:00:00")
+
+
+def _catalog(db):
+    cid = db.add_client("Client")
+    ids = {name: db.add_product(name, price, purchase_price=cost, stock_quantity=50, min_stock=5)
+           for name, price, cost in [("Tele", 700, 400), ("Radio", 200, 200), ("Cable", 60, 10),
+                                      ("Pile", 40, 20), ("Vase", 90, 50)]}
+    for name in ("Tele", "Radio", "Cable", "Pile"):
+        _sell(db, cid, ids[name], db.get_product_by_id(ids[name])["selling_price"])
+    _sell(db, cid, ids["Vase"], 90, day="2024-01-10")   # hors fenetre
+    return cid, ids
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_classify_cumulative_share_cutoffs(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(abc_classification, "np", None)
+    classes, shares = abc_classification.classify([60, 700, 0, 200, 40, -5])
+
+    assert classes == ["B", "A", "C", "A", "C", "C"]
+    assert shares[:5] == pytest.approx([0.96, 0.7, 1.0, 0.9, 1.0])
+    assert abc_classification.classify([0, 0]) == (["C", "C"], [1.0, 1.0])
+
+
+def test_refresh_classifies_whole_catalog_incrementally():
+    db = get_database()
+    cid, ids = _catalog(db)
+
+    assert abc_classification.refresh(db.db_path, as_of=AS_OF) == 5
+    rows = {r["product_id"]: r for r in db.conn.execute("SELECT * FROM product_abc")}
+    assert {name: rows[pid]["revenue_class"] for name, pid in ids.items()} == {
+        "Tele": "A", "Radio": "A", "Cable": "B", "Pile": "C", "Vase": "C"}
+    assert rows[ids["Radio"]]["margin_class"] == "C"        # vendue au cout
+    assert rows[ids["Tele"]]["revenue"] == pytest.approx(700)
+
+    # Seules les nouvelles lignes sont ajoutees au cumul journalier
+    for _ in range(20):
+        _sell(db, cid, ids["Pile"], 40)
+    abc_classification.refresh(db.db_path, as_of=AS_OF)
+    assert db.conn.execute("SELECT quantity FROM product_sales_daily WHERE product_id = ?",
+                           (ids["Pile"],)).fetchone()[0] == 21
+    assert [p["name"] for p in db.get_abc_products("A")] == ["Pile", "Tele"]
+
+    db.update_product(ids["Tele"], "Tele", 700, purchase_price=400, stock_quantity=2, min_stock=5)
+    assert [p["name"] for p in db.get_abc_products("A", low_stock=True)] == ["Tele"]
+    result = report_engine.stock_report(db, 1, "A")
+    assert result.column("name") == ("Tele",)
+    assert result.column("abc") == ("A",)
+
+
+def test_unclassified_catalog_is_left_to_the_worker(monkeypatch):
+    db = get_database()
+    _catalog(db)
+    woken = []
+    monkeypatch.setattr(abc_classification, "wake_abc_worker", woken.append)
+
+    assert db.get_abc_products("A") is None
+    assert woken == [db]
+    assert report_engine.stock_report(db).column("abc") == (None,) * 5   # pas de calcul a la lecture
+    assert abc_classification.last_refresh(db.conn) is None
+
+    worker = abc_classification.AbcWorker(db.db_path, startup_delay=3600)
+    worker.start()
+    try:
+        worker.wake()
+        for _ in range(100):
+            if abc_classification.last_refresh(db.conn) is not None:
+                break
+            worker.join(0.05)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert abc_classification.last_refresh(db.conn) is not None
+
+
+def test_class_query_uses_index():
+    db = get_database()
+    abc_classification.refresh(db.db_path)
+    plan = " ".join(row[-1] for row in db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT product_id FROM product_abc WHERE revenue_class = 'A'"))
+    assert "idx_product_abc_revenue_class" in plan
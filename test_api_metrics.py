@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+import api_server
+from services import api_metrics
+from services.query_profiler import PROFILER
+
+
+class _DummyDB:
+    def get_setting(self, key, default=None):
+        return "TEST_COMPANY"
+
+    def get_statistics(self):
+        return {"total_products": 1}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api_server, "API_ALLOWED_SUBNETS", [])
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    monkeypatch.setattr(api_server, "get_database", lambda: _DummyDB())
+    api_server._rate_limit_state.clear()
+    api_server.METRICS.reset()
+    yield api_server.app.test_client()
+    api_server.METRICS.reset()
+
+
+def _series(text):
+    """Lignes de valeurs: 'nom{labels}' -> valeur."""
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_registry_merges_thread_shards_into_cumulative_histogram():
+    registry = api_metrics.Registry()
+    hits = registry.counter("hits_total", "Appels", ("kind",))
+    latency = registry.histogram("latency_seconds", "Duree", buckets=(0.1, 1.0))
+
+    def work():
+        for _ in range(1000):
+            hits.inc("a")
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(2.0)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    hits.inc("b", value=2)
+
+    series = _series(registry.render())
+    assert series['hits_total{kind="a"}'] == 8000
+    assert series['hits_total{kind="b"}'] == 2
+    assert series['latency_seconds_bucket{le="0.1"}'] == 8
+    assert series['latency_seconds_bucket{le="1.0"}'] == 16
+    assert series['latency_seconds_bucket{le="+Inf"}'] == 24
+    assert series["latency_seconds_count"] == 24
+    assert series["latency_seconds_sum"] == pytest.approx(8 * 2.55)
+    # les tableaux des threads termines sont replies dans le total commun
+    assert len(registry._shards) == 1
+    assert _series(registry.render())['hits_total{kind="a"}'] == 8000
+
+
+def test_metrics_endpoint_counts_routes_auth_and_sync_payloads(client):
+    h = {"Authorization": "Bearer test-token"}
+    assert client.get("/api/status", headers=h).status_code == 200
+    assert client.get("/api/status").status_code == 401
+    assert client.get("/api/nulle-part").status_code == 404
+    client.post("/api/sync/push", headers=h, json={"clients": []})
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    series = _series(response.get_data(as_text=True))
+    assert series['erp_api_requests_total{route="/api/status",method="GET",status="200"}'] == 1
+    assert series['erp_api_requests_total{route="/api/status",method="GET",status="401"}'] == 1
+    assert series['erp_api_requests_total{route="<unmatched>",method="GET",status="404"}'] == 1
+    assert series['erp_api_request_duration_seconds_count{route="/api/status",method="GET"}'] == 2
+    assert series['erp_api_auth_total{result="static"}'] == 2
+    assert series['erp_api_auth_total{result="missing"}'] == 1
+    assert series['erp_api_sync_payload_bytes_count{direction="in"}'] == 1
+    assert "erp_db_profiling_enabled" in series
+
+
+def test_rate_limited_requests_and_remote_scrapes(client, monkeypatch):
+    monkeypatch.setattr(api_server, "API_RATE_LIMIT_MAX_REQUESTS", 1)
+    h = {"Authorization": "Bearer test-token"}
+    client.get("/api/status", headers=h)
+    assert client.get("/api/status", headers=h).status_code == 429
+
+    assert client.get("/api/metrics", environ_overrides={"REMOTE_ADDR": "192.168.1.20"}).status_code == 403
+    series = _series(client.get("/api/metrics").get_data(as_text=True))
+    assert series['erp_api_auth_total{result="rate_limited"}'] == 1
+    assert series['erp_api_requests_total{route="/api/status",method="GET",status="429"}'] == 1
+
+
+def test_db_statement_latency_comes_from_query_profiler():
+    PROFILER.reset()
+    PROFILER.configure(enabled=True)
+    try:
+        PROFILER.record(None, "SELECT 1", (), 3.0, 1)
+        PROFILER.record(None, "SELECT 2", (), 30.0, 1)
+        series = _series(api_metrics.db_metrics(PROFILER))
+    finally:
+        PROFILER.configure(enabled=False)
+        PROFILER.reset()
+    assert series["erp_db_profiling_enabled"] == 1
+    assert series['erp_db_statement_duration_seconds_bucket{le="0.005"}'] == 1
+    assert series['erp_db_statement_duration_seconds_bucket{le="0.05"}'] == 2
+    assert series["erp_db_statement_duration_seconds_sum"] == pytest.approx(0.033)
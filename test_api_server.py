@@ -207,3 +207,100 @@ def test_failed_login_writes_security_audit():
 
     assert response.status_code == 401
     assert after >= before + 1
+
+
+def test_produits_keyset_pagination(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    db = get_database()
+    for name in ["A", "B", "C"]:
+        db.add_product(name, 10)
+    client = api_server.app.test_client()
+    h = {"Authorization": "Bearer test-token"}
+
+    first = client.get("/api/produits?limit=2", headers=h).get_json()
+    assert [p["name"] for p in first["data"]] == ["A", "B"]
+    assert first["next_cursor"]
+
+    second = client.get(f"/api/produits?limit=2&after={first['next_cursor']}", headers=h).get_json()
+    assert [p["name"] for p in second["data"]] == ["C"]
+    assert second["next_cursor"] is None
+
+    bad = client.get("/api/produits?after=@@@", headers=h)
+    assert bad.status_code == 400
+
+
+def test_ventes_limit_without_cursor_is_not_capped_by_page_size(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    monkeypatch.setattr(api_server, "MAX_PAGE_SIZE", 2)
+    db = get_database()
+    pid = db.add_product("Stylo", 10, stock_quantity=100)
+    for _ in range(5):
+        db.create_sale(db.generate_invoice_number(), None,
+                       [{"product_id": pid, "quantity": 1, "unit_price": 10}], tax_rate=0)
+    client = api_server.app.test_client()
+    h = {"Authorization": "Bearer test-token"}
+
+    body = client.get("/api/ventes?limit=5", headers=h).get_json()
+    assert body["count"] == 5
+    assert body["next_cursor"] is None
+    body = client.get("/api/ventes?limit=3", headers=h).get_json()
+    assert body["count"] == 3
+    rest = client.get(f"/api/ventes?limit=3&after={body['next_cursor']}", headers=h).get_json()
+    assert rest["count"] == 2
+
+
+def test_produits_list_serializes_slot_models(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    db = get_database()
+    db.add_product("Gomme", 15)
+    client = api_server.app.test_client()
+
+    body = client.get("/api/produits", headers={"Authorization": "Bearer test-token"}).get_json()
+
+    (product,) = body["data"]
+    assert product["name"] == "Gomme"
+    assert product["image_base64"] is None
+    assert "category_name" in product
+
+
+def test_produits_since_uses_the_same_serializer(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    db = get_database()
+    old = db.add_product("Ancien", 10)
+    db.add_product("Nouveau", 20)
+    db.conn.execute("UPDATE products SET created_at = '2020-01-01', updated_at = '2020-01-01' WHERE id = ?", (old,))
+    db.conn.commit()
+    client = api_server.app.test_client()
+    h = {"Authorization": "Bearer test-token"}
+
+    listed = client.get("/api/produits?since=2024-01-01", headers=h).get_json()["data"]
+    synced = client.get("/api/sync?since=2024-01-01", headers=h).get_json()["data"]["produits"]
+
+    full = client.get("/api/produits", headers=h).get_json()["data"]
+    assert listed == synced == [p for p in full if p["name"] == "Nouveau"]
+    assert listed[0]["image_base64"] is None
+
+def test_facture_pdf_supports_etag_and_range(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", "test-token")
+    db = get_database()
+    cid = db.add_client("Client PDF")
+    pid = db.add_product("Cahier", 50, stock_quantity=10)
+    sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                             [{"product_id": pid, "quantity": 1, "unit_price": 50}])
+    client = api_server.app.test_client()
+    h = {"Authorization": "Bearer test-token"}
+
+    full = client.get(f"/api/factures/{sale_id}/pdf", headers=h)
+    assert full.status_code == 200
+    assert full.mimetype == "application/pdf"
+    assert full.data.startswith(b"%PDF")
+    etag = full.headers["ETag"]
+
+    again = client.get(f"/api/factures/{sale_id}/pdf", headers={**h, "If-None-Match": etag})
+    assert again.status_code == 304
+
+    part = client.get(f"/api/factures/{sale_id}/pdf", headers={**h, "Range": "bytes=0-99"})
+    assert part.status_code == 206
+    assert part.data == full.data[:100]
+
+    assert client.get("/api/factures/999999/pdf", headers=h).status_code == 404
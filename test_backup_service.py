@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db_manager import get_database
+from services import backup_service
+from services.backup_service import BackupCancelled, BackupError, create_backup, restore_backup
+
+
+def _seed(db, count):
+    cid = db.add_client("Client Sauvegarde")
+    pid = db.add_product("Article", 100, stock_quantity=100000)
+    for _ in range(count):
+        db.create_sale(db.generate_invoice_number(), cid,
+                       [{"product_id": pid, "quantity": 1, "unit_price": 100}])
+    return cid, pid
+
+
+def test_online_backup_does_not_block_writers(tmp_path, monkeypatch):
+    db = get_database()
+    cid, _ = _seed(db, 5)
+    db.conn.execute("CREATE TABLE filler (data BLOB)")
+    db.conn.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,) for _ in range(1500)])
+    db.conn.commit()
+    monkeypatch.setattr(backup_service, "BACKUP_PAGES", 16)
+    monkeypatch.setattr(backup_service, "STEP_PAUSE", 0.001)
+
+    steps, waits, stop = [], [], threading.Event()
+
+    def till():
+        conn = sqlite3.connect(db.db_path, timeout=10)
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn.execute("UPDATE clients SET phone = ? WHERE id = ?", (str(started), cid))
+            conn.commit()
+            waits.append(time.perf_counter() - started)
+        conn.close()
+
+    writer = threading.Thread(target=till)
+    writer.start()
+    try:
+        path = create_backup(db.db_path, str(tmp_path / "copie.db"), progress=steps.append)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert len(steps) > 10 and waits
+    assert max(waits) < 2
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 5
+    conn.close()
+
+
+def test_cancelled_backup_leaves_no_file(tmp_path):
+    db = get_database()
+    _seed(db, 1)
+    with pytest.raises(BackupCancelled):
+        create_backup(db.db_path, str(tmp_path / "copie.db"), cancelled=lambda: True)
+
+    assert list(tmp_path.glob("copie.db*")) == []
+
+
+def test_restore_verifies_then_swaps(tmp_path):
+    db = get_database()
+    _seed(db, 2)
+    backup = create_backup(db.db_path, str(tmp_path / "copie.db"))
+    _seed(db, 3)
+    db.set_setting("company_name", "Apres sauvegarde")
+
+    corrupt = tmp_path / "corrupt.db"
+    corrupt.write_bytes(open(backup, "rb").read()[:4096] + b"\0garbage" * 2000)
+    with pytest.raises(BackupError):
+        restore_backup(db, str(corrupt))
+    assert db.conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 5
+
+    restore_backup(db, backup)
+
+    assert db.conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 2
+    assert db.get_setting("company_name", "") != "Apres sauvegarde"
+
+
+def test_restore_is_seen_by_other_open_connections(tmp_path):
+    db = get_database()
+    _seed(db, 2)
+    backup = create_backup(db.db_path, str(tmp_path / "copie.db"))
+    _seed(db, 3)
+    reader = sqlite3.connect(db.db_path)     # ex: lecteur des cohortes, travail planifie
+    try:
+        assert reader.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 5
+        version = reader.execute("PRAGMA data_version").fetchone()[0]
+
+        restore_backup(db, backup)
+
+        assert reader.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 2
+        assert reader.execute("PRAGMA data_version").fetchone()[0] != version
+        reader.execute("INSERT INTO clients(name) VALUES ('Apres restauration')")
+        reader.commit()
+    finally:
+        reader.close()
+    assert db.conn.execute("SELECT COUNT(*) FROM clients WHERE name = 'Apres restauration'").fetchone()[0] == 1
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_busy_source_without_wal_falls_back_to_single_step(tmp_path, monkeypatch):
+    source = str(tmp_path / "rollback.db")
+    conn = sqlite3.connect(source)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("CREATE TABLE t (data BLOB)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(b"x" * 4000,) for _ in range(200)])
+    conn.commit()
+    monkeypatch.setattr(backup_service, "REQUIRED_TABLES", ("t",))
+
+    def step_then_write(copied):
+        conn.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+
+    backup_service.copy_database(source, str(tmp_path / "out.db"), pages=8,
+                                 progress=step_then_write)
+
+    out = sqlite3.connect(str(tmp_path / "out.db"))
+    assert out.execute("SELECT COUNT(*) FROM t").fetchone()[0] > 200
+    out.close()
+    conn.close()
@@ -0,0 +1,75 @@
+import sqlite3
+
+from db_manager import get_database
+from services import backup_store
+from services.backup_service import create_backup, list_backups, restore_backup
+from services.backup_store import BackupStore
+
+
+def _fill(db, rows):
+    db.conn.execute("CREATE TABLE IF NOT EXISTS archive (id INTEGER PRIMARY KEY, note TEXT)")
+    db.conn.executemany("INSERT INTO archive (note) VALUES (?)",
+                        [(f"ligne {i:06d} " + "x" * 200,) for i in range(rows)])
+    db.conn.commit()
+
+
+def test_second_snapshot_stores_only_changed_chunks(tmp_path):
+    db = get_database()
+    _fill(db, 20000)
+    store = BackupStore(str(tmp_path / "bk"))
+
+    first = store.snapshot(db.db_path)
+    db.add_client("Nouveau client")
+    second = store.snapshot(db.db_path)
+
+    assert first.new_chunks == first.chunk_count > 20
+    assert 0 < second.new_chunks <= 4
+    assert second.stored_bytes < first.stored_bytes / 10
+    assert store.stored_size() < first.size
+    assert [s.id for s in store.snapshots()] == [second.id, first.id]
+
+
+def test_any_snapshot_can_be_extracted(tmp_path):
+    db = get_database()
+    _fill(db, 2000)
+    store = BackupStore(str(tmp_path / "bk"))
+    first = store.snapshot(db.db_path)
+    db.add_client("Apres le premier")
+    store.snapshot(db.db_path)
+
+    out = store.extract(first.id, str(tmp_path / "premier.db"))
+
+    conn = sqlite3.connect(out)
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert conn.execute("SELECT COUNT(*) FROM clients WHERE name = 'Apres le premier'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0] == 2000
+    conn.close()
+
+
+def test_prune_keeps_max_count_and_drops_orphan_chunks(tmp_path):
+    db = get_database()
+    folder = str(tmp_path / "bk")
+    for i in range(4):
+        _fill(db, 500)
+        create_backup(db.db_path, backup_dir=folder, max_count=2)
+
+    store = BackupStore(folder)
+    kept = list_backups(folder)
+    assert len(kept) == 2
+    referenced = {d for s in kept for d in store.load_manifest(s.id)["chunks"]}
+    on_disk = {p.name.split(".")[0] for p in (tmp_path / "bk" / "chunks").glob("*/*")}
+    assert on_disk == referenced
+
+
+def test_restore_from_manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_store, "CHUNK_PAGES", 4)
+    db = get_database()
+    db.add_client("Avant")
+    manifest = create_backup(db.db_path, backup_dir=str(tmp_path / "bk"), label="test")
+    db.add_client("Apres")
+
+    restore_backup(db, manifest)
+
+    names = [r[0] for r in db.conn.execute("SELECT name FROM clients")]
+    assert names == ["Avant"]
+    assert manifest.endswith("_test.json")
@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+
+import pytest
+
+import report_engine
+from db_manager import get_database
+from services import client_segments
+
+TODAY = date(2026, 6, 30)
+
+
+def _buy(db, client_id, days_ago, total):
+    pid = db.add_product(f"P{client_id}-{days_ago}", total, stock_quantity=1)
+    db.create_sale(db.generate_invoice_number(), client_id,
+                   [{"product_id": pid, "quantity": 1, "unit_price": total}], tax_rate=0,
+                   sale_date=f"{(TODAY - timedelta(days=days_ago)).isoformat()} 10:00:00")
+
+
+def _clients(db):
+    ids = {}
+    for name, purchases in [("Fidele", [(1, 900), (20, 900), (40, 900), (60, 900)]),
+                            ("Nouveau", [(2, 100)]),
+                            ("Endormi", [(200, 800), (260, 800), (300, 800)]),
+                            ("Perdu", [(400, 50)]),
+                            ("Moyen", [(30, 300), (90, 300)])]:
+        ids[name] = db.add_client(name)
+        for days_ago, total in purchases:
+            _buy(db, ids[name], days_ago, total)
+    ids["Jamais"] = db.add_client("Jamais")
+    return ids
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_rfm_scores_and_segments(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(client_segments, "np", None)
+    db = get_database()
+    ids = _clients(db)
+
+    assert client_segments.refresh_segments(db.conn, as_of=TODAY) == 5
+    segments = client_segments.all_segments(db.conn)
+
+    fidele = segments[ids["Fidele"]]
+    assert (fidele["recency_days"], fidele["frequency"], fidele["monetary"]) == (1, 4, 3600)
+    assert (fidele["r_score"], fidele["f_score"], fidele["m_score"]) == (5, 5, 5)
+    assert {name: segments[ids[name]]["segment"] for name in ("Fidele", "Nouveau", "Endormi", "Perdu")} == {
+        "Fidele": "champions", "Nouveau": "new", "Endormi": "at_risk", "Perdu": "lost"}
+    assert ids["Jamais"] not in segments
+
+
+def test_new_sales_rescore_only_their_clients_against_stored_quintiles():
+    db = get_database()
+    ids = _clients(db)
+    client_segments.refresh_segments(db.conn, as_of=TODAY)
+    before = client_segments.all_segments(db.conn)
+
+    for days_ago in (0, 0, 0):
+        _buy(db, ids["Perdu"], days_ago, 2000)
+    assert client_segments.refresh_segments(db.conn, as_of=TODAY) == 1
+    assert client_segments.refresh_segments(db.conn, as_of=TODAY) == 0
+
+    after = client_segments.all_segments(db.conn)
+    assert after[ids["Perdu"]]["segment"] == "champions"
+    assert after[ids["Moyen"]] == before[ids["Moyen"]]
+    report = report_engine.clients_report(db)
+    labels = dict(zip(report.column("name"), report.column("segment")))
+    assert labels["Perdu"] == "champions" and labels["Jamais"] is None
+
+
+def test_ties_on_a_quintile_edge_do_not_penalize_recent_clients():
+    r, f, m, segments, _ = client_segments.score([0, 0, 0, 0, 0], [1, 1, 1, 1, 2], [10, 10, 10, 10, 10])
+    assert r == [5] * 5 and f == [1, 1, 1, 1, 5]
+    assert segments[:4] == ["new"] * 4
+
+
+def test_reads_stay_incremental_and_leave_the_daily_refresh_to_the_worker(monkeypatch):
+    db = get_database()
+    ids = _clients(db)
+    woken = []
+    monkeypatch.setattr(client_segments, "wake_segments_worker", woken.append)
+
+    assert db.get_client_segments() == {} and woken == [db]        # jamais calcule
+    client_segments.refresh_segments(db.conn, as_of=TODAY)          # calcul d'un jour precedent
+    _buy(db, ids["Perdu"], 0, 2000)
+
+    segments = db.get_client_segments()
+
+    assert len(woken) == 2                                           # complet du jour demande
+    assert segments[ids["Perdu"]]["monetary"] == 2050                 # nouvel acheteur rescore
+    assert client_segments._state(db.conn)[0] == TODAY.isoformat()   # toujours a refaire
+
+    worker = client_segments.SegmentsWorker(db.db_path, startup_delay=3600)
+    worker.start()
+    try:
+        worker.wake()
+        for _ in range(100):
+            if not client_segments.is_due(db.db_path):
+                break
+            worker.join(0.05)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert not client_segments.is_due(db.db_path)
+    assert not client_segments.wake_if_due(db) and len(woken) == 2
@@ -0,0 +1,62 @@
+import pytest
+
+import report_engine
+from db_manager import get_database
+from services import cohort_analysis
+
+
+def _buy(db, client_id, day, total):
+    pid = db.add_product(f"P{client_id}-{day}-{total}", total, stock_quantity=1)
+    db.create_sale(db.generate_invoice_number(), client_id,
+                   [{"product_id": pid, "quantity": 1, "unit_price": total}], tax_rate=0,
+                   sale_date=f"{day} 10:00:00")
+
+
+def _history(db):
+    a, b, c = (db.add_client(name) for name in ("A", "B", "C"))
+    for client, day, total in [(a, "2025-01-05", 100), (a, "2025-01-20", 50), (b, "2025-01-09", 200),
+                               (a, "2025-02-03", 80), (c, "2025-02-14", 300), (c, "2025-03-01", 30),
+                               (a, "2025-04-30", 10)]:
+        _buy(db, client, day, total)
+    return a
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_retention_matrix_by_first_purchase_month(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(cohort_analysis, "np", None)
+    db = get_database()
+    _history(db)
+
+    data = cohort_analysis.compute(db.conn)
+
+    assert data.months == ["2025-01", "2025-02", "2025-03", "2025-04"]
+    assert data.sizes == [2, 1, 0, 0]
+    assert data.repeat == [1, 1, 0, 0]
+    assert data.active[0] == [2, 1, 0, 1]
+    assert data.active[1] == [1, 1, 0, None]
+    assert data.revenue[0][0] == pytest.approx(350)
+    assert data.revenue[1][:2] == pytest.approx([300, 30])
+
+
+def test_cohort_report_and_cache_per_data_version():
+    db = get_database()
+    a = _history(db)
+
+    first = cohort_analysis.cohorts(db.db_path)
+    assert cohort_analysis.cohorts(db.db_path) is first
+
+    result = report_engine.cohort_report(db)
+    assert result.column("cohort") == ("2025-01", "2025-02")
+    assert result.column("revenue") == pytest.approx((440, 330))
+    assert result.column("m1") == pytest.approx((50, 100))
+    assert result.column("m3")[0] == pytest.approx(50)
+    assert result.column("m3")[1] is None
+    assert result.totals["m1"] == pytest.approx(200 / 3)
+    assert result.totals["repeat_rate"] == pytest.approx(200 / 3)
+    assert report_engine.cohort_report(db, "2025-02-01", "2025-12-31").column("cohort") == ("2025-02",)
+
+    _buy(db, a, "2025-05-02", 40)
+    after = cohort_analysis.cohorts(db.db_path)
+    assert after is not first
+    assert after.months[-1] == "2025-05"
@@ -0,0 +1,87 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+import report_engine
+from db_manager import get_database
+
+MIGRATION = Path(__file__).parent / "migrations" / "sql" / "V010__cost_engine.py"
+
+
+def _setup(db, method):
+    db.set_setting("cost_method", method)
+    cid = db.add_client("Client")
+    sid = db.add_supplier("Fournisseur")
+    pid = db.add_product("Article", 300, purchase_price=100, stock_quantity=10)
+    db.create_purchase("A-1", sid, [{"product_id": pid, "product_name": "Article",
+                                     "quantity": 10, "unit_price": 200}], tax_rate=0)
+    return cid, pid
+
+
+def _sell(db, cid, pid, quantity):
+    sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                             [{"product_id": pid, "quantity": quantity, "unit_price": 300}], tax_rate=0)
+    return sale_id, db.conn.execute("SELECT unit_cost FROM sale_items WHERE sale_id = ?", (sale_id,)).fetchone()[0]
+
+
+def test_average_cost_is_stamped_and_margins_ignore_later_price_changes():
+    db = get_database()
+    cid, pid = _setup(db, "average")
+
+    sale_id, unit_cost = _sell(db, cid, pid, 5)
+    db.update_product(pid, "Article", 300, purchase_price=999, stock_quantity=15)
+
+    assert unit_cost == 150
+    top = db.get_most_profitable_products()[0]
+    assert top["gross_margin"] == 5 * 300 - 5 * 150
+    assert report_engine.profit_report(db).totals["cost"] == 750
+
+    db.create_return(sale_id, [{"product_id": pid, "quantity": 2, "unit_price": 300, "total": 600}])
+    assert db.conn.execute("SELECT unit_cost FROM return_items").fetchone()[0] == 150
+
+
+def test_fifo_consumes_oldest_layers_first():
+    db = get_database()
+    cid, pid = _setup(db, "fifo")
+
+    _, first = _sell(db, cid, pid, 15)
+    _, second = _sell(db, cid, pid, 5)
+    _, beyond = _sell(db, cid, pid, 2)
+
+    assert first == pytest.approx((10 * 100 + 5 * 200) / 15)
+    assert second == 200
+    assert beyond == 150        # plus de couche: cout moyen
+    remaining = db.conn.execute("SELECT COALESCE(SUM(remaining), 0) FROM cost_layers").fetchone()[0]
+    assert remaining == 0
+
+
+def test_cancelled_sale_returns_goods_at_their_sold_cost():
+    db = get_database()
+    cid, pid = _setup(db, "fifo")
+    sale_id, unit_cost = _sell(db, cid, pid, 12)
+
+    db.delete_sale(sale_id)
+
+    layer = db.conn.execute("SELECT quantity, unit_cost FROM cost_layers WHERE source = 'sale_deletion'").fetchone()
+    assert tuple(layer) == (12, pytest.approx(unit_cost))
+    assert db.conn.execute("SELECT SUM(remaining) FROM cost_layers").fetchone()[0] == 20
+
+
+def test_unit_cost_migration_backfills_existing_rows_in_batches():
+    db = get_database()
+    cid, pid = _setup(db, "average")
+    for _ in range(5):
+        _sell(db, cid, pid, 1)
+    db.conn.execute("UPDATE sale_items SET unit_cost = NULL")
+    db.conn.execute("UPDATE products SET purchase_price = 80 WHERE id = ?", (pid,))
+    db.conn.commit()
+
+    spec = importlib.util.spec_from_file_location("v010", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    migration.BATCH = 2
+    migration.migrate(db.conn)
+
+    costs = db.conn.execute("SELECT DISTINCT unit_cost FROM sale_items").fetchall()
+    assert [r[0] for r in costs] == [80]
@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+import currency
+from currency import currency_manager, fmt_da, fmt_da_many, format_many
+
+EDGE_VALUES = [0, 0.0, -0.0, 1, -1, 999.995, 1.005, 2.675, 0.5, -0.001, 1234567.891,
+               -9876543.21, 10 ** 15, -1e20, float("nan"), float("inf"), "12.5"]
+
+
+def _sample():
+    rng = random.Random(7)
+    values = [round(rng.uniform(-1e7, 1e7), rng.choice([0, 2, 3])) for _ in range(2000)]
+    return values + EDGE_VALUES + [rng.choice(values[:20]) for _ in range(500)]
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_bulk_matches_scalar_formatting(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(currency, "np", None)
+    values = _sample()
+
+    assert fmt_da_many(values) == [fmt_da(v) for v in values]
+    assert fmt_da_many(values, False, 2) == [fmt_da(v, False, 2) for v in values]
+    for code in ("DZD", "EUR", "TND"):
+        assert format_many(values, code) == [currency_manager.format(v, code) for v in values]
+
+
+def test_invalid_values_fall_back_to_scalar_rules():
+    values = [None, "abc", 3] * 40
+    assert fmt_da_many(values)[:3] == ["0 DA", "0 DA", "3 DA"]
+    assert format_many(values, "EUR")[:3] == ["€ 0.00", "€ 0.00", "€ 3.00"]
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+import currency
+import report_engine
+from currency import CurrencyManager
+from db_manager import get_database
+
+
+def _manager(db):
+    manager = CurrencyManager()
+    manager.load(db)
+    manager.record_rate("EUR", 140.0, "2026-01-01")
+    manager.record_rate("EUR", 150.0, "2026-03-01")
+    manager.record_rate("USD", 130.0, "2026-02-01")
+    return manager
+
+
+def test_as_of_lookup_uses_rate_valid_at_date():
+    db = get_database()
+    manager = _manager(db)
+
+    assert manager.get_rate_to_dzd_at("EUR", "2025-06-30") == 140.0
+    assert manager.get_rate_to_dzd_at("EUR", "2026-02-28 23:59:59") == 140.0
+    assert manager.get_rate_to_dzd_at("EUR", datetime(2026, 3, 1, 8)) == 150.0
+    assert manager.convert_at(300, "2026-03-02", to="EUR") == 2.0
+
+    reloaded = CurrencyManager()
+    reloaded.load(db)
+    assert reloaded.get_rate_to_dzd_at("EUR", "2026-04-01") == 150.0
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_convert_series_in_one_pass_without_queries(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(currency, "np", None)
+    db = get_database()
+    manager = _manager(db)
+    dates = ["2026-01-15 10:00:00", "2026-03-15 10:00:00"] * 100
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+
+    converted = manager.convert_series([1400, 1500] * 100, dates, "EUR")
+
+    assert statements == []
+    assert converted[:2] == pytest.approx([10.0, 10.0])
+    assert manager.convert_series([260], ["2026-02-10"], "USD", from_code="DZD") == [2.0]
+
+
+def test_saving_a_new_rate_keeps_the_old_one_for_past_dates():
+    db = get_database()
+    manager = CurrencyManager()
+    manager.load(db)
+    manager.set_rate_to_dzd("EUR", 160.0)
+    manager.save(db)
+
+    assert manager.get_rate_to_dzd_at("EUR", "2020-01-01") == currency.DEFAULT_RATES_TO_DZD["EUR"]
+    assert manager.get_rate_to_dzd_at("EUR", datetime.now()) == 160.0
+
+
+def test_sales_report_converts_totals_at_sale_dates():
+    db = get_database()
+    manager = _manager(db)
+    cid = db.add_client("Client Devises")
+    pid = db.add_product("Article", 100, stock_quantity=10)
+    for day in ("2026-01-10 09:00:00", "2026-03-10 09:00:00"):
+        sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                                 [{"product_id": pid, "quantity": 1, "unit_price": 100}])
+        db.conn.execute("UPDATE sales SET sale_date = ?, total = ? WHERE id = ?",
+                        (day, 1500 if day.startswith("2026-03") else 1400, sale_id))
+    db.conn.commit()
+
+    result = report_engine.add_converted_column(report_engine.sales_report(db), "total",
+                                                "sale_date", "EUR", "total_eur", manager=manager)
+
+    assert result.column("total_eur") == pytest.approx((10.0, 10.0))
+    assert "revenue_converted" in report_engine.sales_report(db, to_code="EUR").totals
@@ -0,0 +1,46 @@
+import tracemalloc
+
+from db_manager import get_database, namedtuple_row, tuple_row
+
+
+def _seed_sale_lines(db, n_items):
+    pid = db.add_product("Article", 10, stock_quantity=0)
+    db.cursor.execute(
+        "INSERT INTO sales (invoice_number, subtotal, tax_amount, total, sale_date) "
+        "VALUES ('FAC-1000', 0, 0, 0, '2026-01-01 10:00:00')")
+    sale_id = db.cursor.lastrowid
+    db.cursor.executemany(
+        "INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total) "
+        "VALUES (?, ?, 1, 10, 10)",
+        ((sale_id, pid) for _ in range(n_items)))
+    db.conn.commit()
+
+
+def test_iter_query_row_factories():
+    db = get_database()
+    db.add_client("Alice", "0555")
+
+    as_row = next(db.iter_clients())
+    assert as_row["name"] == "Alice"
+
+    as_tuple = next(db.iter_query("SELECT name, phone FROM clients", row_factory=tuple_row))
+    assert as_tuple == ("Alice", "0555")
+
+    as_nt = next(db.iter_query("SELECT name, phone FROM clients", row_factory=namedtuple_row))
+    assert (as_nt.name, as_nt.phone) == ("Alice", "0555")
+
+
+def test_iter_sale_lines_streams_in_bounded_memory():
+    db = get_database()
+    _seed_sale_lines(db, 50_000)
+
+    tracemalloc.start()
+    count = 0
+    for line in db.iter_sale_lines(row_factory=tuple_row, arraysize=500):
+        count += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == 50_000
+    # Bien en dessous de la liste materialisee (plusieurs dizaines de Mo)
+    assert peak < 2 * 1024 * 1024
@@ -0,0 +1,77 @@
+from datetime import date, timedelta
+
+import pytest
+
+from db_manager import get_database
+from services import demand_forecast
+
+END = date(2026, 6, 30)
+
+
+def _history(db):
+    cid = db.add_client("Client")
+    steady = db.add_product("Eau 1.5L", 50, purchase_price=30, stock_quantity=1000, min_stock=5)
+    idle = db.add_product("Parapluie", 900, purchase_price=400, stock_quantity=3, min_stock=2)
+    for day in range(120):
+        sold_on = END - timedelta(days=day)
+        db.create_sale(db.generate_invoice_number(), cid,
+                       [{"product_id": steady, "quantity": 4, "unit_price": 50}],
+                       tax_rate=0, sale_date=f"{sold_on.isoformat()} 10:00:00")
+    db.update_product(steady, "Eau 1.5L", 50, purchase_price=30, stock_quantity=40, min_stock=5)
+    return steady, idle
+
+
+@pytest.mark.parametrize("numpy_enabled", [True, False])
+def test_forecast_flags_items_running_out_before_lead_time(monkeypatch, numpy_enabled):
+    if not numpy_enabled:
+        monkeypatch.setattr(demand_forecast, "np", None)
+    db = get_database()
+    steady, idle = _history(db)
+
+    forecast = demand_forecast.compute(db.conn, end=END, lead_days=7, review_days=14)
+    rows = {row[0]: row for row in forecast.rows()}
+
+    _, demand, moving_avg, sigma, stock, cover, reorder_point, qty = rows[steady]
+    assert demand == pytest.approx(4, rel=1e-4)
+    assert (moving_avg, sigma, stock) == (pytest.approx(4), pytest.approx(0, abs=1e-6), 40)
+    assert cover == pytest.approx(10, rel=1e-4)
+    assert reorder_point == pytest.approx(28, rel=1e-4)
+    assert qty == 0                          # 40 > 28 : pas encore
+
+    # Produit sans vente: seul le stock minimum compte
+    assert rows[idle][5] is None
+    assert rows[idle][6:] == (2, 0)
+
+
+def test_refresh_stores_suggestions_for_purchase_draft(monkeypatch):
+    db = get_database()
+    steady, _ = _history(db)
+    db.update_product(steady, "Eau 1.5L", 50, purchase_price=30, stock_quantity=20, min_stock=5)
+
+    woken = []
+    monkeypatch.setattr(demand_forecast, "wake_forecast_worker", woken.append)
+    assert db.get_reorder_suggestions() is None      # jamais calculees: demandees en arriere-plan
+    assert woken == [db]
+
+    assert demand_forecast.refresh_forecasts(db.db_path, end=END, lead_days=7, review_days=14) == 2
+    suggestions = db.get_reorder_suggestions()
+
+    assert [(s["name"], s["order_qty"]) for s in suggestions] == [("Eau 1.5L", 84 - 20)]
+    assert suggestions[0]["purchase_price"] == 30
+
+
+def test_woken_worker_skips_startup_delay():
+    db = get_database()
+    _history(db)
+    worker = demand_forecast.ForecastWorker(db.db_path, startup_delay=3600)
+    worker.start()
+    try:
+        worker.wake()
+        for _ in range(100):
+            if demand_forecast.last_refresh(db.conn) is not None:
+                break
+            worker.join(0.05)
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert demand_forecast.last_refresh(db.conn) is not None
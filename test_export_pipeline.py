@@ -0,0 +1,69 @@
+import csv
+import zipfile
+
+import pytest
+
+from db_manager import get_database
+from export_pipeline import (ExportCancelled, ExportWorker, QuerySource,
+                             write_csv, write_pdf, write_xlsx)
+
+
+def _source(n=1200):
+    db = get_database()
+    db.cursor.executemany(
+        "INSERT INTO clients (name, phone) VALUES (?, ?)",
+        [(f"Client {i:05d}", f"05{i:08d}") for i in range(n)])
+    db.conn.commit()
+    return QuerySource(db.db_path, "SELECT name, phone FROM clients ORDER BY name",
+                       row_mapper=lambda names: lambda row: [row[0].upper(), row[1]])
+
+
+def test_csv_streams_query_rows_with_progress(tmp_path):
+    seen = []
+    path = tmp_path / "clients.csv"
+
+    count = write_csv(str(path), ["Nom", "Tel"], _source(), progress=seen.append)
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    assert count == 1200
+    assert rows[0] == ["Nom", "Tel"] and rows[1] == ["CLIENT 00000", "0500000000"]
+    assert seen == [500, 1000, 1200]
+
+
+def test_xlsx_and_pdf_are_written(tmp_path):
+    xlsx = tmp_path / "r.xlsx"
+    pdf = tmp_path / "r.pdf"
+
+    source = _source()
+
+    assert write_xlsx(str(xlsx), ["Nom", "Tel"], source, title="Clients") == 1200
+    assert write_pdf(str(pdf), ["Nom", "Tel"], source, title="Clients", chunk_rows=100) == 1200
+
+    with zipfile.ZipFile(xlsx) as z:
+        assert "xl/worksheets/sheet1.xml" in z.namelist()
+    data = pdf.read_bytes()
+    assert data.startswith(b"%PDF") and data.count(b"/Type /Page\n") > 10
+
+
+def test_cancel_leaves_no_partial_file(tmp_path):
+    path = tmp_path / "annule.csv"
+
+    with pytest.raises(ExportCancelled):
+        write_csv(str(path), ["Nom", "Tel"], _source(), cancelled=lambda: True)
+
+    assert not path.exists()
+    assert not (tmp_path / "annule.csv.part").exists()
+
+
+def test_worker_reports_abort_and_completion():
+    events = []
+    worker = ExportWorker(lambda progress, cancelled: 42)
+    worker.finished.connect(events.append)
+    worker.run()
+
+    aborted = ExportWorker(lambda progress, cancelled: (_ for _ in ()).throw(ExportCancelled()))
+    aborted.aborted.connect(lambda: events.append("aborted"))
+    aborted.run()
+
+    assert events == [42, "aborted"]
@@ -0,0 +1,94 @@
+from db_manager import get_database
+from services import integrity_service as integrity
+
+
+def _seed_anomalies(db):
+    cid = db.add_client("Client")
+    pid = db.add_product("Article", 100, stock_quantity=10)
+    db.create_sale(db.generate_invoice_number(), cid,
+                   [{"product_id": pid, "quantity": 2, "unit_price": 100}])
+    db.conn.execute("INSERT INTO sale_items (sale_id, product_id, quantity, unit_price, total) "
+                    "VALUES (999, ?, 1, 100, 100)", (pid,))
+    db.conn.execute("UPDATE sales SET client_id = 777")
+    db.conn.execute("UPDATE products SET category_id = 55, stock_quantity = stock_quantity - 1")
+    db.conn.commit()
+    return pid
+
+
+def _open_keys(db):
+    return {f["check_key"]: f for f in integrity.open_findings(db.db_path)}
+
+
+def test_checks_find_orphans_foreign_keys_and_stock_drift():
+    db = get_database()
+    _seed_anomalies(db)
+    steps = []
+
+    report = integrity.run_checks(db.db_path, progress=steps.append, pause=0)
+
+    assert report.status == "done" and steps[-1] == report.checks > 10
+    found = _open_keys(db)
+    assert set(found) == {"orphan:sale_items_sale", "orphan:sales_client",
+                          "foreign_key:products:categories", "stock:mismatch"}
+    assert found["orphan:sale_items_sale"]["severity"] == "error"
+    assert found["stock:mismatch"]["details"].endswith("stock 7, mouvements 8")
+    assert integrity.summary(db.db_path)["error"] == 1
+
+
+def test_opening_stock_is_not_reported_as_drift():
+    db = get_database()
+    cid = db.add_client("Client")
+    pid = db.add_product("Article", 100, stock_quantity=10)
+    db.create_sale(db.generate_invoice_number(), cid,
+                   [{"product_id": pid, "quantity": 2, "unit_price": 100}])
+    db.update_product(pid, "Article", 100, stock_quantity=12)
+    # produit cree avant le mouvement 'initial': stock d'ouverture non trace
+    legacy = db.conn.execute("INSERT INTO products (name, selling_price, stock_quantity) "
+                             "VALUES ('Ancien', 50, 4)").lastrowid
+    db.conn.commit()
+    db.create_sale(db.generate_invoice_number(), cid,
+                   [{"product_id": legacy, "quantity": 1, "unit_price": 50}])
+
+    integrity.run_checks(db.db_path, pause=0)
+
+    found = _open_keys(db)
+    assert "stock:mismatch" not in found
+    assert found["stock:opening"]["severity"] == "info" and not found["stock:opening"]["repair"]
+    assert found["stock:opening"]["details"] == f"#{legacy} Ancien: stock 3, mouvements -1"
+
+
+def test_repairs_run_in_batches_and_resolve_on_next_run(monkeypatch):
+    monkeypatch.setattr(integrity, "REPAIR_BATCH", 2)
+    db = get_database()
+    pid = _seed_anomalies(db)
+    db.conn.executemany("INSERT INTO stock_movements (product_id, movement_type, quantity) VALUES (?, 'x', 1)",
+                        [(900 + i,) for i in range(5)])
+    db.conn.commit()
+    integrity.run_checks(db.db_path, pause=0)
+
+    repaired = {key: integrity.repair_finding(db.db_path, f["id"], actor={"id": 1, "username": "admin"})
+                for key, f in _open_keys(db).items() if f["repair"]}
+
+    assert repaired == {"orphan:sale_items_sale": 1, "orphan:sales_client": 1,
+                        "orphan:stock_movements_product": 5, "stock:mismatch": 1}
+    moved = db.conn.execute("SELECT SUM(quantity) FROM stock_movements WHERE product_id = ?", (pid,)).fetchone()[0]
+    assert moved == 7
+    assert db.conn.execute("SELECT COUNT(*) FROM audit_log WHERE action = 'integrity_repair'").fetchone()[0] == 4
+
+    integrity.run_checks(db.db_path, pause=0)
+    assert set(_open_keys(db)) == {"foreign_key:products:categories"}
+
+
+def test_cancelled_run_keeps_previous_findings_and_schedule_is_due():
+    db = get_database()
+    _seed_anomalies(db)
+    assert integrity.is_due(db.db_path, 24)
+    integrity.run_checks(db.db_path, pause=0)
+    assert not integrity.is_due(db.db_path, 24)
+    db.conn.execute("DELETE FROM sale_items WHERE sale_id = 999")
+    db.conn.commit()
+
+    report = integrity.run_checks(db.db_path, cancelled=lambda: True, pause=0)
+
+    assert report.status == "cancelled" and report.checks == 1
+    assert "orphan:sale_items_sale" in _open_keys(db)
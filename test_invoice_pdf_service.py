@@ -0,0 +1,88 @@
+import os
+
+import invoice_pdf
+from db_manager import get_database
+from services import invoice_pdf_service
+from services.invoice_pdf_service import InvoicePdfService, render_batch
+
+
+def _seed_sales(db, count):
+    cid = db.add_client("Client Lot", phone="0555", address="Alger")
+    pid = db.add_product("Article", 100, stock_quantity=1000)
+    return [db.create_sale(db.generate_invoice_number(), cid,
+                           [{"product_id": pid, "quantity": 2, "unit_price": 100}])
+            for _ in range(count)]
+
+
+def test_styles_and_company_lines_are_built_once():
+    assert invoice_pdf.invoice_styles() is invoice_pdf.invoice_styles()
+    company = {"name": "DAR ELSSALEM", "phone": "023"}
+    key = invoice_pdf.company_key(company)
+    assert invoice_pdf.company_lines(*key) is invoice_pdf.company_lines(*key)
+    assert invoice_pdf.company_lines(*key) == ("DAR", "DAR ELSSALEM", ("Tél : 023",))
+
+    # flowables reportlab (modifiés par wrap/split): neufs à chaque document
+    first, second = invoice_pdf.company_block(company), invoice_pdf.company_block(company)
+    assert not any(a is b for a, b in zip(first, second))
+
+
+def test_batch_renders_in_memory_in_sale_order():
+    db = get_database()
+    ids = _seed_sales(db, 3)
+    service = InvoicePdfService(db)
+
+    invoices = service.load_invoices(list(reversed(ids)))
+    assert [sale_id for sale_id, _ in invoices] == list(reversed(ids))
+    assert invoices[0][1]["items"][0]["quantity"] == 2
+    assert invoices[0][1]["customer"]["name"] == "Client Lot"
+
+    result = render_batch(invoices)
+    assert set(result.outputs) == set(ids)
+    assert all(pdf.startswith(b"%PDF") for pdf in result.outputs.values())
+    assert result.invoices_per_second > 0
+    assert not result.errors
+
+
+def test_batch_uses_process_pool_and_writes_files(tmp_path, monkeypatch):
+    db = get_database()
+    ids = _seed_sales(db, 4)
+    monkeypatch.setattr(invoice_pdf_service, "MIN_PARALLEL_BATCH", 2)
+
+    result = InvoicePdfService(db).render_sales(ids, str(tmp_path / "out"), max_workers=2)
+
+    assert result.workers == 2
+    assert len(result.outputs) == 4
+    files = sorted(p.name for p in (tmp_path / "out").iterdir())
+    assert len(files) == 4 and all(f.startswith("facture_") for f in files)
+
+
+def test_batch_stops_when_cancelled():
+    db = get_database()
+    ids = _seed_sales(db, 3)
+    invoices = InvoicePdfService(db).load_invoices(ids)
+
+    result = render_batch(invoices, cancelled=lambda: True)
+
+    assert result.cancelled
+    assert len(result.outputs) == 1
+
+
+def test_cached_pdf_is_reused_until_inputs_change(monkeypatch):
+    db = get_database()
+    (sale_id,) = _seed_sales(db, 1)
+    service = InvoicePdfService(db)
+    renders = []
+    real_create = invoice_pdf.create_invoice_pdf
+    monkeypatch.setattr(invoice_pdf, "create_invoice_pdf",
+                        lambda data, path: renders.append(path) or real_create(data, path))
+
+    path, digest = service.cached_pdf(sale_id)
+    assert service.cached_pdf(sale_id) == (path, digest)
+    assert len(renders) == 1
+
+    db.set_setting("company_phone", "021 00 00 00")
+    new_path, new_digest = service.cached_pdf(sale_id)
+
+    assert len(renders) == 2
+    assert new_digest != digest
+    assert os.path.exists(new_path) and not os.path.exists(path)
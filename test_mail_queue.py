@@ -0,0 +1,165 @@
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+import pytest
+
+from db_manager import get_database
+from services import mail_queue
+from services.mail_queue import SmtpSettings, deliver_due, get_mail_queue
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Serveur SMTP minimal: enregistre les sessions et les messages recus."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        self.reply("220 localhost ESMTP test")
+        rcpts = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            verb = line.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                rcpts = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                addr = line.split(":", 1)[1].strip(" <>")
+                code = server.refuse.get(addr)
+                if code:
+                    self.reply(f"{code} refuse")
+                else:
+                    rcpts.append(addr)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 go")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data += chunk
+                server.messages.append((rcpts, message_from_bytes(data, policy=policy.default)))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SmtpHandler)
+    server.daemon_threads = True
+    server.sessions, server.messages, server.refuse = 0, [], {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _settings(server):
+    return SmtpSettings("127.0.0.1", server.server_address[1], "erp@test.local",
+                        use_tls=False, timeout=5)
+
+
+def test_batch_is_sent_over_one_session(smtp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(mail_queue, "CLAIM_SIZE", 7)  # plusieurs reservations, une session
+    queue = get_mail_queue(get_database())
+    pdf = tmp_path / "releve.pdf"
+    pdf.write_bytes(b"%PDF-1.4 test")
+    batch = queue.enqueue_many(
+        [{"recipients": f"client{i}@test.local", "subject": f"Releve {i}", "body": "Bonjour",
+          "attachment_path": str(pdf)} for i in range(20)])
+
+    report = deliver_due(queue, _settings(smtp_server), batch_id=batch)
+
+    assert report.sent == 20 and report.sessions == 1
+    assert smtp_server.sessions == 1 and len(smtp_server.messages) == 20
+    rcpts, msg = smtp_server.messages[0]
+    assert rcpts == ["client0@test.local"]
+    assert [p.get_filename() for p in msg.iter_attachments()] == ["releve.pdf"]
+    assert queue.batch_status(batch) == {"pending": 0, "sending": 0, "sent": 20, "failed": 0, "total": 20}
+    assert list((tmp_path / "mail_spool").iterdir()) == []
+
+
+def test_failures_are_retried_with_backoff_or_failed(smtp_server):
+    queue = get_mail_queue(get_database())
+    smtp_server.refuse = {"busy@test.local": 451, "unknown@test.local": 550}
+    batch = queue.enqueue_many([{"recipients": r, "subject": "Facture"} for r in
+                                ("ok@test.local", "busy@test.local", "unknown@test.local")])
+
+    report = deliver_due(queue, _settings(smtp_server), batch_id=batch)
+
+    assert (report.sent, report.retried, report.failed) == (1, 1, 1)
+    by_rcpt = {m["recipients"]: m for m in queue.messages(batch)}
+    assert by_rcpt["busy@test.local"]["status"] == "pending"
+    assert by_rcpt["busy@test.local"]["attempts"] == 1
+    assert by_rcpt["unknown@test.local"]["status"] == "failed"
+    # La nouvelle tentative n'est pas encore echue
+    assert deliver_due(queue, _settings(smtp_server), batch_id=batch).processed == 0
+    assert mail_queue.retry_delay(1) < mail_queue.retry_delay(2) <= mail_queue.RETRY_MAX_SECONDS
+
+
+def test_unreachable_server_reschedules_whole_batch():
+    queue = get_mail_queue(get_database())
+    batch = queue.enqueue_many([{"recipients": "a@test.local", "subject": "x"},
+                                {"recipients": "b@test.local", "subject": "y"}])
+    probe = socketserver.TCPServer(("127.0.0.1", 0), socketserver.BaseRequestHandler)
+    port = probe.server_address[1]
+    probe.server_close()
+
+    report = deliver_due(queue, SmtpSettings("127.0.0.1", port, use_tls=False, timeout=2),
+                         batch_id=batch)
+
+    assert report.retried == 2 and report.sessions == 0
+    assert queue.batch_status(batch)["pending"] == 2
+
+
+def test_sale_invoices_are_queued_as_one_batch(smtp_server):
+    from invoice_email import queue_sale_invoices
+
+    db = get_database()
+    cid = db.add_client("Client Releve")
+    pid = db.add_product("Article", 100, stock_quantity=100)
+    ids = [db.create_sale(db.generate_invoice_number(), cid,
+                          [{"product_id": pid, "quantity": 1, "unit_price": 100}])
+           for _ in range(3)]
+
+    batch = queue_sale_invoices({sale_id: "compta@test.local" for sale_id in ids}, db=db)
+    report = deliver_due(get_mail_queue(db), _settings(smtp_server), batch_id=batch)
+
+    assert report.sent == 3 and smtp_server.sessions == 1
+    _, msg = smtp_server.messages[0]
+    assert msg.get_body(("html",)) is not None
+    assert next(msg.iter_attachments()).get_filename().startswith("facture_")
+
+
+def test_month_invoices_are_queued_to_client_emails(smtp_server):
+    from invoice_email import month_sale_ids, queue_client_invoices
+
+    db = get_database()
+    with_email = db.add_client("Client Mail", email="releve@test.local")
+    without_email = db.add_client("Client Sans Mail")
+    pid = db.add_product("Article Mois", 100, stock_quantity=100)
+    items = [{"product_id": pid, "quantity": 1, "unit_price": 100}]
+    in_month = [db.create_sale(db.generate_invoice_number(), cid, items, sale_date="2026-09-15 10:00:00")
+                for cid in (with_email, with_email, without_email)]
+    db.create_sale(db.generate_invoice_number(), with_email, items, sale_date="2026-10-01 09:00:00")
+
+    ids = month_sale_ids("2026-09", db=db)
+    assert set(in_month) <= set(ids)
+    batch, queued, skipped = queue_client_invoices(in_month, db=db)
+    report = deliver_due(get_mail_queue(db), _settings(smtp_server), batch_id=batch)
+
+    assert (queued, skipped) == (2, 1)
+    assert report.sent == 2 and smtp_server.sessions == 1
+    assert all(rcpts == ["releve@test.local"] for rcpts, _ in smtp_server.messages)
@@ -0,0 +1,53 @@
+import sys
+
+import pytest
+
+from db_manager import get_database
+from models.client import Client
+from models.product import Product
+from repositories.client_repository import ClientRepository
+from repositories.product_repository import ProductRepository
+from repositories.sale_repository import SaleRepository
+
+
+def test_models_have_no_instance_dict_and_stay_small():
+    p = Product(1, "Stylo", None, None, 10.0, 20.0, 5, 1, "123", "2024-01-01", "2024-01-01", "Bureau")
+
+    assert not hasattr(p, "__dict__")
+    assert sys.getsizeof(p) < sys.getsizeof(p.to_dict())
+    with pytest.raises(AttributeError):
+        p.colour = "bleu"
+
+
+def test_models_keep_dict_style_access_for_ui_code():
+    c = Client.from_row((7, "Karim", "0555", None, None, None, "2024-01-01", None))
+
+    assert c["name"] == "Karim"
+    assert c.get("email") is None
+    assert c.get("missing", "x") == "x"
+    assert "phone" in c
+    with pytest.raises(KeyError):
+        c["missing"]
+    assert Client.from_dict(c.to_dict()).to_dict() == c.to_dict()
+
+
+def test_repositories_build_models_from_rows():
+    db = get_database()
+    cat = db.add_category("Papeterie")
+    pid = db.add_product("Cahier", 120, stock_quantity=4, category_id=cat)
+    cid = db.add_client("Amine", "0661")
+    sale_id = db.create_sale("F-M-1", cid, [
+        {"product_id": pid, "quantity": 2, "unit_price": 120, "total": 240},
+    ])
+
+    (product,) = ProductRepository(db).list_products()
+    assert isinstance(product, Product)
+    assert (product.id, product.category_name, product.stock_quantity) == (pid, "Papeterie", 2)
+
+    (client,) = ClientRepository(db).list_clients()
+    assert client.phone == "0661"
+
+    (sale,) = SaleRepository(db).list_sales()
+    assert (sale.id, sale.client_name, sale.items_count) == (sale_id, "Amine", 1)
+    (item,) = SaleRepository(db).get_sale_items(sale_id)
+    assert (item.product_name, item.quantity, item.total) == ("Cahier", 2, 240)
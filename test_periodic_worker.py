@@ -0,0 +1,48 @@
+import threading
+
+from db_manager import get_database
+from services.periodic_worker import PeriodicWorker
+
+
+class FlakyWorker(PeriodicWorker):
+    thread_name = "test-periodic"
+    label = "Travail de test"
+    startup_delay = 3600
+
+    ticks = 0
+    ticked = threading.Event()
+
+    def tick(self):
+        type(self).ticks += 1
+        type(self).ticked.set()
+        if type(self).ticks == 1:
+            raise RuntimeError("premier passage en echec")
+
+
+def _wait_ticks(worker, count):
+    for _ in range(100):
+        if FlakyWorker.ticks >= count:
+            return
+        FlakyWorker.ticked.wait(0.05)
+        FlakyWorker.ticked.clear()
+
+
+def test_start_once_wake_and_stop():
+    db = get_database()
+    assert FlakyWorker.wake_running() is False
+
+    worker = FlakyWorker.start_once(db)
+    try:
+        assert FlakyWorker.start_once(db) is worker
+        assert FlakyWorker.ticks == 0            # attente de demarrage
+
+        assert FlakyWorker.wake_or_start(db) is worker
+        _wait_ticks(worker, 1)
+        assert FlakyWorker.wake_running() is True
+        _wait_ticks(worker, 2)                   # l'echec du 1er passage ne l'arrete pas
+        assert FlakyWorker.ticks == 2
+    finally:
+        worker.stop()
+        worker.join(5)
+    assert not worker.is_alive()
+    assert FlakyWorker.wake_running() is False
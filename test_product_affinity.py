@@ -0,0 +1,60 @@
+import pytest
+
+from db_manager import get_database
+from services import product_affinity
+
+
+def _catalog(db):
+    return {name: db.add_product(name, 100, stock_quantity=1000)
+            for name in ("Cafe", "Sucre", "Lait", "Pain", "Sel")}
+
+
+def _basket(db, cid, *pids):
+    db.create_sale(db.generate_invoice_number(), cid,
+                   [{"product_id": pid, "quantity": 1, "unit_price": 100} for pid in pids], tax_rate=0)
+
+
+def test_top_neighbours_with_confidence_and_lift():
+    db = get_database()
+    cid = db.add_client("Client")
+    p = _catalog(db)
+    for _ in range(3):
+        _basket(db, cid, p["Cafe"], p["Sucre"])
+    _basket(db, cid, p["Cafe"], p["Lait"])
+    _basket(db, cid, p["Cafe"], p["Lait"])
+    for _ in range(5):
+        _basket(db, cid, p["Pain"], p["Sel"])
+
+    assert product_affinity.update_index(db.db_path) == 10
+    rows = db.conn.execute("SELECT related_id, together, confidence, lift, rank FROM product_affinity "
+                           "WHERE product_id = ? ORDER BY rank", (p["Cafe"],)).fetchall()
+
+    assert [tuple(r)[:2] + (r[4],) for r in rows] == [(p["Sucre"], 3, 1), (p["Lait"], 2, 2)]
+    assert rows[0]["confidence"] == pytest.approx(3 / 5)
+    assert rows[0]["lift"] == pytest.approx(3 * 10 / (5 * 3))
+    suggested = db.get_product_suggestions([p["Cafe"]])
+    assert [s["name"] for s in suggested] == ["Sucre", "Lait"]
+    assert db.get_product_suggestions([p["Cafe"], p["Sucre"]])[0]["name"] == "Lait"
+
+
+def test_incremental_update_reads_only_new_sales_and_matches_rebuild():
+    db = get_database()
+    cid = db.add_client("Client")
+    p = _catalog(db)
+    for _ in range(2):
+        _basket(db, cid, p["Pain"], p["Sel"])
+        _basket(db, cid, p["Cafe"], p["Sucre"], p["Lait"])
+    product_affinity.update_index(db.db_path)
+
+    for _ in range(3):
+        _basket(db, cid, p["Pain"], p["Lait"])
+    assert product_affinity.update_index(db.db_path) == 3
+
+    incremental = db.conn.execute("SELECT product_id, related_id, together, rank FROM product_affinity "
+                                  "ORDER BY product_id, rank").fetchall()
+    product_affinity.update_index(db.db_path, rebuild=True)
+    rebuilt = db.conn.execute("SELECT product_id, related_id, together, rank FROM product_affinity "
+                              "ORDER BY product_id, rank").fetchall()
+    assert [tuple(r) for r in incremental] == [tuple(r) for r in rebuilt]
+    # Pain + Lait: 3 paniers sur 7 mais Lait est dans 5 paniers, lift < 1
+    assert [s["name"] for s in db.get_product_suggestions([p["Pain"]])] == ["Sel"]
@@ -0,0 +1,62 @@
+import json
+import sqlite3
+
+import pytest
+
+from db_manager import get_database
+from services.query_profiler import PROFILER, ProfiledCursor, StatementStats
+
+
+@pytest.fixture
+def profiler():
+    PROFILER.reset()
+    yield PROFILER
+    PROFILER.configure(enabled=False, slow_ms=100)
+    PROFILER.reset()
+
+
+def test_disabled_profiler_leaves_plain_cursor(profiler):
+    db = get_database()
+    assert type(db.cursor) is sqlite3.Cursor
+    db.cursor.execute("SELECT COUNT(*) FROM products").fetchone()
+    assert profiler.snapshot()["calls"] == 0
+
+
+def test_cursor_calls_are_timed_with_rows_and_slow_plans(profiler, tmp_path):
+    db = get_database()
+    for name in ("A", "B", "C"):
+        db.add_client(name)
+    db.set_query_profiling(True, slow_ms=0)
+    assert isinstance(db.cursor, ProfiledCursor)
+    assert db.get_setting("query_profiling") == "1"
+
+    for ids in ((1,), (1, 2), (1, 2, 3)):
+        db.cursor.execute(f"SELECT name FROM clients WHERE id IN ({','.join('?' * len(ids))})", ids)
+        db.cursor.fetchall()
+    db.cursor.execute("UPDATE clients SET phone = '0' WHERE id > ?", (1,))
+
+    top = {q["sql"]: q for q in profiler.top()}
+    select = top["SELECT name FROM clients WHERE id IN (?...)"]
+    assert (select["count"], select["rows"]) == (3, 6)
+    assert sum(select["histogram"].values()) == 3
+    assert top["UPDATE clients SET phone = '0' WHERE id > ?"]["rows"] == 2
+    slow = profiler.slow_queries()
+    assert slow[0]["sql"].startswith("UPDATE clients")
+    assert any("clients" in line for line in slow[-1]["plan"])
+
+    data = profiler.dump(tmp_path / "profile.json")
+    assert json.loads((tmp_path / "profile.json").read_text(encoding="utf-8"))["calls"] == data["calls"] == 4
+
+    db.set_query_profiling(False)
+    assert type(db.cursor) is sqlite3.Cursor
+    assert db.get_setting("query_profiling") == "0"
+
+
+def test_histogram_percentile():
+    stats = StatementStats("SELECT 1")
+    for ms in [0.5] * 90 + [20] * 8 + [2000] * 2:
+        stats.add(ms, 1)
+    assert stats.percentile(0.5) == 1
+    assert stats.percentile(0.95) == 50
+    assert stats.percentile(0.99) is None
+    assert stats.as_dict()["max_ms"] == 2000
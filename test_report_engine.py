@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+import report_engine
+from db_manager import get_database
+from reports_module import ReportColumn, ReportTableModel
+
+
+def _seed_sales(db):
+    pid = db.add_product("Cahier", 100, stock_quantity=50, min_stock=5)
+    db.cursor.execute("UPDATE products SET purchase_price = 60 WHERE id = ?", (pid,))
+    alice = db.add_client("Alice")
+    bob = db.add_client("Bob")
+    db.add_client("Chloe")
+    db.create_sale("F-1", alice, [{"product_id": pid, "quantity": 2, "unit_price": 100}],
+                   tax_rate=0, sale_date="2026-01-10 10:00:00")
+    db.create_sale("F-2", bob, [{"product_id": pid, "quantity": 1, "unit_price": 100}],
+                   tax_rate=0, sale_date="2026-02-10 10:00:00")
+    db.create_sale("F-3", alice, [{"product_id": pid, "quantity": 3, "unit_price": 100}],
+                   tax_rate=0, sale_date="2026-02-20 10:00:00")
+    return pid
+
+
+def test_sales_report_is_columnar_with_sql_totals():
+    db = get_database()
+    _seed_sales(db)
+
+    result = report_engine.sales_report(db)
+
+    assert len(result) == 3
+    assert result.column("invoice_number") == ("F-3", "F-2", "F-1")
+    assert result.totals == {"count": 3, "revenue": 600.0, "tax": 0.0}
+
+    february = report_engine.sales_report(db, "2026-02-01", "2026-02-28")
+    assert february.totals["count"] == 2
+    assert february.totals["revenue"] == 400.0
+
+
+def test_clients_profit_and_trends_reports():
+    db = get_database()
+    _seed_sales(db)
+
+    clients = report_engine.clients_report(db)
+    assert clients.column("name") == ("Alice", "Bob", "Chloe")
+    assert clients.column("rank") == (1, 2, 3)
+    assert clients.totals == {"clients": 3, "revenue": 600.0, "active": 2}
+
+    profit = report_engine.profit_report(db)
+    assert profit.column("margin") == (40.0,)
+    assert profit.totals == {"revenue": 600.0, "cost": 360.0, "profit": 240.0}
+
+    trends = report_engine.trends_report(db, group=2)
+    assert trends.column("period") == ("2026-01", "2026-02")
+    assert trends.column("evolution") == (None, 100.0)
+    assert trends.totals["best_period"] == "2026-02"
+    assert trends.totals["growth"] == 100.0
+
+
+def test_stock_report_filters_in_sql():
+    db = get_database()
+    db.add_product("Vide", 10, stock_quantity=0, min_stock=2)
+    db.add_product("Faible", 10, stock_quantity=1, min_stock=2)
+    db.add_product("Plein", 10, stock_quantity=9, min_stock=2)
+
+    everything = report_engine.stock_report(db)
+    assert everything.column("status") == ("rupture", "low", "normal")
+    assert everything.totals["low"] == 1 and everything.totals["out"] == 1
+
+    low_only = report_engine.stock_report(db, 1)
+    assert low_only.column("name") == ("Faible",)
+    assert low_only.totals["products"] == 1
+    assert everything.totals["products"] == 3
+
+
+def test_table_model_formats_cells_on_demand():
+    result = report_engine.ReportResult(("name", "amount"), [("A", "B"), (1.5, -2.0)])
+    model = ReportTableModel([
+        ReportColumn("Nom", "name"),
+        ReportColumn("Montant", "amount", lambda v: f"{v:.2f}",
+                     lambda v: "#22C55E" if v >= 0 else "#EF4444"),
+    ])
+    model.set_result(result)
+
+    assert (model.rowCount(), model.columnCount()) == (2, 2)
+    assert model.data(model.index(1, 1)) == "-2.00"
+    assert list(model.iter_display_rows()) == [["A", "1.50"], ["B", "-2.00"]]
+
+
+@pytest.mark.skipif(not os.getenv("ERP_PERF_TESTS"), reason="mesure de temps: ERP_PERF_TESTS=1")
+def test_stock_report_200k_products_under_one_second():
+    db = get_database()
+    db.conn.executemany(
+        "INSERT INTO products (name, selling_price, purchase_price, stock_quantity, min_stock) "
+        "VALUES (?, 100, 60, ?, 5)",
+        ((f"P{i:06d}", i % 50) for i in range(200_000)))
+    db.conn.commit()
+    report_engine.stock_report(db, 1)       # cache SQLite chaud, comme a l'ouverture suivante
+
+    start = time.perf_counter()
+    result = report_engine.stock_report(db)
+    elapsed = time.perf_counter() - start
+
+    assert result.totals["products"] == len(result) == 200_000
+    assert elapsed < 1.0, f"{elapsed:.2f} s"
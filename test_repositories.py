@@ -0,0 +1,78 @@
+import pytest
+
+from db_manager import get_database
+from repositories.client_repository import ClientRepository
+from repositories.pagination import decode_cursor, encode_cursor, iter_pages
+from repositories.product_repository import ProductRepository
+from repositories.return_repository import ReturnRepository
+from repositories.sale_repository import SaleRepository
+
+
+def test_client_keyset_pages_cover_all_rows_in_order():
+    db = get_database()
+    for name in ["Zoe", "Adam", "Bob", "Adam", "Carla"]:
+        db.add_client(name)
+    repo = ClientRepository(db)
+
+    seen = []
+    for page in iter_pages(repo.iter_page, limit=2):
+        seen.extend((c["name"], c["id"]) for c in page.items)
+
+    assert seen == sorted(seen)
+    assert len(seen) == 5
+
+
+def test_product_page_is_parameterized_and_reports_end():
+    db = get_database()
+    for i in range(3):
+        db.add_product(f"P{i}", 10 + i)
+    repo = ProductRepository(db)
+
+    first = repo.iter_page(limit=2)
+    assert [p["name"] for p in first.items] == ["P0", "P1"]
+    assert first.next_cursor == ("P1", first.items[-1]["id"])
+
+    last = repo.iter_page(after=first.next_cursor, limit=2)
+    assert [p["name"] for p in last.items] == ["P2"]
+    assert last.next_cursor is None
+
+
+def test_sales_are_paged_most_recent_first():
+    db = get_database()
+    pid = db.add_product("Article", 100, stock_quantity=50)
+    for day in range(1, 6):
+        db.create_sale(f"FAC-{1000 + day}", None,
+                       [{"product_id": pid, "quantity": 1, "unit_price": 100}],
+                       tax_rate=0, sale_date=f"2026-01-0{day} 10:00:00")
+    repo = SaleRepository(db)
+
+    page = repo.iter_page(limit=3)
+    assert [s["invoice_number"] for s in page.items] == ["FAC-1005", "FAC-1004", "FAC-1003"]
+    assert page.items[0]["items_count"] == 1
+
+    rest = repo.iter_page(after=page.next_cursor, limit=3)
+    assert [s["invoice_number"] for s in rest.items] == ["FAC-1002", "FAC-1001"]
+
+
+def test_cursor_token_round_trip_and_rejects_garbage():
+    token = encode_cursor(("Élodie", 42))
+    assert decode_cursor(token) == ("Élodie", 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_return_pages_and_totals():
+    db = get_database()
+    cid = db.add_client("Client")
+    pid = db.add_product("Stylo", 10, stock_quantity=100)
+    for _ in range(3):
+        sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                                 [{"product_id": pid, "quantity": 2, "unit_price": 10}], tax_rate=0)
+        db.create_return(sale_id, [{"product_id": pid, "quantity": 1, "unit_price": 10, "total": 10}])
+    repo = ReturnRepository(db)
+
+    pages = list(iter_pages(repo.iter_page, limit=2))
+
+    assert [len(p.items) for p in pages] == [2, 1]
+    assert len({r["id"] for p in pages for r in p.items}) == 3
+    assert repo.totals() == (3, pytest.approx(30))
@@ -0,0 +1,51 @@
+import importlib.util
+from pathlib import Path
+
+import report_engine
+from db_manager import get_database
+
+MIGRATION = Path(__file__).parent / "migrations" / "sql" / "V011__sale_item_snapshots.py"
+
+
+def _sale(db):
+    cid = db.add_client("Client")
+    pid = db.add_product("Cafe moulu 250g", 300, purchase_price=120, stock_quantity=20, barcode="613000")
+    sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                             [{"product_id": pid, "quantity": 3, "unit_price": 300}], tax_rate=0)
+    return pid, sale_id
+
+
+def test_sold_name_survives_rename_and_deletion():
+    db = get_database()
+    pid, sale_id = _sale(db)
+    db.create_return(sale_id, [{"product_id": pid, "quantity": 1, "unit_price": 300, "total": 300}])
+    db.conn.execute("UPDATE products SET name = 'Cafe 500g', barcode = '999' WHERE id = ?", (pid,))
+    db.conn.commit()
+    db.delete_product(pid)
+
+    item = db.get_sale_by_id(sale_id)["items"][0]
+    assert (item["product_name"], item["product_reference"], item["unit_cost"]) == ("Cafe moulu 250g", "613000", 120)
+    assert db.get_sale_items(sale_id)[0]["product_name"] == "Cafe moulu 250g"
+    assert db.get_top_products()[0]["name"] == "Cafe moulu 250g"
+    assert report_engine.profit_report(db).column("name") == ("Cafe moulu 250g",)
+    returned = db.conn.execute("SELECT product_name, barcode, unit_cost FROM return_items").fetchone()
+    assert tuple(returned) == ("Cafe moulu 250g", "613000", 120)
+
+
+def test_backfill_migration_fills_existing_rows_in_batches():
+    db = get_database()
+    for _ in range(5):
+        _sale(db)
+    db.conn.execute("UPDATE sale_items SET product_name = NULL, barcode = NULL")
+    db.conn.commit()
+    assert db.conn.execute("SELECT COUNT(*) FROM schema_migrations "
+                           "WHERE version = 'V011__sale_item_snapshots'").fetchone()[0] == 1
+
+    spec = importlib.util.spec_from_file_location("v011", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    migration.BATCH = 2
+    migration.migrate(db.conn)
+
+    names = db.conn.execute("SELECT DISTINCT product_name, barcode FROM sale_items").fetchall()
+    assert [tuple(r) for r in names] == [("Cafe moulu 250g", "613000")]
@@ -0,0 +1,57 @@
+import sqlite3
+
+import db_manager
+from currency import CurrencyManager
+from db_manager import get_database
+
+
+def _count_statements(db):
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    return statements
+
+
+def test_settings_are_read_once_and_written_through():
+    db = get_database()
+    db.set_setting("vat", "9")
+    assert db.get_setting("vat") == "9"
+
+    statements = _count_statements(db)
+    for _ in range(100):
+        db.get_setting("vat")
+        db.get_tax_rates()
+    assert statements == []
+
+    version = db.settings_version
+    db.set_setting("vat", "7")
+    assert db.get_tax_rates()["sales_tax"] == 7.0
+    assert db.settings_version == version + 1
+    assert db.get_setting("missing", "defaut") == "defaut"
+
+
+def test_writes_from_another_connection_are_detected(monkeypatch):
+    db = get_database()
+    db.set_setting("company_name", "Avant")
+    assert db.get_setting("company_name") == "Avant"
+    monkeypatch.setattr(db_manager, "SETTINGS_CHECK_SECONDS", 0)
+
+    other = sqlite3.connect(db.db_path)
+    with other:
+        other.execute("UPDATE settings SET value = 'Apres' WHERE key = 'company_name'")
+    other.close()
+
+    assert db.get_setting("company_name") == "Apres"
+
+
+def test_currency_load_uses_one_settings_snapshot():
+    db = get_database()
+    db.set_setting("currency_primary", "EUR")
+    db.set_setting("rate_EUR_to_DZD", "150")
+    db.get_settings()
+
+    statements = _count_statements(db)
+    manager = CurrencyManager()
+    manager.load(db)
+
+    assert not [sql for sql in statements if "settings" in sql]
+    assert manager._primary_code == "EUR" and manager._rates["EUR"] == 150.0
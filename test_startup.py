@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import main
+from db_manager import get_database
+
+ROOT = Path(__file__).resolve().parent
+# Dependances lourdes chargees a la demande (pages, PDF, exports, API)
+HEAVY_MODULES = {"flask", "reportlab", "pyqtgraph", "xlsxwriter", "numpy"}
+# Du lancement du processus a l'ecran de connexion affiche (mesure opt-in)
+STARTUP_BUDGET_SECONDS = 1.0
+
+LOGIN_SCRIPT = """
+import sys
+import config
+config.config._parser.set("database", "path", sys.argv[1])
+from PyQt6.QtWidgets import QApplication
+import main
+app = QApplication(sys.argv[:1])
+dialog = main.LoginDialog()
+dialog.show()
+app.processEvents()
+"""
+
+
+def _run(code, *args):
+    """Execute `code` avec -X importtime; retourne (duree, module -> temps cumule en us)."""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code, *args],
+                          cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    elapsed = time.perf_counter() - start
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    return elapsed, modules
+
+
+def test_main_imports_no_page_or_heavy_module():
+    _, modules = _run("import main")
+    pages = {module for _, module, _, _ in main.PAGES} - {"login_dialog"}
+    assert not (HEAVY_MODULES | pages | {"api_server"}) & modules.keys()
+
+
+def _login_screen():
+    db = get_database()          # base migree, comme au lancement normal
+    db_path = db.db_path
+    db.disconnect()
+    return _run(LOGIN_SCRIPT, str(db_path))
+
+
+def test_login_screen_imports_no_heavy_module():
+    _, modules = _login_screen()
+    assert not HEAVY_MODULES & modules.keys()
+
+
+@pytest.mark.skipif(not os.getenv("ERP_PERF_TESTS"), reason="mesure de temps: ERP_PERF_TESTS=1")
+def test_cold_start_to_login_screen_within_budget():
+    elapsed, modules = _login_screen()
+    assert elapsed < STARTUP_BUDGET_SECONDS, (
+        f"{elapsed:.2f} s, imports les plus longs: "
+        f"{sorted(modules.items(), key=lambda m: -m[1])[:10]}")
+
+
+def test_failing_background_service_does_not_stop_the_others(monkeypatch, caplog):
+    started = []
+
+    class _Module:
+        def __getattr__(self, starter):
+            return lambda **kwargs: started.append(starter)
+
+    def import_module(name):
+        if name == "api_server":
+            raise ImportError("No module named 'flask'")
+        return _Module()
+
+    monkeypatch.setattr(main.importlib, "import_module", import_module)
+    main.start_background_services(db=get_database()).join(5)
+
+    assert "start_api_server" not in started
+    assert started[0] == "start_mail_worker" and started[-1] == "start_segments_worker"
+    assert "api_server.start_api_server" in caplog.text
@@ -0,0 +1,72 @@
+import report_engine
+from db_manager import get_database
+from services import stock_ledger
+
+
+def _move(db, pid, quantity, created_at):
+    db.conn.execute("INSERT INTO stock_movements (product_id, movement_type, quantity, created_at) "
+                    "VALUES (?, 'test', ?, ?)", (pid, quantity, created_at))
+    db.conn.execute("UPDATE products SET stock_quantity = stock_quantity + ? WHERE id = ?", (quantity, pid))
+    db.conn.commit()
+
+
+def _product(db, name, cost=10):
+    pid = db.add_product(name, 100, purchase_price=cost, stock_quantity=0)
+    db.conn.execute("UPDATE products SET created_at = '2023-01-01 00:00:00' WHERE id = ?", (pid,))
+    db.conn.commit()
+    return pid
+
+
+def _history(db):
+    pid = _product(db, "Article")
+    for quantity, created_at in ((50, "2024-01-10 09:00:00"), (-10, "2024-02-05 12:00:00"),
+                                 (-5, "2024-02-20 18:00:00"), (20, "2024-03-03 08:30:00")):
+        _move(db, pid, quantity, created_at)
+    return pid
+
+
+EXPECTED = {"2023-12-31": 0, "2024-01-31": 50, "2024-02-10": 40, "2024-02-29": 35, "2024-06-30": 55}
+
+
+def test_stock_at_date_is_the_same_with_or_without_snapshots():
+    db = get_database()
+    pid = _history(db)
+    recent = db.add_product("Nouveau", 100, stock_quantity=10)
+
+    replayed = {day: stock_ledger.stock_at(db.conn, day, pid) for day in EXPECTED}
+    created = stock_ledger.ensure_snapshots(db.db_path)
+    anchored = {day: stock_ledger.stock_at(db.conn, day, pid) for day in EXPECTED}
+
+    assert replayed == anchored == EXPECTED
+    periods = dict(db.conn.execute("SELECT period, products FROM stock_snapshots"))
+    assert created == len(periods) and min(periods) == "2024-01" and periods["2024-02"] == 1
+    assert stock_ledger.stock_at(db.conn, "2024-02-29") == {pid: 35}
+    assert stock_ledger.stock_at(db.conn, stock_ledger.date.today()) == {pid: 55, recent: 10}
+    # Debut de mois: l'instantane suffit, aucun mouvement a rejouer
+    cut = stock_ledger.movement_cut(db.conn, "2024-03-01 00:00:00")
+    assert stock_ledger.find_anchor(db.conn, cut).last_movement_id == cut
+    assert stock_ledger.ensure_snapshots(db.db_path) == 0
+
+
+def test_average_inventory_turnover_and_valuation():
+    db = get_database()
+    pid = _product(db, "Article", cost=10)
+    _move(db, pid, 100, "2023-12-20 10:00:00")
+    cid = db.add_client("Client")
+    sale_id = db.create_sale(db.generate_invoice_number(), cid,
+                             [{"product_id": pid, "quantity": 60, "unit_price": 100}])
+    db.conn.execute("UPDATE sales SET sale_date = '2024-01-15 11:00:00' WHERE id = ?", (sale_id,))
+    db.conn.execute("UPDATE stock_movements SET created_at = '2024-01-15 11:00:00' "
+                    "WHERE created_at > '2025-01-01'")
+    db.conn.commit()
+
+    for _ in range(2):      # sans puis avec instantanes
+        report = report_engine.inventory_report(db, "2024-01-01", "2024-02-29")
+        assert list(report.rows()) == [("Article", "—", 100, 40, 60.0, 600.0, 400.0)]
+        assert report.totals["cogs"] == 600 and report.totals["turnover"] == 1.0
+        turnover = db.get_inventory_turnover("2024-01-01", "2024-02-29")
+        assert turnover["avg_stock_value"] == 600 and turnover["turnover_rate"] == 1.0
+        stock_ledger.ensure_snapshots(db.db_path)
+
+    valuation = report_engine.valuation_report(db, "2024-01-10")
+    assert valuation.totals["value"] == 1000 and valuation.column("quantity") == (100,)